@@ -0,0 +1,85 @@
+"""
+Benchmark est.BlockCoordinateEstimator against the number of workers
+
+For each worker type (threads or processes) and number of workers, fits an embedding model
+for a fixed number of sweeps, checks that the cost of each sweep agrees with a single worker,
+then reports the time of the first sweep (which builds the cost functions of blocks),
+the mean time of the other sweeps, and the speedup of the other sweeps over a single worker
+
+Usage: python benchmarks/bench_block_coordinate.py [num_students] [num_ixns_per_student] [embedding_dimension] [block_size] [num_sweeps]
+"""
+
+from __future__ import division
+
+import multiprocessing
+import sys
+
+import numpy as np
+
+from lentil import est
+from lentil import models
+from lentil import telemetry
+
+from bench_common import make_history
+
+
+NUM_WORKERS = [1, 2, 4, 8]
+
+
+def fit(history, split_history, embedding_dimension, block_size, num_sweeps, **kwargs):
+    """
+    Fit an embedding model with est.BlockCoordinateEstimator
+
+    :param dict kwargs: Other arguments for est.BlockCoordinateEstimator
+    :rtype: (list[float], list[float])
+    :return: (cost of each sweep, seconds spent in each sweep)
+    """
+
+    records = []
+    np.random.seed(0)
+    model = models.EmbeddingModel(history, embedding_dimension)
+    model.fit(est.BlockCoordinateEstimator(
+        regularization_constant=1e-3,
+        num_sweeps=num_sweeps,
+        ftol=1e-12,
+        student_max_iter=20,
+        module_max_iter=5,
+        block_size=block_size,
+        split_history=split_history,
+        telemetry=telemetry.TrainingTelemetry([records.append]),
+        **kwargs))
+    return [r['cost'] for r in records], [r['iter_time'] for r in records]
+
+
+def main(num_students=20000, num_ixns_per_student=50, embedding_dimension=5, block_size=1000,
+         num_sweeps=3):
+    history = make_history(num_students, num_ixns_per_student)
+    split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+    print('{} students, {} interactions, embedding_dimension={}, block_size={}, {} cpus'.format(
+        num_students, len(history.data), embedding_dimension, block_size,
+        multiprocessing.cpu_count()))
+    print('{:<8} {:>8} {:>16} {:>16} {:>8}'.format(
+        'workers', 'type', 'first sweep (s)', 'next sweeps (s)', 'speedup'))
+
+    expected_costs = None
+    for worker_type in est.WORKER_TYPES:
+        single_worker_time = None
+        for num_workers in NUM_WORKERS:
+            costs, sweep_times = fit(
+                history, split_history, embedding_dimension, block_size, num_sweeps,
+                num_workers=num_workers, worker_type=worker_type)
+            if expected_costs is None:
+                expected_costs = costs
+            else:
+                np.testing.assert_allclose(costs, expected_costs, rtol=1e-6)
+
+            sweep_time = np.mean(sweep_times[1:])
+            if single_worker_time is None:
+                single_worker_time = sweep_time
+            print('{:<8} {:>8} {:>16.2f} {:>16.2f} {:>8.2f}'.format(
+                num_workers, worker_type, sweep_times[0], sweep_time,
+                single_worker_time / sweep_time))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
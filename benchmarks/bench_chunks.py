@@ -0,0 +1,73 @@
+"""
+Benchmark chunked evaluation of grad.CostFunction
+
+For each chunk size and scatter backend, checks that the cost and gradient agree with
+evaluating all interactions at once, then reports the time per evaluation, the memory
+held by scratch buffers and by participation matrices or scatter indexes, and the peak
+memory allocated while setting up the cost function and evaluating it once
+
+Usage: python benchmarks/bench_chunks.py [num_students] [num_ixns_per_student] [embedding_dimension]
+"""
+
+from __future__ import division
+
+import sys
+import tracemalloc
+
+import numpy as np
+
+from lentil import grad
+
+from bench_common import make_cost_function, make_history, profile
+from bench_scatter import scatter_nbytes
+
+
+CHUNK_SIZES = [None, 1000000, 100000, 10000, 1000]
+
+
+def scratch_buffer_nbytes(cost_function):
+    """
+    :param grad.CostFunction cost_function: A cost function
+    :rtype: int
+    :return: Bytes held by the scratch buffers of the shards
+    """
+
+    buffers = {id(x): x for shard in cost_function._shards for x in shard._scratch_buffers}
+    return sum(x.nbytes for x in buffers.values())
+
+
+def main(num_students=20000, num_ixns_per_student=50, embedding_dimension=5):
+    history = make_history(num_students, num_ixns_per_student)
+    split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+    print('{} students, {} interactions, embedding_dimension={}'.format(
+        num_students, len(history.data), embedding_dimension))
+    print('{:<12} {:>10} {:>12} {:>14} {:>12} {:>12}'.format(
+        'chunk size', 'backend', 'eval (ms)', 'scratch (MB)', 'index (MB)', 'peak (MB)'))
+
+    for scatter_backend in grad.SCATTER_BACKENDS:
+        expected_cost = expected_gradient = None
+        for chunk_size in CHUNK_SIZES:
+            tracemalloc.start()
+            cost_function, param_vals = make_cost_function(
+                history, embedding_dimension, split_history=split_history,
+                scatter_backend=scatter_backend, chunk_size=chunk_size)
+            cost, gradient = cost_function(param_vals)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if expected_cost is None:
+                expected_cost, expected_gradient = cost, gradient.copy()
+            else:
+                np.testing.assert_allclose(cost, expected_cost, rtol=1e-10)
+                np.testing.assert_allclose(gradient, expected_gradient, rtol=1e-8, atol=1e-12)
+
+            eval_time, _ = profile(cost_function, param_vals)
+            print('{:<12} {:>10} {:>12.2f} {:>14.1f} {:>12.1f} {:>12.1f}'.format(
+                'all' if chunk_size is None else chunk_size, scatter_backend, 1e3 * eval_time,
+                scratch_buffer_nbytes(cost_function) / 2**20,
+                scatter_nbytes(cost_function) / 2**20, peak / 2**20))
+            cost_function.close()
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,194 @@
+"""
+Helpers shared by the benchmarks: synthetic interaction histories, cost functions
+set up the way est.EmbeddingMAPEstimator.fit_model does, and profiling of cost functions
+"""
+
+from __future__ import division
+
+from collections import OrderedDict
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from lentil import datasynth
+from lentil import datatools
+from lentil import est
+from lentil import grad
+from lentil import models
+
+
+# students complete this many assessments at each timestep, and a lesson between timesteps,
+# so about a quarter of interactions are lesson interactions
+NUM_ASSESSMENT_IXNS_PER_TIMESTEP = 3
+
+
+def make_history(num_students, num_ixns_per_student, num_assessments=100, num_lessons=50,
+                 seed=0):
+    """
+    Sample an interaction history with :py:func:`datasynth.sample_synthetic_history`,
+    from the module parameters of a random embedding model with lessons and prereqs
+
+    :param int num_students: Number of students
+    :param int num_ixns_per_student: Approximate number of interactions for each student
+    :param int num_assessments: Number of assessments
+    :param int num_lessons: Number of lessons
+    :param int seed: Random seed
+    :rtype: datatools.InteractionHistory
+    """
+
+    rng = np.random.RandomState(seed)
+    embedding_dimension = 5
+    model = models.EmbeddingModel(None, embedding_dimension=embedding_dimension)
+    model.assessment_embeddings = 0.1 + rng.random_sample((num_assessments, embedding_dimension))
+    model.lesson_embeddings = 0.1 * rng.random_sample((num_lessons, embedding_dimension))
+    model.prereq_embeddings = 0.1 + rng.random_sample((num_lessons, embedding_dimension))
+    model.assessment_biases = rng.normal(size=num_assessments)
+
+    num_timesteps = max(1, (num_ixns_per_student + 1) // (NUM_ASSESSMENT_IXNS_PER_TIMESTEP + 1))
+    return datasynth.sample_synthetic_history(
+        model, num_students, num_timesteps, size_of_test_set=0,
+        num_assessment_ixns_per_timestep=NUM_ASSESSMENT_IXNS_PER_TIMESTEP,
+        random_state=rng)
+
+
+def make_cost_function(history, embedding_dimension, using_lessons=True, using_prereqs=True,
+                       split_history=None, dtype=np.float64, **kwargs):
+    """
+    Set up the cost function the way est.EmbeddingMAPEstimator.fit_model does
+
+    :param datatools.InteractionHistory history: An interaction history
+    :param int embedding_dimension: Number of dimensions in the latent skill space
+    :param bool using_lessons: True => include lessons in the model
+    :param bool using_prereqs: True => include prereqs in the model
+    :param datatools.SplitHistory|None split_history: The history split by
+        :py:func:`datatools.InteractionHistory.split_interactions_by_type`
+        (None => split it here)
+    :param type dtype: Data type of parameters and participation matrices
+    :param dict kwargs: Other arguments for grad.CostFunction
+    :rtype: (grad.CostFunction, np.ndarray)
+    :return: (cost function, parameter values in dtype)
+    """
+
+    if split_history is None:
+        split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+    if not using_lessons and split_history.lesson_interactions[1] is not None:
+        # only keep the temporal process, like the dummy lesson interactions do
+        student_idxes_for_lesson_ixns, _, times = split_history.lesson_interactions
+        split_history = datatools.SplitHistory(
+            split_history.assessment_interactions,
+            (student_idxes_for_lesson_ixns, None, times),
+            split_history.timestep_of_last_interaction,
+            split_history.trajectory_offsets)
+
+    student_embeddings = models.StudentTrajectories(
+        split_history.trajectory_offsets, embedding_dimension)
+    num_assessments = history.num_assessments()
+    num_lessons = history.num_lessons()
+
+    param_shapes = OrderedDict([
+        (models.STUDENT_EMBEDDINGS, student_embeddings.states.shape),
+        (models.ASSESSMENT_EMBEDDINGS, (num_assessments, embedding_dimension))])
+    if using_lessons:
+        param_shapes[models.LESSON_EMBEDDINGS] = (num_lessons, embedding_dimension)
+    if using_prereqs:
+        param_shapes[models.PREREQ_EMBEDDINGS] = (num_lessons, embedding_dimension)
+    param_shapes[models.STUDENT_BIASES] = (history.num_students(), )
+    param_shapes[models.ASSESSMENT_BIASES] = (num_assessments, )
+
+    rng = np.random.RandomState(1)
+    param_vals = np.concatenate([
+        rng.random_sample(shape).ravel() + 0.1 for shape in param_shapes.values()]).astype(dtype)
+
+    if kwargs.get('scatter_backend', grad.SCATTER_BACKENDS[0]) == 'csr':
+        participation_matrices = est.compute_participation_matrices(
+            split_history, num_assessments, num_lessons if using_lessons else 0,
+            using_lessons=using_lessons, using_prereqs=using_prereqs, dtype=dtype)
+    else:
+        participation_matrices = None
+
+    cost_function = grad.CostFunction(
+        param_shapes,
+        split_history.assessment_interactions,
+        split_history.lesson_interactions,
+        participation_matrices,
+        student_embeddings.student_idxes_of_states(),
+        regularization_constant=[1e-3] * 5,
+        using_lessons=using_lessons,
+        using_prereqs=using_prereqs,
+        dtype=dtype,
+        **kwargs)
+
+    return cost_function, param_vals
+
+
+def profile(f, x, repeats=5):
+    """
+    :param function f: Cost function
+    :param np.ndarray x: Parameter values
+    :param int repeats: Number of evaluations to time
+    :rtype: (float, float)
+    :return: (shortest time per evaluation in seconds,
+        peak memory allocated during an evaluation in MB)
+    """
+
+    f(x)
+    times = []
+    for _ in range(repeats):
+        start_time = time.time()
+        f(x)
+        times.append(time.time() - start_time)
+
+    tracemalloc.start()
+    f(x)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(times), peak / 2**20
+
+
+def count_allocations(f, x):
+    """
+    Count the array buffers that numpy allocates during an evaluation of a cost function
+
+    Snapshots are taken with tracemalloc before every line of Python that runs during
+    the evaluation, and the buffers that each line allocated are counted from the block
+    counts in the snapshot statistics, so buffers that are allocated and freed within
+    a single line (e.g., temporaries of an expression) are not counted
+
+    :param function f: Cost function
+    :param np.ndarray x: Parameter values
+    :rtype: int
+    :return: Number of allocated array buffers
+    """
+
+    # numpy traces array buffers in its own domain, apart from Python objects
+    # (including the ones that make up the snapshots)
+    snapshot_filters = [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)]
+    counts = {'snapshot' : None, 'num_blocks' : 0}
+
+    def count_new_blocks():
+        snapshot = tracemalloc.take_snapshot().filter_traces(snapshot_filters)
+        if counts['snapshot'] is not None:
+            counts['num_blocks'] += sum(max(0, stat.count_diff) for stat in snapshot.compare_to(
+                counts['snapshot'], 'traceback'))
+        counts['snapshot'] = snapshot
+
+    def trace(frame, event, arg):
+        if event in ('line', 'return'):
+            count_new_blocks()
+        return trace
+
+    f(x)
+    tracemalloc.start()
+    count_new_blocks()
+    sys.settrace(trace)
+    try:
+        f(x)
+    finally:
+        sys.settrace(None)
+        count_new_blocks()
+        tracemalloc.stop()
+
+    return counts['num_blocks']
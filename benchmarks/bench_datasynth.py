@@ -0,0 +1,127 @@
+"""
+Benchmark the vectorized synthetic history generator in datasynth against
+sampling interactions one at a time in a Python loop (the way the toy builders do)
+
+Reports interactions sampled per second by both, and for the vectorized generator,
+the time spent writing chunks to disk and the size of the chunk files
+
+Usage: python benchmarks/bench_datasynth.py [num_students] [num_timesteps] [chunk_size]
+"""
+
+from __future__ import division
+
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from lentil import datasynth
+from lentil import datatools
+from lentil import models
+
+
+def make_model(num_assessments=1000, num_lessons=500, embedding_dimension=10, seed=0):
+    """
+    Sample the module parameters of an embedding model
+
+    :rtype: models.EmbeddingModel
+    """
+
+    rng = np.random.RandomState(seed)
+    model = models.EmbeddingModel(None, embedding_dimension=embedding_dimension)
+    model.assessment_embeddings = 0.1 + rng.random_sample((num_assessments, embedding_dimension))
+    model.lesson_embeddings = 0.1 * rng.random_sample((num_lessons, embedding_dimension))
+    model.prereq_embeddings = 0.1 + rng.random_sample((num_lessons, embedding_dimension))
+    model.assessment_biases = rng.normal(size=num_assessments)
+    return model
+
+
+def sample_history_in_loop(model, num_students, num_timesteps, rng):
+    """
+    Sample one interaction at a time, appending a dict for each interaction
+
+    :rtype: pd.DataFrame
+    """
+
+    d = model.embedding_dimension
+    num_assessments = model.assessment_embeddings.shape[0]
+    num_lessons = model.lesson_embeddings.shape[0]
+    lower_bound = model.anti_singularity_lower_bounds[models.STUDENT_EMBEDDINGS]
+
+    data = []
+    for student_idx in range(num_students):
+        student_id = 'S{}'.format(student_idx)
+        student = np.maximum(lower_bound, rng.normal(size=d))
+        student_bias = rng.normal()
+        for timestep in range(1, num_timesteps + 1):
+            if timestep > 1:
+                lesson_idx = rng.randint(num_lessons)
+                gate = model.prereq_weight(student, model.prereq_embeddings[lesson_idx])
+                student = np.maximum(lower_bound, student + gate * model.lesson_embeddings[
+                    lesson_idx] + math.sqrt(model.learning_update_variance_constant) * \
+                            rng.normal(size=d))
+                data.append({
+                    'module_id' : 'L{}'.format(lesson_idx),
+                    'module_type' : datatools.LessonInteraction.MODULETYPE,
+                    'outcome' : None,
+                    'student_id' : student_id,
+                    'timestep' : timestep})
+            assessment_idx = rng.randint(num_assessments)
+            pass_likelihood = math.exp(model.assessment_outcome_log_likelihood_helper(
+                student, model.assessment_embeddings[assessment_idx], student_bias,
+                model.assessment_biases[assessment_idx], 1))
+            data.append({
+                'module_id' : 'A{}'.format(assessment_idx),
+                'module_type' : datatools.AssessmentInteraction.MODULETYPE,
+                'outcome' : rng.random_sample() < pass_likelihood,
+                'student_id' : student_id,
+                'timestep' : timestep})
+    return pd.DataFrame(data)
+
+
+def main(num_students=100000, num_timesteps=10, chunk_size=20000):
+    model = make_model()
+    num_ixns = num_students * (2 * num_timesteps - 1)
+    print('{} students, {} timesteps, {} interactions'.format(
+        num_students, num_timesteps, num_ixns))
+    print('{:<32} {:>14} {:>16}'.format('generator', 'time (s)', 'interactions/s'))
+
+    # the loop is too slow to run at full scale
+    num_loop_students = min(num_students, 2000)
+    start_time = time.time()
+    sample_history_in_loop(model, num_loop_students, num_timesteps, np.random.RandomState(0))
+    loop_time = time.time() - start_time
+    print('{:<32} {:>14.2f} {:>16.0f}'.format(
+        'loop ({} students)'.format(num_loop_students), loop_time,
+        num_loop_students * (2 * num_timesteps - 1) / loop_time))
+
+    start_time = time.time()
+    for _ in datasynth.sample_history_chunks(
+            model, num_students, num_timesteps, chunk_size=chunk_size,
+            random_state=np.random.RandomState(0)):
+        pass
+    sample_time = time.time() - start_time
+    print('{:<32} {:>14.2f} {:>16.0f}'.format('vectorized', sample_time, num_ixns / sample_time))
+
+    output_dir = tempfile.mkdtemp()
+    try:
+        start_time = time.time()
+        paths = datasynth.write_history_chunks(
+            model, os.path.join(output_dir, 'history'), num_students, num_timesteps,
+            chunk_size=chunk_size, random_state=np.random.RandomState(0))
+        write_time = time.time() - start_time
+        print('{:<32} {:>14.2f} {:>16.0f}'.format(
+            'vectorized, written to disk', write_time, num_ixns / write_time))
+        print('{} chunk files, {:.1f} MB'.format(
+            len(paths), sum(os.path.getsize(path) for path in paths) / 2**20))
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,102 @@
+"""
+Benchmark float32 training against float64
+
+For each data type, reports the time per evaluation of the cost function and its
+gradient, the memory held by the cost function (participation matrices, per-interaction
+arrays, scratch buffers and gradients), and the wall-clock time and held-out AUC of fits
+with L-BFGS-B and mini-batch Adam. Outcomes are sampled from a random embedding model
+(see bench_common.make_history), and a random 20% of assessment interactions are held out
+of the training likelihood
+
+Usage: python benchmarks/bench_float32.py [num_students] [num_ixns_per_student] [embedding_dimension]
+"""
+
+from __future__ import division
+
+import sys
+import time
+
+import numpy as np
+from sklearn import metrics
+
+from lentil import datatools
+from lentil import est
+from lentil import models
+
+from bench_common import make_cost_function, make_history, profile
+
+
+def cost_function_nbytes(cost_function):
+    """
+    :param grad.CostFunction cost_function: A cost function
+    :rtype: int
+    :return: Bytes held by the arrays and sparse matrices of the cost function and its shards
+    """
+
+    seen = set()
+    nbytes = 0
+    for obj in [cost_function] + cost_function._shards:
+        for x in obj.__dict__.values():
+            if id(x) in seen:
+                continue
+            seen.add(id(x))
+            if isinstance(x, np.ndarray):
+                nbytes += x.nbytes
+            elif hasattr(x, 'data') and hasattr(x, 'indices'):
+                nbytes += x.data.nbytes + x.indices.nbytes + x.indptr.nbytes
+    return nbytes
+
+
+def held_out_auc(history, held_out_ixns, embedding_dimension, estimator):
+    """
+    :rtype: (float, float)
+    :return: (seconds spent fitting, AUC on held-out interactions)
+    """
+
+    np.random.seed(0)
+    model = models.EmbeddingModel(history, embedding_dimension)
+    start_time = time.time()
+    model.fit(estimator)
+    fit_time = time.time() - start_time
+    return fit_time, metrics.roc_auc_score(
+        held_out_ixns['outcome'].astype(bool), model.assessment_pass_likelihoods(held_out_ixns))
+
+
+def main(num_students=2000, num_ixns_per_student=50, embedding_dimension=5):
+    history = make_history(num_students, num_ixns_per_student)
+
+    df = history.data
+    rng = np.random.RandomState(0)
+    is_held_out = (df['module_type'] == datatools.AssessmentInteraction.MODULETYPE).values & (
+        rng.random_sample(len(df)) < 0.2)
+    filtered_history = df[~is_held_out]
+    held_out_ixns = df[is_held_out]
+
+    print('{} students, {} interactions, embedding_dimension={}'.format(
+        num_students, len(df), embedding_dimension))
+    print('{:<10} {:>12} {:>12} {:>14} {:>10} {:>14} {:>10}'.format(
+        'dtype', 'eval (ms)', 'memory (MB)', 'l-bfgs-b (s)', 'AUC', 'adam (s)', 'AUC'))
+
+    for dtype in [np.float64, np.float32]:
+        cost_function, param_vals = make_cost_function(history, embedding_dimension, dtype=dtype)
+        eval_time, _ = profile(cost_function, param_vals)
+        nbytes = cost_function_nbytes(cost_function)
+        cost_function.close()
+
+        lbfgsb_time, lbfgsb_auc = held_out_auc(
+            history, held_out_ixns, embedding_dimension, est.EmbeddingMAPEstimator(
+                filtered_history=filtered_history, regularization_constant=1e-3, dtype=dtype))
+        adam_time, adam_auc = held_out_auc(
+            history, held_out_ixns, embedding_dimension, est.EmbeddingMAPEstimator(
+                filtered_history=filtered_history, regularization_constant=1e-3,
+                using_minibatches=True, minibatch_kwargs={
+                    'using_adam' : True, 'batch_size' : 256, 'rate' : 5e-2, 'max_epochs' : 20},
+                dtype=dtype))
+
+        print('{:<10} {:>12.1f} {:>12.1f} {:>14.2f} {:>10.4f} {:>14.2f} {:>10.4f}'.format(
+            np.dtype(dtype).name, 1e3 * eval_time, nbytes / 2**20,
+            lbfgsb_time, lbfgsb_auc, adam_time, adam_auc))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,309 @@
+"""
+Benchmark grad.CostFunction against the per-configuration gradient functions
+it replaced, which are kept in legacy_grad.py
+
+The legacy functions index student embeddings as student * num_timesteps + timestep,
+so both implementations are evaluated with every student trajectory padded to the
+same length (see dense_split_history)
+
+For each model configuration (lessons, prereqs, bias terms, graph prior, L1 regularizer),
+checks that both implementations agree, then reports the time per evaluation of the cost
+function and its gradient, the number of array buffers allocated during an evaluation
+(see bench_common.count_allocations), and the peak memory traced by tracemalloc
+during an evaluation (the high-water mark of allocated bytes, in MiB)
+
+Usage: python benchmarks/bench_grad.py [num_students] [num_ixns_per_student] [embedding_dimension]
+"""
+
+from __future__ import division
+
+from collections import OrderedDict
+import sys
+
+import numpy as np
+from scipy import sparse
+
+from lentil import datatools
+from lentil import est
+from lentil import grad
+from lentil import models
+
+from bench_common import count_allocations, make_history, profile
+import legacy_grad
+
+
+# (using_lessons, using_prereqs, using_bias, using_graph_prior, using_l1_regularizer)
+CONFIGS = [
+    (False, False, True, False, False),
+    (True, False, True, False, False),
+    (True, True, True, False, False),
+    (True, True, False, False, False),
+    (True, False, True, True, False),
+    (True, True, True, True, False),
+    (True, True, True, False, True),
+    (False, False, False, True, True),
+    (True, True, False, True, True)]
+
+# modules are assigned to concepts round-robin, and concepts depend on earlier concepts
+NUM_CONCEPTS = 3
+PREREQ_EDGES = [(0, 1), (0, 2), (1, 2)]
+
+
+def make_concept_matrices(num_assessments, num_lessons):
+    """
+    Set up the concept graph of the graph prior the way est.EmbeddingMAPEstimator.fit_model
+    does, for a graph that assigns each module to one of NUM_CONCEPTS concepts
+
+    :param int num_assessments: Number of assessments
+    :param int num_lessons: Number of lessons
+    :rtype: dict[str,object]
+    :return: Keyword arguments for grad.CostFunction
+    """
+
+    def module_participation_in_concepts(num_modules):
+        module_idxes = np.arange(num_modules)
+        return sparse.coo_matrix(
+            (np.ones(num_modules), (module_idxes, module_idxes % NUM_CONCEPTS)),
+            shape=(num_modules, NUM_CONCEPTS)).tocsr()
+
+    prereq_idxes, postreq_idxes = (np.array(idxes) for idxes in zip(*PREREQ_EDGES))
+    entries = np.ones(len(PREREQ_EDGES))
+    edge_idxes = np.arange(len(PREREQ_EDGES))
+    return {
+        'assessment_participation_in_concepts' : module_participation_in_concepts(
+            num_assessments),
+        'lesson_participation_in_concepts' : module_participation_in_concepts(num_lessons),
+        'prereq_edge_concept_idxes' : (prereq_idxes, postreq_idxes),
+        'concept_participation_in_prereq_edges' : tuple(sparse.coo_matrix(
+            (entries, (concept_idxes, edge_idxes)),
+            shape=(NUM_CONCEPTS, len(PREREQ_EDGES))).tocsr() for concept_idxes in (
+                prereq_idxes, postreq_idxes))
+    }
+
+
+def dense_split_history(split_history):
+    """
+    Pad every student trajectory to the length of the longest one, so the student state
+    at a timestep is in row student * num_timesteps + timestep (the dense layout
+    that the legacy gradient functions expect)
+
+    :param datatools.SplitHistory split_history: A split history
+    :rtype: (datatools.SplitHistory, int)
+    :return: (split history with the dense layout, number of timesteps)
+    """
+
+    offsets = split_history.trajectory_offsets
+    num_timesteps = np.diff(offsets).max()
+    student_idxes_of_states = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    def densified(state_idxes):
+        student_idxes = student_idxes_of_states[state_idxes]
+        return student_idxes * num_timesteps + state_idxes - offsets[student_idxes]
+
+    student_idxes_for_assessment_ixns, assessment_idxes, outcomes = \
+            split_history.assessment_interactions
+    student_idxes_for_lesson_ixns, lesson_idxes, times = split_history.lesson_interactions
+    return datatools.SplitHistory(
+        (densified(student_idxes_for_assessment_ixns), assessment_idxes, outcomes),
+        (densified(student_idxes_for_lesson_ixns), lesson_idxes, times),
+        split_history.timestep_of_last_interaction,
+        np.arange(len(offsets)) * num_timesteps), num_timesteps
+
+
+def make_cost_functions(history, embedding_dimension, using_lessons, using_prereqs,
+                        using_bias=True, using_graph_prior=False, using_l1_regularizer=False,
+                        num_threads=1):
+    """
+    Set up both implementations the way est.EmbeddingMAPEstimator.fit_model does
+
+    :rtype: (function, function, np.ndarray)
+    :return: (legacy cost function, fused cost function, parameter values),
+        where both cost functions map parameter values to (cost, gradient)
+    """
+
+    split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+    if not using_lessons and split_history.lesson_interactions[1] is not None:
+        # only keep the temporal process, like the dummy lesson interactions do
+        student_idxes_for_lesson_ixns, _, times = split_history.lesson_interactions
+        split_history.lesson_interactions = (student_idxes_for_lesson_ixns, None, times)
+    split_history, num_timesteps = dense_split_history(split_history)
+
+    student_embeddings = models.StudentTrajectories(
+        split_history.trajectory_offsets, embedding_dimension)
+    student_idxes_of_states = student_embeddings.student_idxes_of_states()
+    num_assessments = history.num_assessments()
+    num_lessons = history.num_lessons()
+
+    param_shapes = OrderedDict([
+        (models.STUDENT_EMBEDDINGS, student_embeddings.states.shape),
+        (models.ASSESSMENT_EMBEDDINGS, (num_assessments, embedding_dimension))])
+    if using_lessons:
+        param_shapes[models.LESSON_EMBEDDINGS] = (num_lessons, embedding_dimension)
+    if using_prereqs:
+        param_shapes[models.PREREQ_EMBEDDINGS] = (num_lessons, embedding_dimension)
+    param_shapes[models.STUDENT_BIASES] = (history.num_students(), )
+    param_shapes[models.ASSESSMENT_BIASES] = (num_assessments, )
+    if using_graph_prior:
+        param_shapes[models.CONCEPT_EMBEDDINGS] = (NUM_CONCEPTS, embedding_dimension)
+        concept_matrices = make_concept_matrices(num_assessments, num_lessons)
+    else:
+        concept_matrices = {}
+
+    rng = np.random.RandomState(1)
+    param_vals = np.concatenate([
+        rng.random_sample(shape).ravel() + 0.1 for shape in param_shapes.values()])
+
+    participation_matrices = est.compute_participation_matrices(
+        split_history, num_assessments, num_lessons,
+        using_lessons=using_lessons, using_prereqs=using_prereqs)
+
+    regularization_constant = [1e-3] * 5
+    learning_update_variance = 0.5
+    forgetting_penalty_terms = 0
+
+    cost_function = grad.CostFunction(
+        param_shapes,
+        split_history.assessment_interactions,
+        split_history.lesson_interactions,
+        participation_matrices,
+        student_idxes_of_states,
+        learning_update_variance=learning_update_variance,
+        forgetting_penalty_terms=forgetting_penalty_terms,
+        regularization_constant=regularization_constant,
+        using_lessons=using_lessons,
+        using_prereqs=using_prereqs,
+        using_bias=using_bias,
+        using_graph_prior=using_graph_prior,
+        using_l1_regularizer=using_l1_regularizer,
+        num_threads=num_threads,
+        **concept_matrices)
+
+    last_idxes = {}
+    for name, param_slice in cost_function.param_slices.items():
+        last_idxes[name] = param_slice.stop
+    gradient_holder = np.zeros(param_vals.shape)
+
+    def transpose(matrix):
+        return None if matrix is None else matrix.T.tocsr()
+
+    legacy_args = [
+        param_shapes,
+        split_history.assessment_interactions,
+        split_history.lesson_interactions,
+        learning_update_variance,
+        forgetting_penalty_terms,
+        regularization_constant,
+        0.1,
+        participation_matrices['student_participation_in_assessment_ixns'],
+        participation_matrices['student_bias_participation_in_assessment_ixns'],
+        participation_matrices['assessment_participation_in_assessment_ixns'],
+        participation_matrices['curr_student_participation_in_lesson_ixns'],
+        participation_matrices['prev_student_participation_in_lesson_ixns'],
+        participation_matrices['lesson_participation_in_lesson_ixns'],
+        concept_matrices.get('assessment_participation_in_concepts'),
+        concept_matrices.get('lesson_participation_in_concepts'),
+        transpose(concept_matrices.get('assessment_participation_in_concepts')),
+        transpose(concept_matrices.get('lesson_participation_in_concepts')),
+        concept_matrices.get('prereq_edge_concept_idxes'),
+        concept_matrices.get('concept_participation_in_prereq_edges'),
+        last_idxes[models.STUDENT_EMBEDDINGS],
+        last_idxes[models.ASSESSMENT_EMBEDDINGS],
+        last_idxes.get(models.LESSON_EMBEDDINGS),
+        last_idxes.get(models.PREREQ_EMBEDDINGS),
+        last_idxes[models.STUDENT_BIASES],
+        last_idxes[models.ASSESSMENT_BIASES],
+        num_timesteps,
+        using_bias,
+        using_graph_prior,
+        using_l1_regularizer,
+        gradient_holder]
+    legacy_grads = legacy_grad.get_grad(using_lessons=using_lessons, using_prereqs=using_prereqs)
+    legacy_cost_function = lambda x: legacy_grads(x, *legacy_args)
+
+    return legacy_cost_function, cost_function, param_vals
+
+
+def finite_difference_gradient(cost_function, param_vals, param_slice, epsilon=1e-6):
+    """
+    Estimate the gradient of a cost function w.r.t. a slice of the parameters
+    with central differences
+
+    :param function cost_function: Maps parameter values to (cost, gradient)
+    :param np.ndarray param_vals: Parameter values
+    :param slice param_slice: Parameters to differentiate with respect to
+    :param float epsilon: Step size
+    :rtype: np.ndarray
+    """
+
+    gradient = np.zeros(param_slice.stop - param_slice.start)
+    for i, param_idx in enumerate(range(param_slice.start, param_slice.stop)):
+        costs = []
+        for step in (epsilon, -epsilon):
+            x = param_vals.copy()
+            x[param_idx] += step
+            costs.append(cost_function(x)[0])
+        gradient[i] = (costs[0] - costs[1]) / (2 * epsilon)
+    return gradient
+
+
+def check_cost_functions(legacy_cost_function, cost_function, param_vals, using_graph_prior):
+    """
+    Check that the fused cost function agrees with the legacy one
+
+    :param function legacy_cost_function: See make_cost_functions
+    :param grad.CostFunction cost_function: See make_cost_functions
+    :param np.ndarray param_vals: Parameter values
+    :param bool using_graph_prior: True => the cost functions include the graph prior
+    :raises AssertionError: If the costs or gradients disagree
+    """
+
+    # the legacy functions zero out the biases in place when not using_bias
+    legacy_cost, legacy_gradient = legacy_cost_function(param_vals.copy())
+    legacy_gradient = legacy_gradient.copy()
+    cost, gradient = cost_function(param_vals.copy())
+    gradient = gradient.copy()
+    np.testing.assert_allclose(cost, legacy_cost, rtol=1e-8)
+    if using_graph_prior:
+        # the legacy gradients w.r.t. concept embeddings are inconsistent with the cost,
+        # so check the fused ones against finite differences instead
+        concept_slice = cost_function.param_slices[models.CONCEPT_EMBEDDINGS]
+        np.testing.assert_allclose(
+            gradient[concept_slice],
+            finite_difference_gradient(cost_function, param_vals, concept_slice),
+            rtol=1e-4, atol=1e-6)
+        gradient, legacy_gradient = (
+            g[:concept_slice.start] for g in (gradient, legacy_gradient))
+    np.testing.assert_allclose(gradient, legacy_gradient, rtol=1e-6, atol=1e-9)
+
+
+def main(num_students=2000, num_ixns_per_student=50, embedding_dimension=5):
+    history = make_history(num_students, num_ixns_per_student)
+    print('{} students, {} interactions, embedding_dimension={}'.format(
+        num_students, len(history.data), embedding_dimension))
+    print('{:<48} {:>12} {:>12} {:>14} {:>14} {:>18} {:>18}'.format(
+        'config', 'legacy (ms)', 'fused (ms)', 'legacy allocs', 'fused allocs',
+        'legacy peak (MiB)', 'fused peak (MiB)'))
+
+    for using_lessons, using_prereqs, using_bias, using_graph_prior, using_l1_regularizer \
+            in CONFIGS:
+        legacy_cost_function, cost_function, param_vals = make_cost_functions(
+            history, embedding_dimension, using_lessons, using_prereqs,
+            using_bias=using_bias, using_graph_prior=using_graph_prior,
+            using_l1_regularizer=using_l1_regularizer)
+
+        check_cost_functions(
+            legacy_cost_function, cost_function, param_vals, using_graph_prior)
+        legacy_time, legacy_peak = profile(legacy_cost_function, param_vals.copy())
+        fused_time, fused_peak = profile(cost_function, param_vals)
+        legacy_allocs = count_allocations(legacy_cost_function, param_vals.copy())
+        fused_allocs = count_allocations(cost_function, param_vals)
+        print('{:<48} {:>12.2f} {:>12.2f} {:>14d} {:>14d} {:>18.1f} {:>18.1f}'.format(
+            'lessons={:d} prereqs={:d} bias={:d} graph={:d} l1={:d}'.format(
+                using_lessons, using_prereqs, using_bias, using_graph_prior,
+                using_l1_regularizer),
+            1e3 * legacy_time, 1e3 * fused_time, legacy_allocs, fused_allocs,
+            legacy_peak, fused_peak))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,112 @@
+"""
+Benchmark model files written by pickling an embedding model against
+the binary format of models.EmbeddingModel.save
+
+For each format, reports the size of the model file and the cold-start time of an
+inference worker (a fresh interpreter that loads the model and scores a batch of
+interactions), and checks that the loaded models agree
+
+Usage: python benchmarks/bench_model_io.py [num_students] [num_scored_ixns]
+"""
+
+from __future__ import division
+
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from bench_recommend import make_model
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# loads a model file and scores a batch of interactions, then prints
+# the time spent loading and scoring, and the pass likelihoods
+WORKER_SCRIPT = '''
+import pickle
+import sys
+import time
+
+import numpy as np
+
+start_time = time.time()
+from lentil import models
+model_format, model_file, ixns_file = sys.argv[1:]
+if model_format == 'pickle':
+    with open(model_file, 'rb') as f:
+        model = pickle.load(f)
+else:
+    model = models.EmbeddingModel.load(model_file)
+student_idxes, assessment_idxes, timesteps = np.load(ixns_file)
+pass_likelihoods = model.pass_likelihoods_from_idxes(student_idxes, assessment_idxes, timesteps)
+print(time.time() - start_time)
+print(' '.join(str(x) for x in pass_likelihoods[:10]))
+'''
+
+
+def cold_start(model_format, model_file, ixns_file, env):
+    """
+    :param str model_format: 'pickle' or 'binary'
+    :param str model_file: Path to model file
+    :param str ixns_file: Path to .npy file containing interactions to score
+    :param dict[str,str] env: Environment variables
+    :rtype: (float,np.ndarray)
+    :return: (seconds spent loading the model and scoring, first few pass likelihoods)
+    """
+
+    output = subprocess.check_output([
+        sys.executable, '-c', WORKER_SCRIPT, model_format, model_file, ixns_file],
+        env=env).decode().split('\n')
+    return float(output[0]), np.array([float(x) for x in output[1].split()])
+
+
+def main(num_students=100000, num_scored_ixns=1000):
+    model = make_model(num_students, 1000, 500, 5)
+    history = model.history
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REPO_DIR] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+
+    print('{} students, {} interactions, {} states'.format(
+        history.num_students(), len(history.data), model.student_embeddings.num_states()))
+    print('{:<24} {:>12} {:>16}'.format('format', 'size (MB)', 'cold start (s)'))
+
+    model_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(0)
+        ixns_file = os.path.join(model_dir, 'ixns.npy')
+        np.save(ixns_file, np.array([
+            rng.randint(history.num_students(), size=num_scored_ixns),
+            rng.randint(history.num_assessments(), size=num_scored_ixns),
+            rng.randint(history.duration(), size=num_scored_ixns)]))
+
+        model_files = [
+            ('pickle', 'pickle', os.path.join(model_dir, 'model.pkl')),
+            ('binary', 'binary', os.path.join(model_dir, 'model.bin')),
+            ('binary (float32)', 'binary', os.path.join(model_dir, 'model32.bin'))]
+        with open(model_files[0][2], 'wb') as f:
+            pickle.dump(model, f, pickle.HIGHEST_PROTOCOL)
+        model.save(model_files[1][2])
+        model.save(model_files[2][2], dtype=np.float32)
+
+        reference_pass_likelihoods = None
+        for name, model_format, model_file in model_files:
+            # the first run warms up the page cache
+            cold_start(model_format, model_file, ixns_file, env)
+            load_time, pass_likelihoods = cold_start(model_format, model_file, ixns_file, env)
+            if reference_pass_likelihoods is None:
+                reference_pass_likelihoods = pass_likelihoods
+            np.testing.assert_allclose(pass_likelihoods, reference_pass_likelihoods, rtol=1e-4)
+            print('{:<24} {:>12.1f} {:>16.3f}'.format(
+                name, os.path.getsize(model_file) / 2**20, load_time))
+    finally:
+        shutil.rmtree(model_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,100 @@
+"""
+Benchmark batched recommendation queries with recommend.EmbeddingRecommender
+
+Parameters of an embedding model are sampled instead of estimated (query cost
+does not depend on parameter values), then the throughput of top-k lesson queries
+(against all assessments, and against a small set of target assessments) and
+pass-likelihood band queries (with and without the spatial index) is reported
+in students per second
+
+Usage: python benchmarks/bench_recommend.py [num_students] [num_assessments] [num_lessons] [embedding_dimension]
+"""
+
+from __future__ import division
+
+import sys
+import time
+
+import numpy as np
+
+from lentil import models
+from lentil import recommend
+
+from bench_common import make_history
+
+
+def make_model(num_students, num_assessments, num_lessons, embedding_dimension, seed=0):
+    """
+    Sample the parameters of an embedding model
+
+    :param int num_students: Number of students
+    :param int num_assessments: Number of assessments
+    :param int num_lessons: Number of lessons
+    :param int embedding_dimension: Number of dimensions in the latent skill space
+    :param int seed: Random seed
+    :rtype: models.EmbeddingModel
+    """
+
+    rng = np.random.RandomState(seed)
+    history = make_history(
+        num_students, 10, num_assessments=num_assessments, num_lessons=num_lessons)
+    model = models.EmbeddingModel(history, embedding_dimension)
+    model.student_embeddings.states = rng.random_sample(model.student_embeddings.states.shape)
+    model.assessment_embeddings = 0.1 + rng.random_sample(model.assessment_embeddings.shape)
+    model.lesson_embeddings = 0.5 * rng.random_sample(model.lesson_embeddings.shape)
+    model.prereq_embeddings = 0.1 + rng.random_sample(model.prereq_embeddings.shape)
+    model.student_biases = rng.normal(size=model.student_biases.shape)
+    model.assessment_biases = rng.normal(size=model.assessment_biases.shape)
+    return model
+
+
+def profile(f, num_students):
+    start_time = time.time()
+    f()
+    return num_students / (time.time() - start_time)
+
+
+def main(num_students=2000, num_assessments=5000, num_lessons=500, embedding_dimension=5):
+    model = make_model(num_students, num_assessments, num_lessons, embedding_dimension)
+    num_students = model.history.num_students()
+    num_assessments = model.history.num_assessments()
+    num_lessons = model.history.num_lessons()
+    student_idxes = np.arange(num_students)
+    target_assessment_idxes = np.arange(min(50, num_assessments))
+
+    print('{} students, {} assessments, {} lessons, embedding_dimension={}'.format(
+        num_students, num_assessments, num_lessons, embedding_dimension))
+    print('{:<48} {:>14}'.format('query', 'students/s'))
+
+    recommender = recommend.EmbeddingRecommender(model)
+    print('{:<48} {:>14.0f}'.format('top-10 lessons (all assessments)', profile(
+        lambda: recommender.top_k_lessons(student_idxes, k=10), num_students)))
+    print('{:<48} {:>14.0f}'.format('top-10 lessons (all assessments, linearized)', profile(
+        lambda: recommender.top_k_lessons(student_idxes, k=10, linearized=True), num_students)))
+    print('{:<48} {:>14.0f}'.format('top-10 lessons ({} target assessments)'.format(
+        len(target_assessment_idxes)), profile(lambda: recommender.top_k_lessons(
+            student_idxes, k=10, target_assessment_idxes=target_assessment_idxes),
+            num_students)))
+
+    for lower, upper in [(0.6, 0.8), (0.95, 0.96)]:
+        assessments = {}
+        for using_spatial_index in [False, True]:
+            recommender = recommend.EmbeddingRecommender(
+                model, using_spatial_index=using_spatial_index)
+            if using_spatial_index:
+                # build the tree outside the timed query
+                recommender.assessments_in_band(student_idxes[:1], lower=lower, upper=upper)
+            students_per_second = profile(lambda: assessments.__setitem__(
+                using_spatial_index, recommender.assessments_in_band(
+                    student_idxes, lower=lower, upper=upper)), num_students)
+            print('{:<48} {:>14.0f}'.format('assessments in [{}, {}] ({})'.format(
+                lower, upper, 'k-d tree' if using_spatial_index else 'brute force'),
+                students_per_second))
+
+        assert all((set(x) == set(y)) for x, y in zip(assessments[False], assessments[True]))
+        print('{:<48} {:>14.1f}'.format(
+            'mean assessments in band', np.mean([len(x) for x in assessments[False]])))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
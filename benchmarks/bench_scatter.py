@@ -0,0 +1,136 @@
+"""
+Benchmark the scatter backends of grad.CostFunction, i.e., sparse participation matrix
+products (csr) against np.bincount on interaction indices (bincount)
+
+For each model configuration, checks that both backends agree, then reports the time to
+set up the cost function (including building participation matrices for csr), the time
+per evaluation of the cost function and its gradient, the time per evaluation spent
+in scatters, and the memory held by participation matrices or scatter indexes.
+Also reports the wall-clock time of a fit with a fixed budget of L-BFGS-B iterations.
+
+Usage: python benchmarks/bench_scatter.py [num_students] [num_ixns_per_student] [embedding_dimension]
+"""
+
+from __future__ import division
+
+import sys
+import time
+
+import numpy as np
+
+from lentil import est
+from lentil import grad
+from lentil import models
+from lentil import telemetry
+
+from bench_common import make_cost_function, make_history, profile
+
+
+PARTICIPATION_MATRICES = [
+    'student_participation_in_assessment_ixns',
+    'student_bias_participation_in_assessment_ixns',
+    'assessment_participation_in_assessment_ixns',
+    'curr_student_participation_in_lesson_ixns',
+    'prev_student_participation_in_lesson_ixns',
+    'lesson_participation_in_lesson_ixns']
+
+
+def _base_array(x):
+    """
+    :param np.ndarray x: An array
+    :rtype: np.ndarray
+    :return: The array that owns the memory of x
+    """
+
+    while isinstance(x.base, np.ndarray):
+        x = x.base
+    return x
+
+
+def scatter_nbytes(cost_function):
+    """
+    :param grad.CostFunction cost_function: A cost function
+    :rtype: int
+    :return: Bytes held by the participation matrices or scatter indexes of the shards,
+        counting each array once, and leaving out scratch buffers and the index arrays
+        of the cost function that scatter indexes are views of
+    """
+
+    shared = {id(_base_array(v)) for v in vars(cost_function).values() \
+            if isinstance(v, np.ndarray)}
+    arrays = {}
+    for shard in cost_function._shards:
+        for name in PARTICIPATION_MATRICES:
+            x = getattr(shard, name)
+            if isinstance(x, grad._RowWindow):
+                x = x.participation
+            if x is None:
+                continue
+            if isinstance(x, grad._ScatterIndex):
+                shard_arrays = [x.idxes, x.subtracted_idxes]
+            else:
+                shard_arrays = [x.data, x.indices, x.indptr]
+            for v in shard_arrays:
+                if v is not None and id(_base_array(v)) not in shared:
+                    arrays[id(_base_array(v))] = _base_array(v)
+    return sum(v.nbytes for v in arrays.values())
+
+
+def main(num_students=20000, num_ixns_per_student=50, embedding_dimension=5):
+    history = make_history(num_students, num_ixns_per_student)
+    split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+    print('{} students, {} interactions, embedding_dimension={}'.format(
+        num_students, len(history.data), embedding_dimension))
+    print('{:<32} {:>10} {:>12} {:>12} {:>14} {:>10}'.format(
+        'config', 'backend', 'setup (ms)', 'eval (ms)', 'scatter (ms)', 'MB'))
+
+    for using_lessons, using_prereqs in [(False, False), (True, False), (True, True)]:
+        config = 'lessons={}, prereqs={}'.format(using_lessons, using_prereqs)
+        expected_cost = expected_gradient = None
+        for scatter_backend in grad.SCATTER_BACKENDS:
+            start_time = time.time()
+            cost_function, param_vals = make_cost_function(
+                history, embedding_dimension, using_lessons, using_prereqs,
+                split_history=split_history, scatter_backend=scatter_backend)
+            setup_time = time.time() - start_time
+
+            cost, gradient = cost_function(param_vals)
+            if expected_cost is None:
+                expected_cost, expected_gradient = cost, gradient.copy()
+            else:
+                np.testing.assert_allclose(cost, expected_cost, rtol=1e-10)
+                np.testing.assert_allclose(gradient, expected_gradient, rtol=1e-8, atol=1e-12)
+
+            eval_time, _ = profile(cost_function, param_vals)
+
+            # time scatters separately, since timing phases slows down evaluations
+            records = []
+            evaluation_telemetry = telemetry.TrainingTelemetry([records.append])
+            timed_cost_function, _ = make_cost_function(
+                history, embedding_dimension, using_lessons, using_prereqs,
+                split_history=split_history, scatter_backend=scatter_backend,
+                telemetry=evaluation_telemetry)
+            num_evaluations = 5
+            for _ in range(num_evaluations):
+                timed_cost_function(param_vals)
+            evaluation_telemetry(1, None, [], {})
+            scatter_time = records[0]['phase_times']['scatter'] / num_evaluations
+
+            print('{:<32} {:>10} {:>12.2f} {:>12.2f} {:>14.2f} {:>10.1f}'.format(
+                config, scatter_backend, 1e3 * setup_time, 1e3 * eval_time,
+                1e3 * scatter_time, scatter_nbytes(cost_function) / 2**20))
+
+    print('{:<32} {:>10} {:>12}'.format('fit (10 L-BFGS-B iterations)', 'backend', 'time (s)'))
+    for scatter_backend in grad.SCATTER_BACKENDS:
+        np.random.seed(0)
+        model = models.EmbeddingModel(history, embedding_dimension)
+        start_time = time.time()
+        model.fit(est.EmbeddingMAPEstimator(
+            regularization_constant=1e-3, max_iter=10, ftol=1e-12,
+            split_history=split_history, scatter_backend=scatter_backend))
+        print('{:<32} {:>10} {:>12.2f}'.format(
+            'lessons=True, prereqs=True', scatter_backend, time.time() - start_time))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
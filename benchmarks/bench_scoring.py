@@ -0,0 +1,130 @@
+"""
+Benchmark batch scoring of assessment interactions for every skill model
+
+Each model is fit to a small synthetic history, then scores num_ixns random
+(student, assessment, timestep) index triples with pass_likelihoods_from_idxes.
+The DataFrame path (assessment_pass_likelihoods, which also maps ids to indices)
+is timed on a sample of the interactions, and checked against the index path
+
+Usage: python benchmarks/bench_scoring.py [num_ixns] [num_students] [num_ixns_per_student]
+"""
+
+from __future__ import division
+
+from collections import OrderedDict
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from lentil import datatools
+from lentil import est
+from lentil import models
+
+from bench_common import make_history
+
+
+# size of the sample of interactions scored through the DataFrame path
+NUM_DATAFRAME_IXNS = 1000000
+
+
+def make_models(history):
+    """
+    Fit every model to an interaction history
+
+    :param datatools.InteractionHistory history: An interaction history
+    :rtype: OrderedDict[str,models.SkillModel]
+    :return: Trained models
+    """
+
+    skill_models = OrderedDict([
+        ('student biased coin', models.StudentBiasedCoinModel(history, history.data)),
+        ('assessment biased coin', models.AssessmentBiasedCoinModel(history, history.data)),
+        ('1PL IRT', models.OneParameterLogisticModel(history.data)),
+        ('2PL IRT', models.TwoParameterLogisticModel(history.data))])
+
+    for model in skill_models.values():
+        model.fit()
+
+    embedding_model = models.EmbeddingModel(history, embedding_dimension=5)
+    embedding_model.fit(est.EmbeddingMAPEstimator())
+    skill_models['embedding'] = embedding_model
+
+    mirt_model = models.MIRTModel(history, dims=5)
+    mirt_model.fit(est.MIRTMAPEstimator())
+    skill_models['MIRT'] = mirt_model
+
+    return skill_models
+
+
+def sample_ixns(history, num_ixns, seed=0):
+    """
+    Sample assessment interactions between random students and assessments
+
+    :param datatools.InteractionHistory history: An interaction history
+    :param int num_ixns: Number of interactions
+    :param int seed: Random seed
+    :rtype: (np.ndarray,np.ndarray,np.ndarray)
+    :return: (student indices, assessment indices, timesteps)
+    """
+
+    rng = np.random.RandomState(seed)
+    return (
+        rng.randint(history.num_students(), size=num_ixns),
+        rng.randint(history.num_assessments(), size=num_ixns),
+        rng.randint(history.duration(), size=num_ixns))
+
+
+def main(num_ixns=10000000, num_students=2000, num_ixns_per_student=20):
+    history = make_history(num_students, num_ixns_per_student)
+    skill_models = make_models(history)
+    student_idxes, assessment_idxes, timesteps = sample_ixns(history, num_ixns)
+
+    num_dataframe_ixns = min(num_ixns, NUM_DATAFRAME_IXNS)
+    df = pd.DataFrame({
+        'student_id' : np.asarray(history._student_ids)[student_idxes[:num_dataframe_ixns]],
+        'module_id' : np.asarray(history._assessment_ids)[assessment_idxes[:num_dataframe_ixns]],
+        'module_type' : datatools.AssessmentInteraction.MODULETYPE,
+        'timestep' : timesteps[:num_dataframe_ixns]})
+
+    print('{} students, {} assessments, {} interactions scored'.format(
+        history.num_students(), history.num_assessments(), num_ixns))
+    print('{:<24} {:>12} {:>14} {:>16}'.format(
+        'model', 'idxes (s)', 'Mixns/s', 'DataFrame (s/M)'))
+
+    for name, model in skill_models.items():
+        if isinstance(model, models.StudentBiasedCoinModel):
+            # biased coin models and IRT models keep their own index maps
+            model_student_idxes = model._user_ids.get_indexer(
+                np.asarray(history._student_ids))[student_idxes]
+        elif isinstance(model, models.IRTModel):
+            model_student_idxes = model._student_ids.get_indexer(
+                np.asarray(history._student_ids))[student_idxes]
+        else:
+            model_student_idxes = student_idxes
+        if isinstance(model, models.IRTModel):
+            model_assessment_idxes = model._assessment_ids.get_indexer(
+                np.asarray(history._assessment_ids))[assessment_idxes]
+        else:
+            model_assessment_idxes = assessment_idxes
+
+        start_time = time.time()
+        pass_likelihoods = model.pass_likelihoods_from_idxes(
+            model_student_idxes, model_assessment_idxes, timesteps)
+        idx_time = time.time() - start_time
+
+        start_time = time.time()
+        dataframe_pass_likelihoods = model.assessment_pass_likelihoods(df)
+        dataframe_time = time.time() - start_time
+
+        np.testing.assert_allclose(
+            dataframe_pass_likelihoods, pass_likelihoods[:num_dataframe_ixns])
+
+        print('{:<24} {:>12.3f} {:>14.1f} {:>16.3f}'.format(
+            name, idx_time, num_ixns / idx_time / 1e6,
+            dataframe_time / num_dataframe_ixns * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,85 @@
+"""
+Benchmark InteractionHistory.split_interactions_by_type against the
+row-by-row implementation it replaced, which is kept in tests/test_datatools.py
+(along with the tests that check that both implementations agree)
+
+Usage: python benchmarks/bench_split_history.py [num_students] [num_timesteps]
+"""
+
+from __future__ import division
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from lentil import datatools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'tests'))
+from test_datatools import assert_split_histories_equal, reference_split_interactions_by_type
+
+
+def make_history(num_students, num_timesteps, num_assessments=100, seed=0):
+    """
+    Sample an assessment-only interaction history where every student
+    answers one assessment per timestep
+
+    :param int num_students: Number of students
+    :param int num_timesteps: Number of timesteps
+    :param int num_assessments: Number of assessments
+    :param int seed: Random seed
+    :rtype: datatools.InteractionHistory
+    """
+
+    rng = np.random.RandomState(seed)
+    num_ixns = num_students * num_timesteps
+    data = pd.DataFrame({
+        'student_id': np.repeat(np.arange(num_students), num_timesteps).astype(str),
+        'module_id': rng.randint(num_assessments, size=num_ixns).astype(str),
+        'module_type': datatools.AssessmentInteraction.MODULETYPE,
+        'outcome': rng.rand(num_ixns) < 0.5,
+        'timestep': np.tile(np.arange(1, num_timesteps + 1), num_students),
+        'time_since_previous_interaction': rng.exponential(size=num_ixns)})
+    return datatools.InteractionHistory(data, reindex_timesteps=False)
+
+
+def best_time(f, repeats=3):
+    """
+    :param function f: Function to time
+    :param int repeats: Number of calls
+    :rtype: float
+    :return: Shortest wall-clock time of a call, in seconds
+    """
+
+    times = []
+    for _ in range(repeats):
+        start_time = time.time()
+        f()
+        times.append(time.time() - start_time)
+    return min(times)
+
+
+def main(num_students=2000, num_timesteps=20):
+    history = make_history(num_students, num_timesteps)
+    print('{} students, {} interactions'.format(num_students, len(history.data)))
+
+    for insert_dummy_lesson_ixns in [False, True]:
+        split = lambda: history.split_interactions_by_type(
+            insert_dummy_lesson_ixns=insert_dummy_lesson_ixns)
+        legacy_split = lambda: reference_split_interactions_by_type(
+            history, insert_dummy_lesson_ixns=insert_dummy_lesson_ixns)
+
+        assert_split_histories_equal(split(), legacy_split())
+
+        vectorized_time = best_time(split)
+        legacy_time = best_time(legacy_split, repeats=1)
+        print('insert_dummy_lesson_ixns={}: legacy {:.3f}s, vectorized {:.3f}s ({:.1f}x)'.format(
+            insert_dummy_lesson_ixns, legacy_time, vectorized_time,
+            legacy_time / vectorized_time))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""
+Benchmark startup time of the lentil modules and command-line scripts
+
+For each command, reports the shortest wall-clock time of several runs in fresh
+interpreters, and checks that importing the modules used for training does not
+load matplotlib or sklearn
+
+Usage: python benchmarks/bench_startup.py [num_runs]
+"""
+
+from __future__ import division
+
+import os
+import subprocess
+import sys
+import time
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = [
+    ('python -c "import numpy, scipy.optimize"', [
+        sys.executable, '-c', 'import numpy, scipy.optimize']),
+    ('import lentil.models, lentil.est', [
+        sys.executable, '-c', 'import lentil.models, lentil.est']),
+    ('import lentil.evaluate', [
+        sys.executable, '-c', 'import lentil.evaluate']),
+    ('lse_train --help', [
+        sys.executable, os.path.join(REPO_DIR, 'scripts', 'lse_train.py'), '--help']),
+    ('lse_eval --help', [
+        sys.executable, os.path.join(REPO_DIR, 'scripts', 'lse_eval.py'), '--help'])
+]
+
+HEAVY_MODULES = ['matplotlib', 'sklearn']
+
+
+def time_command(args, env, num_runs):
+    """
+    :param list[str] args: Command to run
+    :param dict[str,str] env: Environment variables
+    :param int num_runs: Number of runs to time
+    :rtype: float
+    :return: Shortest wall-clock time of a run, in seconds
+    """
+
+    times = []
+    for _ in range(num_runs):
+        start_time = time.time()
+        subprocess.check_call(args, env=env, stdout=subprocess.DEVNULL)
+        times.append(time.time() - start_time)
+    return min(times)
+
+
+def main(num_runs=5):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REPO_DIR] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+
+    print('{:<40} {:>10}'.format('command', 'time (ms)'))
+    for name, args in COMMANDS:
+        print('{:<40} {:>10.1f}'.format(name, 1e3 * time_command(args, env, num_runs)))
+
+    loaded_modules = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, lentil.models, lentil.est, lentil.evaluate; '
+        'print(" ".join(sorted(set(m.split(".")[0] for m in sys.modules))))'],
+        env=env).decode().split()
+    for module in HEAVY_MODULES:
+        print('{} loaded by lentil.models, lentil.est, lentil.evaluate: {}'.format(
+            module, module in loaded_modules))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,256 @@
+"""
+Benchmark suite for the training and evaluation hot paths
+
+Times interaction history construction, timestep squashing and splitting, one evaluation
+of the cost function and its gradient for each model configuration, a fit with a fixed
+budget of L-BFGS-B iterations, scoring all assessment interactions, and 5-fold
+cross-validation, on a synthetic history at one of several scales (see SCALES).
+
+Results are written to a JSON file, along with the scale and the environment
+(versions, platform, number of CPUs, git revision). If a baseline results file is
+supplied, then the ratio of each timing to the baseline is reported, and the script
+exits with a nonzero status if any case got slower than REGRESSION_THRESHOLD times
+the baseline. Timings are the shortest of several calls.
+
+Usage: python benchmarks/bench_suite.py [scale] [output_file] [baseline_file]
+"""
+
+from __future__ import division
+
+from collections import OrderedDict
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import scipy
+
+from lentil import datatools
+from lentil import est
+from lentil import evaluate
+from lentil import models
+
+from bench_common import make_cost_function, make_history
+
+
+# scale -> (number of students, number of interactions per student, number of repeats)
+SCALES = OrderedDict([
+    ('10k', (200, 50, 20)),
+    ('1m', (20000, 50, 3)),
+    ('10m', (200000, 50, 1))])
+
+EMBEDDING_DIMENSION = 5
+
+# fits run for a fixed number of iterations, so timings are comparable across revisions
+FIT_MAX_ITER = 10
+
+NUM_FOLDS = 5
+
+# a case is a regression if it takes longer than this multiple of the baseline,
+# and at least this many more seconds (so that timer noise on short cases is ignored)
+REGRESSION_THRESHOLD = 1.25
+REGRESSION_MIN_SECONDS = 1e-3
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_case(f, repeats, setup=None):
+    """
+    :param function f: Function to time, which takes the output of setup as input
+    :param int repeats: Number of calls to time
+    :param function|None setup: Untimed function that prepares the arguments of each call
+        (None => f takes no arguments)
+    :rtype: dict[str,float|int]
+    :return: Shortest and median seconds per call, and the number of calls
+    """
+
+    times = []
+    for _ in range(repeats):
+        args = setup() if setup is not None else ()
+        start_time = time.time()
+        f(*args)
+        times.append(time.time() - start_time)
+    return {'min' : min(times), 'median' : float(np.median(times)), 'repeats' : repeats}
+
+
+def environment():
+    """
+    :rtype: dict[str,str|int|None]
+    :return: Versions, platform, number of CPUs and git revision
+    """
+
+    try:
+        git_revision = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        git_revision = None
+
+    return {
+        'python' : platform.python_version(),
+        'numpy' : np.__version__,
+        'scipy' : scipy.__version__,
+        'platform' : platform.platform(),
+        'cpu_count' : multiprocessing.cpu_count(),
+        'git_revision' : git_revision
+    }
+
+
+def make_estimator(**kwargs):
+    return est.EmbeddingMAPEstimator(
+        regularization_constant=1e-3, max_iter=FIT_MAX_ITER, ftol=1e-12, **kwargs)
+
+
+def cross_validation_history(history):
+    """
+    :param datatools.InteractionHistory history: An interaction history
+    :rtype: datatools.InteractionHistory
+    :return: The histories of students with assessment interactions late enough to hold out
+    """
+
+    df = history.data
+    is_late_assessment_ixn = (df['module_type'] == datatools.AssessmentInteraction.MODULETYPE) & (
+        df['timestep'] > evaluate.MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY)
+    return datatools.InteractionHistory(
+        df[df['student_id'].isin(df['student_id'][is_late_assessment_ixn])].copy(),
+        size_of_test_set=0)
+
+
+def run_suite(scale):
+    """
+    :param str scale: A key of SCALES
+    :rtype: collections.OrderedDict
+    :return: Case name -> timings (see time_case)
+    """
+
+    num_students, num_ixns_per_student, repeats = SCALES[scale]
+    history = make_history(num_students, num_ixns_per_student)
+    data = history.data
+
+    results = OrderedDict()
+    results['history.construction'] = time_case(
+        datatools.InteractionHistory, repeats, setup=lambda: (data.copy(), ))
+    results['history.squash_timesteps'] = time_case(history.squash_timesteps, repeats)
+    results['history.split_interactions_by_type'] = time_case(
+        lambda: history.split_interactions_by_type(insert_dummy_lesson_ixns=True), repeats)
+
+    configs = [('no_lessons', False, False), ('lessons', True, False), ('prereqs', True, True)]
+    for name, using_lessons, using_prereqs in configs:
+        cost_function, param_vals = make_cost_function(
+            history, EMBEDDING_DIMENSION, using_lessons, using_prereqs)
+        cost_function(param_vals)
+        results['grad.{}'.format(name)] = time_case(
+            lambda: cost_function(param_vals), repeats)
+        cost_function.close()
+
+    cost_function, param_vals = make_cost_function(
+        history, EMBEDDING_DIMENSION, dtype=np.float32)
+    cost_function(param_vals)
+    results['grad.prereqs.float32'] = time_case(lambda: cost_function(param_vals), repeats)
+    cost_function.close()
+
+    cost_function, param_vals = make_cost_function(
+        history, EMBEDDING_DIMENSION, scatter_backend='bincount')
+    cost_function(param_vals)
+    results['grad.prereqs.bincount'] = time_case(lambda: cost_function(param_vals), repeats)
+    cost_function.close()
+
+    model = models.EmbeddingModel(history, EMBEDDING_DIMENSION)
+    results['est.fit_model'] = time_case(
+        lambda: model.fit(make_estimator(filtered_history=data)), repeats)
+
+    assessment_ixns = data[data['module_type'] == datatools.AssessmentInteraction.MODULETYPE]
+    results['models.assessment_pass_likelihoods'] = time_case(
+        lambda: model.assessment_pass_likelihoods(assessment_ixns), repeats)
+
+    def build_embedding(history, filtered_history, split_history=None,
+                        initial_param_vals=None):
+        model = models.EmbeddingModel(history, EMBEDDING_DIMENSION)
+        model.fit(make_estimator(
+            filtered_history=filtered_history,
+            split_history=split_history,
+            initial_param_vals=initial_param_vals if initial_param_vals is not None else {}))
+        return model
+
+    cv_history = cross_validation_history(history)
+    results['evaluate.cross_validated_auc'] = time_case(
+        lambda: evaluate.cross_validated_auc(
+            {'model' : build_embedding}, cv_history, num_folds=NUM_FOLDS, size_of_test_set=0),
+        1)
+
+    return results
+
+
+def compare(results, baseline_results):
+    """
+    Print the ratio of each timing to the baseline
+
+    :param dict[str,dict] results: Case name -> timings
+    :param dict[str,dict] baseline_results: Case name -> timings of the baseline
+    :rtype: list[str]
+    :return: Names of cases that regressed
+    """
+
+    regressions = []
+    print('{:<40} {:>14} {:>14} {:>8}'.format('case', 'baseline (s)', 'current (s)', 'ratio'))
+    for name, timings in results.items():
+        if name not in baseline_results:
+            continue
+        ratio = timings['min'] / baseline_results[name]['min']
+        is_regression = ratio > REGRESSION_THRESHOLD and (
+            timings['min'] - baseline_results[name]['min'] > REGRESSION_MIN_SECONDS)
+        if is_regression:
+            regressions.append(name)
+        print('{:<40} {:>14.4f} {:>14.4f} {:>8.2f}{}'.format(
+            name, baseline_results[name]['min'], timings['min'], ratio,
+            ' REGRESSION' if is_regression else ''))
+    return regressions
+
+
+def main(scale='10k', output_file=None, baseline_file=None):
+    if scale not in SCALES:
+        raise ValueError('Invalid scale: {} (expected one of {})'.format(
+            scale, ', '.join(SCALES)))
+
+    num_students, num_ixns_per_student, _ = SCALES[scale]
+    np.random.seed(0)
+    results = run_suite(scale)
+
+    print('{} students, {} interactions, embedding_dimension={}'.format(
+        num_students, num_students * num_ixns_per_student, EMBEDDING_DIMENSION))
+    print('{:<40} {:>14} {:>14}'.format('case', 'min (s)', 'median (s)'))
+    for name, timings in results.items():
+        print('{:<40} {:>14.4f} {:>14.4f}'.format(name, timings['min'], timings['median']))
+
+    if output_file is None:
+        output_file = 'bench_suite_{}.json'.format(scale)
+    with open(output_file, 'w') as f:
+        json.dump({
+            'scale' : scale,
+            'num_students' : num_students,
+            'num_ixns' : num_students * num_ixns_per_student,
+            'embedding_dimension' : EMBEDDING_DIMENSION,
+            'fit_max_iter' : FIT_MAX_ITER,
+            'environment' : environment(),
+            'results' : results
+        }, f, indent=2)
+    print('Results written to {}'.format(output_file))
+
+    if baseline_file is not None:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+        if baseline['scale'] != scale:
+            raise ValueError('Baseline was run at scale {} not {}'.format(
+                baseline['scale'], scale))
+        regressions = compare(results, baseline['results'])
+        if regressions:
+            print('Regressions: {}'.format(', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
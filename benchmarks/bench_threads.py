@@ -0,0 +1,51 @@
+"""
+Benchmark sharded evaluation of grad.CostFunction on a thread pool
+
+For each model configuration and number of threads, checks that the cost and gradient
+agree with single-threaded evaluation, then reports the time per evaluation
+and the speedup over a single thread
+
+Usage: python benchmarks/bench_threads.py [num_students] [num_ixns_per_student] [embedding_dimension]
+"""
+
+from __future__ import division
+
+import multiprocessing
+import sys
+
+import numpy as np
+
+from bench_common import make_cost_function, make_history, profile
+
+
+def main(num_students=20000, num_ixns_per_student=50, embedding_dimension=5):
+    history = make_history(num_students, num_ixns_per_student)
+    print('{} students, {} interactions, embedding_dimension={}, {} cpus'.format(
+        num_students, len(history.data), embedding_dimension, multiprocessing.cpu_count()))
+    print('{:<32} {:>8} {:>12} {:>8}'.format('config', 'threads', 'time (ms)', 'speedup'))
+
+    for using_lessons, using_prereqs in [(False, False), (True, False), (True, True)]:
+        config = 'lessons={}, prereqs={}'.format(using_lessons, using_prereqs)
+        cost_function, param_vals = make_cost_function(
+            history, embedding_dimension, using_lessons, using_prereqs)
+        cost, gradient = cost_function(param_vals)
+        gradient = gradient.copy()
+        single_thread_time, _ = profile(cost_function, param_vals)
+        print('{:<32} {:>8} {:>12.2f} {:>8.2f}'.format(config, 1, 1e3 * single_thread_time, 1))
+
+        for num_threads in [2, 4, 8, 16]:
+            cost_function, _ = make_cost_function(
+                history, embedding_dimension, using_lessons, using_prereqs,
+                num_threads=num_threads)
+            sharded_cost, sharded_gradient = cost_function(param_vals)
+            np.testing.assert_allclose(sharded_cost, cost, rtol=1e-10)
+            np.testing.assert_allclose(sharded_gradient, gradient, rtol=1e-8, atol=1e-12)
+
+            sharded_time, _ = profile(cost_function, param_vals)
+            cost_function.close()
+            print('{:<32} {:>8} {:>12.2f} {:>8.2f}'.format(
+                config, num_threads, 1e3 * sharded_time, single_thread_time / sharded_time))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
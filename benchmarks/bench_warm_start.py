@@ -0,0 +1,99 @@
+"""
+Benchmark warm-started cross-validation folds against cold starts
+
+Runs evaluate.cross_validated_auc on the same folds with and without warm_start,
+then reports the wall-clock time spent fitting (split into the full fit to non-test
+students and the folds) and the difference in training/validation AUCs on each fold
+
+Usage: python benchmarks/bench_warm_start.py [num_students] [num_ixns_per_student] [num_folds]
+"""
+
+from __future__ import division
+
+import sys
+import time
+
+import numpy as np
+
+from lentil import datatools
+from lentil import est
+from lentil import evaluate
+from lentil import models
+
+from bench_common import make_history
+
+
+def main(num_students=500, num_ixns_per_student=30, num_folds=5):
+    history = make_history(num_students, num_ixns_per_student, num_assessments=50,
+                           num_lessons=20)
+
+    # cross-validation needs assessment interactions after the first few timesteps
+    df = history.data
+    is_late_assessment_ixn = (df['module_type'] == datatools.AssessmentInteraction.MODULETYPE) & (
+        df['timestep'] > evaluate.MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY)
+    history = datatools.InteractionHistory(
+        df[df['student_id'].isin(df['student_id'][is_late_assessment_ixn])].copy(),
+        size_of_test_set=0)
+
+    print('{} students, {} interactions, {} folds'.format(
+        history.num_students(), len(history.data), num_folds))
+
+    fit_times = []
+
+    def build_embedding(history, filtered_history, split_history=None,
+                        initial_param_vals=None):
+        model = models.EmbeddingModel(history, embedding_dimension=2)
+        estimator = est.EmbeddingMAPEstimator(
+            filtered_history=filtered_history,
+            split_history=split_history,
+            initial_param_vals=initial_param_vals if initial_param_vals is not None else {})
+        start_time = time.time()
+        model.fit(estimator)
+        fit_times.append(time.time() - start_time)
+        return model
+
+    results = {}
+    times = {}
+    for warm_start in [False, True]:
+        del fit_times[:]
+        np.random.seed(0)
+        results[warm_start] = evaluate.cross_validated_auc(
+            {'model' : build_embedding},
+            history,
+            num_folds=num_folds,
+            size_of_test_set=0,
+            warm_start=warm_start)
+        times[warm_start] = list(fit_times)
+
+    cold_fold_time = sum(times[False])
+    full_fit_time, warm_fold_time = times[True][0], sum(times[True][1:])
+    print('{:<32} {:>10.2f}'.format('cold folds (s)', cold_fold_time))
+    print('{:<32} {:>10.2f}'.format('full fit (s)', full_fit_time))
+    print('{:<32} {:>10.2f}'.format('warm folds (s)', warm_fold_time))
+    print('{:<32} {:>10.2f}'.format('speedup (folds only)', cold_fold_time / warm_fold_time))
+    print('{:<32} {:>10.2f}'.format(
+        'speedup (with full fit)', cold_fold_time / (full_fit_time + warm_fold_time)))
+
+    print('{:<8} {:>12} {:>12} {:>12} {:>12}'.format(
+        'fold', 'cold val', 'warm val', 'delta val', 'delta train'))
+    cold_train_aucs = results[False].training_aucs('model')
+    warm_train_aucs = results[True].training_aucs('model')
+    cold_val_aucs = results[False].validation_aucs('model')
+    warm_val_aucs = results[True].validation_aucs('model')
+    for fold_idx in range(num_folds):
+        print('{:<8} {:>12.4f} {:>12.4f} {:>12.4f} {:>12.4f}'.format(
+            fold_idx,
+            cold_val_aucs[fold_idx],
+            warm_val_aucs[fold_idx],
+            warm_val_aucs[fold_idx] - cold_val_aucs[fold_idx],
+            warm_train_aucs[fold_idx] - cold_train_aucs[fold_idx]))
+    print('{:<8} {:>12.4f} {:>12.4f} {:>12.4f} {:>12.4f}'.format(
+        'mean',
+        np.mean(cold_val_aucs),
+        np.mean(warm_val_aucs),
+        np.mean(warm_val_aucs) - np.mean(cold_val_aucs),
+        np.mean(warm_train_aucs) - np.mean(cold_train_aucs)))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -28,7 +28,7 @@ def sample_synthetic_model_and_history(
     An example invocation of this function can be found in
     :py:func:`toy.get_assessment_grid_model`
 
-    :param function sample_students: A function that outputs a student tensor
+    :param function sample_students: A function that outputs a (dense) student tensor
     :param function sample_assessments: A function that outputs a assessment matrix
     :param function sample_interactions: A function that takes a :py:class:`models.EmbeddingModel`
         as input and outputs a pandas DataFrame
@@ -44,9 +44,9 @@ def sample_synthetic_model_and_history(
 
     model = models.EmbeddingModel(None, **embedding_kwargs)
 
-    model.student_embeddings = np.maximum(
+    model.student_embeddings = models.StudentTrajectories.from_dense(np.maximum(
         model.anti_singularity_lower_bounds[models.STUDENT_EMBEDDINGS],
-        sample_students())
+        sample_students()))
     model.assessment_embeddings = np.maximum(
         model.anti_singularity_lower_bounds[models.ASSESSMENT_EMBEDDINGS],
         sample_assessments())
@@ -65,3 +65,215 @@ def sample_synthetic_model_and_history(
 
     return model
 
+
+def _logistic(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def sample_history_chunks(
+    model,
+    num_students,
+    num_timesteps,
+    num_assessment_ixns_per_timestep=1,
+    student_embedding_std=1.,
+    student_bias_std=1.,
+    mean_time_between_ixns=1.,
+    chunk_size=100000,
+    random_state=None):
+    """
+    Sample interaction histories for a large number of students from the module parameters
+    of an embedding model, a chunk of students at a time
+
+    Each student starts from a random embedding, and at each timestep completes
+    num_assessment_ixns_per_timestep random assessments. Between timesteps, the student
+    completes a random lesson, and moves to a new embedding sampled from the Gaussian
+    learning update of the model (gated by the lesson's prereq embedding if the model uses
+    prereqs, and shifted by the model's forgetting penalty). If the model does not use
+    lessons, then student embeddings follow a Gaussian random walk between timesteps.
+    Times between interactions are exponentially distributed.
+
+    Students in a chunk are sampled together, one timestep at a time, so the cost of
+    sampling is a few array operations per timestep rather than a Python loop over
+    interactions.
+
+    :param models.EmbeddingModel model: An embedding model with assessment embeddings,
+        lesson and prereq embeddings (if the model uses them), and assessment biases
+        (if the model uses bias terms). Student parameters are sampled instead.
+
+    :param int num_students: Number of students
+    :param int num_timesteps: Number of timesteps in each student's history
+    :param int num_assessment_ixns_per_timestep: Number of assessments completed
+        at each timestep
+    :param float student_embedding_std: Standard deviation of initial student embeddings
+    :param float student_bias_std: Standard deviation of student bias terms
+    :param float mean_time_between_ixns: Mean time between consecutive interactions
+    :param int chunk_size: Number of students in each chunk
+    :param np.random.RandomState|None random_state: Source of randomness
+
+    :rtype: generator
+    :return: For each chunk, a dictionary mapping column name to column in the format of
+        :py:func:`datatools.InteractionHistory.to_npz`, where students have ids S0, S1, ...,
+        assessments have ids A0, A1, ... and lessons have ids L0, L1, ...
+    """
+
+    if num_students < 1:
+        raise ValueError('Number of students must be positive not {}'.format(num_students))
+    if num_timesteps < 1:
+        raise ValueError('Number of timesteps must be positive not {}'.format(num_timesteps))
+    if num_assessment_ixns_per_timestep < 1:
+        raise ValueError('Number of assessment interactions per timestep must be positive')
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive not {}'.format(chunk_size))
+
+    if random_state is None:
+        random_state = np.random
+
+    rng = random_state
+    d = model.embedding_dimension
+    lower_bound = model.anti_singularity_lower_bounds[models.STUDENT_EMBEDDINGS]
+
+    assessment_embeddings = model.assessment_embeddings
+    num_assessments = assessment_embeddings.shape[0]
+    assessment_norms = np.linalg.norm(assessment_embeddings, axis=1)
+    assessment_unit_vectors = assessment_embeddings / assessment_norms[:, None]
+    assessment_offsets = -assessment_norms
+    if model.using_bias:
+        assessment_offsets = assessment_offsets + model.assessment_biases
+
+    if model.using_lessons:
+        lesson_embeddings = model.lesson_embeddings
+        num_lessons = lesson_embeddings.shape[0]
+    else:
+        num_lessons = 0
+    if model.using_prereqs:
+        prereq_norms = np.linalg.norm(model.prereq_embeddings, axis=1)
+        prereq_unit_vectors = model.prereq_embeddings / prereq_norms[:, None]
+
+    # every student has the same sequence of interaction types: assessments at the first
+    # timestep, then a lesson followed by assessments at each of the next timesteps
+    k = num_assessment_ixns_per_timestep
+    num_lesson_ixns_per_timestep = 1 if model.using_lessons else 0
+    block_size = k + num_lesson_ixns_per_timestep
+    num_ixns_per_student = num_timesteps * block_size - num_lesson_ixns_per_timestep
+    is_lesson_ixn = np.zeros(num_ixns_per_student, dtype=bool)
+    is_lesson_ixn[k::block_size] = model.using_lessons
+    timesteps = 1 + (
+        np.arange(num_ixns_per_student) + num_lesson_ixns_per_timestep) // block_size
+
+    assessment_ids = ['A{}'.format(i) for i in range(num_assessments)]
+    lesson_ids = ['L{}'.format(i) for i in range(num_lessons)]
+
+    for chunk_start in range(0, num_students, chunk_size):
+        n = min(chunk_size, num_students - chunk_start)
+
+        states = np.maximum(lower_bound, rng.normal(scale=student_embedding_std, size=(n, d)))
+        student_biases = rng.normal(
+            scale=student_bias_std, size=n) if model.using_bias else np.zeros(n)
+
+        module_idxes = np.empty((n, num_ixns_per_student), dtype=int)
+        outcomes = np.full((n, num_ixns_per_student), -1, dtype=np.int8)
+        times_since_prev_ixn = rng.exponential(
+            scale=mean_time_between_ixns, size=(n, num_ixns_per_student))
+
+        for t in range(num_timesteps):
+            first_assessment_ixn = t * block_size
+
+            if t > 0:
+                if model.using_lessons:
+                    lesson_ixn = first_assessment_ixn - 1
+                    lesson_idxes = rng.randint(num_lessons, size=n)
+                    module_idxes[:, lesson_ixn] = lesson_idxes
+                    times = times_since_prev_ixn[:, lesson_ixn]
+
+                    if model.using_prereqs:
+                        gates = _logistic(np.einsum(
+                            'ij, ij->i', states, prereq_unit_vectors[lesson_idxes]) - \
+                                    prereq_norms[lesson_idxes])
+                    else:
+                        gates = np.ones(n)
+                    means = states + gates[:, None] * lesson_embeddings[lesson_idxes] - \
+                            model.forgetting_penalty_terms(times)
+                else:
+                    times = times_since_prev_ixn[:, first_assessment_ixn]
+                    means = states
+
+                states = np.maximum(lower_bound, means + np.sqrt(
+                    model.learning_update_variance(times)) * rng.normal(size=(n, d)))
+
+            assessment_ixns = slice(first_assessment_ixn, first_assessment_ixn + k)
+            assessment_idxes = rng.randint(num_assessments, size=(n, k))
+            module_idxes[:, assessment_ixns] = assessment_idxes
+            pass_likelihoods = _logistic(np.einsum(
+                'ij, ikj->ik', states, assessment_unit_vectors[assessment_idxes]) + \
+                        assessment_offsets[assessment_idxes] + student_biases[:, None])
+            outcomes[:, assessment_ixns] = rng.random_sample((n, k)) < pass_likelihoods
+
+        num_ixns = n * num_ixns_per_student
+        yield datatools._npz_columns(
+            np.char.add('S', np.arange(chunk_start, chunk_start + n).astype(str)),
+            assessment_ids,
+            lesson_ids,
+            np.repeat(np.arange(n), num_ixns_per_student),
+            module_idxes.ravel(),
+            np.tile(is_lesson_ixn, n),
+            outcomes.ravel(),
+            np.tile(timesteps, n),
+            np.full(num_ixns, np.nan),
+            times_since_prev_ixn.ravel())
+
+
+def write_history_chunks(model, path_prefix, num_students, num_timesteps, **kwargs):
+    """
+    Sample interaction histories with :py:func:`datasynth.sample_history_chunks`,
+    and write each chunk of students to its own .npz file as soon as it is sampled,
+    so memory usage is bounded by the chunk size
+
+    Each file is an interaction history in the format of
+    :py:func:`datatools.InteractionHistory.to_npz`, and can be loaded with
+    :py:func:`datatools.load_interaction_history`
+
+    :param models.EmbeddingModel model: An embedding model (see sample_history_chunks)
+    :param str path_prefix: Chunk i is written to [path_prefix]-[i].npz
+    :param int num_students: Number of students
+    :param int num_timesteps: Number of timesteps in each student's history
+    :param dict kwargs: Keyword arguments for sample_history_chunks
+    :rtype: list[str]
+    :return: Paths to chunk files
+    """
+
+    paths = []
+    for chunk_idx, columns in enumerate(sample_history_chunks(
+            model, num_students, num_timesteps, **kwargs)):
+        path = '{}-{:05d}.npz'.format(path_prefix, chunk_idx)
+        np.savez(path, **columns)
+        paths.append(path)
+    return paths
+
+
+def sample_synthetic_history(model, num_students, num_timesteps, size_of_test_set=0.2,
+                             **kwargs):
+    """
+    Sample interaction histories with :py:func:`datasynth.sample_history_chunks`,
+    and gather them into a single interaction history in memory
+
+    :param models.EmbeddingModel model: An embedding model (see sample_history_chunks)
+    :param int num_students: Number of students
+    :param int num_timesteps: Number of timesteps in each student's history
+    :param float size_of_test_set: Fraction of students to include in the test set
+    :param dict kwargs: Keyword arguments for sample_history_chunks
+    :rtype: datatools.InteractionHistory
+    """
+
+    chunks = list(sample_history_chunks(model, num_students, num_timesteps, **kwargs))
+    columns = dict(chunks[0])
+    for name in columns:
+        if name == 'student_idx':
+            # student indices are local to each chunk
+            num_students_before_chunks = np.cumsum([0] + [
+                len(chunk['student_ids']) for chunk in chunks[:-1]])
+            columns[name] = np.concatenate([chunk[name] + num_students_before_chunk \
+                    for chunk, num_students_before_chunk in zip(
+                        chunks, num_students_before_chunks)])
+        elif name not in ['format_version', 'assessment_ids', 'lesson_ids']:
+            columns[name] = np.concatenate([chunk[name] for chunk in chunks])
+    return datatools.InteractionHistory.from_columns(columns, size_of_test_set=size_of_test_set)
@@ -9,10 +9,14 @@ Module for storing and manipulating interaction histories
 from abc import abstractmethod
 from collections import defaultdict, namedtuple
 import datetime as dt
+import hashlib
 import logging
+import os
+import pickle
 import random
 import re
 import uuid
+import zipfile
 
 import numpy as np
 import pandas as pd
@@ -157,10 +161,15 @@ class SplitHistory(object):
         self,
         assessment_interactions,
         lesson_interactions,
-        timestep_of_last_interaction):
+        timestep_of_last_interaction,
+        trajectory_offsets):
         """
         Initialize split history object
 
+        The student "indices" in assessment_interactions and lesson_interactions are
+        row indices into a packed array of student states, laid out according to
+        trajectory_offsets (see :py:class:`models.StudentTrajectories`)
+
         :param (np.ndarray,np.ndarray,np.ndarray) assessment_interactions:
             A tuple of (student_idxes, module_idxes, outcomes)
 
@@ -169,11 +178,284 @@ class SplitHistory(object):
 
         :param dict[str,int] timestep_of_last_interaction:
             A dictionary mapping student_id to the timestep of the student's last interaction
+
+        :param np.ndarray trajectory_offsets: An array of length num_students + 1, where the
+            states of the student at student_idx occupy rows
+            trajectory_offsets[student_idx]:trajectory_offsets[student_idx+1]
         """
 
         self.assessment_interactions = assessment_interactions
         self.lesson_interactions = lesson_interactions
         self.timestep_of_last_interaction = timestep_of_last_interaction
+        self.trajectory_offsets = trajectory_offsets
+
+    def fingerprint(self):
+        """
+        Compute a content hash of the split history
+
+        :rtype: str
+        :return: A hex digest that only depends on the interactions and trajectory layout
+        """
+
+        h = hashlib.sha1()
+        for ixns in [self.assessment_interactions, self.lesson_interactions]:
+            for x in ixns:
+                h.update(b'None' if x is None else _array_bytes(x))
+        h.update(_array_bytes(self.trajectory_offsets))
+        return h.hexdigest()
+
+
+def _array_bytes(x):
+    """
+    :param np.ndarray x: An array
+    :rtype: bytes
+    :return: The array's contents, prefixed by its dtype and shape
+    """
+
+    x = np.ascontiguousarray(x)
+    return '{}{}'.format(x.dtype.str, x.shape).encode('utf-8') + x.tobytes()
+
+
+def _idxes_of_ids(id_index, ids):
+    """
+    Map ids to indices with a single hash-table lookup
+
+    :param pd.Index id_index: Ids, ordered by index
+    :param np.ndarray|pd.Series ids: Ids to look up
+    :rtype: np.ndarray
+    :return: Indices of ids
+    """
+
+    idxes = id_index.get_indexer(ids)
+    if (idxes < 0).any():
+        raise KeyError('Unrecognized ids: {}'.format(
+            list(pd.unique(np.asarray(ids)[idxes < 0]))[:10]))
+    return idxes
+
+
+def _id_array(ids):
+    """
+    :param iterable ids: Ids
+    :rtype: np.ndarray
+    :return: An array of ids that can be written to an .npz file without pickling,
+        and that loads back to the same ids
+
+    :raises ValueError: If the ids are neither all strings nor all of one numeric type
+    """
+
+    ids = list(ids)
+    id_array = np.asarray(ids)
+    # np.asarray silently casts mixed ids (e.g., [1, 'a']) to strings, and
+    # object arrays would have to be pickled, so only keep homogeneous ids
+    if id_array.dtype == object or id_array.dtype.kind in 'US':
+        non_str_ids = [x for x in ids if not isinstance(x, str)]
+        if non_str_ids:
+            raise ValueError('Ids must all be strings or all be numbers, got {}'.format(
+                [type(x).__name__ for x in non_str_ids[:10]]))
+        return id_array.astype(str)
+    return id_array
+
+
+# version of the columnar history format written by InteractionHistory.to_npz
+NPZ_FORMAT_VERSION = 1
+
+# columns of an interaction history that are stored in the columnar history format
+# (other columns are dropped by InteractionHistory.to_npz)
+NPZ_HISTORY_COLUMNS = (
+    'student_id', 'module_id', 'module_type', 'outcome', 'timestep', 'duration',
+    'time_since_previous_interaction', 'timestamp')
+
+
+def _npz_columns(
+    student_ids,
+    assessment_ids,
+    lesson_ids,
+    student_idxes,
+    module_idxes,
+    is_lesson_ixn,
+    outcomes,
+    timesteps,
+    durations,
+    times_since_prev_ixn):
+    """
+    Lay out interactions in the columnar history format of
+    :py:func:`datatools.InteractionHistory.to_npz`
+
+    :param iterable student_ids: Student ids, in order of student index
+    :param iterable assessment_ids: Assessment ids, in order of assessment index
+    :param iterable lesson_ids: Lesson ids, in order of lesson index
+    :param np.ndarray student_idxes: Student index of each interaction
+    :param np.ndarray module_idxes: Assessment or lesson index of each interaction
+    :param np.ndarray is_lesson_ixn: True for lesson interactions
+    :param np.ndarray outcomes: 1 => pass, 0 => fail, -1 => lesson interaction
+    :param np.ndarray timesteps: Timestep of each interaction
+    :param np.ndarray durations: Duration of each interaction
+    :param np.ndarray times_since_prev_ixn: Time since the previous interaction
+    :rtype: dict[str,np.ndarray]
+    :return: A dictionary mapping column name to column, which can be passed to np.savez
+    """
+
+    return {
+        'format_version' : np.array(NPZ_FORMAT_VERSION),
+        'student_ids' : _id_array(student_ids),
+        'assessment_ids' : _id_array(assessment_ids),
+        'lesson_ids' : _id_array(lesson_ids),
+        'student_idx' : np.asarray(student_idxes, dtype=int),
+        'module_idx' : np.asarray(module_idxes, dtype=int),
+        'is_lesson' : np.asarray(is_lesson_ixn, dtype=bool),
+        'outcome' : np.asarray(outcomes, dtype=np.int8),
+        'timestep' : np.asarray(timesteps, dtype=int),
+        'duration' : np.asarray(durations, dtype=float),
+        'time_since_previous_interaction' : np.asarray(times_since_prev_ixn, dtype=float)
+    }
+
+
+def _load_npz(path, mmap_mode='r'):
+    """
+    Load the arrays of an uncompressed .npz file, memory-mapping them if possible
+
+    np.load ignores mmap_mode for .npz files, but the members of an archive
+    written by np.savez are stored uncompressed, so each array can be
+    memory-mapped at its offset into the file
+
+    :param str path: Path to .npz file
+    :param str|None mmap_mode: Memory-map mode passed to np.memmap
+        (None => read arrays into memory)
+
+    :rtype: dict[str,np.ndarray]
+    :return: A dictionary mapping array name to array
+    """
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith(
+                '.npy') else info.filename
+            if mmap_mode is None or info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            # skip the local file header, which has a fixed size of 30 bytes
+            # followed by the file name and the extra field
+            f.seek(info.header_offset + 26)
+            # (as Python ints, so the offsets below cannot overflow uint16)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2').tolist()
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError('Cannot memory-map object array {} in {}'.format(name, path))
+
+            if np.prod(shape) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode=mmap_mode, offset=f.tell(), shape=shape,
+                    order='F' if fortran_order else 'C')
+    return arrays
+
+
+class IdMaps(object):
+    """
+    Class for the id -> index maps of an interaction history, without the interactions
+
+    Exposes the lookups of :py:class:`InteractionHistory` that a trained model
+    needs to score interactions, so a model can be loaded without its training data.
+    Hash tables for id -> index lookups are built on first use.
+    """
+
+    def __init__(self, student_ids, assessment_ids, lesson_ids, duration):
+        """
+        Initialize id maps
+
+        :param np.ndarray student_ids: Student ids, ordered by student index
+        :param np.ndarray assessment_ids: Assessment ids, ordered by assessment index
+        :param np.ndarray lesson_ids: Lesson ids, ordered by lesson index
+        :param int duration: Total duration of the interaction history
+        """
+
+        self._student_id_array = np.asarray(student_ids)
+        self._assessment_id_array = np.asarray(assessment_ids)
+        self._lesson_id_array = np.asarray(lesson_ids)
+        self._duration = duration
+
+        # pd.Index of ids, ordered by index
+        self._id_indexes = {}
+
+    @classmethod
+    def from_history(cls, history):
+        """
+        :param InteractionHistory history: An interaction history
+        :rtype: IdMaps
+        :return: The id -> index maps of the history
+        """
+
+        return cls(
+            _id_array(history._student_ids),
+            _id_array(history._assessment_ids),
+            _id_array(history._lesson_ids),
+            history.duration())
+
+    def _id_index(self, name):
+        id_index = self._id_indexes.get(name)
+        if id_index is None:
+            id_index = self._id_indexes[name] = pd.Index(
+                getattr(self, '_{}_id_array'.format(name)).tolist())
+        return id_index
+
+    def id_of_student_idx(self, student_idx):
+        return self._student_id_array[student_idx]
+
+    def id_of_assessment_idx(self, assessment_idx):
+        return self._assessment_id_array[assessment_idx]
+
+    def id_of_lesson_idx(self, lesson_idx):
+        return self._lesson_id_array[lesson_idx]
+
+    def idx_of_student_id(self, student_id):
+        return self._id_index('student').get_loc(student_id)
+
+    def idx_of_assessment_id(self, assessment_id):
+        return self._id_index('assessment').get_loc(assessment_id)
+
+    def idx_of_lesson_id(self, lesson_id):
+        return self._id_index('lesson').get_loc(lesson_id)
+
+    def idxes_of_student_ids(self, student_ids):
+        return _idxes_of_ids(self._id_index('student'), student_ids)
+
+    def idxes_of_assessment_ids(self, assessment_ids):
+        return _idxes_of_ids(self._id_index('assessment'), assessment_ids)
+
+    def idxes_of_lesson_ids(self, lesson_ids):
+        return _idxes_of_ids(self._id_index('lesson'), lesson_ids)
+
+    def duration(self):
+        return self._duration
+
+    def num_students(self):
+        return len(self._student_id_array)
+
+    def num_assessments(self):
+        return len(self._assessment_id_array)
+
+    def num_lessons(self):
+        return len(self._lesson_id_array)
+
+    def iter_students(self):
+        return iter(self._student_id_array.tolist())
+
+    def iter_assessments(self):
+        return iter(self._assessment_id_array.tolist())
+
+    def iter_lessons(self):
+        return iter(self._lesson_id_array.tolist())
+
 
 class InteractionHistory(object):
     """
@@ -181,7 +463,8 @@ class InteractionHistory(object):
     """
 
     def __init__(
-        self, data, sort_by_timestep=False, reindex_timesteps=False, size_of_test_set=0.2):
+        self, data, sort_by_timestep=False, reindex_timesteps=False, size_of_test_set=0.2,
+        student_idx=None, assessment_idx=None, lesson_idx=None):
         """
         Initialize interaction history object
 
@@ -203,8 +486,15 @@ class InteractionHistory(object):
 
         :param float size_of_test_set: Fraction of students to include in test set, where
             0 <= size_of_test_set < 1 (size_of_test_set = 0 => don't use a test set)
+
+        :param dict[str,int]|None student_idx: A dictionary mapping student_id to student_idx
+            (None => index students in order of appearance)
+        :param dict[str,int]|None assessment_idx: A dictionary mapping assessment_id to
+            assessment_idx (None => index assessments in order of appearance)
+        :param dict[str,int]|None lesson_idx: A dictionary mapping lesson_id to lesson_idx
+            (None => index lessons in order of appearance)
         """
-        data.index = list(range(len(data)))
+        data.index = pd.RangeIndex(len(data))
 
         if sort_by_timestep:
             data.sort('timestep', axis=0, inplace=True)
@@ -225,7 +515,12 @@ class InteractionHistory(object):
         # need to add 1 since internal time starts at zero
         self._duration = self.data['timestep'].max() + 1
 
-        all_student_ids = self.data['student_id'].unique()
+        if student_idx is None:
+            all_student_ids = self.data['student_id'].unique()
+        else:
+            # avoid scanning the student_id column when the students are given
+            all_student_ids = np.empty(len(student_idx), dtype=object)
+            all_student_ids[list(student_idx.values())] = list(student_idx.keys())
         random.shuffle(all_student_ids)
         num_nontest_students = int((1 - size_of_test_set) * len(all_student_ids))
         self.id_of_nontest_student_idx = {i: k for i, k in enumerate(
@@ -259,19 +554,218 @@ class InteractionHistory(object):
         # student_id -> timestep
         self._timestep_of_last_interaction = {}
 
-        self.compute_idx_maps()
+        self.compute_idx_maps(
+            student_idx=student_idx, assessment_idx=assessment_idx, lesson_idx=lesson_idx)
+
+    @property
+    def data(self):
+        """
+        The interaction history dataframe
+
+        Interactions appended with :py:func:`datatools.InteractionHistory.append`
+        are buffered, and only concatenated to the dataframe when it is accessed
+        """
+
+        if self._appended_data:
+            self._data = pd.concat([self._data] + self._appended_data, ignore_index=True)
+            self._appended_data = []
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+        # list[pd.DataFrame]
+        # appended interactions that are not yet concatenated to self._data
+        self._appended_data = []
+
+        # rows of each student, built by self._build_student_row_index
+        self._student_row_index = None
 
     def reindex_timesteps(self):
         """
         See constructor for details
         """
 
-        new_timesteps_for_student = {student_id: {k: (i+1) for i, k in enumerate(
-            sorted(group['timestep'].unique()))} for student_id, group in self.data.groupby(
-                'student_id')}
-        self.data['timestep'] = self.data.apply(
-                lambda ixn: new_timesteps_for_student[ixn['student_id']][ixn['timestep']],
-                axis=1)
+        # dense rank of each timestep among the distinct timesteps of its student
+        self.data['timestep'] = self.data.groupby('student_id')['timestep'].rank(
+            method='dense').astype(int)
+
+    def to_npz(self, path):
+        """
+        Write interaction history to a columnar .npz file
+
+        Students and modules are stored as integer codes into id arrays
+        (ordered by student/assessment/lesson index, so the id -> index maps
+        of this history are preserved), alongside timesteps, outcomes, durations,
+        timestamps and times since previous interactions (other columns, i.e., columns
+        that are not in NPZ_HISTORY_COLUMNS, are not stored). Arrays are stored
+        uncompressed, so :py:func:`datatools.InteractionHistory.from_npz` can
+        memory-map them.
+
+        :param str path: Output path to .npz file
+        """
+
+        df = self.data
+
+        is_lesson_ixn = (df['module_type'] == LessonInteraction.MODULETYPE).values
+        is_assessment_ixn = (df['module_type'] == AssessmentInteraction.MODULETYPE).values
+        if not (is_lesson_ixn | is_assessment_ixn).all():
+            raise ValueError('Unrecognized module types: {}'.format(
+                list(df['module_type'][~(is_lesson_ixn | is_assessment_ixn)].unique())))
+
+        module_idxes = np.zeros(len(df), dtype=int)
+        module_ids = df['module_id'].values
+        module_idxes[is_assessment_ixn] = self.idxes_of_assessment_ids(
+            module_ids[is_assessment_ixn])
+        module_idxes[is_lesson_ixn] = self.idxes_of_lesson_ids(module_ids[is_lesson_ixn])
+
+        # True => 1, False => 0, None (for lesson interactions) => -1
+        is_missing_outcome = df['outcome'].isnull().values
+        outcomes = np.where(is_missing_outcome, -1, np.array(
+            df['outcome'].where(~is_missing_outcome, False).values, dtype=bool)).astype(np.int8)
+
+        columns = _npz_columns(
+            self._student_ids,
+            self._assessment_ids,
+            self._lesson_ids,
+            self.idxes_of_student_ids(df['student_id']),
+            module_idxes,
+            is_lesson_ixn,
+            outcomes,
+            df['timestep'].values,
+            df['duration'].values,
+            df['time_since_previous_interaction'].values)
+
+        timestamps = df['timestamp']
+        if timestamps.dtype != object:
+            columns['timestamp'] = timestamps.values
+        elif timestamps.notnull().any():
+            try:
+                columns['timestamp'] = pd.to_datetime(timestamps).values
+            except (ValueError, TypeError):
+                _logger.warning('Skipping timestamps that cannot be converted to datetimes')
+
+        np.savez(path, **columns)
+
+    @classmethod
+    def from_npz(cls, path, mmap=True, **kwargs):
+        """
+        Load interaction history from a columnar .npz file
+        written by :py:func:`datatools.InteractionHistory.to_npz`
+
+        :param str path: Path to .npz file
+        :param bool mmap: True => memory-map numeric columns instead of reading them into memory
+        :param dict kwargs: Keyword arguments for the constructor,
+            e.g., size_of_test_set
+
+        :rtype: InteractionHistory
+        :return: An interaction history with the same id -> index maps as the one
+            that was written to file
+        """
+
+        return cls.from_columns(_load_npz(path, mmap_mode='c' if mmap else None), **kwargs)
+
+    @classmethod
+    def from_columns(cls, columns, **kwargs):
+        """
+        Build an interaction history from arrays in the columnar history format
+        (see :py:func:`datatools.InteractionHistory.to_npz`)
+
+        The student_id, module_id and module_type columns are categoricals over
+        the stored codes, and outcomes of histories with lesson interactions
+        are nullable bools (or objects, on pandas<1.0).
+
+        :param dict[str,np.ndarray] columns: Column name -> column
+        :param dict kwargs: Keyword arguments for the constructor,
+            e.g., size_of_test_set
+
+        :rtype: InteractionHistory
+        :return: An interaction history with the id -> index maps given by the id arrays
+        """
+
+        format_version = int(columns['format_version'])
+        if format_version > NPZ_FORMAT_VERSION:
+            raise ValueError('Unsupported history format version: {}'.format(format_version))
+
+        student_ids = np.array(columns['student_ids'].tolist(), dtype=object)
+        assessment_ids = np.array(columns['assessment_ids'].tolist(), dtype=object)
+        lesson_ids = np.array(columns['lesson_ids'].tolist(), dtype=object)
+
+        # id columns are categoricals over the stored integer codes,
+        # so they are not expanded into a column of Python objects
+        student_id_column = pd.Categorical.from_codes(
+            columns['student_idx'], categories=pd.Index(student_ids))
+
+        # an assessment and a lesson may share an id, so lesson codes
+        # are offset by the number of assessments and then mapped to distinct ids
+        is_lesson_ixn = np.asarray(columns['is_lesson'])
+        module_categories = pd.Index(assessment_ids).append(pd.Index(lesson_ids)).unique()
+        code_of_module = np.concatenate([
+            module_categories.get_indexer(assessment_ids),
+            module_categories.get_indexer(lesson_ids)])
+        module_id_column = pd.Categorical.from_codes(code_of_module[
+            columns['module_idx'] + len(assessment_ids) * is_lesson_ixn],
+            categories=module_categories)
+
+        module_type_column = pd.Categorical.from_codes(
+            is_lesson_ixn.astype(np.int8),
+            categories=[AssessmentInteraction.MODULETYPE, LessonInteraction.MODULETYPE])
+
+        outcomes = np.asarray(columns['outcome'])
+        if not is_lesson_ixn.any():
+            outcomes = outcomes.astype(bool)
+        elif hasattr(pd, 'arrays') and hasattr(pd.arrays, 'BooleanArray'):
+            # nullable bools (pandas>=1.0) keep outcome arithmetic working,
+            # with missing outcomes for lesson interactions
+            outcomes = pd.arrays.BooleanArray(outcomes > 0, outcomes < 0)
+        else:
+            outcomes = np.array([True, False, None], dtype=object)[
+                np.where(outcomes < 0, 2, 1 - outcomes)]
+
+        data = {
+            'student_id' : student_id_column,
+            'module_id' : module_id_column,
+            'module_type' : module_type_column,
+            'outcome' : outcomes,
+            'timestep' : columns['timestep'],
+            'duration' : columns['duration'],
+            'time_since_previous_interaction' : columns['time_since_previous_interaction'],
+            'timestamp' : columns.get('timestamp', np.nan)
+        }
+        # copy=False keeps memory-mapped columns backed by the file,
+        # and the stored id arrays give the id -> index maps,
+        # so the id columns are not scanned
+        return cls(
+            pd.DataFrame(data, copy=False),
+            student_idx={k: i for i, k in enumerate(student_ids)},
+            assessment_idx={k: i for i, k in enumerate(assessment_ids)},
+            lesson_idx={k: i for i, k in enumerate(lesson_ids)},
+            **kwargs)
+
+    def fingerprint(self, filtered_history=None):
+        """
+        Compute a content hash of the interaction history
+
+        Two histories get the same fingerprint if they have the same interactions
+        (and the same id -> index maps), so the fingerprint can be used to key
+        cached preprocessing results
+
+        :param pd.DataFrame|None filtered_history: A filtered interaction history
+        :rtype: str
+        :return: A hex digest
+        """
+
+        df = filtered_history if filtered_history is not None else self.data
+
+        h = hashlib.sha1()
+        columns = ['student_id', 'module_id', 'module_type', 'outcome', 'timestep',
+                'time_since_previous_interaction']
+        h.update(_array_bytes(pd.util.hash_pandas_object(
+            df[columns].astype({'outcome' : object}), index=False).values))
+        for ids in [self._student_ids, self._assessment_ids, self._lesson_ids]:
+            h.update(_array_bytes(pd.util.hash_pandas_object(ids).values))
+        return h.hexdigest()
 
     def compute_idx_maps(
         self,
@@ -287,46 +781,142 @@ class InteractionHistory(object):
         :param dict[str,int]|None lesson_idx: A dictionary mapping lesson_id to lesson_idx
         """
 
-        student_ids = self.data['student_id'].unique()
-        assessment_ids = self.data['module_id'][self.data['module_type'] == \
-                AssessmentInteraction.MODULETYPE].unique()
-        lesson_ids = self.data['module_id'][self.data['module_type'] == \
-                LessonInteraction.MODULETYPE].unique()
-
+        # only scan the id columns for maps that are not given
         buildidx = lambda s: {x: i for i, x in enumerate(s)}
-        self._student_idx = buildidx(student_ids) if student_idx is None else student_idx
-        self._assessment_idx = buildidx(
-                assessment_ids) if assessment_idx is None else assessment_idx
-        self._lesson_idx = buildidx(lesson_ids) if lesson_idx is None else lesson_idx
+        module_ids_of_type = lambda module_type: self.data['module_id'][
+                self.data['module_type'] == module_type].unique()
+        self._student_idx = buildidx(
+                self.data['student_id'].unique()) if student_idx is None else student_idx
+        self._assessment_idx = buildidx(module_ids_of_type(
+                AssessmentInteraction.MODULETYPE)) if assessment_idx is None else assessment_idx
+        self._lesson_idx = buildidx(module_ids_of_type(
+                LessonInteraction.MODULETYPE)) if lesson_idx is None else lesson_idx
 
         build_inv_idx = lambda d: {v: k for k, v in d.items()}
         self._student_inv_idx = build_inv_idx(self._student_idx)
         self._assessment_inv_idx = build_inv_idx(self._assessment_idx)
         self._lesson_inv_idx = build_inv_idx(self._lesson_idx)
 
-    def squash_timesteps(self, num_checkpoints=10):
+        # pd.Index of ids, ordered by index, for vectorized id -> index lookups
+        def build_id_index(d):
+            ids = np.empty(len(d), dtype=object)
+            ids[list(d.values())] = list(d.keys())
+            return pd.Index(ids)
+        self._student_ids = build_id_index(self._student_idx)
+        self._assessment_ids = build_id_index(self._assessment_idx)
+        self._lesson_ids = build_id_index(self._lesson_idx)
+
+    def append(self, data):
         """
-        Squash timesteps for consecutive assessment interactions,
-        i.e., timestep should only increment when a student works on a lesson
+        Append interactions between existing students and existing modules to the history
+
+        The id -> index maps are kept as they are, so the parameters of a model
+        that was trained on the history stay aligned with it
 
-        :param int num_checkpoints: Number of checkpoints to log during iteration over students
+        Appended interactions are buffered instead of being copied into the dataframe
+        on every call, so appending takes time proportional to the number of new interactions
+
+        :param pd.DataFrame data: An interaction history dataframe
+            (see the constructor for the expected columns)
         """
 
-        num_students = self.num_students()
-        checkpoint_len = num_students // num_checkpoints
+        is_assessment_ixn = (data['module_type'] == AssessmentInteraction.MODULETYPE).values
+        is_lesson_ixn = (data['module_type'] == LessonInteraction.MODULETYPE).values
+        try:
+            student_idxes = self.idxes_of_student_ids(data['student_id'].values)
+            self.idxes_of_assessment_ids(data['module_id'].values[is_assessment_ixn])
+            self.idxes_of_lesson_ids(data['module_id'].values[is_lesson_ixn])
+        except KeyError as e:
+            raise ValueError('Cannot append interactions with new ids: {}'.format(e))
+
+        data = data.copy()
+        for column in self._data.columns:
+            if column not in data.columns:
+                data[column] = np.nan
+
+        if self._student_row_index is not None:
+            row_idxes = self._num_rows() + np.arange(len(data))
+            appended_rows_of_student_idx = self._student_row_index[2]
+            for student_idx, row_idx in zip(student_idxes, row_idxes):
+                appended_rows_of_student_idx.setdefault(student_idx, []).append(row_idx)
+
+        # the dataframe is not copied on every append
+        # (see InteractionHistory.data)
+        self._appended_data.append(data[self._data.columns])
+        self._duration = max(self._duration, data['timestep'].max() + 1)
+
+    def _num_rows(self):
+        return len(self._data) + sum(len(data) for data in self._appended_data)
+
+    def _build_student_row_index(self):
+        """
+        Group the rows of the history by student, so the rows of a few students
+        can be looked up without scanning the whole history
 
-        df = self.data.groupby('student_id')
+        :rtype: (np.ndarray, np.ndarray, dict[int,list[int]])
+        :return: (row positions sorted by student index, offsets of each student's rows
+            in the sorted positions, rows appended since the index was built for each student)
+        """
 
-        for student_idx, student_id in enumerate(self.iter_students()):
-            if checkpoint_len > 0 and student_idx % checkpoint_len == 0:
-                _logger.debug("Processed student %d of %d", student_idx, num_students)
-            timestep = 1
-            for idx, interaction in df.get_group(student_id).iterrows():
-                module_type = interaction['module_type']
-                if module_type == LessonInteraction.MODULETYPE:
-                    timestep += 1
+        student_idxes = self.idxes_of_student_ids(self.data['student_id'].values)
+        row_idxes = np.argsort(student_idxes, kind='mergesort')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(
+            student_idxes, minlength=self.num_students()))))
+        return row_idxes, offsets, {}
 
-                self.data.loc[idx, 'timestep'] = timestep
+    def interactions_of_students(self, student_idxes):
+        """
+        Get the interactions of a batch of students
+
+        Rows are found with an index of the rows of each student, which is built by the first
+        call in O(number of interactions) and kept up to date by
+        :py:func:`datatools.InteractionHistory.append`. Later calls take time proportional
+        to the number of rows returned, and do not concatenate appended interactions
+        to the history.
+
+        :param np.ndarray student_idxes: Indices of students
+        :rtype: (pd.DataFrame, np.ndarray)
+        :return: (interactions of each student in turn, each in the order of the history,
+            and the number of interactions of each student)
+        """
+
+        if self._student_row_index is None:
+            self._student_row_index = self._build_student_row_index()
+        sorted_row_idxes, offsets, appended_rows_of_student_idx = self._student_row_index
+
+        row_idxes_of_students = [np.concatenate((
+            sorted_row_idxes[offsets[student_idx]:offsets[student_idx+1]],
+            appended_rows_of_student_idx.get(student_idx, []))).astype(int)
+            for student_idx in student_idxes]
+        num_ixns = np.array([len(x) for x in row_idxes_of_students], dtype=int)
+        row_idxes = np.concatenate(
+            row_idxes_of_students) if row_idxes_of_students else np.zeros(0, dtype=int)
+
+        # take rows from the dataframe, and from the appended dataframes
+        # that have not been concatenated to it
+        frames = [self._data] + self._appended_data
+        frame_offsets = np.cumsum([0] + [len(frame) for frame in frames])
+        frame_idxes = np.searchsorted(frame_offsets, row_idxes, side='right') - 1
+        order = np.argsort(frame_idxes, kind='mergesort')
+        rows = pd.concat([frames[i].iloc[row_idxes[order][frame_idxes[order] == i] - \
+                frame_offsets[i]] for i in np.unique(frame_idxes)] or [self._data.iloc[:0]],
+            ignore_index=True)
+
+        return rows.iloc[np.argsort(order, kind='mergesort')].reset_index(drop=True), num_ixns
+
+    def squash_timesteps(self, num_checkpoints=None):
+        """
+        Squash timesteps for consecutive assessment interactions,
+        i.e., timestep should only increment when a student works on a lesson
+
+        :param int|None num_checkpoints: Ignored, kept for backwards compatibility
+            (timesteps are no longer computed in a loop over students)
+        """
+
+        # each student starts at timestep 1, and every lesson interaction
+        # (in the order they appear in the history) moves them to the next timestep
+        is_lesson_ixn = (self.data['module_type'] == LessonInteraction.MODULETYPE).astype(int)
+        self.data['timestep'] = 1 + is_lesson_ixn.groupby(self.data['student_id']).cumsum()
 
         # need to add 1 since internal time starts at zero
         self._duration = self.data['timestep'].max() + 1
@@ -355,66 +945,117 @@ class InteractionHistory(object):
 
         df = filtered_history if filtered_history is not None else self.data
 
-        num_timesteps = self.duration()
+        # map ids to indices once for the whole history,
+        # instead of looking up every interaction with Series.apply
+        student_idxes = self.idxes_of_student_ids(df['student_id'])
+        timesteps = np.array(df['timestep'].values, dtype=int)
+        is_assessment_ixn = (df['module_type'] == AssessmentInteraction.MODULETYPE).values
+        is_lesson_ixn = (df['module_type'] == LessonInteraction.MODULETYPE).values
+
+        timestep_of_last_student_idx = self._timestep_of_last_student_idx(
+            student_idxes, timesteps)
+        trajectory_offsets = np.concatenate(([0], np.cumsum(timestep_of_last_student_idx + 1)))
 
-        def df_to_unique_timesteps(dataframe):
-            """ Convert a dataframe's timesteps so that only one event happens per timestep """
-            output = dataframe['student_id'].apply(self.idx_of_student_id).values
-            return output * num_timesteps + dataframe['timestep'].values
+        # rows of the packed student states (see models.StudentTrajectories)
+        state_idxes = trajectory_offsets[student_idxes] + timesteps
 
-        assessment_df = df[df['module_type']==AssessmentInteraction.MODULETYPE]
-        assessment_timesteps = df_to_unique_timesteps(assessment_df)
-        assessment_idxes = assessment_df['module_id'].apply(self.idx_of_assessment_id)
+        assessment_idxes = self.idxes_of_assessment_ids(df['module_id'].values[is_assessment_ixn])
 
         # Convert bools to +/- 1
-        assessment_outcomes = assessment_df['outcome'] * 2 - 1
+        assessment_outcomes = np.array(
+            df['outcome'].values[is_assessment_ixn], dtype=int) * 2 - 1
 
-        # the cast to np.array is necessary, otherwise grad.* will complain
+        # the cast to np.array is necessary, otherwise grad.CostFunction will complain
         # during parameter estimation
-        assessment_interactions = (np.array(assessment_timesteps, dtype=np.int),
-                np.array(assessment_idxes, dtype=np.int),
-                np.array(assessment_outcomes, dtype=np.int))
+        assessment_interactions = (state_idxes[is_assessment_ixn],
+                assessment_idxes,
+                assessment_outcomes)
 
-        lesson_df = df[df['module_type']==LessonInteraction.MODULETYPE]
-        if len(lesson_df) == 0 and insert_dummy_lesson_ixns:
+        if not is_lesson_ixn.any() and insert_dummy_lesson_ixns:
             # these dummy ixns are going to be used to create a temporal process
             # for student embeddings, so lessons are irrelevant
             lesson_idxes_of_lesson_ixns = None
 
-            student_idxes_of_lesson_ixns = []
-            times_since_prev_ixn_of_lesson_ixns = []
-            for student_id, group in df.groupby('student_id'):
-                # we want a dummy lesson interaction for each transition
-                # t=1 to t=2
-                # t=2 to t=3
-                # ...
-                # but not t=0 to t=1
-                T = group['timestep'].max()
-
-                student_idxes_of_lesson_ixns.extend([self.idx_of_student_id(student_id)] * (T-1))
-                grouped = group.groupby('timestep')
-                for timestep in range(2, T+1):
-                    times_since_prev_ixn_of_lesson_ixns.append(grouped.get_group(
-                        timestep)['time_since_previous_interaction'][0])
-            student_idxes_of_lesson_ixns = np.array(student_idxes_of_lesson_ixns)
-            times_since_prev_ixn_of_lesson_ixns = np.array(times_since_prev_ixn_of_lesson_ixns)
+            # we want a dummy lesson interaction for each transition
+            # t=1 to t=2
+            # t=2 to t=3
+            # ...
+            # but not t=0 to t=1
+            num_dummy_ixns_of_student_idx = np.maximum(0, timestep_of_last_student_idx - 1)
+            dummy_student_idxes = np.repeat(
+                np.arange(len(num_dummy_ixns_of_student_idx)), num_dummy_ixns_of_student_idx)
+            first_dummy_ixn_of_student_idx = np.cumsum(
+                num_dummy_ixns_of_student_idx) - num_dummy_ixns_of_student_idx
+            dummy_timesteps = 2 + np.arange(len(dummy_student_idxes)) - \
+                    first_dummy_ixn_of_student_idx[dummy_student_idxes]
+            student_idxes_of_lesson_ixns = trajectory_offsets[dummy_student_idxes] + \
+                    dummy_timesteps
+
+            # time since previous interaction of the first interaction at each student state
+            first_ixns_of_states = pd.Series(
+                df['time_since_previous_interaction'].values,
+                index=state_idxes).groupby(level=0).first()
+            times_since_prev_ixn_of_lesson_ixns = first_ixns_of_states.reindex(
+                student_idxes_of_lesson_ixns).values
         else:
-            student_idxes_of_lesson_ixns = np.array(lesson_df['student_id'].apply(
-                self.idx_of_student_id)) * num_timesteps + np.array(lesson_df['timestep'])
-            lesson_idxes_of_lesson_ixns = np.array(lesson_df['module_id'].apply(
-                self.idx_of_lesson_id))
+            student_idxes_of_lesson_ixns = state_idxes[is_lesson_ixn]
+            lesson_idxes_of_lesson_ixns = self.idxes_of_lesson_ids(
+                df['module_id'].values[is_lesson_ixn])
             times_since_prev_ixn_of_lesson_ixns = np.array(
-                    lesson_df['time_since_previous_interaction'])
+                    df['time_since_previous_interaction'].values[is_lesson_ixn])
 
         lesson_interactions = (student_idxes_of_lesson_ixns,
                 lesson_idxes_of_lesson_ixns,
                 times_since_prev_ixn_of_lesson_ixns)
 
-        timestep_of_last_interaction = df.groupby('student_id')['timestep'].max().to_dict()
-        num_students = self.num_students()
+        in_history = np.bincount(student_idxes, minlength=self.num_students()) > 0
+        timestep_of_last_interaction = dict(zip(
+            self._student_ids[in_history], timestep_of_last_student_idx[in_history].tolist()))
 
         return SplitHistory(
-                assessment_interactions, lesson_interactions, timestep_of_last_interaction)
+                assessment_interactions,
+                lesson_interactions,
+                timestep_of_last_interaction,
+                trajectory_offsets)
+
+    def _timestep_of_last_student_idx(self, student_idxes, timesteps):
+        """
+        Get the timestep of the last interaction of each student
+
+        :param np.ndarray student_idxes: Student index of each interaction
+        :param np.ndarray timesteps: Timestep of each interaction
+        :rtype: np.ndarray
+        :return: An array of length num_students (zero for students without interactions)
+        """
+
+        timestep_of_last_student_idx = np.zeros(self.num_students(), dtype=int)
+        last_timesteps = pd.Series(timesteps).groupby(student_idxes).max()
+        timestep_of_last_student_idx[last_timesteps.index.values] = last_timesteps.values
+        return timestep_of_last_student_idx
+
+    def trajectory_offsets(self, filtered_history=None):
+        """
+        Lay out student trajectories in a packed array of student states
+
+        A student whose last interaction occurs at timestep T gets T+1 states
+        (for timesteps 0, 1, ..., T), so the total number of states scales with
+        the lengths of individual student histories instead of
+        num_students * duration()
+
+        :param pd.DataFrame|None filtered_history: A filtered interaction history
+        :rtype: np.ndarray
+        :return: An array of length num_students + 1, where the states of the student at
+            student_idx occupy rows offsets[student_idx]:offsets[student_idx+1]
+        """
+
+        df = filtered_history if filtered_history is not None else self.data
+
+        # students that do not show up in the (filtered) history only get an initial state
+        timestep_of_last_student_idx = self._timestep_of_last_student_idx(
+            self.idxes_of_student_ids(df['student_id']),
+            np.array(df['timestep'].values, dtype=int))
+
+        return np.concatenate(([0], np.cumsum(timestep_of_last_student_idx + 1)))
 
     # TODO: replace these functions with direct calls to the dicts
     # ...and replace pd.Series.apply(lambda x: id_of_*_idx) with pd.Series.map(dict)
@@ -479,6 +1120,39 @@ class InteractionHistory(object):
         """
         return self._lesson_idx[lesson_id]
 
+    def idxes_of_student_ids(self, student_ids):
+        """
+        Get student indices of an array of student ids
+        (vectorized version of :py:func:`datatools.InteractionHistory.idx_of_student_id`)
+
+        :param np.ndarray|pd.Series student_ids: Student ids
+        :rtype: np.ndarray
+        :return: The students' indices
+        """
+        return _idxes_of_ids(self._student_ids, student_ids)
+
+    def idxes_of_assessment_ids(self, assessment_ids):
+        """
+        Get assessment indices of an array of assessment ids
+        (vectorized version of :py:func:`datatools.InteractionHistory.idx_of_assessment_id`)
+
+        :param np.ndarray|pd.Series assessment_ids: Assessment ids
+        :rtype: np.ndarray
+        :return: The assessments' indices
+        """
+        return _idxes_of_ids(self._assessment_ids, assessment_ids)
+
+    def idxes_of_lesson_ids(self, lesson_ids):
+        """
+        Get lesson indices of an array of lesson ids
+        (vectorized version of :py:func:`datatools.InteractionHistory.idx_of_lesson_id`)
+
+        :param np.ndarray|pd.Series lesson_ids: Lesson ids
+        :rtype: np.ndarray
+        :return: The lessons' indices
+        """
+        return _idxes_of_ids(self._lesson_ids, lesson_ids)
+
     def duration(self):
         """
         Get the total duration of the interaction history
@@ -574,3 +1248,32 @@ class InteractionHistory(object):
         """
         return self.data['module_id'][self.data['student_id']==student_id]
 
+
+def load_interaction_history(history_file, **kwargs):
+    """
+    Load an interaction history from a file
+
+    :param str history_file: Path to a .csv file containing an interaction history dataframe,
+        a .npz file written by :py:func:`datatools.InteractionHistory.to_npz`, or
+        a .pkl file containing a pickled :py:class:`datatools.InteractionHistory`
+
+    :param dict kwargs: Keyword arguments for the InteractionHistory constructor
+        (ignored for .pkl files)
+
+    :rtype: InteractionHistory
+    :return: An interaction history
+    """
+
+    _, history_file_ext = os.path.splitext(history_file)
+    if history_file_ext == '.csv':
+        return InteractionHistory(pd.read_csv(history_file), **kwargs)
+    elif history_file_ext == '.npz':
+        return InteractionHistory.from_npz(history_file, **kwargs)
+    elif history_file_ext == '.pkl':
+        with open(history_file, 'rb') as f:
+            return pickle.load(f)
+    else:
+        raise ValueError('Unrecognized file extension for history_file.\
+                Please supply a .csv with an interaction history, a .npz file written by\
+                datatools.InteractionHistory.to_npz, or a .pkl file containing\
+                a datatools.InteractionHistory object.')
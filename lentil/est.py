@@ -9,16 +9,23 @@ Module for estimating model parameters
 from abc import abstractmethod
 from collections import OrderedDict
 import copy
+import json
 import logging
 import math
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import pickle
 import time
 
-from matplotlib import pyplot as plt
 import numpy as np
+import pandas as pd
 from scipy import optimize, sparse
 
+from . import datatools
 from . import models
 from . import grad
+from . import telemetry
 
 
 _logger = logging.getLogger(__name__)
@@ -36,7 +43,9 @@ def gradient_descent(
     max_iter=1000,
     using_adagrad=True,
     debug_mode_on=False,
-    verify_gradient=False):
+    verify_gradient=False,
+    callback=None,
+    resume_state=None):
     """
     Batch gradient descent
 
@@ -47,7 +56,7 @@ def gradient_descent(
         and outputs values for gradients and the cost function
         evaluated with current parameter values
 
-        For example, see :py:func:`grad.without_scipy_*`
+        For example, see :py:func:`grad.CostFunction.grads`
 
     :param dict[str,np.ndarray] params: Parameters allowed to vary
     :param dict[str,function] param_constraint_funcs: Functions that enforce bounds on parameters
@@ -66,6 +75,14 @@ def gradient_descent(
     :param bool debug_mode_on: True => dump plots using matplotlib.pyplot.show
     :param int num_checkpoints: Number of times to print "Iteration #" during updates
     :param int max_iter: Maximum number of training steps
+    :param function|None callback: Called after each iteration with
+        (number of completed iterations, params, cost history, optimizer state),
+        where the optimizer state is {'hg' : historical gradient} for Adagrad
+
+    :param dict[str,object]|None resume_state: State of an interrupted run to continue from,
+        i.e., a dictionary with keys 'iter_idx' (number of completed iterations), 'costs',
+        and 'optimizer_state' (see :py:func:`est.FitCheckpointer.load`)
+
     :rtype: dict[str,np.ndarray]
     :return: Parameter values at which gradient descent "converges"
     """
@@ -80,12 +97,18 @@ def gradient_descent(
 
     if using_adagrad:
         # historical gradient (for Adagrad)
-        hg = {k: np.zeros_like(v) for k, v in params.items()}
+        if resume_state is not None:
+            hg = {k: np.array(resume_state['optimizer_state']['hg'][k]) for k in params}
+        else:
+            hg = {k: np.zeros_like(v) for k, v in params.items()}
 
     checkpoint_iter_step = max(1, max_iter // num_checkpoints)
     is_checkpoint = lambda idx: idx % checkpoint_iter_step == 0
 
     if verify_gradient:
+        # imported here, so that matplotlib is only loaded when plots are requested
+        from matplotlib import pyplot as plt
+
         # check accuracy of gradient function using finite differences
         # TODO: move this check into a test suite and automate checking for correctness
         # for now, set verify_gradient=True in a notebook (e.g., nb/toy_examples.ipynb)
@@ -138,13 +161,14 @@ def gradient_descent(
             except IndexError:
                 pass
 
-    costs = []
+    costs = list(resume_state['costs']) if resume_state is not None else []
     gradient_norms = {k: [] for k in params}
 
     start_time = time.time()
 
     rel_diff = 2 * ftol # arbitrary starting point (should be greater than ftol)
-    for iter_idx in range(max_iter):
+    first_iter_idx = resume_state['iter_idx'] if resume_state is not None else 0
+    for iter_idx in range(first_iter_idx, max_iter):
         g, cst = grads(params)
 
         # don't use "for k, v in g.iteritems()", because we may be computing gradients
@@ -163,20 +187,25 @@ def gradient_descent(
         for k in params:
             gradient_norms[k].append(np.linalg.norm(g[k]))
 
-        if iter_idx >= 1:
+        if costs:
             rel_diff = (cst - costs[-1]) / costs[-1]
 
         if is_checkpoint(iter_idx):
             _logger.debug('Iteration %d, rel_diff=%f', iter_idx, rel_diff)
             _logger.debug('Running at %f seconds per iteration',
-                (time.time() - start_time) / (iter_idx + 1))
+                (time.time() - start_time) / (iter_idx + 1 - first_iter_idx))
 
         costs.append(cst)
-        
+
+        if callback is not None:
+            callback(iter_idx + 1, params, costs, {'hg' : hg} if using_adagrad else {})
+
         if abs(rel_diff) <= ftol:
             break
 
     if debug_mode_on:
+        from matplotlib import pyplot as plt
+
         _, ax = plt.subplots()
         ax.set_xlabel('Iteration')
         ax.set_ylabel('Cost')
@@ -194,6 +223,739 @@ def gradient_descent(
     return params
 
 
+def minibatch_gradient_descent(
+    batch_grads,
+    params,
+    param_constraint_funcs,
+    num_students,
+    batch_size=256,
+    rate=0.01,
+    lr_schedule='constant',
+    lr_decay=0.9,
+    using_adam=True,
+    beta1=0.9,
+    beta2=0.999,
+    eps=1e-8,
+    ftol=1e-3,
+    max_epochs=100,
+    random_state=None,
+    debug_mode_on=False,
+    callback=None,
+    resume_state=None):
+    """
+    Mini-batch stochastic gradient descent on random batches of students
+
+    Optionally uses Adam to compute adaptive learning rates. Each step only updates
+    the rows of parameters that participate in the batch (i.e., the batch's student states
+    and biases, and all module parameters), so the cost of a step depends on the size of
+    the batch and not on the size of the interaction history.
+
+    :param function batch_grads: A function that takes parameter values and an array of
+        student indices as input, and outputs (gradients, cost, rows), where gradients and
+        cost are those of the part of the cost function that depends on the interactions of
+        those students, and rows maps a parameter's name to the rows of the parameter
+        that the gradient covers
+
+        For example, see :py:class:`est.StudentMinibatchCostFunction`
+
+    :param dict[str,np.ndarray] params: Parameters allowed to vary
+    :param dict[str,function] param_constraint_funcs: Functions that enforce bounds on parameters
+    :param int num_students: Number of students in the interaction history
+    :param int batch_size: Number of students in each mini-batch
+    :param float rate: Initial learning rate
+    :param str lr_schedule: Learning rate as a function of the epoch
+        'constant' => rate
+        'inverse' => rate / (1 + lr_decay * epoch)
+        'exponential' => rate * lr_decay ** epoch
+
+    :param float lr_decay: Decay parameter of the learning rate schedule
+    :param bool using_adam: Whether or not to use Adam
+    :param float beta1: Adam decay rate for the first moment of the gradient
+    :param float beta2: Adam decay rate for the second moment of the gradient
+    :param float eps: Adam small epsilon
+    :param float ftol: Stopping condition
+        When relative difference between the total cost of consecutive epochs
+        drops below ftol, then the iterative optimization has "converged"
+
+    :param int max_epochs: Maximum number of passes over the students
+    :param np.random.RandomState|None random_state: Source of random batches
+    :param bool debug_mode_on: True => dump plots using matplotlib.pyplot.show
+    :param function|None callback: Called after each epoch with
+        (number of completed epochs, params, history of epoch costs, optimizer state),
+        where the optimizer state is {'m' : first moments, 'v' : second moments,
+        'step_idx' : number of steps} for Adam, and {'step_idx' : number of steps} otherwise
+
+    :param dict[str,object]|None resume_state: State of an interrupted run to continue from
+        (see :py:func:`est.gradient_descent`). Batches are not replayed, so a resumed run
+        draws different batches than an uninterrupted one.
+
+    :rtype: dict[str,np.ndarray]
+    :return: Parameter values at which gradient descent "converges"
+    """
+    if batch_size <= 0:
+        raise ValueError('batch_size must be positive not {}'.format(batch_size))
+    if rate <= 0:
+        raise ValueError('rate must be positive not {}'.format(rate))
+    if max_epochs <= 0:
+        raise ValueError('Maximum number of epochs must be strictly positive')
+
+    lr_schedules = {
+        'constant' : lambda epoch: rate,
+        'inverse' : lambda epoch: rate / (1 + lr_decay * epoch),
+        'exponential' : lambda epoch: rate * lr_decay ** epoch
+    }
+    if lr_schedule not in lr_schedules:
+        raise ValueError('Invalid learning rate schedule: {}'.format(lr_schedule))
+
+    if random_state is None:
+        random_state = np.random
+
+    optimizer_state = resume_state['optimizer_state'] if resume_state is not None else None
+    if using_adam:
+        # first and second moments of the gradient (for Adam)
+        if optimizer_state is not None:
+            m = {k: np.array(optimizer_state['m'][k]) for k in params}
+            v = {k: np.array(optimizer_state['v'][k]) for k in params}
+        else:
+            m = {k: np.zeros_like(v) for k, v in params.items()}
+            v = {k: np.zeros_like(x) for k, x in params.items()}
+
+    epoch_costs = list(resume_state['costs']) if resume_state is not None else []
+
+    start_time = time.time()
+
+    step_idx = int(optimizer_state['step_idx']) if optimizer_state is not None else 0
+    first_epoch_idx = resume_state['iter_idx'] if resume_state is not None else 0
+    for epoch_idx in range(first_epoch_idx, max_epochs):
+        epoch_rate = lr_schedules[lr_schedule](epoch_idx)
+        student_idxes = random_state.permutation(num_students)
+
+        epoch_cost = 0
+        for batch_start_idx in range(0, num_students, batch_size):
+            step_idx += 1
+            g, cst, rows = batch_grads(
+                params, student_idxes[batch_start_idx:batch_start_idx+batch_size])
+            epoch_cost += cst
+
+            for k in params:
+                r = rows[k]
+                if using_adam:
+                    # moments are only updated for rows that participate in the batch
+                    m[k][r] = beta1 * m[k][r] + (1 - beta1) * g[k]
+                    v[k][r] = beta2 * v[k][r] + (1 - beta2) * np.square(g[k])
+                    m_hat = m[k][r] / (1 - beta1**step_idx)
+                    v_hat = v[k][r] / (1 - beta2**step_idx)
+                    params[k][r] -= epoch_rate * m_hat / (np.sqrt(v_hat) + eps)
+                else:
+                    params[k][r] -= epoch_rate * g[k]
+
+                # projected gradient
+                params[k][r] = param_constraint_funcs[k](params[k][r])
+
+        if epoch_costs:
+            rel_diff = (epoch_cost - epoch_costs[-1]) / epoch_costs[-1]
+        else:
+            rel_diff = 2 * ftol # arbitrary starting point (should be greater than ftol)
+
+        _logger.debug('Epoch %d, cost=%f, rel_diff=%f', epoch_idx, epoch_cost, rel_diff)
+        _logger.debug('Running at %f seconds per epoch',
+            (time.time() - start_time) / (epoch_idx + 1 - first_epoch_idx))
+
+        epoch_costs.append(epoch_cost)
+
+        if callback is not None:
+            callback(epoch_idx + 1, params, epoch_costs, dict(
+                {'m' : m, 'v' : v} if using_adam else {}, step_idx=np.array(step_idx)))
+
+        if abs(rel_diff) <= ftol:
+            break
+
+    if debug_mode_on:
+        from matplotlib import pyplot as plt
+
+        _, ax = plt.subplots()
+        ax.set_xlabel('Epoch')
+        ax.set_ylabel('Cost')
+        ax.plot(epoch_costs)
+        plt.show()
+
+    return params
+
+
+def compute_participation_matrices(
+    split_history,
+    num_assessments,
+    num_lessons,
+    using_lessons=True,
+    using_prereqs=True,
+    dtype=np.float64):
+    """
+    Build the sparse matrices that map interactions to the students, assessments,
+    and lessons that participate in them
+
+    :param datatools.SplitHistory split_history: An interaction history split into
+        assessment interactions and lesson interactions
+    :param int num_assessments: Number of assessments
+    :param int num_lessons: Number of lessons
+    :param bool using_lessons: Including lessons in embedding
+    :param bool using_prereqs: Including lesson prereqs in embedding
+    :param type dtype: Data type of matrix entries
+
+    :rtype: dict[str,sparse.csr_matrix|None]
+    :return: A dictionary mapping the name of a participation matrix to the matrix
+    """
+
+    (
+        student_idxes_for_assessment_ixns,
+        assessment_idxes_for_assessment_ixns, _) = split_history.assessment_interactions
+
+    (
+        student_idxes_for_lesson_ixns,
+        lesson_idxes_for_lesson_ixns, _) = split_history.lesson_interactions
+    num_lesson_ixns = len(student_idxes_for_lesson_ixns)
+    lesson_ixns_participation_matrix_entries = np.ones(num_lesson_ixns, dtype=dtype)
+
+    num_assessment_ixns = len(student_idxes_for_assessment_ixns)
+    assessment_ixns_participation_matrix_entries = np.ones(num_assessment_ixns, dtype=dtype)
+    assessment_ixn_idxes = np.arange(num_assessment_ixns)
+
+    # total number of student states across all trajectories
+    trajectory_offsets = split_history.trajectory_offsets
+    num_students = len(trajectory_offsets) - 1
+    num_student_states = trajectory_offsets[-1]
+    student_idxes_of_states = np.repeat(np.arange(num_students), np.diff(trajectory_offsets))
+
+    assessment_participation_in_assessment_ixns = sparse.coo_matrix(
+        (assessment_ixns_participation_matrix_entries,
+            (assessment_idxes_for_assessment_ixns, assessment_ixn_idxes)),
+        shape=(num_assessments, num_assessment_ixns)).tocsr()
+    student_participation_in_assessment_ixns = sparse.coo_matrix(
+        (assessment_ixns_participation_matrix_entries,
+            (student_idxes_for_assessment_ixns, assessment_ixn_idxes)),
+        shape=(num_student_states, num_assessment_ixns)).tocsr()
+
+    student_bias_participation_in_assessment_ixns = sparse.coo_matrix(
+        (assessment_ixns_participation_matrix_entries,
+            (student_idxes_of_states[student_idxes_for_assessment_ixns],
+                assessment_ixn_idxes)),
+        shape=(num_students, num_assessment_ixns)).tocsr()
+
+    # outside the "if using_lessons" statement
+    # because we may need these for dummy lesson interactions
+    # in the temporal process of models without lessons
+    lesson_ixn_idxes = np.arange(num_lesson_ixns)
+    curr_student_participation_in_lesson_ixns = sparse.coo_matrix(
+        (lesson_ixns_participation_matrix_entries,
+            (student_idxes_for_lesson_ixns, lesson_ixn_idxes)),
+        shape=(num_student_states, num_lesson_ixns)).tocsr()
+    prev_student_participation_in_lesson_ixns = sparse.coo_matrix(
+        (lesson_ixns_participation_matrix_entries,
+            (student_idxes_for_lesson_ixns - 1, lesson_ixn_idxes)),
+        shape=(num_student_states, num_lesson_ixns)).tocsr()
+
+    if not using_prereqs:
+        # when computing gradients, we will be computing Ax - Bx
+        # where A = curr_student_participation_in_lesson_ixns
+        # and B = prev_student_participation_in_lesson_ixns,
+        # so to speed things up we precompute A-B and compute (A-B)x
+        curr_student_participation_in_lesson_ixns -= prev_student_participation_in_lesson_ixns
+
+    if using_lessons:
+        lesson_participation_in_lesson_ixns = sparse.coo_matrix(
+            (lesson_ixns_participation_matrix_entries,
+                (lesson_idxes_for_lesson_ixns, lesson_ixn_idxes)),
+            shape=(num_lessons, num_lesson_ixns)).tocsr()
+    else:
+        lesson_participation_in_lesson_ixns = None
+
+    return {
+        'student_participation_in_assessment_ixns' : student_participation_in_assessment_ixns,
+        'student_bias_participation_in_assessment_ixns' : (
+            student_bias_participation_in_assessment_ixns),
+        'assessment_participation_in_assessment_ixns' : (
+            assessment_participation_in_assessment_ixns),
+        'curr_student_participation_in_lesson_ixns' : curr_student_participation_in_lesson_ixns,
+        'prev_student_participation_in_lesson_ixns' : prev_student_participation_in_lesson_ixns,
+        'lesson_participation_in_lesson_ixns' : lesson_participation_in_lesson_ixns
+    }
+
+
+def _chain_callbacks(callbacks):
+    """
+    :param list[function|None] callbacks: Optimizer callbacks
+    :rtype: function|None
+    :return: A callback that calls each of the callbacks in turn,
+        or None if there are no callbacks
+    """
+
+    callbacks = [callback for callback in callbacks if callback is not None]
+    if not callbacks:
+        return None
+
+    def callback(*args):
+        for f in callbacks:
+            f(*args)
+    return callback
+
+
+def _concatenated_ranges(starts, stops):
+    """
+    :param np.ndarray starts: Start of each range
+    :param np.ndarray stops: End of each range (exclusive)
+    :rtype: np.ndarray
+    :return: The concatenation of np.arange(start, stop) for each range
+    """
+
+    lengths = stops - starts
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+
+class StudentMinibatchCostFunction(object):
+    """
+    Evaluates the part of the cost function that depends on the interactions
+    of a mini-batch of students, for :py:func:`est.minibatch_gradient_descent`
+
+    Interactions are sorted by student once, so gathering a batch's interactions,
+    building its participation matrices, and evaluating its gradient
+    all take time proportional to the size of the batch.
+
+    Each student's states only appear in the batch that contains the student,
+    so the student regularization term is included in full. The module regularization
+    and graph regularization terms are split across batches in proportion to batch size,
+    so that the costs of the batches in an epoch sum to the full cost function.
+    """
+
+    def __init__(
+        self,
+        split_history,
+        param_shapes,
+        num_assessments,
+        num_lessons,
+        learning_update_variance=0.5,
+        forgetting_penalty_terms=0,
+        regularization_constant=(1e-6, 1e-6, 1e-6, 1e-6, 1e-6),
+        graph_regularization_constant=0.1,
+        using_lessons=True,
+        using_prereqs=True,
+        dtype=np.float64,
+        scatter_backend='csr',
+        **cost_function_kwargs):
+        """
+        Initialize mini-batch cost function object
+
+        :param datatools.SplitHistory split_history: An interaction history split into
+            assessment interactions and lesson interactions
+        :param collections.OrderedDict param_shapes: Shapes of the full set of parameters
+        :param int num_assessments: Number of assessments
+        :param int num_lessons: Number of lessons
+        :param np.array|float learning_update_variance: See :py:class:`grad.CostFunction`
+        :param np.array|float forgetting_penalty_terms: See :py:class:`grad.CostFunction`
+        :param (float,float,float,float,float) regularization_constant:
+            See :py:class:`grad.CostFunction`
+        :param float graph_regularization_constant: See :py:class:`grad.CostFunction`
+        :param bool using_lessons: Including lessons in the embedding model
+        :param bool using_prereqs: Including lesson prereqs in the embedding model
+        :param type dtype: See :py:class:`grad.CostFunction`
+        :param str scatter_backend: See :py:class:`grad.CostFunction`
+            (participation matrices are only built for mini-batches with the csr backend)
+        :param dict cost_function_kwargs: Other arguments for :py:class:`grad.CostFunction`
+        """
+
+        self.param_shapes = param_shapes
+        self.num_assessments = num_assessments
+        self.num_lessons = num_lessons
+        self.learning_update_variance = learning_update_variance
+        self.forgetting_penalty_terms = forgetting_penalty_terms
+        self.regularization_constant = regularization_constant
+        self.graph_regularization_constant = graph_regularization_constant
+        self.using_lessons = using_lessons
+        self.using_prereqs = using_prereqs
+        self.dtype = dtype
+        self.scatter_backend = scatter_backend
+        self.cost_function_kwargs = cost_function_kwargs
+
+        self.assessment_interactions = split_history.assessment_interactions
+        self.lesson_interactions = split_history.lesson_interactions
+        self.trajectory_offsets = split_history.trajectory_offsets
+        self.num_students = len(self.trajectory_offsets) - 1
+        student_idxes_of_states = np.repeat(
+            np.arange(self.num_students), np.diff(self.trajectory_offsets))
+
+        def sort_by_student(state_idxes):
+            student_idxes = student_idxes_of_states[state_idxes]
+            order = np.argsort(student_idxes, kind='mergesort')
+            bounds = np.searchsorted(student_idxes[order], np.arange(self.num_students + 1))
+            return order, bounds
+
+        self._assessment_ixns_by_student = sort_by_student(self.assessment_interactions[0])
+        self._lesson_ixns_by_student = sort_by_student(self.lesson_interactions[0])
+
+    def _batch_ixns(self, ixns_by_student, student_idxes):
+        """
+        :rtype: (np.ndarray, np.ndarray)
+        :return: (Indices of the interactions of the students,
+            position of each interaction's student in student_idxes)
+        """
+
+        order, bounds = ixns_by_student
+        starts = bounds[student_idxes]
+        stops = bounds[student_idxes + 1]
+        ixn_idxes = order[_concatenated_ranges(starts, stops)]
+        batch_idxes = np.repeat(np.arange(len(student_idxes)), stops - starts)
+        return ixn_idxes, batch_idxes
+
+    def __call__(self, params, student_idxes):
+        """
+        Evaluate the gradient for the interactions of a mini-batch of students
+
+        :param dict[str,np.ndarray] params:
+            A dictionary mapping a parameter's name to its current value
+        :param np.ndarray student_idxes: Students in the mini-batch
+        :rtype: (dict[str,np.ndarray], float, dict[str,np.ndarray|slice])
+        :return: (gradients, cost, rows), where rows maps a parameter's name to
+            the rows of the parameter that the gradient covers
+        """
+
+        cost_function, batch_params, rows = self.batch_cost_function(params, student_idxes)
+        try:
+            gradients, cost = cost_function.grads(batch_params)
+        finally:
+            cost_function.close()
+        return gradients, cost, rows
+
+    def batch_cost_function(self, params, student_idxes):
+        """
+        Set up the cost function of the interactions of a mini-batch of students
+
+        :param dict[str,np.ndarray] params:
+            A dictionary mapping a parameter's name to its current value
+        :param np.ndarray student_idxes: Students in the mini-batch
+        :rtype: (grad.CostFunction, collections.OrderedDict, dict[str,np.ndarray|slice])
+        :return: (cost function, parameter values of the mini-batch, rows), where rows maps
+            a parameter's name to the rows of the parameter that the mini-batch covers
+        """
+
+        offsets = self.trajectory_offsets
+        state_starts = offsets[student_idxes]
+        state_stops = offsets[student_idxes + 1]
+        batch_offsets = np.concatenate([[0], np.cumsum(state_stops - state_starts)])
+
+        # move the batch's student states to the front of a packed array of their own
+        def batch_state_idxes(state_idxes, batch_idxes):
+            return state_idxes - state_starts[batch_idxes] + batch_offsets[batch_idxes]
+
+        assessment_ixn_idxes, batch_idxes = self._batch_ixns(
+            self._assessment_ixns_by_student, student_idxes)
+        (
+            student_idxes_for_assessment_ixns,
+            assessment_idxes_for_assessment_ixns,
+            outcomes_for_assessment_ixns) = self.assessment_interactions
+        assessment_interactions = (
+            batch_state_idxes(
+                student_idxes_for_assessment_ixns[assessment_ixn_idxes], batch_idxes),
+            assessment_idxes_for_assessment_ixns[assessment_ixn_idxes],
+            outcomes_for_assessment_ixns[assessment_ixn_idxes])
+
+        lesson_ixn_idxes, batch_idxes = self._batch_ixns(
+            self._lesson_ixns_by_student, student_idxes)
+        (
+            student_idxes_for_lesson_ixns,
+            lesson_idxes_for_lesson_ixns,
+            times_since_prev_ixn_for_lesson_ixns) = self.lesson_interactions
+        lesson_interactions = (
+            batch_state_idxes(student_idxes_for_lesson_ixns[lesson_ixn_idxes], batch_idxes),
+            grad.select_ixns(lesson_idxes_for_lesson_ixns, lesson_ixn_idxes),
+            grad.select_ixns(times_since_prev_ixn_for_lesson_ixns, lesson_ixn_idxes))
+
+        batch_split_history = datatools.SplitHistory(
+            assessment_interactions, lesson_interactions, None, batch_offsets)
+
+        rows = {k: slice(None) for k in self.param_shapes}
+        rows[models.STUDENT_EMBEDDINGS] = _concatenated_ranges(state_starts, state_stops)
+        rows[models.STUDENT_BIASES] = student_idxes
+        batch_params = OrderedDict((k, params[k][rows[k]]) for k in self.param_shapes)
+        batch_param_shapes = OrderedDict((k, v.shape) for k, v in batch_params.items())
+
+        batch_fraction = len(student_idxes) / float(self.num_students)
+        student_regularization_constant = self.regularization_constant[0]
+        regularization_constant = [student_regularization_constant] + [
+            batch_fraction * c for c in self.regularization_constant[1:]]
+
+        if self.scatter_backend == 'csr':
+            participation_matrices = compute_participation_matrices(
+                batch_split_history,
+                self.num_assessments,
+                self.num_lessons,
+                using_lessons=self.using_lessons,
+                using_prereqs=self.using_prereqs,
+                dtype=self.dtype)
+        else:
+            participation_matrices = None
+
+        cost_function = grad.CostFunction(
+            batch_param_shapes,
+            assessment_interactions,
+            lesson_interactions,
+            participation_matrices,
+            np.repeat(np.arange(len(student_idxes)), np.diff(batch_offsets)),
+            learning_update_variance=grad.select_ixns(
+                self.learning_update_variance, lesson_ixn_idxes),
+            forgetting_penalty_terms=grad.select_ixns(
+                self.forgetting_penalty_terms, lesson_ixn_idxes),
+            regularization_constant=regularization_constant,
+            graph_regularization_constant=batch_fraction * self.graph_regularization_constant,
+            using_lessons=self.using_lessons,
+            using_prereqs=self.using_prereqs,
+            dtype=self.dtype,
+            scatter_backend=self.scatter_backend,
+            **self.cost_function_kwargs)
+
+        return cost_function, batch_params, rows
+
+
+class PreprocessingCache(object):
+    """
+    Cache of split histories and participation matrices, so that repeated fits
+    on the same data (e.g., across hyperparameter settings) skip preprocessing
+
+    Entries are keyed by content hashes of the (filtered) interaction history
+    and of the split history, and are kept in memory and, optionally,
+    pickled to a directory
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        Initialize cache object
+
+        :param str|None cache_dir: Directory where cache entries are pickled
+            (None => only cache in memory)
+        """
+
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        self.cache_dir = cache_dir
+
+        # dict[str,object]
+        # key -> cached value
+        self._entries = {}
+
+    def _get(self, key, compute):
+        """
+        :param str key: A cache key
+        :param function compute: Computes the value if it is not in the cache
+        :rtype: object
+        :return: The cached value
+        """
+
+        if key in self._entries:
+            _logger.debug('Loading %s from memory', key)
+            return self._entries[key]
+
+        path = os.path.join(self.cache_dir, key + '.pkl') if self.cache_dir is not None else None
+        if path is not None and os.path.exists(path):
+            _logger.debug('Loading %s from %s', key, path)
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        else:
+            value = compute()
+            if path is not None:
+                # write to a temporary file first, so readers never see a partial entry
+                tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmp_path, path)
+
+        self._entries[key] = value
+        return value
+
+    def split_history(self, history, filtered_history=None, insert_dummy_lesson_ixns=False):
+        """
+        Get a cached split of an interaction history
+
+        See :py:func:`datatools.InteractionHistory.split_interactions_by_type` for details
+
+        :param datatools.InteractionHistory history: An interaction history
+        :param pd.DataFrame|None filtered_history: A filtered interaction history
+        :param bool insert_dummy_lesson_ixns: Insert dummy lesson interactions
+        :rtype: datatools.SplitHistory
+        """
+
+        key = 'split-{}-{}'.format(
+            history.fingerprint(filtered_history=filtered_history),
+            int(insert_dummy_lesson_ixns))
+        return self._get(key, lambda: history.split_interactions_by_type(
+            filtered_history=filtered_history,
+            insert_dummy_lesson_ixns=insert_dummy_lesson_ixns))
+
+    def participation_matrices(
+        self,
+        split_history,
+        num_assessments,
+        num_lessons,
+        using_lessons=True,
+        using_prereqs=True,
+        dtype=np.float64):
+        """
+        Get cached participation matrices for a split history
+
+        See :py:func:`est.compute_participation_matrices` for details
+
+        :rtype: dict[str,sparse.csr_matrix|None]
+        """
+
+        key = 'participation-{}-{}-{}-{}-{}-{}'.format(
+            split_history.fingerprint(),
+            num_assessments,
+            num_lessons,
+            int(using_lessons),
+            int(using_prereqs),
+            np.dtype(dtype).name)
+        return self._get(key, lambda: compute_participation_matrices(
+            split_history,
+            num_assessments,
+            num_lessons,
+            using_lessons=using_lessons,
+            using_prereqs=using_prereqs,
+            dtype=dtype))
+
+    def clear(self):
+        """
+        Evict all entries from memory (entries pickled to cache_dir are kept)
+        """
+        self._entries = {}
+
+
+# version of the checkpoint format written by FitCheckpointer
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class FitCheckpointer(object):
+    """
+    Periodically writes the state of a fit to a file, so that a preempted fit can resume
+
+    A checkpoint holds the parameters, the optimizer state (e.g., the historical gradient
+    for Adagrad), the number of completed iterations, the cost history, and the configuration
+    of the fit (optimizer, data type and parameter shapes), which is checked on resume.
+    The file is written to a temporary path and then renamed, so an interrupted write
+    leaves the previous checkpoint intact.
+
+    Instances are callbacks for :py:func:`est.gradient_descent` and
+    :py:func:`est.minibatch_gradient_descent`, and are also called by
+    :py:class:`est.EmbeddingMAPEstimator` after each iteration of L-BFGS-B.
+    """
+
+    def __init__(self, path, every=10):
+        """
+        Initialize checkpointer object
+
+        :param str path: Path to checkpoint file
+        :param int every: Number of iterations (or epochs) between checkpoints
+        """
+
+        if every < 1:
+            raise ValueError('every must be positive not {}'.format(every))
+
+        self.path = path
+        self.every = every
+
+        # dict[str,object]
+        # configuration of the fit being checkpointed (see start)
+        self.config = None
+
+    def start(self, optimizer, param_shapes, dtype):
+        """
+        Set the configuration of the fit that is about to be checkpointed
+
+        :param str optimizer: Name of the optimizer
+        :param collections.OrderedDict param_shapes: Shapes of the parameters
+        :param type dtype: Data type of the parameters
+        """
+
+        self.config = {
+            'optimizer' : optimizer,
+            'param_shapes' : [[k, list(v)] for k, v in param_shapes.items()],
+            'dtype' : np.dtype(dtype).name
+        }
+
+    def __call__(self, iter_idx, params, costs, optimizer_state, force=False):
+        """
+        Write a checkpoint every self.every iterations
+
+        :param int iter_idx: Number of completed iterations
+        :param dict[str,np.ndarray] params: Parameter values
+        :param list[float] costs: Cost history
+        :param dict[str,np.ndarray|dict[str,np.ndarray]] optimizer_state: Optimizer state
+        :param bool force: True => write a checkpoint regardless of iter_idx
+        """
+
+        if not force and iter_idx % self.every != 0:
+            return
+
+        arrays = {
+            'format_version' : np.array(CHECKPOINT_FORMAT_VERSION),
+            'config' : np.array(json.dumps(self.config, sort_keys=True)),
+            'iter_idx' : np.array(iter_idx),
+            'costs' : np.array(costs, dtype=float)
+        }
+        for k, v in params.items():
+            arrays['params.' + k] = v
+        for k, v in optimizer_state.items():
+            if isinstance(v, dict):
+                for name, x in v.items():
+                    arrays['optimizer_state.{}.{}'.format(k, name)] = x
+            else:
+                arrays['optimizer_state.' + k] = v
+
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.rename(tmp_path, self.path)
+
+        _logger.debug('Wrote checkpoint at iteration %d to %s', iter_idx, self.path)
+
+    def load(self):
+        """
+        Read the latest checkpoint, and check that it matches the configuration of the fit
+
+        :rtype: dict[str,object]|None
+        :return: A dictionary with keys 'iter_idx', 'costs', 'params' (a dictionary mapping
+            parameter name to value), and 'optimizer_state', or None if there is no checkpoint
+        """
+
+        if not os.path.exists(self.path):
+            return None
+
+        with np.load(self.path, allow_pickle=False) as arrays:
+            format_version = int(arrays['format_version'])
+            if format_version > CHECKPOINT_FORMAT_VERSION:
+                raise ValueError('Unsupported checkpoint format version: {}'.format(
+                    format_version))
+            config = json.loads(str(arrays['config']))
+            if self.config is not None and config != self.config:
+                raise ValueError('Checkpoint in {} was written by a different fit: {}'.format(
+                    self.path, config))
+
+            state = {
+                'iter_idx' : int(arrays['iter_idx']),
+                'costs' : arrays['costs'].tolist(),
+                'params' : {},
+                'optimizer_state' : {}
+            }
+            for key in arrays.files:
+                if key.startswith('params.'):
+                    state['params'][key[len('params.'):]] = arrays[key]
+                elif key.startswith('optimizer_state.'):
+                    names = key[len('optimizer_state.'):].split('.', 1)
+                    if len(names) == 1:
+                        state['optimizer_state'][names[0]] = arrays[key]
+                    else:
+                        state['optimizer_state'].setdefault(names[0], {})[names[1]] = arrays[key]
+
+        return state
+
+
 class EmbeddingMAPEstimator(object):
     """
     Trains a model on an interaction history by computing
@@ -211,7 +973,17 @@ class EmbeddingMAPEstimator(object):
         verify_gradient=False,
         debug_mode_on=False,
         filtered_history=None,
-        split_history=None):
+        split_history=None,
+        cache=None,
+        num_threads=1,
+        using_minibatches=False,
+        minibatch_kwargs={},
+        dtype=np.float64,
+        checkpointer=None,
+        resuming=False,
+        telemetry=None,
+        scatter_backend='csr',
+        chunk_size=None):
         """
         Initialize estimator object
 
@@ -224,6 +996,8 @@ class EmbeddingMAPEstimator(object):
 
         :param dict[str,object] gradient_descent_kwargs: Arguments for gradient_descent
         :param dict[str,np.ndarray] initial_param_vals: For warm starts
+            Student embeddings can be passed as a :py:class:`models.StudentTrajectories`,
+            which gets repacked to the trajectory lengths of the split history
         :param bool using_scipy:
             True => use scipy.optimize.minimize,
             False => use batch gradient descent
@@ -243,12 +1017,61 @@ class EmbeddingMAPEstimator(object):
 
         :param datatools.SplitHistory split_history: An interaction history split into assessment
             interactions, lesson interactions, and timestep of last interaction for each student
+
+        :param PreprocessingCache|None cache: A cache of split histories and participation
+            matrices shared across fits (None => preprocess from scratch on every fit)
+
+        :param int num_threads: Number of threads used to evaluate the cost function
+            and its gradient on shards of the interaction history
+            (with using_minibatches, each mini-batch is sharded across its own thread pool)
+
+        :param bool using_minibatches:
+            True => use mini-batch stochastic gradient descent on batches of students
+            (takes precedence over using_scipy)
+
+        :param dict[str,object] minibatch_kwargs: Arguments for minibatch_gradient_descent
+
+        :param type dtype: Floating-point type of parameters, participation matrices and
+            scratch buffers during fitting (np.float32 or np.float64). L-BFGS-B iterates
+            in float64, so with np.float32 parameters are converted on each evaluation
+            of the cost function, and the gradient is converted back.
+
+        :param FitCheckpointer|None checkpointer: Writes periodic checkpoints of the fit
+            (None => no checkpoints)
+        :param bool resuming: True => continue from the latest checkpoint of the checkpointer,
+            if there is one, instead of initial_param_vals and random initialization.
+            L-BFGS-B restarts from the checkpointed parameters with an empty approximation
+            of the Hessian, and its remaining iterations are reduced accordingly.
+
+        :param telemetry.TrainingTelemetry|None telemetry: Receives statistics of each
+            iteration of the fit, and of each evaluation of the cost function
+            (None => no telemetry)
+
+        :param str scatter_backend: How per-interaction values are added into the gradient,
+            one of grad.SCATTER_BACKENDS (see :py:class:`grad.CostFunction`).
+            'bincount' skips building participation matrices.
+
+        :param int|None chunk_size: Maximum number of interactions of each type that
+            a thread evaluates at once, which bounds the memory used by intermediate
+            quantities in the cost function (see :py:class:`grad.CostFunction`)
+            (None => evaluate all interactions at once)
         """
         if regularization_constant < 0:
             raise ValueError('regularization_constant must be nonnegative not {}'.format(
                 regularization_constant))
         if ftol <= 0:
             raise ValueError('ftol must be positive not {}'.format(ftol))
+        if num_threads < 1:
+            raise ValueError('num_threads must be positive not {}'.format(num_threads))
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError('dtype must be float32 or float64 not {}'.format(np.dtype(dtype)))
+        if resuming and checkpointer is None:
+            raise ValueError('Cannot resume without a checkpointer!')
+        if scatter_backend not in grad.SCATTER_BACKENDS:
+            raise ValueError('scatter_backend must be one of {} not {}'.format(
+                ', '.join(grad.SCATTER_BACKENDS), scatter_backend))
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError('chunk_size must be positive not {}'.format(chunk_size))
 
         try:
             # if a number is passed, use same regularization constant for all embedding parameters
@@ -264,12 +1087,22 @@ class EmbeddingMAPEstimator(object):
         self.initial_param_vals = initial_param_vals
         self.filtered_history = filtered_history
         self.split_history = split_history
+        self.cache = cache
+        self.num_threads = num_threads
         self.ftol = ftol
         self.max_iter = max_iter
 
         self.using_scipy = using_scipy
+        self.using_minibatches = using_minibatches
+        self.minibatch_kwargs = minibatch_kwargs
         self.verify_gradient = verify_gradient
         self.debug_mode_on = debug_mode_on
+        self.dtype = np.dtype(dtype)
+        self.checkpointer = checkpointer
+        self.resuming = resuming
+        self.scatter_backend = scatter_backend
+        self.chunk_size = chunk_size
+        self.telemetry = telemetry
 
     def fit_model(self, model):
         """
@@ -280,10 +1113,30 @@ class EmbeddingMAPEstimator(object):
             that needs to be fit to its interaction history
         """
 
+        if self.split_history is None and self.cache is not None:
+            split_history = self.cache.split_history(
+                    model.history,
+                    filtered_history=self.filtered_history,
+                    insert_dummy_lesson_ixns=True)
+        elif self.split_history is None:
+            split_history = model.history.split_interactions_by_type(
+                    filtered_history=self.filtered_history,
+                    insert_dummy_lesson_ixns=True)
+        else:
+            split_history = self.split_history
+        assessment_interactions = split_history.assessment_interactions
+        lesson_interactions = split_history.lesson_interactions
+
+        # student embeddings are packed into a (num_states, embedding_dimension) matrix,
+        # where each student only gets states up to the timestep of their last interaction
+        student_embeddings = models.StudentTrajectories(
+            split_history.trajectory_offsets,
+            model.embedding_dimension,
+            duration=model.history.duration())
+        student_idxes_of_states = student_embeddings.student_idxes_of_states()
+
         param_shapes = OrderedDict([
-            (models.STUDENT_EMBEDDINGS, (
-                model.student_embeddings.shape[0] * model.student_embeddings.shape[2],
-                model.student_embeddings.shape[1])),
+            (models.STUDENT_EMBEDDINGS, student_embeddings.states.shape),
             (models.ASSESSMENT_EMBEDDINGS, model.assessment_embeddings.shape)
             ])
 
@@ -311,72 +1164,74 @@ class EmbeddingMAPEstimator(object):
             models.CONCEPT_EMBEDDINGS : constraint_func(models.CONCEPT_EMBEDDINGS),
         }
 
+        if self.using_minibatches:
+            optimizer = 'minibatch-adam' if self.minibatch_kwargs.get(
+                'using_adam', True) else 'minibatch-sgd'
+        elif self.using_scipy:
+            optimizer = 'l-bfgs-b'
+        else:
+            optimizer = 'adagrad' if self.gradient_descent_kwargs.get(
+                'using_adagrad', True) else 'batch-gd'
+
+        resume_state = None
+        if self.checkpointer is not None:
+            self.checkpointer.start(optimizer, param_shapes, self.dtype)
+            if self.resuming:
+                resume_state = self.checkpointer.load()
+                if resume_state is None:
+                    _logger.warning('No checkpoint in %s, starting from scratch',
+                                    self.checkpointer.path)
+                else:
+                    _logger.info('Resuming from iteration %d', resume_state['iter_idx'])
+
+        if self.telemetry is not None:
+            self.telemetry.start(optimizer)
+        callback = _chain_callbacks([self.checkpointer, self.telemetry])
+
         params = OrderedDict()
         for key, value in param_shapes.items():
-            if key in self.initial_param_vals:
-                params[key] = param_constraint_funcs[key](self.initial_param_vals[key])
+            if resume_state is not None:
+                params[key] = resume_state['params'][key]
+            elif key in self.initial_param_vals:
+                initial_param_val = self.initial_param_vals[key]
+                if isinstance(initial_param_val, models.StudentTrajectories):
+                    # trajectories from a fit on a different split of the history
+                    # need to be repacked to the trajectory lengths of this fit
+                    initial_param_val = initial_param_val.repacked(
+                        student_embeddings.offsets).states
+                params[key] = param_constraint_funcs[key](initial_param_val)
             else:
                 params[key] = param_constraint_funcs[key](np.random.random(value))
+            params[key] = np.asarray(params[key], dtype=self.dtype)
 
-        if self.split_history is None:
-            split_history = model.history.split_interactions_by_type(
-                    filtered_history=self.filtered_history,
-                    insert_dummy_lesson_ixns=True)
-        else:
-            split_history = self.split_history
-        assessment_interactions = split_history.assessment_interactions
-        lesson_interactions = split_history.lesson_interactions
-        timestep_of_last_interaction = split_history.timestep_of_last_interaction
-
-        grads = grad.get_grad(
-            using_scipy=self.using_scipy,
-            using_lessons=model.using_lessons,
-            using_prereqs=model.using_prereqs)
-
-        #param_sizes = {k: v.size for k, v in params.iteritems()}
-        param_sizes = {k: np.prod(v.shape) for k, v in params.items()}
         param_vals = np.concatenate([v.ravel() for v in params.values()], axis=0)
 
-        (
-            student_idxes_for_assessment_ixns,
-            assessment_idxes_for_assessment_ixns, _) = assessment_interactions
-            
-        (
-            student_idxes_for_lesson_ixns,
-            lesson_idxes_for_lesson_ixns,
-            times_since_prev_ixn_for_lesson_ixns) = lesson_interactions
-        num_lesson_ixns = len(student_idxes_for_lesson_ixns)
-        lesson_ixns_participation_matrix_entries = np.ones(num_lesson_ixns)
-        
-        num_assessment_ixns = len(student_idxes_for_assessment_ixns)
-        assessment_ixns_participation_matrix_entries = np.ones(num_assessment_ixns)
-        assessment_ixn_idxes = np.arange(num_assessment_ixns)
-
-        # num_students * num_timesteps
-        num_students_by_timesteps = param_shapes[models.STUDENT_EMBEDDINGS][0]
-        
-        num_assessments = param_shapes[models.ASSESSMENT_EMBEDDINGS][0]
-        assessment_participation_in_assessment_ixns = sparse.coo_matrix(
-            (assessment_ixns_participation_matrix_entries,
-                (assessment_idxes_for_assessment_ixns, assessment_ixn_idxes)),
-            shape=(num_assessments, num_assessment_ixns)).tocsr()
-        student_participation_in_assessment_ixns = sparse.coo_matrix(
-            (assessment_ixns_participation_matrix_entries,
-                (student_idxes_for_assessment_ixns, assessment_ixn_idxes)),
-            shape=(num_students_by_timesteps, num_assessment_ixns)).tocsr()
-
-        num_timesteps = model.history.duration()
-        student_bias_participation_in_assessment_ixns = sparse.coo_matrix(
-            (assessment_ixns_participation_matrix_entries,
-                (student_idxes_for_assessment_ixns // num_timesteps,
-                    assessment_ixn_idxes)),
-            shape=(num_students_by_timesteps // num_timesteps, num_assessment_ixns)).tocsr()
+        _, _, times_since_prev_ixn_for_lesson_ixns = lesson_interactions
+
+        if self.using_minibatches or self.scatter_backend != 'csr':
+            # participation matrices are built for each mini-batch,
+            # and other scatter backends do not use them
+            participation_matrices = None
+        elif self.cache is not None:
+            participation_matrices = self.cache.participation_matrices(
+                split_history,
+                model.assessment_embeddings.shape[0],
+                model.lesson_embeddings.shape[0] if model.using_lessons else 0,
+                using_lessons=model.using_lessons,
+                using_prereqs=model.using_prereqs,
+                dtype=self.dtype)
+        else:
+            participation_matrices = compute_participation_matrices(
+                split_history,
+                model.assessment_embeddings.shape[0],
+                model.lesson_embeddings.shape[0] if model.using_lessons else 0,
+                using_lessons=model.using_lessons,
+                using_prereqs=model.using_prereqs,
+                dtype=self.dtype)
 
         if not model.using_graph_prior:
             assessment_participation_in_concepts = None
             lesson_participation_in_concepts = None
-            concept_participation_in_assessments = None
-            concept_participation_in_lessons = None
         else:
             (
                 assessment_idxes,
@@ -387,49 +1242,19 @@ class EmbeddingMAPEstimator(object):
             assessment_participation_in_concepts = sparse.coo_matrix(
                 (1 / num_concepts_per_assessment, (assessment_idxes, concept_idxes)),
                 shape=(num_assessments, num_concepts)).tocsr()
-            concept_participation_in_assessments = assessment_participation_in_concepts.T
-
-        # outside the "if model.using_lessons" statement
-        # because we may need these for dummy lesson interactions in grad.*_without_lessons
-        lesson_ixn_idxes = np.arange(num_lesson_ixns)
-        curr_student_participation_in_lesson_ixns = sparse.coo_matrix(
-            (lesson_ixns_participation_matrix_entries,
-                (student_idxes_for_lesson_ixns, lesson_ixn_idxes)),
-            shape=(num_students_by_timesteps, num_lesson_ixns)).tocsr()
-        prev_student_participation_in_lesson_ixns = sparse.coo_matrix(
-            (lesson_ixns_participation_matrix_entries,
-                (student_idxes_for_lesson_ixns - 1, lesson_ixn_idxes)),
-            shape=(num_students_by_timesteps, num_lesson_ixns)).tocsr()
 
-        if not model.using_prereqs:
-            # when computing gradients, we will be computing Ax - Bx
-            # where A = curr_student_participation_in_lesson_ixns
-            # and B = prev_student_participation_in_lesson_ixns,
-            # so to speed things up we precompute A-B and compute (A-B)x
-            curr_student_participation_in_lesson_ixns -= prev_student_participation_in_lesson_ixns
-
-        if model.using_lessons:
-            num_lessons = param_shapes[models.LESSON_EMBEDDINGS][0]
-            lesson_participation_in_lesson_ixns = sparse.coo_matrix(
-                (lesson_ixns_participation_matrix_entries,
-                    (lesson_idxes_for_lesson_ixns, lesson_ixn_idxes)),
-                shape=(num_lessons, num_lesson_ixns)).tocsr()
-
-            if model.using_graph_prior:
-                (
-                    lesson_idxes,
-                    concept_idxes,
-                    num_lessons,
-                    num_concepts,
-                    num_concepts_per_lesson) = model.concept_lesson_edges_in_graph()
-                lesson_participation_in_concepts = sparse.coo_matrix(
-                    (1 / num_concepts_per_lesson, (lesson_idxes, concept_idxes)),
-                    shape=(num_lessons, num_concepts))
-                concept_participation_in_lessons = lesson_participation_in_concepts.T
+        if model.using_lessons and model.using_graph_prior:
+            (
+                lesson_idxes,
+                concept_idxes,
+                num_lessons,
+                num_concepts,
+                num_concepts_per_lesson) = model.concept_lesson_edges_in_graph()
+            lesson_participation_in_concepts = sparse.coo_matrix(
+                (1 / num_concepts_per_lesson, (lesson_idxes, concept_idxes)),
+                shape=(num_lessons, num_concepts)).tocsr()
         else:
-            lesson_participation_in_lesson_ixns = None
             lesson_participation_in_concepts = None
-            concept_participation_in_lessons = None
 
         if model.using_graph_prior:
             prereq_idxes, postreq_idxes, num_concepts = model.graph.concept_prereq_edges()
@@ -449,25 +1274,6 @@ class EmbeddingMAPEstimator(object):
         else:
             prereq_edge_concept_idxes = concept_participation_in_prereq_edges = None
 
-        last_student_embedding_idx = param_sizes[models.STUDENT_EMBEDDINGS]
-        last_assessment_embedding_idx = last_student_embedding_idx + (
-            param_sizes[models.ASSESSMENT_EMBEDDINGS])
-        last_lesson_embedding_idx = last_assessment_embedding_idx + (
-            param_sizes[models.LESSON_EMBEDDINGS]) if model.using_lessons else None
-        last_prereq_embedding_idx = last_lesson_embedding_idx + (
-            param_sizes[models.PREREQ_EMBEDDINGS]) if model.using_prereqs else None
-        if model.using_lessons:
-            if model.using_prereqs:
-                last_student_bias_idx = last_prereq_embedding_idx
-            else:
-                last_student_bias_idx = last_lesson_embedding_idx
-            last_student_bias_idx += param_sizes[models.STUDENT_BIASES]
-        else:
-            last_student_bias_idx = last_assessment_embedding_idx + \
-                    param_sizes[models.STUDENT_BIASES]
-
-        last_assessment_bias_idx = last_student_bias_idx + param_sizes[models.ASSESSMENT_BIASES]
-
         # dict[str,tuple(float|None,float|None)]
         # parameter name -> (lower bound, upper bound)
         box_constraints_of_parameters = {
@@ -492,133 +1298,124 @@ class EmbeddingMAPEstimator(object):
         box_constraints = np.concatenate(
             [[box_constraints_of_parameters[k]] * v.size for (k, v) in params.items()])
 
-        gradient_holder = np.zeros(param_vals.shape)
+        cost_function_kwargs = {
+            'learning_update_variance' : model.learning_update_variance(
+                times_since_prev_ixn_for_lesson_ixns),
+            'forgetting_penalty_terms' : model.forgetting_penalty_terms(
+                times_since_prev_ixn_for_lesson_ixns),
+            'regularization_constant' : self.regularization_constant,
+            'graph_regularization_constant' : model.graph_regularization_constant,
+            'assessment_participation_in_concepts' : assessment_participation_in_concepts,
+            'lesson_participation_in_concepts' : lesson_participation_in_concepts,
+            'prereq_edge_concept_idxes' : prereq_edge_concept_idxes,
+            'concept_participation_in_prereq_edges' : concept_participation_in_prereq_edges,
+            'using_lessons' : model.using_lessons,
+            'using_prereqs' : model.using_prereqs,
+            'using_bias' : model.using_bias,
+            'using_graph_prior' : model.using_graph_prior,
+            'using_l1_regularizer' : model.using_l1_regularizer,
+            'dtype' : self.dtype,
+            'telemetry' : self.telemetry,
+            'scatter_backend' : self.scatter_backend,
+            'chunk_size' : self.chunk_size
+        }
 
-        # TODO: pass these as kwargs
-        # right now, we have to be very careful about the order of these arguments
-        # and how they are received by functions in the grad module
-        grad_args = [
-            assessment_interactions,
-            lesson_interactions,
-            model.learning_update_variance(times_since_prev_ixn_for_lesson_ixns),
-            model.forgetting_penalty_terms(times_since_prev_ixn_for_lesson_ixns),
-            self.regularization_constant,
-            model.graph_regularization_constant,
-            student_participation_in_assessment_ixns,
-            student_bias_participation_in_assessment_ixns,
-            assessment_participation_in_assessment_ixns,
-            curr_student_participation_in_lesson_ixns,
-            prev_student_participation_in_lesson_ixns,
-            lesson_participation_in_lesson_ixns,
-            assessment_participation_in_concepts,
-            lesson_participation_in_concepts,
-            concept_participation_in_assessments,
-            concept_participation_in_lessons,
-            prereq_edge_concept_idxes,
-            concept_participation_in_prereq_edges,
-            last_student_embedding_idx,
-            last_assessment_embedding_idx,
-            last_lesson_embedding_idx,
-            last_prereq_embedding_idx,
-            last_student_bias_idx,
-            last_assessment_bias_idx,
-            model.history.duration(),
-            model.using_bias,
-            model.using_graph_prior,
-            model.using_l1_regularizer,
-            gradient_holder]
-
-        if not self.using_scipy:
-            # do not pass the gradient holder
-            grad_args = grad_args[:-1]
-
-            params = gradient_descent(
-                grads(*grad_args),
+        if self.using_minibatches:
+            batch_grads = StudentMinibatchCostFunction(
+                split_history,
+                param_shapes,
+                model.assessment_embeddings.shape[0],
+                model.lesson_embeddings.shape[0] if model.using_lessons else 0,
+                num_threads=self.num_threads,
+                **cost_function_kwargs)
+            params = minibatch_gradient_descent(
+                batch_grads,
                 params,
-                param_constraint_funcs=param_constraint_funcs,
-                **self.gradient_descent_kwargs)
-
-            # we originally passed in student embeddings
-            # with shape (num_students * num_timesteps, embedding_dimension),
-            # so let's switch back to (num_students, embedding_dimension, num_timesteps)
-            params[models.STUDENT_EMBEDDINGS] = np.reshape(
-                params[models.STUDENT_EMBEDDINGS],
-                (model.student_embeddings.shape[0],
-                    model.student_embeddings.shape[2],
-                    model.student_embeddings.shape[1])).swapaxes(1, 2)
+                param_constraint_funcs,
+                batch_grads.num_students,
+                callback=callback,
+                resume_state=resume_state,
+                **self.minibatch_kwargs)
         else:
-            if self.verify_gradient:
-                self.fd_err = optimize.check_grad(
-                    (lambda x, args: grads(x, *args)[0]),
-                    (lambda x, args: grads(x, *args)[1]),
-                    param_vals,
-                    tuple([param_shapes] + grad_args)) / math.sqrt(param_vals.size)
-
-                _logger.debug(
-                    'RMSE of (forward) finite difference vs. analytic gradient = %f', self.fd_err)
-
-            map_estimates = optimize.minimize(
-                grads,
-                param_vals,
-                args=tuple([param_shapes] + grad_args),
-                method='L-BFGS-B',
-                jac=True,
-                bounds=box_constraints,
-                options={
-                    'disp': self.debug_mode_on,
-                    'ftol' : self.ftol,
-                    'maxiter' : self.max_iter
-                    })
-
-            # reshape parameter estimates from flattened array into tensors and matrices
-
-            # we originally passed in student embeddings
-            # with shape (num_students * num_timesteps, embedding_dimension),
-            # so let's switch back to (num_students, embedding_dimension, num_timesteps)
-            params[models.STUDENT_EMBEDDINGS] = np.reshape(
-                map_estimates.x[:last_student_embedding_idx],
-                (model.student_embeddings.shape[0],
-                    model.student_embeddings.shape[2],
-                    model.student_embeddings.shape[1])).swapaxes(1, 2)
-
-            params[models.ASSESSMENT_EMBEDDINGS] = np.reshape(
-                map_estimates.x[last_student_embedding_idx:last_assessment_embedding_idx],
-                param_shapes[models.ASSESSMENT_EMBEDDINGS])
-
-            begin_idx = last_assessment_embedding_idx
-            if model.using_lessons:
-                begin_idx = last_lesson_embedding_idx
-                params[models.LESSON_EMBEDDINGS] = np.reshape(
-                    map_estimates.x[last_assessment_embedding_idx:last_lesson_embedding_idx],
-                    param_shapes[models.LESSON_EMBEDDINGS])
-
-            if model.using_prereqs:
-                begin_idx = last_prereq_embedding_idx
-                params[models.PREREQ_EMBEDDINGS] = np.reshape(
-                    map_estimates.x[last_lesson_embedding_idx:last_prereq_embedding_idx],
-                    param_shapes[models.PREREQ_EMBEDDINGS])
-
-            if model.using_bias:
-                params[models.STUDENT_BIASES] = np.reshape(
-                    map_estimates.x[begin_idx:last_student_bias_idx],
-                    param_shapes[models.STUDENT_BIASES])
-                params[models.ASSESSMENT_BIASES] = np.reshape(
-                    map_estimates.x[last_student_bias_idx:last_assessment_bias_idx],
-                    param_shapes[models.ASSESSMENT_BIASES])
-
-            if model.using_graph_prior:
-                params[models.CONCEPT_EMBEDDINGS] = np.reshape(
-                    map_estimates.x[last_assessment_bias_idx:],
-                    param_shapes[models.CONCEPT_EMBEDDINGS])
-
-        # manually pin student state after last interaction 
-        # lack of interactions => no drift likelihoods in objective function to pin students
-        for student_id, t in timestep_of_last_interaction.items():
-            student_idx = model.history.idx_of_student_id(student_id)
-            params[models.STUDENT_EMBEDDINGS][student_idx, :, t:] = \
-                    params[models.STUDENT_EMBEDDINGS][student_idx, :, t][:, None]
-
-        model.student_embeddings = params[models.STUDENT_EMBEDDINGS]
+            cost_function = grad.CostFunction(
+                param_shapes,
+                assessment_interactions,
+                lesson_interactions,
+                participation_matrices,
+                student_idxes_of_states,
+                num_threads=self.num_threads,
+                **cost_function_kwargs)
+
+            try:
+                if not self.using_scipy:
+                    params = gradient_descent(
+                        cost_function.grads,
+                        params,
+                        param_constraint_funcs=param_constraint_funcs,
+                        callback=callback,
+                        resume_state=resume_state,
+                        **self.gradient_descent_kwargs)
+                else:
+                    if self.verify_gradient:
+                        # the cost function reuses its gradient buffer across evaluations,
+                        # so the analytic gradient needs to be copied before finite differencing
+                        self.fd_err = optimize.check_grad(
+                            (lambda x: cost_function.float64(x)[0]),
+                            (lambda x: cost_function.float64(x)[1].copy()),
+                            param_vals) / math.sqrt(param_vals.size)
+
+                        _logger.debug(
+                            'RMSE of (forward) finite difference vs. analytic gradient = %f',
+                            self.fd_err)
+
+                    iter_idx = resume_state['iter_idx'] if resume_state is not None else 0
+                    costs = list(resume_state['costs']) if resume_state is not None else []
+
+                    # L-BFGS-B works in float64, so convert at the boundary
+                    def lbfgsb_cost_function(x):
+                        cost, gradient = cost_function.float64(x)
+                        lbfgsb_cost_function.cost = cost
+                        return cost, gradient
+
+                    def lbfgsb_callback(x):
+                        lbfgsb_callback.iter_idx += 1
+                        costs.append(lbfgsb_cost_function.cost)
+                        if callback is not None:
+                            callback(
+                                lbfgsb_callback.iter_idx,
+                                OrderedDict((k, np.reshape(
+                                    x[cost_function.param_slices[k]], v)) \
+                                            for k, v in param_shapes.items()),
+                                costs,
+                                {})
+                    lbfgsb_callback.iter_idx = iter_idx
+
+                    map_estimates = optimize.minimize(
+                        lbfgsb_cost_function,
+                        param_vals.astype(np.float64),
+                        method='L-BFGS-B',
+                        jac=True,
+                        bounds=box_constraints,
+                        callback=lbfgsb_callback,
+                        options={
+                            'disp': self.debug_mode_on,
+                            'ftol' : self.ftol,
+                            'maxiter' : max(1, self.max_iter - iter_idx)
+                            })
+
+                    # reshape parameter estimates from flattened array into matrices
+                    for key in param_shapes:
+                        params[key] = np.reshape(
+                            map_estimates.x[cost_function.param_slices[key]],
+                            param_shapes[key]).astype(self.dtype, copy=False)
+            finally:
+                # shut down the thread pool that evaluates shards of interactions
+                cost_function.close()
+
+        # student states after the last interaction are pinned to the state at the last
+        # interaction, since StudentTrajectories clamps timesteps to the end of each trajectory
+        student_embeddings.states = params[models.STUDENT_EMBEDDINGS]
+        model.student_embeddings = student_embeddings
         model.assessment_embeddings = params[models.ASSESSMENT_EMBEDDINGS]
         if model.using_lessons:
             model.lesson_embeddings = params[models.LESSON_EMBEDDINGS]
@@ -631,6 +1428,897 @@ class EmbeddingMAPEstimator(object):
             model.concept_embeddings = params[models.CONCEPT_EMBEDDINGS]
 
 
+# ways of running the workers that solve blocks of students in BlockCoordinateEstimator
+WORKER_TYPES = ['thread', 'process']
+
+
+def _minimize_free_params(cost_function, params, free_param_names, bounds, max_iter, ftol):
+    """
+    Minimize a cost function over some of its parameters with L-BFGS-B,
+    holding the rest fixed
+
+    :param grad.CostFunction cost_function: A cost function
+    :param collections.OrderedDict params: Values of all parameters of the cost function
+    :param list[str] free_param_names: Parameters to minimize over
+    :param dict[str,(float|None,float|None)] bounds: Box constraints on parameters
+    :param int max_iter: Maximum number of iterations
+    :param float ftol: Stopping condition of L-BFGS-B
+    :rtype: dict[str,np.ndarray]
+    :return: Minimizing values of the free parameters
+    """
+
+    param_vals = np.concatenate([
+        np.ravel(params[k]) for k in cost_function.param_shapes]).astype(float)
+    is_free = np.zeros(len(param_vals), dtype=bool)
+    box_constraints = []
+    for k in cost_function.param_shapes:
+        if k in free_param_names:
+            param_slice = cost_function.param_slices[k]
+            is_free[param_slice] = True
+            box_constraints.extend([bounds[k]] * (param_slice.stop - param_slice.start))
+
+    def free_cost_function(x):
+        param_vals[is_free] = x
+        cost, gradient = cost_function.float64(param_vals)
+        return cost, gradient[is_free]
+
+    map_estimates = optimize.minimize(
+        free_cost_function,
+        param_vals[is_free],
+        method='L-BFGS-B',
+        jac=True,
+        bounds=box_constraints,
+        options={
+            'ftol' : ftol,
+            'maxiter' : max_iter
+            })
+
+    param_vals[is_free] = map_estimates.x
+    return {k: np.reshape(param_vals[cost_function.param_slices[k]],
+                          cost_function.param_shapes[k]) for k in free_param_names}
+
+
+class _StudentBlocks(object):
+    """
+    The blocks of students that one worker of :py:class:`est.BlockCoordinateEstimator` solves
+
+    The cost function of each block is built the first time the worker needs it, and reused
+    in later sweeps, since only parameter values change between sweeps. The worker keeps
+    the current student parameters of its blocks, so only module parameters are passed to it,
+    and only its share of the cost and of the module gradient is passed back.
+    """
+
+    def __init__(
+        self,
+        blocks,
+        block_grads,
+        params,
+        student_param_names,
+        module_param_names,
+        bounds,
+        max_iter,
+        ftol,
+        using_telemetry=False):
+        """
+        Initialize student blocks object
+
+        :param list[np.ndarray] blocks: Students in each of the worker's blocks
+        :param StudentMinibatchCostFunction block_grads: Builds the cost function of a block
+        :param collections.OrderedDict params: Initial values of all parameters
+            (only read when the cost functions of blocks are built)
+        :param list[str] student_param_names: Parameters that are free when solving blocks
+        :param list[str] module_param_names: Parameters that are free in the module step
+        :param dict[str,(float|None,float|None)] bounds: Box constraints on parameters
+        :param int max_iter: Maximum number of L-BFGS-B iterations for each block
+        :param float ftol: Stopping condition of L-BFGS-B
+        :param bool using_telemetry: True => collect statistics of evaluations of the cost
+            functions of blocks (see :py:func:`est._StudentBlocks.take_evaluations`)
+        """
+
+        self.blocks = blocks
+        self.student_param_names = student_param_names
+        self.module_param_names = module_param_names
+        self.bounds = bounds
+        self.max_iter = max_iter
+        self.ftol = ftol
+
+        self.telemetry = telemetry.TrainingTelemetry([]) if using_telemetry else None
+        # cost functions of blocks report to the worker's own telemetry object
+        self.block_grads = copy.copy(block_grads)
+        self.block_grads.cost_function_kwargs = dict(
+            block_grads.cost_function_kwargs, telemetry=self.telemetry)
+
+        self._params = params
+
+        # list[(grad.CostFunction, collections.OrderedDict, dict[str,np.ndarray|slice])]
+        # (cost function, parameter values, rows of the full parameters) for each block
+        self._block_cost_functions = None
+
+    def _cost_functions(self):
+        """
+        :rtype: list[(grad.CostFunction, collections.OrderedDict, dict[str,np.ndarray|slice])]
+        :return: (cost function, parameter values, rows of the full parameters) for each block
+        """
+
+        if self._block_cost_functions is None:
+            self._block_cost_functions = [self.block_grads.batch_cost_function(
+                self._params, student_idxes) for student_idxes in self.blocks]
+            self._params = None
+        return self._block_cost_functions
+
+    def solve(self, module_params):
+        """
+        Minimize the cost function of each block over its student parameters,
+        holding module parameters fixed
+
+        :param dict[str,np.ndarray] module_params: Values of module parameters
+        :rtype: (int, dict[str,float])|None
+        :return: See :py:func:`est._StudentBlocks.take_evaluations`
+        """
+
+        for cost_function, block_params, _ in self._cost_functions():
+            block_params.update(module_params)
+            block_params.update(_minimize_free_params(
+                cost_function, block_params, self.student_param_names, self.bounds,
+                self.max_iter, self.ftol))
+        return self.take_evaluations()
+
+    def evaluate(self, module_params):
+        """
+        Evaluate the worker's share of the cost function
+
+        The costs of the blocks of all workers sum to the full cost function
+        (see :py:class:`est.StudentMinibatchCostFunction`)
+
+        :param dict[str,np.ndarray] module_params: Values of module parameters
+        :rtype: (float, np.ndarray, dict[str,float], (int, dict[str,float])|None)
+        :return: (cost, gradient w.r.t. free module parameters as a flattened vector,
+            squared L2 norm of the gradient w.r.t. each student parameter,
+            the output of :py:func:`est._StudentBlocks.take_evaluations`)
+        """
+
+        cost = 0
+        module_gradient = 0
+        student_gradient_sq_norms = dict.fromkeys(self.student_param_names, 0.)
+        for cost_function, block_params, _ in self._cost_functions():
+            block_params.update(module_params)
+            block_cost, gradient = cost_function.float64(np.concatenate(
+                [np.ravel(v) for v in block_params.values()]))
+            cost += block_cost
+            module_gradient = module_gradient + np.concatenate([
+                gradient[cost_function.param_slices[k]] for k in self.module_param_names])
+            for k in self.student_param_names:
+                student_gradient = gradient[cost_function.param_slices[k]]
+                student_gradient_sq_norms[k] += np.dot(student_gradient, student_gradient)
+        return cost, module_gradient, student_gradient_sq_norms, self.take_evaluations()
+
+    def student_params(self):
+        """
+        :rtype: list[(dict[str,np.ndarray|slice], dict[str,np.ndarray])]
+        :return: (rows of the full parameters, values of student parameters) for each block
+        """
+
+        return [(rows, {k: block_params[k] for k in self.student_param_names}) \
+                for _, block_params, rows in self._cost_functions()]
+
+    def take_evaluations(self):
+        """
+        :rtype: (int, dict[str,float])|None
+        :return: (Number of evaluations, phase -> seconds spent in that phase) of the cost
+            functions of blocks since the last call, or None if there is no telemetry
+        """
+
+        if self.telemetry is None:
+            return None
+        num_evaluations, _, phase_times = self.telemetry.take_evaluations()
+        return num_evaluations, phase_times
+
+    def close(self):
+        """
+        Shut down the cost functions of blocks
+        """
+
+        for cost_function, _, _ in self._block_cost_functions or []:
+            cost_function.close()
+
+
+# the student blocks of a block-coordinate worker process
+# (see _init_block_worker and _call_block_worker)
+_block_worker_state = {}
+
+
+def _init_block_worker(*args):
+    """
+    Set up the student blocks of a block-coordinate worker process
+
+    :param list args: Arguments of :py:class:`est._StudentBlocks`
+    """
+
+    _block_worker_state['blocks'] = _StudentBlocks(*args)
+
+
+def _call_block_worker(method_name, *args):
+    """
+    Call a method of the student blocks of a block-coordinate worker process
+
+    :param str method_name: Name of a method of :py:class:`est._StudentBlocks`
+    :rtype: object
+    :return: Output of the method
+    """
+
+    return getattr(_block_worker_state['blocks'], method_name)(*args)
+
+
+class _StudentBlockWorkers(object):
+    """
+    Workers that each own a fixed share of the blocks of students
+    of :py:class:`est.BlockCoordinateEstimator`, running on threads or in processes
+
+    A worker process is a pool of one process, so that it always gets the calls
+    for the same blocks, and the cost functions it builds are reused across sweeps
+    """
+
+    def __init__(self, worker_type, blocks_of_workers, *args):
+        """
+        Initialize workers object
+
+        :param str worker_type: One of WORKER_TYPES
+        :param list[list[np.ndarray]] blocks_of_workers: Students in each block of each worker
+        :param list args: Other arguments of :py:class:`est._StudentBlocks`
+        """
+
+        self.worker_type = worker_type
+        if worker_type == 'thread':
+            self._workers = [_StudentBlocks(blocks, *args) for blocks in blocks_of_workers]
+            self._pool = ThreadPool(len(self._workers)) if len(self._workers) > 1 else None
+        else:
+            self._workers = [multiprocessing.Pool(
+                1,
+                initializer=_init_block_worker,
+                initargs=(blocks, ) + args) for blocks in blocks_of_workers]
+
+    def call(self, method_name, *args):
+        """
+        Call a method of :py:class:`est._StudentBlocks` on every worker
+
+        :param str method_name: Name of the method
+        :rtype: list[object]
+        :return: The output of the method for each worker
+        """
+
+        if self.worker_type == 'process':
+            results = [pool.apply_async(_call_block_worker, (method_name, ) + args) \
+                    for pool in self._workers]
+            return [result.get() for result in results]
+
+        call = lambda worker: getattr(worker, method_name)(*args)
+        if self._pool is None:
+            return [call(worker) for worker in self._workers]
+        return self._pool.map(call, self._workers)
+
+    def close(self):
+        """
+        Shut down the workers
+        """
+
+        if self.worker_type == 'process':
+            for pool in self._workers:
+                pool.close()
+                pool.join()
+            return
+
+        for worker in self._workers:
+            worker.close()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+
+class BlockCoordinateEstimator(object):
+    """
+    Estimates the parameters of a skill embedding model by alternating between
+    student parameters and module parameters
+
+    With assessment, lesson and prereq embeddings and assessment biases held fixed,
+    the cost function separates into independent problems, one for each student's trajectory
+    and bias term. Students are split into blocks of block_size students, and blocks are
+    split evenly across num_workers workers (threads or processes, see worker_type).
+    The students in a block share nothing, so solving a block is the same as solving each of
+    its students on their own, with less overhead per student.
+
+    Each sweep first solves every block with L-BFGS-B over its student parameters, on all
+    workers at once. Then it takes L-BFGS-B iterations over the module parameters, with student
+    parameters held fixed, where each evaluation of the cost function and its gradient is
+    split into the workers' shares of blocks. Each worker builds the cost functions of its
+    blocks once (participation matrices and scratch buffers), and reuses them in every sweep.
+    The parent holds the interaction history and parameter values, but no cost function,
+    and only sends module parameters to workers.
+
+    With worker_type='thread', workers share the process, so the Python parts of L-BFGS-B and
+    of evaluations of the cost functions of small blocks contend for the GIL. With
+    worker_type='process', each worker is a process that gets a copy of the interaction
+    history (shared copy-on-write where processes are forked), and only holds the cost
+    functions of its own blocks.
+
+    Alternating between students and modules takes more sweeps to converge than
+    L-BFGS-B iterations over all parameters at once.
+
+    Graph priors are not supported.
+    """
+
+    def __init__(
+        self,
+        regularization_constant=1e-6,
+        num_sweeps=10,
+        ftol=1e-3,
+        student_max_iter=100,
+        module_max_iter=20,
+        block_size=1000,
+        num_workers=1,
+        worker_type='thread',
+        initial_param_vals={},
+        filtered_history=None,
+        split_history=None,
+        cache=None,
+        callback=None,
+        debug_mode_on=False,
+        dtype=np.float64,
+        telemetry=None,
+        scatter_backend='csr',
+        chunk_size=None):
+        """
+        Initialize estimator object
+
+        :param float|list[float] regularization_constant: Coefficient of the norm regularization
+            terms, either a number or a list of coefficients for (students, assessments,
+            lessons, prereqs, concepts) (see :py:class:`est.EmbeddingMAPEstimator`)
+        :param int num_sweeps: Maximum number of alternations between students and modules
+        :param float ftol: Stopping condition
+            When relative difference between the costs of consecutive sweeps drops below ftol,
+            then the iterative optimization has "converged". Also passed to L-BFGS-B.
+        :param int student_max_iter: Maximum number of L-BFGS-B iterations for each block
+            of students in each sweep
+        :param int module_max_iter: Maximum number of L-BFGS-B iterations for module
+            parameters in each sweep
+        :param int block_size: Number of students in each block
+        :param int num_workers: Number of workers that solve blocks of students concurrently
+        :param str worker_type: Whether workers are threads or processes
+            (one of WORKER_TYPES)
+        :param dict[str,np.ndarray] initial_param_vals: For warm starts
+        :param pd.DataFrame|None filtered_history: A filtered history to be used instead of
+            the history attached to the model passed to fit_model
+        :param datatools.SplitHistory|None split_history: An interaction history split into
+            assessment interactions, lesson interactions, and timestep of last interaction
+            for each student
+        :param PreprocessingCache|None cache: Cache of split histories
+            (participation matrices are built for each block)
+        :param function|None callback: Called after each sweep with (number of completed sweeps,
+            params, cost history, {}), like the callbacks of :py:func:`est.gradient_descent`
+        :param bool debug_mode_on: True => log the cost of each sweep
+        :param type dtype: See :py:class:`est.EmbeddingMAPEstimator`
+        :param telemetry.TrainingTelemetry|None telemetry: Receives a record for each sweep,
+            with statistics of the evaluations of the cost functions of blocks in that sweep
+            (None => no telemetry)
+        :param str scatter_backend: See :py:class:`est.EmbeddingMAPEstimator`
+        :param int|None chunk_size: See :py:class:`est.EmbeddingMAPEstimator`
+        """
+
+        if num_sweeps <= 0:
+            raise ValueError('Maximum number of sweeps must be strictly positive')
+        if ftol <= 0:
+            raise ValueError('ftol must be positive not {}'.format(ftol))
+        if block_size <= 0:
+            raise ValueError('block_size must be positive not {}'.format(block_size))
+        if num_workers < 1:
+            raise ValueError('num_workers must be positive not {}'.format(num_workers))
+        if worker_type not in WORKER_TYPES:
+            raise ValueError('worker_type must be one of {} not {}'.format(
+                ', '.join(WORKER_TYPES), worker_type))
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError('dtype must be float32 or float64 not {}'.format(dtype))
+        if scatter_backend not in grad.SCATTER_BACKENDS:
+            raise ValueError('scatter_backend must be one of {} not {}'.format(
+                ', '.join(grad.SCATTER_BACKENDS), scatter_backend))
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError('chunk_size must be positive not {}'.format(chunk_size))
+
+        try:
+            regularization_constant = [float(regularization_constant)] * 5
+        except TypeError:
+            if len(regularization_constant) != 5:
+                raise ValueError(
+                        'regularization_constant must be either a number or a list of length 5')
+        if min(regularization_constant) < 0:
+            raise ValueError('regularization_constant must be nonnegative not {}'.format(
+                regularization_constant))
+
+        self.regularization_constant = regularization_constant
+        self.num_sweeps = num_sweeps
+        self.ftol = ftol
+        self.student_max_iter = student_max_iter
+        self.module_max_iter = module_max_iter
+        self.block_size = block_size
+        self.num_workers = num_workers
+        self.worker_type = worker_type
+        self.initial_param_vals = initial_param_vals
+        self.filtered_history = filtered_history
+        self.split_history = split_history
+        self.cache = cache
+        self.callback = callback
+        self.debug_mode_on = debug_mode_on
+        self.dtype = np.dtype(dtype)
+        self.telemetry = telemetry
+        self.scatter_backend = scatter_backend
+        self.chunk_size = chunk_size
+
+    def fit_model(self, model):
+        """
+        Use block-coordinate descent to compute MAP estimates of model parameters
+
+        :param models.EmbeddingModel model: A skill embedding model
+            that needs to be fit to its interaction history
+        """
+
+        if model.using_graph_prior:
+            raise ValueError('Block-coordinate estimation does not support graph priors!')
+
+        if self.split_history is None and self.cache is not None:
+            split_history = self.cache.split_history(
+                    model.history,
+                    filtered_history=self.filtered_history,
+                    insert_dummy_lesson_ixns=True)
+        elif self.split_history is None:
+            split_history = model.history.split_interactions_by_type(
+                    filtered_history=self.filtered_history,
+                    insert_dummy_lesson_ixns=True)
+        else:
+            split_history = self.split_history
+
+        student_embeddings = models.StudentTrajectories(
+            split_history.trajectory_offsets,
+            model.embedding_dimension,
+            duration=model.history.duration())
+
+        param_shapes = OrderedDict([
+            (models.STUDENT_EMBEDDINGS, student_embeddings.states.shape),
+            (models.ASSESSMENT_EMBEDDINGS, model.assessment_embeddings.shape)])
+        if model.using_lessons:
+            param_shapes[models.LESSON_EMBEDDINGS] = model.lesson_embeddings.shape
+        if model.using_prereqs:
+            param_shapes[models.PREREQ_EMBEDDINGS] = model.prereq_embeddings.shape
+        param_shapes[models.STUDENT_BIASES] = model.student_biases.shape
+        param_shapes[models.ASSESSMENT_BIASES] = model.assessment_biases.shape
+
+        # dict[str,(float|None,float|None)]
+        # parameter name -> (lower bound, upper bound)
+        bounds = {k: (model.anti_singularity_lower_bounds[k], None) for k in [
+            models.STUDENT_EMBEDDINGS, models.ASSESSMENT_EMBEDDINGS,
+            models.LESSON_EMBEDDINGS, models.PREREQ_EMBEDDINGS]}
+        bounds[models.STUDENT_BIASES] = bounds[models.ASSESSMENT_BIASES] = (None, None)
+
+        params = OrderedDict()
+        for key, shape in param_shapes.items():
+            if key in self.initial_param_vals:
+                initial_param_val = self.initial_param_vals[key]
+                if isinstance(initial_param_val, models.StudentTrajectories):
+                    initial_param_val = initial_param_val.repacked(
+                        student_embeddings.offsets).states
+                params[key] = np.array(initial_param_val, dtype=self.dtype)
+            elif key in [models.STUDENT_BIASES, models.ASSESSMENT_BIASES]:
+                params[key] = np.zeros(shape, dtype=self.dtype)
+            else:
+                params[key] = np.random.random(shape)
+            if bounds[key][0] is not None:
+                params[key] = np.maximum(bounds[key][0], params[key])
+            params[key] = np.asarray(params[key], dtype=self.dtype)
+
+        _, _, times_since_prev_ixn_for_lesson_ixns = split_history.lesson_interactions
+        cost_function_kwargs = {
+            'learning_update_variance' : model.learning_update_variance(
+                times_since_prev_ixn_for_lesson_ixns),
+            'forgetting_penalty_terms' : model.forgetting_penalty_terms(
+                times_since_prev_ixn_for_lesson_ixns),
+            'regularization_constant' : self.regularization_constant,
+            'using_lessons' : model.using_lessons,
+            'using_prereqs' : model.using_prereqs,
+            'using_bias' : model.using_bias,
+            'using_l1_regularizer' : model.using_l1_regularizer,
+            'dtype' : self.dtype,
+            'scatter_backend' : self.scatter_backend,
+            'chunk_size' : self.chunk_size
+        }
+
+        # student parameters are free in the student step, and module parameters are free
+        # in the module step (bias terms are only free if the model uses them)
+        module_param_names = [k for k in param_shapes if k not in [
+            models.STUDENT_EMBEDDINGS, models.STUDENT_BIASES]]
+        free_student_param_names = [models.STUDENT_EMBEDDINGS]
+        free_module_param_names = [
+            k for k in module_param_names if k != models.ASSESSMENT_BIASES]
+        if model.using_bias:
+            free_student_param_names.append(models.STUDENT_BIASES)
+            free_module_param_names.append(models.ASSESSMENT_BIASES)
+
+        block_grads = StudentMinibatchCostFunction(
+            split_history,
+            param_shapes,
+            model.assessment_embeddings.shape[0],
+            model.lesson_embeddings.shape[0] if model.using_lessons else 0,
+            **cost_function_kwargs)
+        num_students = block_grads.num_students
+        blocks = np.array_split(
+            np.arange(num_students), max(1, -(-num_students // self.block_size)))
+        num_workers = min(self.num_workers, len(blocks))
+
+        if self.telemetry is not None:
+            self.telemetry.start('block-coordinate')
+        callback = _chain_callbacks([self.callback, self.telemetry])
+
+        def record_evaluations(evaluations, gradient_norms=None):
+            if self.telemetry is None:
+                return
+            for num_evaluations, phase_times in evaluations:
+                self.telemetry.record_evaluations(num_evaluations, phase_times)
+            if gradient_norms is not None:
+                self.telemetry.record_evaluations(0, {}, gradient_norms=gradient_norms)
+
+        module_param_slices = {}
+        begin_idx = 0
+        for k in free_module_param_names:
+            module_param_slices[k] = slice(begin_idx, begin_idx + params[k].size)
+            begin_idx += params[k].size
+        module_bounds = [b for k in free_module_param_names for b in [bounds[k]] * params[k].size]
+
+        def evaluate(module_params):
+            results = workers.call('evaluate', module_params)
+            cost = sum(result[0] for result in results)
+            module_gradient = sum(result[1] for result in results)
+            gradient_norms = {k: np.sqrt(sum(result[2][k] for result in results)) \
+                    for k in free_student_param_names}
+            gradient_norms.update({k: np.linalg.norm(module_gradient[module_param_slices[k]]) \
+                    for k in free_module_param_names})
+            record_evaluations([result[3] for result in results], gradient_norms)
+            return cost, module_gradient
+
+        def module_cost_function(x):
+            module_params = {k: params[k] for k in module_param_names}
+            module_params.update({k: x[module_param_slices[k]].reshape(params[k].shape) \
+                    for k in free_module_param_names})
+            return evaluate(module_params)
+
+        workers = _StudentBlockWorkers(
+            self.worker_type,
+            [blocks[i::num_workers] for i in range(num_workers)],
+            block_grads,
+            params,
+            free_student_param_names,
+            free_module_param_names,
+            bounds,
+            self.student_max_iter,
+            self.ftol,
+            self.telemetry is not None)
+
+        costs = []
+        start_time = time.time()
+        try:
+            for sweep_idx in range(self.num_sweeps):
+                record_evaluations(workers.call(
+                    'solve', {k: params[k] for k in module_param_names}))
+
+                map_estimates = optimize.minimize(
+                    module_cost_function,
+                    np.concatenate([params[k].ravel() for k in free_module_param_names]),
+                    method='L-BFGS-B',
+                    jac=True,
+                    bounds=module_bounds,
+                    options={
+                        'ftol' : self.ftol,
+                        'maxiter' : self.module_max_iter
+                        })
+                for k in free_module_param_names:
+                    params[k] = map_estimates.x[module_param_slices[k]].reshape(
+                        params[k].shape).astype(self.dtype, copy=False)
+
+                costs.append(evaluate({k: params[k] for k in module_param_names})[0])
+                if self.debug_mode_on:
+                    _logger.info('Sweep %d, cost=%f, %f seconds per sweep', sweep_idx, costs[-1],
+                                 (time.time() - start_time) / (sweep_idx + 1))
+
+                if self.callback is not None:
+                    self._gather_student_params(workers, params)
+                if callback is not None:
+                    callback(sweep_idx + 1, params, costs, {})
+
+                if len(costs) > 1 and abs((costs[-1] - costs[-2]) / costs[-2]) <= self.ftol:
+                    break
+
+            self._gather_student_params(workers, params)
+        finally:
+            workers.close()
+
+        student_embeddings.states = params[models.STUDENT_EMBEDDINGS]
+        model.student_embeddings = student_embeddings
+        model.assessment_embeddings = params[models.ASSESSMENT_EMBEDDINGS]
+        if model.using_lessons:
+            model.lesson_embeddings = params[models.LESSON_EMBEDDINGS]
+        if model.using_prereqs:
+            model.prereq_embeddings = params[models.PREREQ_EMBEDDINGS]
+        if model.using_bias:
+            model.student_biases = params[models.STUDENT_BIASES]
+            model.assessment_biases = params[models.ASSESSMENT_BIASES]
+
+    def _gather_student_params(self, workers, params):
+        """
+        Copy the current student parameters of every block from the workers into params
+
+        :param _StudentBlockWorkers workers: Workers
+        :param collections.OrderedDict params: Values of all parameters
+        """
+
+        for worker_student_params in workers.call('student_params'):
+            for rows, block_params in worker_student_params:
+                for k, v in block_params.items():
+                    params[k][rows[k]] = v.astype(self.dtype, copy=False)
+
+
+class StudentFoldInEstimator(object):
+    """
+    Folds new interactions of existing students into a trained embedding model,
+    without refitting the model
+
+    Assessment, lesson and prereq embeddings, and bias terms, are held fixed. For each student
+    with new interactions, only the suffix of the student's trajectory that starts at the
+    timestep of the student's first new interaction is re-estimated, warm-started from the
+    student's current state. Earlier states are held fixed.
+
+    Interactions of the students in a fold-in are looked up with
+    :py:func:`datatools.InteractionHistory.interactions_of_students`, and the new interactions
+    are buffered by :py:func:`datatools.InteractionHistory.append`, so the cost of gathering
+    interactions and estimating states depends on the number of interactions of those students
+    instead of the size of the interaction history (after the first fold-in builds the row
+    index of the history). Extending the trajectories still copies the packed student states,
+    which takes time linear in the number of student states, but not in the number of
+    interactions.
+    """
+
+    def __init__(
+        self,
+        regularization_constant=1e-6,
+        ftol=1e-6,
+        max_iter=1000,
+        debug_mode_on=False):
+        """
+        Initialize estimator object
+
+        :param float regularization_constant: Coefficient of L2 regularizer on student embeddings
+        :param float ftol: Stopping condition for L-BFGS-B
+        :param int max_iter: Maximum number of iterations for L-BFGS-B
+        :param bool debug_mode_on: True => display L-BFGS-B iterations
+        """
+        if regularization_constant < 0:
+            raise ValueError('regularization_constant must be nonnegative not {}'.format(
+                regularization_constant))
+        if ftol <= 0:
+            raise ValueError('ftol must be positive not {}'.format(ftol))
+
+        self.regularization_constant = regularization_constant
+        self.ftol = ftol
+        self.max_iter = max_iter
+        self.debug_mode_on = debug_mode_on
+
+    def fold_in_model(self, model, new_interactions):
+        """
+        Append new interactions to the model's history, and re-estimate
+        the trajectory suffixes of the students who participate in them
+
+        :param models.EmbeddingModel model: A trained skill embedding model
+        :param pd.DataFrame new_interactions: Interactions between existing students
+            and existing modules, that occur at or after each student's last interaction
+        """
+
+        history = model.history
+        student_embeddings = model.student_embeddings
+
+        if isinstance(history, datatools.IdMaps):
+            raise ValueError('Cannot fold in interactions to a model without its interaction '
+                             'history (e.g., a model from models.EmbeddingModel.load)')
+
+        # only the id lookups are guarded, so other KeyErrors (e.g., missing columns) propagate
+        student_ids = new_interactions['student_id'].values
+        try:
+            student_idxes_of_new_ixns = history.idxes_of_student_ids(student_ids)
+        except KeyError as e:
+            raise ValueError('Cannot fold in interactions of new students: {}'.format(e))
+
+        module_ids = new_interactions['module_id'].values
+        module_types = new_interactions['module_type'].values
+        try:
+            history.idxes_of_assessment_ids(
+                module_ids[module_types == datatools.AssessmentInteraction.MODULETYPE])
+            history.idxes_of_lesson_ids(
+                module_ids[module_types == datatools.LessonInteraction.MODULETYPE])
+        except KeyError as e:
+            raise ValueError('Cannot fold in interactions with new modules: {}'.format(e))
+        timesteps_of_new_ixns = pd.Series(np.array(
+            new_interactions['timestep'].values, dtype=int)).groupby(student_idxes_of_new_ixns)
+
+        first_new_timesteps = timesteps_of_new_ixns.min()
+        student_idxes = first_new_timesteps.index.values
+        first_new_timesteps = first_new_timesteps.values
+        last_timesteps = student_embeddings.lengths()[student_idxes] - 1
+        if (first_new_timesteps < last_timesteps).any():
+            raise ValueError('Cannot fold in interactions that occur before a student\'s '
+                             'last interaction!')
+
+        # extend a copy of the trajectory store, so the model is left as it was
+        # if the fold-in fails
+        student_embeddings = copy.copy(student_embeddings)
+        last_timesteps = np.maximum(last_timesteps, timesteps_of_new_ixns.max().values)
+        student_embeddings.extend(student_idxes, last_timesteps)
+
+        # the suffix of each trajectory, preceded by a fixed anchor state
+        # (unless the suffix starts at timestep zero)
+        anchor_timesteps = np.maximum(first_new_timesteps - 1, 0)
+        batch_offsets = np.concatenate(([0], np.cumsum(last_timesteps - anchor_timesteps + 1)))
+        state_idxes = _concatenated_ranges(
+            student_embeddings.offsets[student_idxes] + anchor_timesteps,
+            student_embeddings.offsets[student_idxes] + last_timesteps + 1)
+        is_anchor_state = np.zeros(len(state_idxes), dtype=bool)
+        is_anchor_state[batch_offsets[:-1][first_new_timesteps > 0]] = True
+
+        split_history = self._split_suffixes(
+            model, new_interactions, student_idxes, first_new_timesteps,
+            anchor_timesteps, batch_offsets)
+
+        param_shapes = OrderedDict([
+            (models.STUDENT_EMBEDDINGS, (len(state_idxes), model.embedding_dimension)),
+            (models.ASSESSMENT_EMBEDDINGS, model.assessment_embeddings.shape)])
+        params = [student_embeddings.states[state_idxes], model.assessment_embeddings]
+        if model.using_lessons:
+            param_shapes[models.LESSON_EMBEDDINGS] = model.lesson_embeddings.shape
+            params.append(model.lesson_embeddings)
+        if model.using_prereqs:
+            param_shapes[models.PREREQ_EMBEDDINGS] = model.prereq_embeddings.shape
+            params.append(model.prereq_embeddings)
+        param_shapes[models.STUDENT_BIASES] = (len(student_idxes), )
+        param_shapes[models.ASSESSMENT_BIASES] = model.assessment_biases.shape
+        params.extend([model.student_biases[student_idxes], model.assessment_biases])
+        param_vals = np.concatenate([np.ravel(v) for v in params])
+
+        _, _, times_since_prev_ixn_for_lesson_ixns = split_history.lesson_interactions
+        cost_function = grad.CostFunction(
+            param_shapes,
+            split_history.assessment_interactions,
+            split_history.lesson_interactions,
+            compute_participation_matrices(
+                split_history,
+                model.assessment_embeddings.shape[0],
+                model.lesson_embeddings.shape[0] if model.using_lessons else 0,
+                using_lessons=model.using_lessons,
+                using_prereqs=model.using_prereqs),
+            np.repeat(np.arange(len(student_idxes)), np.diff(batch_offsets)),
+            learning_update_variance=model.learning_update_variance(
+                times_since_prev_ixn_for_lesson_ixns),
+            forgetting_penalty_terms=model.forgetting_penalty_terms(
+                times_since_prev_ixn_for_lesson_ixns),
+            # module parameters are fixed, so their regularization terms are constant
+            regularization_constant=(self.regularization_constant, 0, 0, 0, 0),
+            using_lessons=model.using_lessons,
+            using_prereqs=model.using_prereqs,
+            using_bias=model.using_bias)
+
+        # student states come first in the flattened parameter vector
+        num_free_params = len(state_idxes) * model.embedding_dimension
+        def student_cost_function(x):
+            param_vals[:num_free_params] = x
+            cost, gradient = cost_function(param_vals)
+            return cost, gradient[:num_free_params]
+
+        initial_student_vals = param_vals[:num_free_params].copy()
+        lower_bound = model.anti_singularity_lower_bounds[models.STUDENT_EMBEDDINGS]
+        box_constraints = [(lower_bound, None)] * num_free_params
+        for i in np.flatnonzero(np.repeat(is_anchor_state, model.embedding_dimension)):
+            box_constraints[i] = (initial_student_vals[i], initial_student_vals[i])
+
+        map_estimates = optimize.minimize(
+            student_cost_function,
+            initial_student_vals,
+            method='L-BFGS-B',
+            jac=True,
+            bounds=box_constraints,
+            options={
+                'disp': self.debug_mode_on,
+                'ftol' : self.ftol,
+                'maxiter' : self.max_iter
+                })
+
+        # nothing fails after the history is appended to
+        history.append(new_interactions)
+        student_embeddings.states[state_idxes] = np.reshape(
+            map_estimates.x, param_shapes[models.STUDENT_EMBEDDINGS])
+        model.student_embeddings = student_embeddings
+
+    def _split_suffixes(
+        self,
+        model,
+        new_interactions,
+        student_idxes,
+        first_new_timesteps,
+        anchor_timesteps,
+        batch_offsets):
+        """
+        Gather the interactions in the trajectory suffixes of a batch of students
+
+        :param models.EmbeddingModel model: A skill embedding model
+        :param pd.DataFrame new_interactions: New interactions, which are not yet
+            in the model's interaction history
+        :param np.ndarray student_idxes: Students with new interactions
+        :param np.ndarray first_new_timesteps: Timestep of each student's first new interaction
+        :param np.ndarray anchor_timesteps: Timestep of each student's first state in the batch
+        :param np.ndarray batch_offsets: Layout of the batch's packed student states
+        :rtype: datatools.SplitHistory
+        :return: Interactions in the suffixes, where student "indices" are rows of the
+            batch's packed student states
+        """
+
+        history = model.history
+
+        # only look at the interactions of students in the batch,
+        # and follow the interactions in the history with the new interactions
+        ixns_of_students, num_ixns_of_students = history.interactions_of_students(
+            student_idxes)
+        batch_idx_of_student_idx = np.full(history.num_students(), -1, dtype=int)
+        batch_idx_of_student_idx[student_idxes] = np.arange(len(student_idxes))
+        batch_idxes = np.concatenate((
+            np.repeat(np.arange(len(student_idxes)), num_ixns_of_students),
+            batch_idx_of_student_idx[history.idxes_of_student_ids(
+                new_interactions['student_id'].values)]))
+        df = pd.concat([
+            ixns_of_students, new_interactions], ignore_index=True)
+        timesteps = np.array(df['timestep'].values, dtype=int)
+        ixn_idxes = np.flatnonzero(timesteps >= first_new_timesteps[batch_idxes])
+        batch_idxes = batch_idxes[ixn_idxes]
+
+        state_idxes = batch_offsets[batch_idxes] + timesteps[ixn_idxes] - \
+                anchor_timesteps[batch_idxes]
+        module_ids = df['module_id'].values[ixn_idxes]
+        module_types = df['module_type'].values[ixn_idxes]
+        times_since_prev_ixn = np.array(
+            df['time_since_previous_interaction'].values[ixn_idxes], dtype=float)
+        is_assessment_ixn = module_types == datatools.AssessmentInteraction.MODULETYPE
+        is_lesson_ixn = module_types == datatools.LessonInteraction.MODULETYPE
+
+        assessment_interactions = (
+            state_idxes[is_assessment_ixn],
+            history.idxes_of_assessment_ids(module_ids[is_assessment_ixn]),
+            np.array(df['outcome'].values[ixn_idxes[is_assessment_ixn]], dtype=int) * 2 - 1)
+
+        if history.num_lessons() == 0:
+            # dummy lesson interactions for the temporal process on student embeddings,
+            # like datatools.InteractionHistory.split_interactions_by_type
+            # (from timestep 2 onwards)
+            last_timesteps = anchor_timesteps + np.diff(batch_offsets) - 1
+            first_transitions = np.maximum(first_new_timesteps, 2)
+            num_transitions = np.maximum(0, last_timesteps - first_transitions + 1)
+            student_idxes_for_lesson_ixns = _concatenated_ranges(
+                batch_offsets[:-1] + first_transitions - anchor_timesteps,
+                batch_offsets[:-1] + first_transitions - anchor_timesteps + num_transitions)
+            first_ixns_of_states = pd.Series(
+                times_since_prev_ixn, index=state_idxes).groupby(level=0).first()
+            lesson_interactions = (
+                student_idxes_for_lesson_ixns,
+                None,
+                first_ixns_of_states.reindex(student_idxes_for_lesson_ixns).values)
+        else:
+            lesson_interactions = (
+                state_idxes[is_lesson_ixn],
+                history.idxes_of_lesson_ids(module_ids[is_lesson_ixn]),
+                times_since_prev_ixn[is_lesson_ixn])
+
+        return datatools.SplitHistory(
+            assessment_interactions, lesson_interactions, None, batch_offsets)
+
+
 class MIRTMAPEstimator(object):
     """
     Class for estimating parameters of multi-dimensional item response theory (MIRT) model
@@ -712,8 +2400,10 @@ class MIRTMAPEstimator(object):
         assessment_interactions = split_history.assessment_interactions
 
         student_idxes_of_ixns, assessment_idxes_of_ixns, outcomes = assessment_interactions
-        # TODO: explain
-        student_idxes_of_ixns = student_idxes_of_ixns // model.history.duration()
+        # the split history indexes packed student states (see models.StudentTrajectories),
+        # but MIRT student factors are not time-varying, so map states back to students
+        student_idxes_of_ixns = np.searchsorted(
+            split_history.trajectory_offsets, student_idxes_of_ixns, side='right') - 1
         assessment_interactions = student_idxes_of_ixns, assessment_idxes_of_ixns, outcomes
         
         num_ixns = len(student_idxes_of_ixns)
@@ -7,17 +7,20 @@ Module for skill model evaluation
 
 
 import logging
+import multiprocessing
+import os
 import random
+import shutil
+import tempfile
 import time
 import math
 import copy
 
-from matplotlib import pyplot as plt
-from sklearn import cross_validation, metrics
 from scipy import stats
 import numpy as np
 
 from . import datatools
+from . import models
 
 
 _logger = logging.getLogger(__name__)
@@ -201,6 +204,9 @@ def training_auc(
     :return: Area under ROC curve
     """
 
+    # sklearn and matplotlib are imported where they are used, since they are slow to import
+    from sklearn import metrics
+
     train_assessment_interactions = history.data[history.data['module_type'] == \
             datatools.AssessmentInteraction.MODULETYPE]
     train_y_true = train_assessment_interactions['outcome'] * 2 - 1
@@ -220,6 +226,8 @@ def training_auc(
         return None
 
     if plot_roc_curve:
+        from matplotlib import pyplot as plt
+
         _, ax = plt.subplots()
         ax.plot(train_fpr, train_tpr, label='ROC curve (area = %0.2f)' % train_roc_auc)
         ax.plot([0, 1], [0, 1], 'k--')
@@ -233,12 +241,281 @@ def training_auc(
     return train_roc_auc
 
 
+def _training_and_validation_sets(
+    history,
+    left_in_student_ids,
+    left_out_student_ids,
+    random_truncations=False):
+    """
+    Carve out training/validation sets by truncating the histories of left-out students
+
+    :param datatools.InteractionHistory history: An interaction history
+    :param set[str] left_in_student_ids: Left-in students
+    :param set[str] left_out_student_ids: Left-out students
+    :param bool random_truncations:
+        True => truncate student histories at random locations
+        False => truncate student histories just before last batch of assessment interactions
+
+    :rtype: (pd.DataFrame,pd.DataFrame,datatools.SplitHistory,pd.DataFrame)
+    :return:
+        (assessment interactions in training set,
+        interactions in training set,
+        training set split into assessment/lesson ixns and timestep_of_last_interaction,
+        interactions in validation set)
+    """
+
+    df = history.data
+
+    # prepare for left-out student history truncations
+    not_in_beginning = df['timestep'] > MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY
+    is_assessment_ixn = df['module_type'] == datatools.AssessmentInteraction.MODULETYPE
+    left_out = df['student_id'].isin(left_out_student_ids)
+    grouped = df[not_in_beginning & is_assessment_ixn & left_out].groupby('student_id')
+
+    if len(grouped) < len(left_out_student_ids):
+        # at least one student has no assessment ixns after the second timestep
+        raise ValueError('Need to filter out students with too few interactions!')
+
+    if random_truncations:
+        # truncate student history at random location
+        # after timestep [MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY]
+        student_cut_loc = grouped.timestep.apply(lambda x: np.maximum(
+            MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY, np.random.choice(x))) - 1
+    else:
+        # truncate just before the last batch of assessment ixns for each student
+        student_cut_loc = grouped.timestep.max() - 1
+
+    # get timesteps where left-out student histories get truncated
+    student_cut_loc.name = 'student_cut_loc'
+    truncations = df.join(
+        student_cut_loc, on='student_id')['student_cut_loc'].fillna(np.nan, inplace=False)
+
+    # get training set, which consists of full student histories
+    # for "left-in" students, and truncated histories for "left-out" students
+    left_in = df['student_id'].isin(left_in_student_ids)
+    filtered_history = df[left_in | (left_out & ((
+        df['timestep'] <= truncations) | ((df['timestep'] == truncations+1) & (
+            df['module_type'] == datatools.LessonInteraction.MODULETYPE))))]
+
+    # split training set into assessment ixns and lesson ixns
+    split_history = history.split_interactions_by_type(
+            filtered_history=filtered_history,
+            insert_dummy_lesson_ixns=False)
+
+    # get assessment ixns in training set
+    train_assessment_interactions = filtered_history[
+        filtered_history['module_type']==datatools.AssessmentInteraction.MODULETYPE]
+
+    # get set of unique assessment modules in training set
+    training_assessments = set(train_assessment_interactions['module_id'].values)
+
+    # validation interactions = assessment interactions that occur
+    # immediately after the truncated histories of left-out students
+    module_in_train_set = df['module_id'].isin(training_assessments)
+    val_interactions = df[left_out & module_in_train_set & (
+        df['timestep']==truncations+1) & is_assessment_ixn]
+
+    return (train_assessment_interactions, filtered_history, split_history, val_interactions)
+
+
+def _warm_start_param_vals(model, reinitialized_student_ids):
+    """
+    Get initial parameter values for a fold from an embedding model
+    fit to the truncated histories of non-test students
+
+    The embeddings and biases of left-out students are re-randomized,
+    so their held-out interactions do not leak into the fold
+
+    :param models.EmbeddingModel model: A trained embedding model
+    :param set[str] reinitialized_student_ids: Students whose parameters are re-randomized
+    :rtype: dict[str,np.ndarray|models.StudentTrajectories]
+    :return: Initial parameter values for :py:class:`est.EmbeddingMAPEstimator`
+    """
+
+    student_idxes = model.history.idxes_of_student_ids(list(reinitialized_student_ids))
+
+    student_embeddings = models.StudentTrajectories(
+        model.student_embeddings.offsets,
+        model.embedding_dimension,
+        states=model.student_embeddings.states.copy(),
+        duration=model.student_embeddings.duration)
+    is_reinitialized_state = np.isin(
+        student_embeddings.student_idxes_of_states(), student_idxes)
+    student_embeddings.states[is_reinitialized_state, :] = np.random.random(
+        (is_reinitialized_state.sum(), model.embedding_dimension))
+
+    student_biases = model.student_biases.copy()
+    student_biases[student_idxes] = np.random.random(len(student_idxes))
+
+    param_vals = {
+        models.STUDENT_EMBEDDINGS : student_embeddings,
+        models.ASSESSMENT_EMBEDDINGS : model.assessment_embeddings,
+        models.STUDENT_BIASES : student_biases,
+        models.ASSESSMENT_BIASES : model.assessment_biases
+    }
+    if model.using_lessons:
+        param_vals[models.LESSON_EMBEDDINGS] = model.lesson_embeddings
+    if model.using_prereqs:
+        param_vals[models.PREREQ_EMBEDDINGS] = model.prereq_embeddings
+    if model.using_graph_prior:
+        param_vals[models.CONCEPT_EMBEDDINGS] = model.concept_embeddings
+
+    return param_vals
+
+
+def _without_interactions(model):
+    """
+    Strip the interactions from a warm-start model, so it can be sent to worker processes
+    without pickling its interaction history
+
+    :py:func:`evaluate._warm_start_param_vals` only needs the parameters of the model
+    and the id -> index maps of its history
+
+    :param models.EmbeddingModel model: A trained embedding model
+    :rtype: models.EmbeddingModel
+    :return: A shallow copy of the model, whose history is replaced by
+        a :py:class:`datatools.IdMaps`
+    """
+
+    model = copy.copy(model)
+    if not isinstance(model.history, datatools.IdMaps):
+        model.history = datatools.IdMaps.from_history(model.history)
+    model.invalidate_inference_cache()
+    return model
+
+
+def _run_fold(
+    model_builders,
+    history,
+    left_in_student_ids,
+    left_out_student_ids,
+    random_truncations=False,
+    warm_start_models=None,
+    seed=None):
+    """
+    Train models on a training set, and collect true labels and predicted probabilities
+    on the training and validation sets
+
+    :param dict[str,function] model_builders: See :py:func:`evaluate.cross_validated_auc`
+    :param datatools.InteractionHistory history: An interaction history
+    :param set[str] left_in_student_ids: Left-in students
+    :param set[str] left_out_student_ids: Left-out students
+    :param bool random_truncations: See :py:func:`evaluate.cross_validated_auc`
+    :param dict[str,models.EmbeddingModel]|None warm_start_models: Embedding models fit to
+        the truncated histories of non-test students, which are used to warm-start the
+        builders with the same names
+    :param int|None seed: Seed for np.random before the fold runs
+        None => don't reseed
+    :rtype: (np.array,dict[str,np.array],np.array,dict[str,np.array],list[int])
+    :return: (true labels for training set,
+              predicted probabilities for training set,
+              true labels for validation set,
+              predicted probabilities for validation set,
+              indices of validation interactions in the history)
+    """
+
+    if seed is not None:
+        np.random.seed(seed)
+
+    train_assessment_interactions, filtered_history, split_history, val_interactions = \
+            _training_and_validation_sets(
+                    history, left_in_student_ids, left_out_student_ids, random_truncations)
+
+    # train models on training set
+    trained_models = {}
+    for k, build_model in model_builders.items():
+        _logger.info('Training %s model...', k)
+        if warm_start_models is not None and k in warm_start_models:
+            trained_models[k] = build_model(
+                history,
+                filtered_history,
+                split_history=split_history,
+                initial_param_vals=_warm_start_param_vals(
+                    warm_start_models[k], left_out_student_ids))
+        else:
+            trained_models[k] = build_model(
+                history, filtered_history, split_history=split_history)
+
+    # collect true labels and predicted probabilities
+    train_y_true = (2 * train_assessment_interactions['outcome'] - 1).values
+    val_y_true = (2 * val_interactions['outcome'] - 1).values
+
+    train_probas_pred = {}
+    val_probas_pred = {}
+    for k, model in trained_models.items():
+        _logger.info('Evaluating %s model...', k)
+        train_probas_pred[k] = model.assessment_pass_likelihoods(train_assessment_interactions)
+        val_probas_pred[k] = model.assessment_pass_likelihoods(val_interactions)
+
+    return (
+        train_y_true, train_probas_pred, val_y_true, val_probas_pred,
+        list(val_interactions.index))
+
+
+def _columns_not_passed_to_workers(history):
+    """
+    :param datatools.InteractionHistory history: An interaction history
+    :rtype: list[str]
+    :return: Columns of the history that are not stored in the columnar history format,
+        which cross-validation workers load the history from
+    """
+
+    return [c for c in history.data.columns if c not in datatools.NPZ_HISTORY_COLUMNS]
+
+
+# state of a cross-validation worker process
+# (see _init_fold_worker and _run_fold_in_worker)
+_fold_worker_state = {}
+
+
+def _init_fold_worker(model_builders, history_file, random_truncations, warm_start_models):
+    """
+    Load the interaction history in a cross-validation worker process
+
+    The history is memory-mapped from an uncompressed .npz file, so workers share
+    its numeric columns through the page cache instead of receiving a pickled copy per task
+
+    :param dict[str,function] model_builders: See :py:func:`evaluate.cross_validated_auc`
+    :param str history_file: Path to a .npz file written by
+        :py:func:`datatools.InteractionHistory.to_npz`
+    :param bool random_truncations: See :py:func:`evaluate.cross_validated_auc`
+    :param dict[str,models.EmbeddingModel]|None warm_start_models: See
+        :py:func:`evaluate._run_fold`
+    """
+
+    _fold_worker_state['model_builders'] = model_builders
+    _fold_worker_state['history'] = datatools.InteractionHistory.from_npz(
+        history_file, mmap=True)
+    _fold_worker_state['random_truncations'] = random_truncations
+    _fold_worker_state['warm_start_models'] = warm_start_models
+
+
+def _run_fold_in_worker(task):
+    """
+    :param (list[str],list[str],int) task: (left-in students, left-out students, random seed)
+    :rtype: tuple
+    :return: See :py:func:`evaluate._run_fold`
+    """
+
+    left_in_student_ids, left_out_student_ids, seed = task
+    return _run_fold(
+        _fold_worker_state['model_builders'],
+        _fold_worker_state['history'],
+        set(left_in_student_ids),
+        set(left_out_student_ids),
+        _fold_worker_state['random_truncations'],
+        _fold_worker_state['warm_start_models'],
+        seed=seed)
+
+
 def cross_validated_auc(
     model_builders,
     history,
     num_folds=10,
     random_truncations=False,
-    size_of_test_set=0.2):
+    size_of_test_set=0.2,
+    n_jobs=1,
+    warm_start=False):
     """
     Use k-fold cross-validation to evaluate the predictive power of an
     embedding model on an interaction history
@@ -254,6 +531,9 @@ def cross_validated_auc(
 
         See nb/evaluations.ipynb for examples
 
+        If n_jobs > 1 and processes are not started with fork,
+        then model builders need to be picklable
+
     :param datatools.InteractionHistory history: An interaction history
 
     :param int num_folds:
@@ -267,6 +547,25 @@ def cross_validated_auc(
     :param float size_of_test_set: Fraction of students to include in the test set, where
         0 <= size_of_test_set < 1 (size_of_test_set = 0 => don't compute test AUCs)
 
+    :param int n_jobs: Number of worker processes that run folds (and the test run) in parallel
+        n_jobs = 1 => run folds sequentially in this process
+
+        Workers memory-map the history from a temporary .npz file, so folds of histories
+        with columns other than datatools.NPZ_HISTORY_COLUMNS (e.g., the user id column of
+        an IRT model) run sequentially. Each fold is seeded from np.random in this process,
+        so results do not depend on n_jobs
+
+    :param bool warm_start:
+        True => fit each model once to the histories of non-test students, truncated
+        just before their last batch of assessment interactions, and warm-start each
+        fold from that fit. Left-out students get re-randomized embeddings and biases,
+        while module parameters are reused as-is. With random_truncations, folds hold out
+        interactions that the module parameters have seen, so validation AUCs are optimistic.
+
+        Only applies to builders that return a :py:class:`models.EmbeddingModel`
+        from the full fit, and these builders also get called with an
+        initial_param_vals keyword argument (see :py:class:`est.EmbeddingMAPEstimator`)
+
     :rtype: dict[str,(float,float)]
     :return:
         A dictionary mapping model name to a tuple of (training roc auc, validation roc auc)
@@ -277,136 +576,18 @@ def cross_validated_auc(
     if num_folds > num_students:
         raise ValueError('Too many folds! Must be at most num_students ({}) not {}'.format(
                          num_students, num_folds))
+    if n_jobs < 1:
+        raise ValueError('n_jobs must be positive not {}'.format(n_jobs))
 
-    # initialize persistent variables
-    df = history.data
-
-    models = {k: None for k in model_builders}
-
-    # predicted pass likelihoods (training set)
-    train_probas_pred = {k: [] for k in models}
-    # true outcomes (training set)
-    train_y_true = []
-
-    # predicted pass likelihoods (validation set)
-    val_probas_pred = {k: [] for k in models}
-    # true outcomes (validation set)
-    val_y_true = []
+    from sklearn import cross_validation, metrics
 
     # collect errors across CV runs
-    err = {k: [] for k in models}
+    err = {k: [] for k in model_builders}
 
     # collect indices and probas_pred of validation data on each fold
     val_ixn_data = [None] * num_folds
 
-    # define useful helper functions
-    def get_training_and_validation_sets(left_in_student_ids, left_out_student_ids):
-        """
-        Carve out training/validation sets by truncating the histories of left-out students
-
-        :param set[str] left_in_student_ids: Left-in students
-        :param set[str] left_out_student_ids: Left-out students
-        :rtype: (pd.DataFrame,pd.DataFrame,datatools.SplitHistory,pd.DataFrame)
-        :return:
-            (assessment interactions in training set,
-            interactions in training set,
-            training set split into assessment/lesson ixns and timestep_of_last_interaction,
-            interactions in validation set)
-        """
-
-        # prepare for left-out student history truncations
-        not_in_beginning = df['timestep'] > MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY
-        is_assessment_ixn = df['module_type'] == datatools.AssessmentInteraction.MODULETYPE
-        left_out = df['student_id'].isin(left_out_student_ids)
-        grouped = df[not_in_beginning & is_assessment_ixn & left_out].groupby('student_id')
-
-        if len(grouped) < len(left_out_student_ids):
-            # at least one student has no assessment ixns after the second timestep
-            raise ValueError('Need to filter out students with too few interactions!')
-
-        if random_truncations:
-            # truncate student history at random location
-            # after timestep [MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY]
-            student_cut_loc = grouped.timestep.apply(lambda x: np.maximum(
-                MIN_NUM_TIMESTEPS_IN_STUDENT_HISTORY, np.random.choice(x))) - 1
-        else:
-            # truncate just before the last batch of assessment ixns for each student
-            student_cut_loc = grouped.timestep.max() - 1
-
-        # get timesteps where left-out student histories get truncated
-        student_cut_loc.name = 'student_cut_loc'
-        truncations = df.join(
-            student_cut_loc, on='student_id')['student_cut_loc'].fillna(np.nan, inplace=False)
-
-        # get training set, which consists of full student histories
-        # for "left-in" students, and truncated histories for "left-out" students
-        left_in = df['student_id'].isin(left_in_student_ids)
-        filtered_history = df[left_in | (left_out & ((
-            df['timestep'] <= truncations) | ((df['timestep'] == truncations+1) & (
-                df['module_type'] == datatools.LessonInteraction.MODULETYPE))))]
-
-        # split training set into assessment ixns and lesson ixns
-        split_history = history.split_interactions_by_type(
-                filtered_history=filtered_history,
-                insert_dummy_lesson_ixns=False)
-
-        # get assessment ixns in training set
-        train_assessment_interactions = filtered_history[
-            filtered_history['module_type']==datatools.AssessmentInteraction.MODULETYPE]
-
-        # get set of unique assessment modules in training set
-        training_assessments = set(train_assessment_interactions['module_id'].values)
-
-        # validation interactions = assessment interactions that occur
-        # immediately after the truncated histories of left-out students
-        module_in_train_set = df['module_id'].isin(training_assessments)
-        val_interactions = df[left_out & module_in_train_set & (
-            df['timestep']==truncations+1) & is_assessment_ixn]
-      
-        return (train_assessment_interactions, filtered_history, split_history, val_interactions)
-
-    def train_models(
-        filtered_history,
-        split_history):
-        """
-        Train models on training set
-
-        :param pd.DataFrame filtered_history: Interaction history after student truncations
-        :param datatools.SplitHistory split_history: An interaction history split into
-            assessment interactions, lesson interactions, and timestep of last interaction
-            for each student
-        """
-
-        for k, build_model in model_builders.items():
-            _logger.info('Training %s model...', k)
-            models[k] = build_model(history, filtered_history, split_history=split_history)
-
-    def collect_labels_and_predictions(
-        train_assessment_interactions,
-        val_interactions):
-        """
-        Collect true labels and predicted probabilities
-
-        :param pd.DataFrame train_assessment_interactions: Assessment ixns in training set
-        :param pd.DataFrame val_interactions: Assessment ixns in validation set
-        :rtype: (list[{1,-1}],list[float],list[{1,-1}],list[float])
-        :return: (true labels for training set,
-                  predicted probabilities for training set,
-                  true labels for validation set,
-                  predicted probabilities for validation set)
-        """
-
-        train_y_true = (2 * train_assessment_interactions['outcome'] - 1).values
-        val_y_true = (2 * val_interactions['outcome'] - 1).values
-
-        for k, model in models.items():
-            _logger.info('Evaluating %s model...', k)
-            train_probas_pred[k] = model.assessment_pass_likelihoods(train_assessment_interactions)
-            val_probas_pred[k] = model.assessment_pass_likelihoods(val_interactions)
-
-        return (train_y_true, train_probas_pred, val_y_true, val_probas_pred)
-
-    def update_err(err):
+    def update_err(err, train_y_true, train_probas_pred, val_y_true, val_probas_pred):
         """
         Add the current fold's training and validation AUCs to err.
         This function is called at the end of each cross-validation run.
@@ -472,46 +653,82 @@ def cross_validated_auc(
     kf = cross_validation.KFold(
             len(id_of_nontest_student_idx), n_folds=num_folds, shuffle=True)
 
-    start_time = time.time()
-
-    for fold_idx, (train_student_idxes, val_student_idxes) in enumerate(kf):
-        _logger.info('Processing fold %d of %d', fold_idx+1, num_folds)
-
-        left_in_student_ids = {id_of_nontest_student_idx[student_idx] \
-                for student_idx in train_student_idxes}
-        left_out_student_ids = {id_of_nontest_student_idx[student_idx] \
-                for student_idx in val_student_idxes}
-
-        train_assessment_interactions, filtered_history, split_history, val_interactions = \
-                get_training_and_validation_sets(left_in_student_ids, left_out_student_ids)
-
-        train_models(filtered_history, split_history)
-
-        train_y_true, train_probas_pred, val_y_true, val_probas_pred = \
-                collect_labels_and_predictions(train_assessment_interactions, val_interactions)
-        
-        val_ixn_data[fold_idx] = (list(val_interactions.index), copy.deepcopy(val_y_true)
-                , copy.deepcopy(val_probas_pred))
-
-        err = update_err(err)
-
-        _logger.info('Running at %f seconds per fold', (time.time() - start_time) / (fold_idx+1))
-
+    # (left-in student ids, left-out student ids) for each CV run,
+    # followed by the test run
+    runs = []
+    for train_student_idxes, val_student_idxes in kf:
+        runs.append((
+            {id_of_nontest_student_idx[student_idx] for student_idx in train_student_idxes},
+            {id_of_nontest_student_idx[student_idx] for student_idx in val_student_idxes}))
     if size_of_test_set > 0:
-        _logger.info('Computing test AUCs...')
         all_student_ids = set(history._student_idx.keys())
         nontest_student_ids = set(history.id_of_nontest_student_idx.values())
-        train_assessment_interactions, filtered_history, split_history, val_interactions = \
-                get_training_and_validation_sets(
-                        nontest_student_ids, all_student_ids - nontest_student_ids)
+        runs.append((nontest_student_ids, all_student_ids - nontest_student_ids))
 
-        train_models(filtered_history, split_history)
+    # seed each run up front, so runs are reproducible whether or not they run in workers,
+    # and whether or not they are warm-started
+    seeds = np.random.randint(2**31 - 1, size=len(runs))
 
-        train_y_true, train_probas_pred, val_y_true, val_probas_pred = \
-                collect_labels_and_predictions(train_assessment_interactions, val_interactions)
+    if warm_start:
+        _logger.info('Fitting models to non-test students for warm starts...')
+        if random_truncations:
+            _logger.warning(
+                'Warm starts with random truncations: module parameters are fit to '
+                'interactions that get held out in folds, so validation AUCs are optimistic')
+        # truncate the histories of all non-test students just before their last batch of
+        # assessment ixns, which are the validation ixns of every fold without random
+        # truncations, so the module parameters of warm starts have not seen them
+        nontest_student_ids = set(id_of_nontest_student_idx.values())
+        _, nontest_history, nontest_split_history, _ = _training_and_validation_sets(
+            history, set(), nontest_student_ids, random_truncations=False)
+        warm_start_models = {}
+        for k, build_model in model_builders.items():
+            model = build_model(history, nontest_history, split_history=nontest_split_history)
+            if isinstance(model, models.EmbeddingModel):
+                warm_start_models[k] = model
+    else:
+        warm_start_models = None
+
+    # workers only get the columns that are stored in the columnar history format,
+    # so histories with other columns (e.g., the user id column of an IRT model)
+    # would be evaluated on different data than in this process
+    extra_columns = _columns_not_passed_to_workers(history)
+    if n_jobs > 1 and extra_columns:
+        _logger.warning(
+            'Running folds sequentially, since worker processes do not get columns %s',
+            extra_columns)
+        n_jobs = 1
 
-        err = update_err(err)
+    start_time = time.time()
+
+    if n_jobs == 1:
+        run_results = (_run_fold(
+            model_builders,
+            history,
+            left_in_student_ids,
+            left_out_student_ids,
+            random_truncations,
+            warm_start_models,
+            seed=seed) for (left_in_student_ids, left_out_student_ids), seed in zip(runs, seeds))
+    else:
+        run_results = _run_folds_in_pool(
+            model_builders, history, runs, seeds, random_truncations, n_jobs, warm_start_models)
+
+    for run_idx, run_result in enumerate(run_results):
+        train_y_true, train_probas_pred, val_y_true, val_probas_pred, val_idxes = run_result
+
+        if run_idx < num_folds:
+            _logger.info('Processed fold %d of %d', run_idx+1, num_folds)
+            val_ixn_data[run_idx] = (
+                val_idxes, copy.deepcopy(val_y_true), copy.deepcopy(val_probas_pred))
+            _logger.info(
+                'Running at %f seconds per fold', (time.time() - start_time) / (run_idx+1))
+        else:
+            _logger.info('Computing test AUCs...')
 
+        err = update_err(err, train_y_true, train_probas_pred, val_y_true, val_probas_pred)
+
+    if size_of_test_set > 0:
         test_err = {k: v[-1] for k, v in err.items()}
         err = {k: v[:-1] for k, v in err.items()}
     else:
@@ -520,3 +737,48 @@ def cross_validated_auc(
 
     return EvalResults(err, val_ixn_data, raw_test_results=test_err)
 
+
+def _run_folds_in_pool(
+    model_builders, history, runs, seeds, random_truncations, n_jobs, warm_start_models=None):
+    """
+    Run folds in a pool of worker processes
+
+    :param dict[str,function] model_builders: See :py:func:`evaluate.cross_validated_auc`
+    :param datatools.InteractionHistory history: An interaction history
+    :param list[(set[str],set[str])] runs: (Left-in students, left-out students) for each run
+    :param np.ndarray seeds: Seed for np.random in each run
+    :param bool random_truncations: See :py:func:`evaluate.cross_validated_auc`
+    :param int n_jobs: Number of worker processes
+    :param dict[str,models.EmbeddingModel]|None warm_start_models: See
+        :py:func:`evaluate._run_fold`
+    :rtype: list[tuple]
+    :return: The output of :py:func:`evaluate._run_fold` for each run, in order
+    """
+
+    extra_columns = _columns_not_passed_to_workers(history)
+    if extra_columns:
+        raise ValueError('Cannot pass columns {} to worker processes'.format(extra_columns))
+
+    if warm_start_models is not None:
+        # initargs are pickled for every worker
+        warm_start_models = {k: _without_interactions(v) for k, v in warm_start_models.items()}
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        history_file = os.path.join(tmp_dir, 'history.npz')
+        history.to_npz(history_file)
+
+        tasks = [(list(left_in_student_ids), list(left_out_student_ids), seed) \
+                for (left_in_student_ids, left_out_student_ids), seed in zip(runs, seeds)]
+
+        pool = multiprocessing.Pool(
+            min(n_jobs, len(tasks)),
+            initializer=_init_fold_worker,
+            initargs=(model_builders, history_file, random_truncations, warm_start_models))
+        try:
+            return pool.map(_run_fold_in_worker, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -1,8 +1,8 @@
 """
-Module for gradients of the cost function in parameter estimation
+Module for evaluating the cost function in parameter estimation, and its gradient
 
 See https://www.dropbox.com/s/k9qlgn0pd6wtqlw/LSE_Gradient.pdf?dl=0
-for a bunch of equations that summarize most of the functions below
+for a bunch of equations that summarize most of the terms below
 
 @author Siddharth Reddy <sgr45@cornell.edu>
 """
@@ -10,6 +10,9 @@ for a bunch of equations that summarize most of the functions below
 
 
 import logging
+import time
+
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
@@ -18,2604 +21,1267 @@ from . import models
 
 _logger = logging.getLogger(__name__)
 
+# phases of an evaluation of the cost function that are timed for telemetry
+PHASES = ['gather', 'elementwise', 'scatter', 'reduce', 'regularization']
 
-def without_scipy_without_lessons(
-    assessment_interactions,
-    lesson_interactions,
-    learning_update_variance,
-    forgetting_penalty_terms,
-    regularization_constant,
-    graph_regularization_constant,
-    student_participation_in_assessment_ixns,
-    student_bias_participation_in_assessment_ixns,
-    assessment_participation_in_assessment_ixns,
-    curr_student_participation_in_lesson_ixns,
-    prev_student_participation_in_lesson_ixns,
-    lesson_participation_in_lesson_ixns,
-    assessment_participation_in_concepts,
-    lesson_participation_in_concepts,
-    concept_participation_in_assessments,
-    concept_participation_in_lessons,
-    prereq_edge_concept_idxes,
-    concept_participation_in_prereq_edges,
-    last_student_embedding_idx,
-    last_assessment_embedding_idx,
-    last_lesson_embedding_idx,
-    last_prereq_embedding_idx,
-    last_student_bias_idx,
-    last_assessment_bias_idx,
-    num_timesteps,
-    using_bias,
-    using_graph_prior,
-    using_l1_regularizer):
-    """
-    Setup a function that will compute gradients and evaluate the cost function
-    at supplied parameter values, for an embedding model without lessons and
-    a parameter estimation routine that uses gradient descent for optimization
+# ways of adding per-interaction values into the rows of the gradient that participate
+# in each interaction (see CostFunction)
+SCATTER_BACKENDS = ['csr', 'bincount']
 
-    :param (np.array,np.array,np.array) assessment_interactions:
-        For each assessment interaction, (student_idx, assessment_idx, outcome),
-        where outcome is -1 or 1
 
-    :param (np.array,np.array,np.array) lesson_interactions:
-        For each lesson interaction, (student_idx, lesson_idx, time_since_previous_interaction)
+def _scatter_add(participation_matrix, vals, out):
+    """
+    Add the rows of vals into the rows of out that participate in each interaction,
+    i.e., out += participation_matrix * vals
 
-    :param np.array|float learning_update_variance:
-        Variance of the Gaussian learning update. If float, then the variance
-        is constant across all interactions. If np.array, then the variance is
-        different for each lesson interaction.
+    :param scipy.sparse.csr_matrix participation_matrix:
+        A matrix of dimensions [number of rows in out] X [number of interactions]
+    :param np.ndarray vals: Values for each interaction
+    :param np.ndarray out: Output array
+    """
 
-    :param np.array|float forgetting_penalty_terms:
-        Penalty term for the forgetting effect in the Gaussian learning update.
-        If float, then the penalty term is constant across all interactions. If
-        np.array, then the penalty is different for each lesson interaction.
+    out += participation_matrix.dot(vals)
 
-    :param (float,float,float,float,float) regularization_constant:
-        Coefficients of the regularization terms for (students, assessments,
-        lessons, prereqs, concepts)
 
-    :param float graph_regularization_constant:
-        Coefficient of the graph regularization term
+class _ScatterIndex(object):
+    """
+    The row of the output that each interaction is added into, which stands in for
+    a participation matrix in :py:func:`grad._bincount_scatter_add`
 
-    :param scipy.sparse.csr_matrix student_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of assessment interactions] where a non-zero entry indicates that the student at a
-        specific timestep participated in the assessment interaction
+    Only the row of each interaction is kept. For outputs with more than one column,
+    the rows are expanded into the flattened position of every entry at scatter time,
+    in a scratch buffer that is shared by the shards of a thread.
+    """
 
-    :param scipy.sparse.csr_matrix student_bias_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students] X
-        [number of assessment interactions] where a non-zero entry indicates that the student
-        participated in the assessment interaction
+    def __init__(self, idxes, subtracted_idxes=None, flat_idxes=None):
+        """
+        Initialize scatter index object
+
+        :param np.ndarray idxes: For each interaction, the row it is added into
+        :param np.ndarray|None subtracted_idxes: For each interaction, a row that it is
+            subtracted from, like a participation matrix that is the difference of two
+            participation matrices
+        :param np.ndarray|None flat_idxes: Scratch buffer of integers for the flattened
+            positions of matrix-valued scatters, with at least as many entries as the
+            scattered values (None => allocate a buffer for each scatter)
+        """
 
-    :param scipy.sparse.csr_matrix assessment_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique assessments] X
-        [number of assessment interactions] where a non-zero entry indicates that the assessment
-        participated in the assessment interaction
+        self.idxes = np.asarray(idxes, dtype=np.intp)
+        self.subtracted_idxes = None if subtracted_idxes is None else np.asarray(
+            subtracted_idxes, dtype=np.intp)
+        self.flat_idxes = flat_idxes
 
-    :param scipy.sparse.csr_matrix curr_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the post-update student state for the lesson interaction
 
-    :param scipy.sparse.csr_matrix prev_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the pre-update student state for the lesson interaction
+def _bincount_scatter_add(scatter_index, vals, out):
+    """
+    Add the rows of vals into the rows of out given by a scatter index with np.bincount,
+    which gives the same result as :py:func:`grad._scatter_add` with the corresponding
+    participation matrix, without a sparse matrix product
 
-    :param scipy.sparse.csr_matrix lesson_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique lessons] X [number of lesson interactions]
-        where a non-zero entry indicates that the lesson participated in the lesson interaction
+    np.bincount always sums in double precision, so each call allocates one float64 array
+    the size of out (which row windows keep small for chunks of interactions) that is
+    added into out in its own data type.
 
-    :param scipy.sparse.csr_matrix assessment_participation_in_concepts:
-        A binary matrix of dimensions [number of unique assessments] X [number of unique concepts],
-        where an entry indicates assessment-concept association. Concept associations for a given
-        assessment sum to one, i.e., each row sums to one.
+    :param _ScatterIndex scatter_index: The row of out that each interaction is added into
+    :param np.ndarray vals: Values for each interaction
+    :param np.ndarray out: Output array
+    """
 
-    :param scipy.sparse.csr_matrix lesson_participation_in_concepts:
-        A binary matrix of dimensions [number of unique lessons] X [number of unique concepts],
-        where an entry indicates lesson-concept association. Concept associations for a given
-        lesson sum to one, i.e., each row sums to one.
+    if vals.ndim == 1:
+        flatten = lambda x: x
+    else:
+        num_cols = vals.shape[1]
+        if scatter_index.flat_idxes is None:
+            flat_idxes = np.empty(vals.shape, dtype=np.intp)
+        else:
+            flat_idxes = scatter_index.flat_idxes[:vals.size].reshape(vals.shape)
+        flatten = lambda x: np.add(
+            (x * num_cols)[:, None], np.arange(num_cols), out=flat_idxes).ravel()
 
-    :param scipy.sparse.csr_matrix concept_participation_in_assessments:
-        The transpose of assessment_participation_in_concepts
+    vals = vals.ravel()
+    out += np.bincount(
+        flatten(scatter_index.idxes), weights=vals, minlength=out.size).reshape(out.shape)
+    if scatter_index.subtracted_idxes is not None:
+        out -= np.bincount(flatten(scatter_index.subtracted_idxes), weights=vals,
+                           minlength=out.size).reshape(out.shape)
 
-    :param scipy.sparse.csr_matrix concept_participation_in_lessons:
-        The transpose of lesson_participation_in_lessons
 
-    :param (np.array,np.array) prereq_edge_concept_idxes:
-        (Indices of prereq concepts, Indices of postreq concepts)
+def _rowwise_dot(x, y, out):
+    """
+    Compute the dot product of each row of x with the corresponding row of y
 
-    :param (scipy.sparse.csr_matrix,scipy.sparse.csr_matrix) concept_participation_in_prereq_edges:
-        The first binary matrix has dimensions [number of unique concepts] X
-        [number of prereq edges], where a non-zero entry indicates that the concept is the prereq
-        in the edge.
+    :param np.ndarray x: A matrix
+    :param np.ndarray y: A matrix with the same shape as x
+    :param np.ndarray out: A vector with one entry per row
+    :rtype: np.ndarray
+    :return: out
+    """
 
-        The second binary matrix has the same dimensions,
-        where a non-zero entry indicates that the concept is the postreq in the edge.
+    return np.einsum('ij, ij->i', x, y, out=out)
 
-    :param int last_student_embedding_idx:
-        Index of the last student embedding parameter in the flattened gradient
 
-    :param int last_assessment_embedding_idx:
-        Index of the last assessment embedding parameter in the flattened gradient
+def select_ixns(x, ixns):
+    """
+    :param np.ndarray|float|None x: A per-interaction array, or a constant
+    :param slice|np.ndarray ixns: A range of interactions, or indices of interactions
+    :rtype: np.ndarray|float|None
+    :return: The entries of x for the range of interactions, or x if it is a constant
+    """
 
-    :param int last_lesson_embedding_idx:
-        Index of the last lesson embedding parameter in the flattened gradient
+    return x if x is None or np.ndim(x) == 0 else x[ixns]
 
-    :param int last_prereq_embedding_idx:
-        Index of the last prereq embedding parameter in the flattened gradient
 
-    :param int last_student_bias_idx:
-        Index of the last student bias parameter in the flattened gradient
+def _participation_in_ixns(participation_matrix, ixns):
+    """
+    :param scipy.sparse.csc_matrix|None participation_matrix:
+        A matrix of dimensions [number of rows] X [number of interactions]
+    :param slice ixns: A range of interactions
+    :rtype: scipy.sparse.csr_matrix|None
+    :return: The columns of the participation matrix for the range of interactions
+    """
 
-    :param int last_assessment_bias_idx:
-        Index of the last assessment bias parameter in the flattened gradient
+    if participation_matrix is None:
+        return None
+    return participation_matrix[:, ixns].tocsr()
 
-    :param int num_timesteps:
-        Maximum number of timesteps in a student history, i.e.,
-        the output of InteractionHistory.duration()
 
-    :param bool using_bias:
-        Including bias terms in the assessment result likelihood
+def _split_range(start, stop, num_parts):
+    """
+    :param int start: Start of a range
+    :param int stop: End of the range (exclusive)
+    :param int num_parts: Number of parts
+    :rtype: np.ndarray
+    :return: Boundaries of num_parts contiguous ranges that partition the range,
+        where the first range is the longest
+    """
 
-    :param bool using_graph_prior:
-        Including the graph regularization term
+    sizes = np.full(num_parts, (stop - start) // num_parts, dtype=int)
+    sizes[:(stop - start) % num_parts] += 1
+    return start + np.concatenate([[0], np.cumsum(sizes)])
 
-    :param bool using_l1_regularizer:
-        True => use L1 regularization on lesson and assessment embeddings
-        False => use L2 regularization on lesson and assessment embeddings
 
-    :rtype: function
-    :return:
-        A function that computes gradients and evaluates the cost function
-        at supplied parameter values. See the docstring below for my_grads
-        for further details.
+class _RowWindow(object):
     """
+    A participation matrix or scatter index restricted to the range of rows of the output
+    that a shard's interactions are added into
 
-    # pull regularization constants for different parameters out of tuple
-    (
-        student_regularization_constant,
-        assessment_regularization_constant,
-        lesson_regularization_constant,
-        prereq_regularization_constant,
-        concept_regularization_constant) = regularization_constant
+    Scatters into a window only touch (and only allocate temporaries for) that range of rows,
+    which for a small chunk of interactions is much smaller than the output
+    """
 
-    def my_grads(param_vals):
+    def __init__(self, participation, rows):
         """
-        Compute the gradient of the cost function with respect to model parameters
-
-        :param dict[str,np.ndarray] param_vals:
-            A dictionary mapping a parameter's name to its current value
+        Initialize row window object
 
-        :rtype: (dict[str,np.ndarray], float)
-        :return:
-            A dictionary mapping a parameter's name to the gradient
-            of the cost function with respect to that parameter
-            (evaluated at the supplied parameter values), and the value of the cost function
-            (evaluated at the supplied parameter values)
+        :param scipy.sparse.csr_matrix|_ScatterIndex participation: Participation matrix
+            or scatter index whose rows are numbered from the start of the window
+        :param slice rows: Range of rows of the output
         """
 
-        # pull parameters from param_vals into separate variables
-        student_embeddings = param_vals[models.STUDENT_EMBEDDINGS]
-        assessment_embeddings = param_vals[models.ASSESSMENT_EMBEDDINGS]
-        if using_graph_prior:
-            concept_embeddings = param_vals[models.CONCEPT_EMBEDDINGS]
-
-        # split assessment interactions into students, assessments, outcomes
-        (
-            student_idxes_for_assessment_ixns,
-            assessment_idxes_for_assessment_ixns,
-            outcomes_for_assessment_ixns) = assessment_interactions
-
-        # use dummy lesson interactions to get students in temporal process
-        student_idxes_for_temporal_process, _, _ = lesson_interactions
+        self.participation = participation
+        self.rows = rows
 
-        # get biases for assessment interactions
-        if using_bias:
-            student_biases = param_vals[models.STUDENT_BIASES][\
-                    student_idxes_for_assessment_ixns // num_timesteps][:, None]
-            assessment_biases = param_vals[models.ASSESSMENT_BIASES][\
-                    assessment_idxes_for_assessment_ixns][:, None]
-        else:
-            student_biases = assessment_biases = 0
-
-        # shape outcomes as a column vector
-        outcomes = outcomes_for_assessment_ixns[:, None]
 
-        # get the assessment embedding for each assessment interaction
-        assessment_embeddings_for_assessment_ixns = \
-                assessment_embeddings[assessment_idxes_for_assessment_ixns, :]
+class _InteractionShard(object):
+    """
+    A contiguous range of assessment interactions and lesson interactions,
+    the columns of the participation matrices for those interactions,
+    scratch buffers, and a buffer for the shard's contribution to the gradient
+
+    Shards that are evaluated on different threads share nothing that they write to,
+    so they can be evaluated concurrently. Chunks of interactions are shards that
+    are evaluated one after another on the same thread, and share scratch buffers
+    and a gradient buffer.
+    """
 
-        # compute the L2 norm of the assessment embedding for each assessment interaction
-        assessment_embedding_norms_for_assessment_ixns = np.linalg.norm(
-            assessment_embeddings_for_assessment_ixns, axis=1)[:, None]
+    def __init__(
+        self,
+        cost_function,
+        assessment_ixns,
+        lesson_ixns,
+        participation_matrices,
+        gradient,
+        scratch_buffers_of=None,
+        using_row_windows=False):
+        """
+        Initialize shard object
+
+        :param CostFunction cost_function: The cost function that owns the shard
+        :param slice assessment_ixns: Range of assessment interactions in the shard
+        :param slice lesson_ixns: Range of lesson interactions in the shard
+        :param dict[str,scipy.sparse.csr_matrix|None]|None participation_matrices:
+            The participation matrices of the shard's interactions
+            (None => scatter indexes are built from the shard's interactions instead)
+        :param np.ndarray gradient: Buffer for the shard's contribution to the gradient
+        :param _InteractionShard|None scratch_buffers_of: A shard, with at least as many
+            interactions of each type, whose scratch buffers are reused by this shard
+            (None => allocate scratch buffers)
+        :param bool using_row_windows: True => restrict participation matrices
+            (or scatter indexes) to the rows that the shard's interactions are added into
+        """
 
-        # get the student embedding for each assessment interaction
-        student_embeddings_for_assessment_ixns = \
-                student_embeddings[student_idxes_for_assessment_ixns, :]
+        cf = cost_function
+
+        self.student_idxes_for_assessment_ixns = cf.student_idxes_for_assessment_ixns[
+            assessment_ixns]
+        self.assessment_idxes_for_assessment_ixns = cf.assessment_idxes_for_assessment_ixns[
+            assessment_ixns]
+        self.outcomes = cf.outcomes[assessment_ixns]
+        self.student_bias_idxes_for_assessment_ixns = cf.student_bias_idxes_for_assessment_ixns[
+            assessment_ixns]
+
+        self.student_idxes_for_lesson_ixns = cf.student_idxes_for_lesson_ixns[lesson_ixns]
+        self.prev_student_idxes_for_lesson_ixns = cf.prev_student_idxes_for_lesson_ixns[
+            lesson_ixns]
+        self.lesson_idxes_for_lesson_ixns = select_ixns(
+            cf.lesson_idxes_for_lesson_ixns, lesson_ixns)
+        self.learning_update_variance = select_ixns(cf.learning_update_variance, lesson_ixns)
+        self.forgetting_penalty_terms = select_ixns(cf.forgetting_penalty_terms, lesson_ixns)
+
+        self.num_assessment_ixns = len(self.student_idxes_for_assessment_ixns)
+        self.num_lesson_ixns = len(self.student_idxes_for_lesson_ixns)
+
+        self._allocate_scratch_buffers(
+            cf.embedding_dimension, cf.using_lessons, cf.using_prereqs, cf.dtype,
+            participation_matrices is None, scratch_buffers_of)
+
+        scatter_targets = self._scatter_targets(cf.using_lessons, cf.using_prereqs)
+        if participation_matrices is None:
+            participation_matrices = {k: _ScatterIndex(
+                idxes, subtracted_idxes=subtracted_idxes, flat_idxes=self.flat_idxes) \
+                        if idxes is not None else None \
+                        for k, (idxes, subtracted_idxes) in scatter_targets.items()}
+        if using_row_windows:
+            participation_matrices = self._row_windows(participation_matrices, scatter_targets)
+
+        self.student_participation_in_assessment_ixns = participation_matrices[
+            'student_participation_in_assessment_ixns']
+        self.student_bias_participation_in_assessment_ixns = participation_matrices[
+            'student_bias_participation_in_assessment_ixns']
+        self.assessment_participation_in_assessment_ixns = participation_matrices[
+            'assessment_participation_in_assessment_ixns']
+        self.curr_student_participation_in_lesson_ixns = participation_matrices[
+            'curr_student_participation_in_lesson_ixns']
+        self.prev_student_participation_in_lesson_ixns = participation_matrices[
+            'prev_student_participation_in_lesson_ixns']
+        self.lesson_participation_in_lesson_ixns = participation_matrices[
+            'lesson_participation_in_lesson_ixns']
+
+        self.gradient = gradient
+
+        # dict[str,float]|None
+        # phase -> seconds spent in the shard (None => phases are not timed)
+        self.phase_times = None
+
+    def _scatter_targets(self, using_lessons, using_prereqs):
+        """
+        Get the rows that the shard's interactions are added into for each participation matrix
 
-        # compute the dot product of the student embedding
-        # and assessment embedding for each interaction
-        student_dot_assessment = np.einsum(
-            'ij, ij->i',
-            student_embeddings_for_assessment_ixns,
-            assessment_embeddings_for_assessment_ixns)[:, None]
-
-        # compute intermediate quantities for the gradient that get reused
-        exp_diff = np.exp(outcomes * (
-            assessment_embedding_norms_for_assessment_ixns - student_dot_assessment / \
-                    assessment_embedding_norms_for_assessment_ixns - student_biases - \
-                    assessment_biases))
-        one_plus_exp_diff = 1 + exp_diff
-        mult_diff = outcomes * exp_diff / one_plus_exp_diff
-
-        using_temporal_process = len(student_idxes_for_temporal_process) > 0
-        if using_temporal_process:
-            # get embeddings of student states resulting from lesson interactions
-            curr_student_embeddings_for_lesson_ixns = \
-                    student_embeddings[student_idxes_for_temporal_process, :]
-
-            # get embeddings of student states prior to lesson interactions
-            prev_student_embeddings_for_lesson_ixns = \
-                    student_embeddings[student_idxes_for_temporal_process - 1, :]
-
-            # compute intermediate quantities for the gradient that get reused
-            diffs = curr_student_embeddings_for_lesson_ixns - \
-                    prev_student_embeddings_for_lesson_ixns + forgetting_penalty_terms
-            diffs_over_var = diffs / learning_update_variance
-        else:
-            diffs = diffs_over_var = 0
+        :rtype: dict[str,(np.ndarray|None,np.ndarray|None)]
+        :return: A dictionary with the same keys as the output of
+            :py:func:`est.compute_participation_matrices`, mapping to (the row that each
+            interaction is added into, the row that each interaction is subtracted from),
+            where None means (the participation matrix is not used, nothing is subtracted)
+        """
 
-         # compute intermediate quantities for graph regularization terms in the gradient
-        if using_graph_prior:
-            # get distance from an assessment embedding to its prior embedding,
-            # i.e., the weighted average of the embeddings of the assessment's
-            # governing concepts
-            assessment_diffs_from_concept_centers = assessment_embeddings - \
-                    assessment_participation_in_concepts.dot(concept_embeddings)
-
-            # grab the concept dependency graph
-            prereq_concept_idxes, postreq_concept_idxes = prereq_edge_concept_idxes
-            concept_participation_in_prereqs, concept_participation_in_postreqs = \
-                    concept_participation_in_prereq_edges
-
-            # get prereq and postreq concept embeddings
-            prereq_concept_embeddings = concept_embeddings[prereq_concept_idxes, :]
-            postreq_concept_embeddings = concept_embeddings[postreq_concept_idxes, :]
-
-            # compute column vector of L2 norms for postreq concept embeddings
-            postreq_concept_norms = np.linalg.norm(postreq_concept_embeddings, axis=1)[:, None]
-
-            # compute the dot product of the prereq concept embedding
-            # and postreq concept embedding for each edge in the concept dependency graph
-            prereq_dot_postreq = np.einsum(
-                'ij, ij->i',
-                prereq_concept_embeddings,
-                postreq_concept_embeddings)[:, None]
-
-            # intermediate quantity, useful and reusable later
-            prereq_edge_diffs = prereq_dot_postreq / postreq_concept_norms - postreq_concept_norms
-
-        # compute the gradient w.r.t. student embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        # and the gradient of the regularization terms
-        stud_grad_from_asmt_ixns = -student_participation_in_assessment_ixns.dot(
-            mult_diff / assessment_embedding_norms_for_assessment_ixns * \
-                    assessment_embeddings_for_assessment_ixns)
-        stud_grad_from_norm_regularization = 2 * student_regularization_constant * \
-                student_embeddings
-        if using_temporal_process:
-            stud_grad_from_temporal_process = curr_student_participation_in_lesson_ixns.dot(
-                    diffs_over_var)
-        else:
-            stud_grad_from_temporal_process = 0
-        gradient_wrt_student_embedding = stud_grad_from_asmt_ixns + \
-                stud_grad_from_norm_regularization + + stud_grad_from_temporal_process
-
-        # compute the gradient w.r.t. assessment embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        # and the gradient of the regularization terms
-        asmt_grad_from_asmt_ixns = -assessment_participation_in_assessment_ixns.dot(
-                mult_diff / assessment_embedding_norms_for_assessment_ixns * (
-                        student_embeddings_for_assessment_ixns - \
-                                assessment_embeddings_for_assessment_ixns - \
-                                student_dot_assessment / np.einsum(
-                                    'ij, ij->ij',
-                                    assessment_embedding_norms_for_assessment_ixns,
-                                    assessment_embedding_norms_for_assessment_ixns) * \
-                                            assessment_embeddings_for_assessment_ixns))
-        if using_l1_regularizer:
-            asmt_grad_from_norm_regularization = assessment_regularization_constant * np.sign(
-                    assessment_embeddings)
-        else:
-            asmt_grad_from_norm_regularization = 2 * assessment_regularization_constant * \
-                assessment_embeddings
-        if using_graph_prior:
-            asmt_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                    assessment_diffs_from_concept_centers
-        else:
-            asmt_grad_from_graph_regularization = 0
-        gradient_wrt_assessment_embedding = asmt_grad_from_asmt_ixns + \
-                asmt_grad_from_norm_regularization + asmt_grad_from_graph_regularization
+        return {
+            'student_participation_in_assessment_ixns' : (
+                self.student_idxes_for_assessment_ixns, None),
+            'student_bias_participation_in_assessment_ixns' : (
+                self.student_bias_idxes_for_assessment_ixns, None),
+            'assessment_participation_in_assessment_ixns' : (
+                self.assessment_idxes_for_assessment_ixns, None),
+            # without prereqs, the participation matrix of post-update student states
+            # is the difference of the matrices for post-update and pre-update states
+            'curr_student_participation_in_lesson_ixns' : (
+                self.student_idxes_for_lesson_ixns,
+                None if using_prereqs else self.prev_student_idxes_for_lesson_ixns),
+            'prev_student_participation_in_lesson_ixns' : (
+                self.prev_student_idxes_for_lesson_ixns if using_prereqs else None, None),
+            'lesson_participation_in_lesson_ixns' : (
+                self.lesson_idxes_for_lesson_ixns if using_lessons else None, None)
+        }
+
+    def _row_windows(self, participation_matrices, scatter_targets):
+        """
+        Restrict participation matrices or scatter indexes to the range of rows
+        that the shard's interactions are added into
 
-        # compute the gradient w.r.t. student biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient_wrt_student_biases = \
-                -student_bias_participation_in_assessment_ixns.dot(mult_diff)[:,0]
+        :rtype: dict[str,_RowWindow|None]
+        """
 
-        # compute the gradient w.r.t. assessment biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient_wrt_assessment_biases = \
-                -assessment_participation_in_assessment_ixns.dot(mult_diff)[:,0]
+        row_windows = {}
+        for k, participation in participation_matrices.items():
+            idxes, subtracted_idxes = scatter_targets[k]
+            if participation is None or idxes is None or len(idxes) == 0:
+                row_windows[k] = None
+                continue
+
+            row_idxes = [idxes] if subtracted_idxes is None else [idxes, subtracted_idxes]
+            start = min(x.min() for x in row_idxes)
+            rows = slice(start, max(x.max() for x in row_idxes) + 1)
+            if isinstance(participation, _ScatterIndex):
+                participation = _ScatterIndex(
+                    idxes - start, subtracted_idxes=None \
+                            if subtracted_idxes is None else subtracted_idxes - start,
+                    flat_idxes=self.flat_idxes)
+            else:
+                participation = participation[rows]
+            row_windows[k] = _RowWindow(participation, rows)
+        return row_windows
 
-        if using_graph_prior:
-            # compute the gradient w.r.t. concept embeddings,
-            # which is the sum of gradient of the log-likelihood
-            # of assessment and lesson interactions and the gradient
-            # of the regularization terms
-            concept_grad_from_assessments = -concept_participation_in_assessments.dot(
-                2 * assessment_diffs_from_concept_centers)
-
-            concept_grad_from_prereqs = concept_participation_in_prereqs.dot(
-                postreq_concept_embeddings / postreq_concept_norms)
-
-            concept_grad_from_postreqs = concept_participation_in_postreqs.dot(
-                (prereq_concept_embeddings - 2 * postreq_concept_embeddings) / \
-                        postreq_concept_norms + 2 * postreq_concept_embeddings * \
-                        prereq_dot_postreq / postreq_concept_norms**3)
-
-            gradient_wrt_concept_embedding = graph_regularization_constant * (
-                concept_grad_from_assessments + concept_grad_from_prereqs + \
-                        concept_grad_from_postreqs) + 2 * concept_regularization_constant * \
-                        concept_embeddings
-        else:
-            gradient_wrt_concept_embedding = None
-
-        gradient = {
-            models.STUDENT_EMBEDDINGS : gradient_wrt_student_embedding,
-            models.ASSESSMENT_EMBEDDINGS : gradient_wrt_assessment_embedding,
-            models.STUDENT_BIASES : gradient_wrt_student_biases,
-            models.ASSESSMENT_BIASES : gradient_wrt_assessment_biases,
-            models.CONCEPT_EMBEDDINGS : gradient_wrt_concept_embedding
-            }
-
-        cost_from_assessment_ixns = np.einsum('ij->', np.log(one_plus_exp_diff))
-        if using_temporal_process:
-            cost_from_temporal_process = np.einsum(
-                'ij, ij', diffs, diffs) / (2 * learning_update_variance)
-        else:
-            cost_from_temporal_process = 0
-        cost_from_student_regularization = student_regularization_constant * np.einsum(
-            'ij, ij', student_embeddings, student_embeddings)
-        if using_l1_regularizer:
-            cost_from_assessment_regularization = assessment_regularization_constant * np.absolute(
-                    assessment_embeddings).sum()
-        else:
-            cost_from_assessment_regularization = assessment_regularization_constant * np.einsum(
-                'ij, ij', assessment_embeddings, assessment_embeddings)
+    def _allocate_scratch_buffers(
+        self, d, using_lessons, using_prereqs, dtype, using_scatter_indexes,
+        scratch_buffers_of=None):
+        """
+        Allocate buffers for intermediate quantities that get reused across evaluations,
+        or take views of the scratch buffers of another shard
+        """
 
-        if using_graph_prior:
-            cost_from_concept_regularization = concept_regularization_constant * np.einsum(
-                'ij, ij', concept_embeddings, concept_embeddings)
-            cost_from_graph_regularization = graph_regularization_constant * (
-                (assessment_diffs_from_concept_centers**2).sum() + prereq_edge_diffs.sum())
+        num_assessment_ixns = self.num_assessment_ixns
+        num_lesson_ixns = self.num_lesson_ixns
+        if scratch_buffers_of is None:
+            self._scratch_buffers = []
+            def zeros(shape, buffer_dtype=dtype):
+                buf = np.zeros(shape, dtype=buffer_dtype)
+                self._scratch_buffers.append(buf)
+                return buf
         else:
-            cost_from_concept_regularization = cost_from_graph_regularization = 0
-
-        cost_from_regularization = cost_from_student_regularization + \
-                cost_from_assessment_regularization + cost_from_concept_regularization + \
-                cost_from_graph_regularization
-        cost = cost_from_assessment_ixns + cost_from_temporal_process + cost_from_regularization
-
-        return gradient, cost
-
-    return my_grads
-
-def without_scipy_with_prereqs(
-    assessment_interactions,
-    lesson_interactions,
-    learning_update_variance,
-    forgetting_penalty_terms,
-    regularization_constant,
-    graph_regularization_constant,
-    student_participation_in_assessment_ixns,
-    student_bias_participation_in_assessment_ixns,
-    assessment_participation_in_assessment_ixns,
-    curr_student_participation_in_lesson_ixns,
-    prev_student_participation_in_lesson_ixns,
-    lesson_participation_in_lesson_ixns,
-    assessment_participation_in_concepts,
-    lesson_participation_in_concepts,
-    concept_participation_in_assessments,
-    concept_participation_in_lessons,
-    prereq_edge_concept_idxes,
-    concept_participation_in_prereq_edges,
-    last_student_embedding_idx,
-    last_assessment_embedding_idx,
-    last_lesson_embedding_idx,
-    last_prereq_embedding_idx,
-    last_student_bias_idx,
-    last_assessment_bias_idx,
-    num_timesteps,
-    using_bias,
-    using_graph_prior,
-    using_l1_regularizer):
+            # buffers are requested in the order in which they were allocated for the other shard
+            self._scratch_buffers = scratch_buffers_of._scratch_buffers
+            other_buffers = iter(self._scratch_buffers)
+            zeros = lambda shape, buffer_dtype=None: next(other_buffers)[
+                :np.atleast_1d(shape)[0]]
+
+        # assessment interactions
+        self.assessment_embeddings_for_assessment_ixns = zeros((num_assessment_ixns, d))
+        self.student_embeddings_for_assessment_ixns = zeros((num_assessment_ixns, d))
+        self.assessment_embedding_norms = zeros(num_assessment_ixns)
+        self.student_dot_assessment = zeros(num_assessment_ixns)
+        self.assessment_ixn_logits = zeros(num_assessment_ixns)
+        self.assessment_ixn_costs = zeros(num_assessment_ixns)
+        self.mult_diff = zeros(num_assessment_ixns)
+        self.mult_diff_over_norms = zeros(num_assessment_ixns)
+        self.assessment_ixn_work = zeros((num_assessment_ixns, d))
+
+        # lesson interactions
+        self.curr_student_embeddings_for_lesson_ixns = zeros((num_lesson_ixns, d))
+        self.prev_student_embeddings_for_lesson_ixns = zeros((num_lesson_ixns, d))
+        self.diffs = zeros((num_lesson_ixns, d))
+        self.diffs_over_var = zeros((num_lesson_ixns, d))
+        self.lesson_ixn_work = zeros((num_lesson_ixns, d))
+        if using_lessons:
+            self.lesson_embeddings_for_lesson_ixns = zeros((num_lesson_ixns, d))
+        if using_prereqs:
+            self.prereq_embeddings_for_lesson_ixns = zeros((num_lesson_ixns, d))
+            self.prereq_embedding_norms = zeros(num_lesson_ixns)
+            self.prev_student_dot_prereq = zeros(num_lesson_ixns)
+            self.update_exp_diff = zeros(num_lesson_ixns)
+            self.update_gates = zeros(num_lesson_ixns)
+            self.update_mult_diff = zeros(num_lesson_ixns)
+
+        # flattened positions of matrix-valued scatters (see grad._ScatterIndex)
+        self.flat_idxes = zeros(
+            max(num_assessment_ixns, num_lesson_ixns) * d,
+            buffer_dtype=np.intp) if using_scatter_indexes else None
+
+
+class CostFunction(object):
+    """
+    Evaluates the cost function (i.e., the negative log-posterior) of an embedding model
+    and its gradient in a single pass
+
+    Terms are selected by the model's feature flags (lessons, prereqs, bias terms,
+    graph prior, L1 regularizer). Per-interaction intermediate quantities live in scratch
+    buffers that are allocated once, when the cost function is constructed,
+    and reused across evaluations.
+
+    Parameters are laid out in a flat vector as in param_shapes, which is what
+    scipy.optimize.minimize expects. :py:func:`grad.CostFunction.grads` provides
+    the dictionary interface expected by :py:func:`est.gradient_descent`.
+
+    With num_threads > 1, assessment and lesson interactions are split into contiguous
+    shards that are evaluated on a thread pool. The per-interaction work consists of
+    NumPy gathers, ufuncs and sparse products that release the GIL, so shards run
+    concurrently. Each shard accumulates into its own gradient buffer, and the buffers
+    are summed (also on the thread pool) before the remaining terms are added.
+    Call :py:func:`grad.CostFunction.close` to shut down the thread pool.
+
+    With dtype=np.float32, parameters, participation matrices, per-interaction arrays,
+    scratch buffers and the gradient are all single precision, which halves the memory
+    traffic of the gathers, products and scatters that dominate an evaluation.
+    Parameter vectors in other data types (e.g., the float64 iterates of L-BFGS-B) are
+    converted on entry, and :py:func:`grad.CostFunction.float64` converts the gradient
+    back for optimizers that require double precision.
+
+    Per-interaction values are added into the gradient with one of SCATTER_BACKENDS.
+    With scatter_backend='csr', they are multiplied by the sparse participation matrices
+    of :py:func:`est.compute_participation_matrices`. With scatter_backend='bincount',
+    they are summed with np.bincount on the index arrays of the interactions,
+    so no participation matrices need to be built. The bincount backend only keeps the row
+    of each interaction, and expands rows into flattened positions in a scratch buffer.
+
+    By default, scratch buffers hold intermediate quantities for every interaction,
+    i.e., several arrays of [number of interactions] X [embedding_dimension] floats.
+    With chunk_size, the interactions of each thread are split into chunks of at most
+    chunk_size assessment interactions and chunk_size lesson interactions, which are
+    evaluated one after another, and accumulate into the thread's gradient buffer.
+    Scratch buffers only hold a chunk, so their memory is set by chunk_size instead of
+    the number of interactions, and scatters only touch the rows of the gradient that
+    a chunk's interactions are added into. Per-interaction index arrays and participation
+    matrices (or scatter indexes) are still held for every interaction.
     """
-    Setup a function that will compute gradients and evaluate the cost function
-    at supplied parameter values, for a full embedding model and
-    a parameter estimation routine that uses gradient descent for optimization
 
-    :param (np.array,np.array,np.array) assessment_interactions:
-        For each assessment interaction, (student_idx, assessment_idx, outcome),
-        where outcome is -1 or 1
+    def __init__(
+        self,
+        param_shapes,
+        assessment_interactions,
+        lesson_interactions,
+        participation_matrices,
+        student_idxes_of_states,
+        learning_update_variance=0.5,
+        forgetting_penalty_terms=0,
+        regularization_constant=(1e-6, 1e-6, 1e-6, 1e-6, 1e-6),
+        graph_regularization_constant=0.1,
+        assessment_participation_in_concepts=None,
+        lesson_participation_in_concepts=None,
+        prereq_edge_concept_idxes=None,
+        concept_participation_in_prereq_edges=None,
+        using_lessons=True,
+        using_prereqs=True,
+        using_bias=True,
+        using_graph_prior=False,
+        using_l1_regularizer=False,
+        num_threads=1,
+        dtype=np.float64,
+        telemetry=None,
+        scatter_backend='csr',
+        chunk_size=None):
+        """
+        Initialize cost function object
 
-    :param (np.array,np.array,np.array) lesson_interactions:
-        For each lesson interaction, (student_idx, lesson_idx, time_since_previous_interaction)
+        :param collections.OrderedDict param_shapes:
+            A dictionary mapping a parameter's name to its shape, in the order that
+            parameters are laid out in the flattened parameter vector
 
-    :param np.array|float learning_update_variance:
-        Variance of the Gaussian learning update. If float, then the variance
-        is constant across all interactions. If np.array, then the variance is
-        different for each lesson interaction.
+        :param (np.array,np.array,np.array) assessment_interactions:
+            For each assessment interaction, (student_idx, assessment_idx, outcome),
+            where outcome is -1 or 1
 
-    :param np.array|float forgetting_penalty_terms:
-        Penalty term for the forgetting effect in the Gaussian learning update.
-        If float, then the penalty term is constant across all interactions. If
-        np.array, then the penalty is different for each lesson interaction.
+        :param (np.array,np.array,np.array) lesson_interactions:
+            For each lesson interaction, (student_idx, lesson_idx, time_since_previous_interaction)
 
-    :param (float,float,float,float,float) regularization_constant:
-        Coefficients of the regularization terms for (students, assessments,
-        lessons, prereqs, concepts)
+            If the model does not use lessons, then these are dummy lesson interactions
+            that put student embeddings in a temporal process
 
-    :param float graph_regularization_constant:
-        Coefficient of the graph regularization term
+        :param dict[str,scipy.sparse.csr_matrix|None]|None participation_matrices:
+            The output of :py:func:`est.compute_participation_matrices`
+            (only used by the csr scatter backend, and can be None otherwise)
 
-    :param scipy.sparse.csr_matrix student_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of assessment interactions] where a non-zero entry indicates that the student at a
-        specific timestep participated in the assessment interaction
+            If the model does not use prereqs, then curr_student_participation_in_lesson_ixns
+            is expected to be the difference of the participation matrices for post-update and
+            pre-update student states
 
-    :param scipy.sparse.csr_matrix student_bias_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students] X
-        [number of assessment interactions] where a non-zero entry indicates that the student
-        participated in the assessment interaction
+        :param np.array student_idxes_of_states:
+            For each row of the packed student embeddings, the index of the student
+            it belongs to, i.e., the output of models.StudentTrajectories.student_idxes_of_states
 
-    :param scipy.sparse.csr_matrix assessment_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique assessments] X
-        [number of assessment interactions] where a non-zero entry indicates that the assessment
-        participated in the assessment interaction
+        :param np.array|float learning_update_variance:
+            Variance of the Gaussian learning update. If float, then the variance
+            is constant across all interactions. If np.array, then the variance is
+            different for each lesson interaction.
 
-    :param scipy.sparse.csr_matrix curr_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the post-update student state for the lesson interaction
+        :param np.array|float forgetting_penalty_terms:
+            Penalty term for the forgetting effect in the Gaussian learning update.
+            If float, then the penalty term is constant across all interactions. If
+            np.array, then the penalty is different for each lesson interaction.
 
-    :param scipy.sparse.csr_matrix prev_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the pre-update student state for the lesson interaction
+        :param (float,float,float,float,float) regularization_constant:
+            Coefficients of the regularization terms for (students, assessments,
+            lessons, prereqs, concepts)
 
-    :param scipy.sparse.csr_matrix lesson_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique lessons] X [number of lesson interactions]
-        where a non-zero entry indicates that the lesson participated in the lesson interaction
+        :param float graph_regularization_constant:
+            Coefficient of the graph regularization term
 
-    :param scipy.sparse.csr_matrix assessment_participation_in_concepts:
-        A binary matrix of dimensions [number of unique assessments] X [number of unique concepts],
-        where an entry indicates assessment-concept association. Concept associations for a given
-        assessment sum to one, i.e., each row sums to one.
+        :param scipy.sparse.csr_matrix assessment_participation_in_concepts:
+            A matrix of dimensions [number of unique assessments] X [number of unique concepts],
+            where an entry indicates assessment-concept association. Concept associations for a
+            given assessment sum to one, i.e., each row sums to one.
 
-    :param scipy.sparse.csr_matrix lesson_participation_in_concepts:
-        A binary matrix of dimensions [number of unique lessons] X [number of unique concepts],
-        where an entry indicates lesson-concept association. Concept associations for a given
-        lesson sum to one, i.e., each row sums to one.
+        :param scipy.sparse.csr_matrix lesson_participation_in_concepts:
+            A matrix of dimensions [number of unique lessons] X [number of unique concepts],
+            where an entry indicates lesson-concept association. Concept associations for a
+            given lesson sum to one, i.e., each row sums to one.
 
-    :param scipy.sparse.csr_matrix concept_participation_in_assessments:
-        The transpose of assessment_participation_in_concepts
+        :param (np.array,np.array) prereq_edge_concept_idxes:
+            (Indices of prereq concepts, Indices of postreq concepts)
 
-    :param scipy.sparse.csr_matrix concept_participation_in_lessons:
-        The transpose of lesson_participation_in_lessons
+        :param (scipy.sparse.csr_matrix,scipy.sparse.csr_matrix) concept_participation_in_prereq_edges:
+            Binary matrices of dimensions [number of unique concepts] X [number of prereq edges],
+            where a non-zero entry indicates that the concept is the prereq (first matrix)
+            or the postreq (second matrix) in the edge
 
-    :param (np.array,np.array) prereq_edge_concept_idxes:
-        (Indices of prereq concepts, Indices of postreq concepts)
+        :param bool using_lessons: Including lessons in the embedding model
+        :param bool using_prereqs: Including lesson prereqs in the embedding model
+        :param bool using_bias: Including bias terms in the assessment result likelihood
+        :param bool using_graph_prior: Including the graph regularization term
+        :param bool using_l1_regularizer:
+            True => use L1 regularization on lesson and assessment embeddings
+            False => use L2 regularization on lesson and assessment embeddings
 
-    :param (scipy.sparse.csr_matrix,scipy.sparse.csr_matrix) concept_participation_in_prereq_edges:
-        The first binary matrix has dimensions [number of unique concepts] X
-        [number of prereq edges], where a non-zero entry indicates that the concept is the prereq
-        in the edge.
+        :param int num_threads:
+            Number of threads used to evaluate shards of interactions concurrently
 
-        The second binary matrix has the same dimensions,
-        where a non-zero entry indicates that the concept is the postreq in the edge.
+        :param type dtype: Floating-point type of parameters, gradients and intermediate
+            quantities (np.float32 or np.float64)
 
-    :param int last_student_embedding_idx:
-        Index of the last student embedding parameter in the flattened gradient
+        :param telemetry.TrainingTelemetry|None telemetry: Receives the cost, the norm of the
+            gradient w.r.t. each parameter, and the time spent in each phase (see PHASES)
+            of every evaluation (None => evaluations are not timed)
 
-    :param int last_assessment_embedding_idx:
-        Index of the last assessment embedding parameter in the flattened gradient
+        :param str scatter_backend: How per-interaction values are added into the gradient
+            (one of SCATTER_BACKENDS)
 
-    :param int last_lesson_embedding_idx:
-        Index of the last lesson embedding parameter in the flattened gradient
+        :param int|None chunk_size: Maximum number of interactions of each type
+            that a thread evaluates at once (None => evaluate all of a thread's interactions
+            at once)
+        """
 
-    :param int last_prereq_embedding_idx:
-        Index of the last prereq embedding parameter in the flattened gradient
+        if using_prereqs and not using_lessons:
+            raise ValueError('Cannot model lesson prerequisites without lesson embeddings!')
 
-    :param int last_student_bias_idx:
-        Index of the last student bias parameter in the flattened gradient
+        if num_threads < 1:
+            raise ValueError('Number of threads must be positive!')
 
-    :param int last_assessment_bias_idx:
-        Index of the last assessment bias parameter in the flattened gradient
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError('chunk_size must be positive not {}'.format(chunk_size))
+        self.chunk_size = chunk_size
 
-    :param int num_timesteps:
-        Maximum number of timesteps in a student history, i.e.,
-        the output of InteractionHistory.duration()
+        if scatter_backend not in SCATTER_BACKENDS:
+            raise ValueError('Unsupported scatter backend: {} (expected one of {})'.format(
+                scatter_backend, ', '.join(SCATTER_BACKENDS)))
+        self.scatter_backend = scatter_backend
 
-    :param bool using_bias:
-        Including bias terms in the assessment result likelihood
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError('Unsupported dtype: {}'.format(self.dtype))
 
-    :param bool using_graph_prior:
-        Including the graph regularization term
+        if scatter_backend == 'csr':
+            if participation_matrices is None:
+                raise ValueError('The csr scatter backend requires participation matrices!')
+            # participation matrices that are built in another precision are converted once
+            participation_matrices = {k: (v.astype(self.dtype, copy=False) if v is not None \
+                    else None) for k, v in participation_matrices.items()}
+            self._scatter_add = _scatter_add
+        else:
+            participation_matrices = None
+            self._scatter_add = _bincount_scatter_add
+
+        self.param_shapes = param_shapes
+        self.using_lessons = using_lessons
+        self.using_prereqs = using_prereqs
+        self.using_bias = using_bias
+        self.using_graph_prior = using_graph_prior
+        self.using_l1_regularizer = using_l1_regularizer
+
+        # dict[str,slice]
+        # parameter name -> location of parameter in flattened parameter vector
+        self.param_slices = {}
+        begin_idx = 0
+        for name, shape in param_shapes.items():
+            end_idx = begin_idx + int(np.prod(shape))
+            self.param_slices[name] = slice(begin_idx, end_idx)
+            begin_idx = end_idx
+        self.num_params = begin_idx
 
-    :param bool using_l1_regularizer:
-        True => use L1 regularization on lesson and assessment embeddings
-        False => use L2 regularization on lesson and assessment embeddings
+        (
+            self.student_idxes_for_assessment_ixns,
+            self.assessment_idxes_for_assessment_ixns,
+            outcomes_for_assessment_ixns) = assessment_interactions
+        self.outcomes = np.asarray(outcomes_for_assessment_ixns, dtype=self.dtype)
+        self.student_bias_idxes_for_assessment_ixns = student_idxes_of_states[
+            self.student_idxes_for_assessment_ixns]
 
-    :rtype: function
-    :return:
-        A function that computes gradients and evaluates the cost function
-        at supplied parameter values. See the docstring below for my_grads
-        for further details.
-    """
+        (
+            self.student_idxes_for_lesson_ixns,
+            self.lesson_idxes_for_lesson_ixns, _) = lesson_interactions
+        self.prev_student_idxes_for_lesson_ixns = self.student_idxes_for_lesson_ixns - 1
 
-    # pull regularization constants for different parameters out of tuple
-    (
-        student_regularization_constant,
-        assessment_regularization_constant,
-        lesson_regularization_constant,
-        prereq_regularization_constant,
-        concept_regularization_constant) = regularization_constant
+        as_dtype = lambda x: x if np.ndim(x) == 0 else np.asarray(x, dtype=self.dtype)
+        self.learning_update_variance = as_dtype(learning_update_variance)
+        self.forgetting_penalty_terms = as_dtype(forgetting_penalty_terms)
+        (
+            self.student_regularization_constant,
+            self.assessment_regularization_constant,
+            self.lesson_regularization_constant,
+            self.prereq_regularization_constant,
+            self.concept_regularization_constant) = regularization_constant
+        self.graph_regularization_constant = graph_regularization_constant
 
-    def my_grads(param_vals):
+        if using_graph_prior:
+            self.assessment_participation_in_concepts = assessment_participation_in_concepts
+            self.concept_participation_in_assessments = assessment_participation_in_concepts.T
+            if using_lessons:
+                self.lesson_participation_in_concepts = lesson_participation_in_concepts
+                self.concept_participation_in_lessons = lesson_participation_in_concepts.T
+            self.prereq_concept_idxes, self.postreq_concept_idxes = prereq_edge_concept_idxes
+            (
+                self.concept_participation_in_prereqs,
+                self.concept_participation_in_postreqs) = concept_participation_in_prereq_edges
+
+        # the temporal process on student embeddings only kicks in
+        # if there are (possibly dummy) lesson interactions
+        self.using_temporal_process = len(self.student_idxes_for_lesson_ixns) > 0
+
+        self.embedding_dimension = param_shapes[models.STUDENT_EMBEDDINGS][1]
+        self._gradient = np.zeros(self.num_params, dtype=self.dtype)
+        self._regularization_work = np.zeros(self.num_params, dtype=self.dtype)
+        self._init_shards(participation_matrices, num_threads)
+
+        self.telemetry = telemetry
+        if telemetry is not None:
+            for shard in self._shards:
+                shard.phase_times = dict.fromkeys(PHASES, 0.)
+
+        self.num_evaluations = 0
+
+    def _init_shards(self, participation_matrices, num_threads):
         """
-        Compute the gradient of the cost function with respect to model parameters
-
-        :param dict[str,np.ndarray] param_vals:
-            A dictionary mapping a parameter's name to its current value
+        Split assessment and lesson interactions into contiguous shards (and shards into
+        chunks if self.chunk_size is set), and start a thread pool if there is more than
+        one thread
 
-        :rtype: (dict[str,np.ndarray],float)
-        :return:
-            A dictionary mapping a parameter's name to the gradient
-            of the cost function with respect to that parameter
-            (evaluated at the supplied parameter values),
-            and the value of the cost function
-            (evaluated at the supplied parameter values)
+        :param dict[str,scipy.sparse.csr_matrix|None]|None participation_matrices:
+            Participation matrices of all interactions
+            (None => each shard builds scatter indexes for its own interactions)
         """
 
-        # pull parameters from param_vals into separate variables
-        student_embeddings = param_vals[models.STUDENT_EMBEDDINGS]
-        assessment_embeddings = param_vals[models.ASSESSMENT_EMBEDDINGS]
-        lesson_embeddings = param_vals[models.LESSON_EMBEDDINGS]
-        prereq_embeddings = param_vals[models.PREREQ_EMBEDDINGS]
-        if using_graph_prior:
-            concept_embeddings = param_vals[models.CONCEPT_EMBEDDINGS]
-
-        # split assessment interactions into students, assessments, outcomes
-        (
-            student_idxes_for_assessment_ixns,
-            assessment_idxes_for_assessment_ixns,
-            outcomes_for_assessment_ixns) = assessment_interactions
+        num_assessment_ixns = len(self.student_idxes_for_assessment_ixns)
+        num_lesson_ixns = len(self.student_idxes_for_lesson_ixns)
+        num_threads = max(1, min(num_threads, max(num_assessment_ixns, num_lesson_ixns)))
+        self.num_threads = num_threads
+
+        assessment_bounds = np.linspace(0, num_assessment_ixns, num_threads + 1).astype(int)
+        lesson_bounds = np.linspace(0, num_lesson_ixns, num_threads + 1).astype(int)
+
+        if num_threads == 1 and self.chunk_size is None:
+            # no need to copy participation matrices, or to reduce gradients
+            self._shards = [_InteractionShard(
+                self, slice(None), slice(None), participation_matrices, self._gradient)]
+            self._shard_groups = [self._shards]
+            self._pool = None
+            return
+
+        if participation_matrices is not None:
+            # slicing columns is cheap for compressed sparse column matrices
+            participation_matrices = {k: (v.tocsc() if v is not None else None) \
+                    for k, v in participation_matrices.items()}
+
+        # each thread evaluates a group of shards, i.e., its chunks of interactions,
+        # one after another
+        self._shard_groups = []
+        for thread_idx in range(num_threads):
+            thread_assessment_bounds = assessment_bounds[thread_idx:thread_idx + 2]
+            thread_lesson_bounds = lesson_bounds[thread_idx:thread_idx + 2]
+            if self.chunk_size is not None:
+                num_chunks = max(1, -(-max(np.diff(thread_assessment_bounds)[0], np.diff(
+                    thread_lesson_bounds)[0]) // self.chunk_size))
+                thread_assessment_bounds = _split_range(
+                    thread_assessment_bounds[0], thread_assessment_bounds[1], num_chunks)
+                thread_lesson_bounds = _split_range(
+                    thread_lesson_bounds[0], thread_lesson_bounds[1], num_chunks)
+
+            gradient = self._gradient if num_threads == 1 else np.zeros(
+                self.num_params, dtype=self.dtype)
+            shards = []
+            for chunk_idx in range(len(thread_assessment_bounds) - 1):
+                assessment_ixns = slice(*thread_assessment_bounds[chunk_idx:chunk_idx + 2])
+                lesson_ixns = slice(*thread_lesson_bounds[chunk_idx:chunk_idx + 2])
+                if participation_matrices is None:
+                    shard_participation_matrices = None
+                else:
+                    shard_participation_matrices = {k: _participation_in_ixns(
+                        v, assessment_ixns if k.endswith('assessment_ixns') else lesson_ixns) \
+                                for k, v in participation_matrices.items()}
+                # the first chunk is the longest, and lends its scratch buffers to the others
+                shards.append(_InteractionShard(
+                    self, assessment_ixns, lesson_ixns, shard_participation_matrices, gradient,
+                    scratch_buffers_of=shards[0] if shards else None,
+                    using_row_windows=self.chunk_size is not None))
+            self._shard_groups.append(shards)
+        self._shards = [shard for shards in self._shard_groups for shard in shards]
+
+        if num_threads == 1:
+            self._pool = None
+            return
+
+        # each thread sums a contiguous range of the shards' gradients
+        param_bounds = np.linspace(0, self.num_params, num_threads + 1).astype(int)
+        self._reduction_slices = [
+            slice(param_bounds[i], param_bounds[i + 1]) for i in range(num_threads)]
+
+        self._pool = ThreadPool(num_threads)
+
+    def close(self):
+        """
+        Shut down the thread pool used to evaluate shards of interactions
+        """
 
-        # split lesson interactions into students, lessons
-        student_idxes_for_lesson_ixns, lesson_idxes_for_lesson_ixns, _ = lesson_interactions
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
 
-        # get biases for assessment interactions
-        if using_bias:
-            student_biases = param_vals[models.STUDENT_BIASES][\
-                    student_idxes_for_assessment_ixns // num_timesteps][:, None]
-            assessment_biases = param_vals[models.ASSESSMENT_BIASES][\
-                    assessment_idxes_for_assessment_ixns][:, None]
-        else:
-            student_biases = assessment_biases = 0
-
-        # shape outcomes as a column vector
-        outcomes = outcomes_for_assessment_ixns[:, None]
+    def _unpack(self, param_vals, name):
+        """
+        :param np.ndarray param_vals: Flattened parameter vector
+        :param str name: Parameter name
+        :rtype: np.ndarray
+        :return: A view of the parameter in the flattened vector, reshaped
+        """
+        return param_vals[self.param_slices[name]].reshape(self.param_shapes[name])
 
-        # get the assessment embedding for each assessment interaction
-        assessment_embeddings_for_assessment_ixns = \
-                assessment_embeddings[assessment_idxes_for_assessment_ixns, :]
+    def __call__(self, param_vals):
+        """
+        Evaluate the cost function and its gradient
 
-        # compute the L2 norm of the assessment embedding for each assessment interaction
-        assessment_embedding_norms_for_assessment_ixns = np.linalg.norm(
-            assessment_embeddings_for_assessment_ixns, axis=1)[:, None]
+        :param np.ndarray param_vals: Flattened parameter vector
 
-        # get the student embedding for each assessment interaction
-        student_embeddings_for_assessment_ixns = \
-                student_embeddings[student_idxes_for_assessment_ixns, :]
+        :rtype: (float, np.ndarray)
+        :return: The value of the cost function and its gradient (a flattened vector),
+            evaluated at the supplied parameter values
 
-        # compute the dot product of the student embedding
-        # and assessment embedding for each interaction
-        student_dot_assessment = np.einsum(
-            'ij, ij->i',
-            student_embeddings_for_assessment_ixns,
-            assessment_embeddings_for_assessment_ixns)[:, None]
-
-        # compute intermediate quantities for the gradient that get reused
-        exp_diff = np.exp(outcomes * (
-            assessment_embedding_norms_for_assessment_ixns - student_dot_assessment / \
-                    assessment_embedding_norms_for_assessment_ixns - student_biases - \
-                    assessment_biases))
-        one_plus_exp_diff = 1 + exp_diff
-        mult_diff = outcomes * exp_diff / one_plus_exp_diff
-
-        # get lesson embeddings for lesson interactions
-        lesson_embeddings_for_lesson_ixns = lesson_embeddings[lesson_idxes_for_lesson_ixns, :]
-
-        # get lesson prereq embeddings for lesson interactions
-        prereq_embeddings_for_lesson_ixns = prereq_embeddings[lesson_idxes_for_lesson_ixns, :]
-
-        # get embeddings of student states resulting from lesson interactions
-        curr_student_embeddings_for_lesson_ixns = \
-                student_embeddings[student_idxes_for_lesson_ixns, :]
-
-        # get embeddings of student states prior to lesson interactions
-        prev_student_embeddings_for_lesson_ixns = \
-                student_embeddings[student_idxes_for_lesson_ixns - 1, :]
-
-        # compute the L2 norm of the lesson embedding for each lesson interaction
-        prereq_embedding_norms_for_lesson_ixns = np.linalg.norm(
-            prereq_embeddings_for_lesson_ixns, axis=1)[:, None]
-
-        # compute the dot product of the student embedding prior
-        # to the lesson interaction and the lesson prereq embedding,
-        # for each interaction
-        prev_student_dot_prereq = np.einsum(
-            'ij, ij->i',
-            prev_student_embeddings_for_lesson_ixns,
-            prereq_embeddings_for_lesson_ixns)[:, None]
-
-        # compute intermediate quantities for the gradient that get reused
-        update_exp_diff = np.exp(
-            prereq_embedding_norms_for_lesson_ixns - prev_student_dot_prereq / \
-                    prereq_embedding_norms_for_lesson_ixns)
-        update_one_plus_exp_diff = 1 + update_exp_diff
-        diffs = curr_student_embeddings_for_lesson_ixns - prev_student_embeddings_for_lesson_ixns \
-                - lesson_embeddings_for_lesson_ixns / update_one_plus_exp_diff + \
-                forgetting_penalty_terms
-        diffs_over_var = diffs / learning_update_variance
-        update_mult_diff = np.einsum(
-            'ij, ij->i',
-            diffs_over_var,
-            lesson_embeddings_for_lesson_ixns)[:, None] * update_exp_diff / (
-                    np.einsum(
-                        'ij, ij->ij',
-                        update_one_plus_exp_diff,
-                        update_one_plus_exp_diff) * prereq_embedding_norms_for_lesson_ixns)
+            The gradient is written to a buffer that is overwritten by the next evaluation
+        """
 
-        if using_graph_prior:
-            # get distance from an assessment embedding to its prior embedding,
-            # i.e., the weighted average of the embeddings of the assessment's
-            # governing concepts
-            assessment_diffs_from_concept_centers = assessment_embeddings - \
-                    assessment_participation_in_concepts.dot(concept_embeddings)
-
-            # get distance from a lesson embedding to its prior embedding,
-            # i.e., the weighted average of the embeddings of the lesson's
-            # governing concepts
-            lesson_diffs_from_concept_centers = lesson_embeddings - \
-                    lesson_participation_in_concepts.dot(concept_embeddings)
-
-            # grab the concept dependency graph
-            prereq_concept_idxes, postreq_concept_idxes = prereq_edge_concept_idxes
-            concept_participation_in_prereqs, concept_participation_in_postreqs = \
-                    concept_participation_in_prereq_edges
-
-            # get prereq and postreq concept embeddings
-            prereq_concept_embeddings = concept_embeddings[prereq_concept_idxes, :]
-            postreq_concept_embeddings = concept_embeddings[postreq_concept_idxes, :]
-
-            # compute column vector of L2 norms for postreq concept embeddings
-            postreq_concept_norms = np.linalg.norm(postreq_concept_embeddings, axis=1)[:, None]
-
-            # compute the dot product of the prereq concept embedding
-            # and postreq concept embedding for each edge in the concept dependency graph
-            prereq_dot_postreq = np.einsum(
-                'ij, ij->i',
-                prereq_concept_embeddings,
-                postreq_concept_embeddings)[:, None]
-
-            # intermediate quantity, useful and reusable later
-            prereq_edge_diffs = prereq_dot_postreq / postreq_concept_norms - postreq_concept_norms
-
-        # compute the gradient w.r.t. student embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        # and the gradient of the regularization terms
-        stud_grad_from_asmt_ixns = -student_participation_in_assessment_ixns.dot(
-                mult_diff / assessment_embedding_norms_for_assessment_ixns * \
-                        assessment_embeddings_for_assessment_ixns)
-        stud_grad_from_lesson_ixns = curr_student_participation_in_lesson_ixns.dot(
-            diffs_over_var) - prev_student_participation_in_lesson_ixns.dot(
-            update_mult_diff * prereq_embeddings_for_lesson_ixns + diffs_over_var)
-        stud_grad_from_norm_regularization = 2 * student_regularization_constant * \
-                student_embeddings
-        gradient_wrt_student_embedding = stud_grad_from_asmt_ixns + stud_grad_from_lesson_ixns + \
-                stud_grad_from_norm_regularization
-
-        # compute the gradient w.r.t. assessment embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        # and the gradient of the regularization terms
-        asmt_grad_from_asmt_ixns = -assessment_participation_in_assessment_ixns.dot(
-                mult_diff / assessment_embedding_norms_for_assessment_ixns * (
-                        student_embeddings_for_assessment_ixns - \
-                                assessment_embeddings_for_assessment_ixns - \
-                                student_dot_assessment / np.einsum(
-                                    'ij, ij->ij',
-                                    assessment_embedding_norms_for_assessment_ixns,
-                                    assessment_embedding_norms_for_assessment_ixns) * \
-                                            assessment_embeddings_for_assessment_ixns))
-        if using_l1_regularizer:
-            asmt_grad_from_norm_regularization = assessment_regularization_constant * np.sign(
-                    assessment_embeddings)
-        else:
-            asmt_grad_from_norm_regularization = 2 * assessment_regularization_constant * \
-                    assessment_embeddings
-        if using_graph_prior:
-            asmt_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                    assessment_diffs_from_concept_centers
-        else:
-            asmt_grad_from_graph_regularization = 0
-        gradient_wrt_assessment_embedding = asmt_grad_from_asmt_ixns + \
-                asmt_grad_from_norm_regularization + asmt_grad_from_graph_regularization
-
-        # compute the gradient w.r.t. lesson embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment and lesson interactions
-        # and the gradient of the regularization terms
-        lesson_grad_from_lesson_ixns = -lesson_participation_in_lesson_ixns.dot(
-            diffs_over_var / update_one_plus_exp_diff)
-        if using_l1_regularizer:
-            lesson_grad_from_norm_regularization = lesson_regularization_constant * np.sign(
-                    lesson_embeddings)
-        else:
-            lesson_grad_from_norm_regularization = 2 * lesson_regularization_constant * \
-                    lesson_embeddings
-        if using_graph_prior:
-            lesson_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                    lesson_diffs_from_concept_centers
-        else:
-            lesson_grad_from_graph_regularization = 0
-        gradient_wrt_lesson_embedding = lesson_grad_from_lesson_ixns + \
-                lesson_grad_from_norm_regularization + lesson_grad_from_graph_regularization
-
-        # compute the gradient w.r.t. prereq embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment and lesson interactions
-        # and the gradient of the regularization terms
-        prereq_grad_from_lesson_ixns = lesson_participation_in_lesson_ixns.dot(
-            update_mult_diff * (prev_student_dot_prereq / np.einsum(
-                'ij, ij->ij',
-                prereq_embedding_norms_for_lesson_ixns,
-                prereq_embedding_norms_for_lesson_ixns) * \
-                        prereq_embeddings_for_lesson_ixns - \
-                        prev_student_embeddings_for_lesson_ixns + \
-                        prereq_embeddings_for_lesson_ixns))
-        prereq_grad_from_norm_regularization = 2 * prereq_regularization_constant * \
-                prereq_embeddings
-        gradient_wrt_prereq_embedding = \
-                prereq_grad_from_lesson_ixns + prereq_grad_from_norm_regularization
-
-        # compute the gradient w.r.t. student biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient_wrt_student_biases = \
-                -student_bias_participation_in_assessment_ixns.dot(mult_diff)[:,0]
-
-        # compute the gradient w.r.t. assessment biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient_wrt_assessment_biases = \
-                -assessment_participation_in_assessment_ixns.dot(mult_diff)[:,0]
+        self.num_evaluations += 1
+        param_vals = np.asarray(param_vals, dtype=self.dtype)
 
-        if using_graph_prior:
-            # compute the gradient w.r.t. concept embeddings,
-            # which is the sum of gradient of the log-likelihood of assessment
-            # and lesson interactions and the gradient of the regularization terms
-            concept_grad_from_assessments = -concept_participation_in_assessments.dot(
-                2 * assessment_diffs_from_concept_centers)
-
-            concept_grad_from_lessons = concept_participation_in_lessons.dot(
-                2 * lesson_diffs_from_concept_centers)
-
-            concept_grad_from_prereqs = concept_participation_in_prereqs.dot(
-                postreq_concept_embeddings / postreq_concept_norms)
-
-            concept_grad_from_postreqs = concept_participation_in_postreqs.dot(
-                (prereq_concept_embeddings - 2 * postreq_concept_embeddings) / \
-                        postreq_concept_norms - 2 * prereq_dot_postreq * \
-                        postreq_concept_embeddings / postreq_concept_norms**3)
-
-            gradient_wrt_concept_embedding = graph_regularization_constant * (
-                concept_grad_from_assessments + concept_grad_from_lessons + \
-                        concept_grad_from_prereqs + concept_grad_from_postreqs)
+        # likelihood of assessment and lesson interactions
+        if len(self._shard_groups) == 1:
+            cost = self._shard_group_terms(self._shard_groups[0], param_vals)
+            reduce_end_time = time.time()
         else:
-            gradient_wrt_concept_embedding = None
-
-        gradient = {
-            models.STUDENT_EMBEDDINGS : gradient_wrt_student_embedding,
-            models.ASSESSMENT_EMBEDDINGS : gradient_wrt_assessment_embedding,
-            models.LESSON_EMBEDDINGS : gradient_wrt_lesson_embedding,
-            models.PREREQ_EMBEDDINGS : gradient_wrt_prereq_embedding,
-            models.STUDENT_BIASES : gradient_wrt_student_biases,
-            models.ASSESSMENT_BIASES : gradient_wrt_assessment_biases,
-            models.CONCEPT_EMBEDDINGS : gradient_wrt_concept_embedding
-            }
-
-        cost_from_assessment_ixns = np.einsum('ij->', np.log(one_plus_exp_diff))
-        cost_from_lesson_ixns = np.einsum('ij, ij', diffs, diffs) / (2 * learning_update_variance)
-
-        cost_from_student_regularization = student_regularization_constant * np.einsum(
-            'ij, ij', student_embeddings, student_embeddings)
-        if using_l1_regularizer:
-            cost_from_assessment_regularization = assessment_regularization_constant * np.absolute(
-                    assessment_embeddings).sum()
-            cost_from_lesson_regularization = lesson_regularization_constant * np.absolute(
-                    lesson_embeddings).sum()
+            if self._pool is None:
+                raise ValueError('Cannot evaluate cost function after it has been closed!')
+            cost = sum(self._pool.map(
+                lambda shards: self._shard_group_terms(shards, param_vals), self._shard_groups))
+            reduce_start_time = time.time()
+            self._pool.map(self._reduce_shard_gradients, self._reduction_slices)
+            reduce_end_time = time.time()
+
+        student_embeddings = self._unpack(param_vals, models.STUDENT_EMBEDDINGS)
+        assessment_embeddings = self._unpack(param_vals, models.ASSESSMENT_EMBEDDINGS)
+
+        gradient = self._gradient
+        work = self._regularization_work
+        student_grad = self._unpack(gradient, models.STUDENT_EMBEDDINGS)
+        assessment_grad = self._unpack(gradient, models.ASSESSMENT_EMBEDDINGS)
+
+        # norm regularization terms
+        cost += self._module_regularization_terms(
+            student_embeddings, student_grad, self._unpack(work, models.STUDENT_EMBEDDINGS),
+            self.student_regularization_constant, False)
+        cost += self._module_regularization_terms(
+            assessment_embeddings, assessment_grad,
+            self._unpack(work, models.ASSESSMENT_EMBEDDINGS),
+            self.assessment_regularization_constant, self.using_l1_regularizer)
+
+        if self.using_lessons:
+            lesson_embeddings = self._unpack(param_vals, models.LESSON_EMBEDDINGS)
+            lesson_grad = self._unpack(gradient, models.LESSON_EMBEDDINGS)
+            cost += self._module_regularization_terms(
+                lesson_embeddings, lesson_grad, self._unpack(work, models.LESSON_EMBEDDINGS),
+                self.lesson_regularization_constant, self.using_l1_regularizer)
         else:
-            cost_from_assessment_regularization = assessment_regularization_constant * np.einsum(
-                'ij, ij', assessment_embeddings, assessment_embeddings)
-            cost_from_lesson_regularization = lesson_regularization_constant * np.einsum(
-                'ij, ij', lesson_embeddings, lesson_embeddings)
-        cost_from_prereq_regularization = prereq_regularization_constant * np.einsum(
-            'ij, ij', prereq_embeddings, prereq_embeddings)
-
-        if using_graph_prior:
-            cost_from_concept_regularization = concept_regularization_constant * np.einsum(
-                'ij, ij', concept_embeddings, concept_embeddings)
-            cost_from_graph_regularization = graph_regularization_constant * ((
-                assessment_diffs_from_concept_centers**2).sum() + (
-                lesson_diffs_from_concept_centers**2).sum() + prereq_edge_diffs.sum())
-        else:
-            cost_from_concept_regularization = cost_from_graph_regularization = 0
-
-        cost_from_ixns = cost_from_assessment_ixns + cost_from_lesson_ixns
-        cost_from_regularization = cost_from_student_regularization + \
-                cost_from_assessment_regularization + cost_from_lesson_regularization + \
-                cost_from_prereq_regularization + cost_from_concept_regularization + \
-                cost_from_graph_regularization
-        cost = cost_from_ixns + cost_from_regularization
-
-        return gradient, cost
-
-    return my_grads
-
-def without_scipy_without_prereqs(
-    assessment_interactions,
-    lesson_interactions,
-    learning_update_variance,
-    forgetting_penalty_terms,
-    regularization_constant,
-    graph_regularization_constant,
-    student_participation_in_assessment_ixns,
-    student_bias_participation_in_assessment_ixns,
-    assessment_participation_in_assessment_ixns,
-    curr_student_participation_in_lesson_ixns,
-    prev_student_participation_in_lesson_ixns,
-    lesson_participation_in_lesson_ixns,
-    assessment_participation_in_concepts,
-    lesson_participation_in_concepts,
-    concept_participation_in_assessments,
-    concept_participation_in_lessons,
-    prereq_edge_concept_idxes,
-    concept_participation_in_prereq_edges,
-    last_student_embedding_idx,
-    last_assessment_embedding_idx,
-    last_lesson_embedding_idx,
-    last_prereq_embedding_idx,
-    last_student_bias_idx,
-    last_assessment_bias_idx,
-    num_timesteps,
-    using_bias,
-    using_graph_prior,
-    using_l1_regularizer):
-    """
-    Setup a function that will compute gradients and evaluate the cost function
-    at supplied parameter values, for an embedding model without prereqs and
-    a parameter estimation routine that uses gradient descent for optimization
-
-    :param (np.array,np.array,np.array) assessment_interactions:
-        For each assessment interaction, (student_idx, assessment_idx, outcome),
-        where outcome is -1 or 1
-
-    :param (np.array,np.array,np.array) lesson_interactions:
-        For each lesson interaction, (student_idx, lesson_idx, time_since_previous_interaction)
-
-    :param np.array|float learning_update_variance:
-        Variance of the Gaussian learning update. If float, then the variance
-        is constant across all interactions. If np.array, then the variance is
-        different for each lesson interaction.
-
-    :param np.array|float forgetting_penalty_terms:
-        Penalty term for the forgetting effect in the Gaussian learning update.
-        If float, then the penalty term is constant across all interactions. If
-        np.array, then the penalty is different for each lesson interaction.
-
-    :param (float,float,float,float,float) regularization_constant:
-        Coefficients of the regularization terms for (students, assessments,
-        lessons, prereqs, concepts)
-
-    :param float graph_regularization_constant:
-        Coefficient of the graph regularization term
-
-    :param scipy.sparse.csr_matrix student_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of assessment interactions] where a non-zero entry indicates that the student at a
-        specific timestep participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix student_bias_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students] X
-        [number of assessment interactions] where a non-zero entry indicates that the student
-        participated in the assessment interaction
+            lesson_embeddings = lesson_grad = None
+
+        if self.using_prereqs:
+            cost += self._module_regularization_terms(
+                self._unpack(param_vals, models.PREREQ_EMBEDDINGS),
+                self._unpack(gradient, models.PREREQ_EMBEDDINGS),
+                self._unpack(work, models.PREREQ_EMBEDDINGS),
+                self.prereq_regularization_constant, False)
+
+        if self.using_graph_prior:
+            cost += self._graph_terms(
+                self._unpack(param_vals, models.CONCEPT_EMBEDDINGS),
+                assessment_embeddings, lesson_embeddings,
+                self._unpack(gradient, models.CONCEPT_EMBEDDINGS),
+                assessment_grad, lesson_grad)
+
+        if self.telemetry is not None:
+            phase_times = dict.fromkeys(PHASES, 0.)
+            for shard in self._shards:
+                for phase in PHASES:
+                    phase_times[phase] += shard.phase_times[phase]
+                    shard.phase_times[phase] = 0.
+            if len(self._shard_groups) > 1:
+                phase_times['reduce'] = reduce_end_time - reduce_start_time
+            phase_times['regularization'] = time.time() - reduce_end_time
+            self.telemetry.record_evaluation(
+                cost,
+                {k: float(np.linalg.norm(self._unpack(gradient, k))) for k in self.param_shapes},
+                phase_times)
+
+        return cost, gradient
+
+    def float64(self, param_vals):
+        """
+        Evaluate the cost function and its gradient in double precision,
+        for optimizers like L-BFGS-B that require it
 
-    :param scipy.sparse.csr_matrix assessment_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique assessments] X
-        [number of assessment interactions] where a non-zero entry indicates that the assessment
-        participated in the assessment interaction
+        :param np.ndarray param_vals: Flattened parameter vector
+        :rtype: (float, np.ndarray)
+        :return: The value of the cost function and its gradient as a float64 vector
+            (the gradient buffer itself if dtype is float64)
+        """
 
-    :param scipy.sparse.csr_matrix curr_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the post-update student state for the lesson interaction
+        cost, gradient = self(param_vals)
+        return float(cost), gradient.astype(np.float64, copy=False)
 
-    :param scipy.sparse.csr_matrix prev_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the pre-update student state for the lesson interaction
+    def _shard_group_terms(self, shards, param_vals):
+        """
+        Evaluate the negative log-likelihood of the interactions in a group of shards
+        that share a gradient buffer, one shard after another
 
-    :param scipy.sparse.csr_matrix lesson_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique lessons] X [number of lesson interactions]
-        where a non-zero entry indicates that the lesson participated in the lesson interaction
+        :param list[_InteractionShard] shards: Shards of interactions
+        :param np.ndarray param_vals: Flattened parameter vector
+        :rtype: float
+        :return: The negative log-likelihood of the interactions in the shards
+        """
 
-    :param scipy.sparse.csr_matrix assessment_participation_in_concepts:
-        A binary matrix of dimensions [number of unique assessments] X [number of unique concepts],
-        where an entry indicates assessment-concept association. Concept associations for a given
-        assessment sum to one, i.e., each row sums to one.
+        shards[0].gradient[:] = 0
+        return sum(self._shard_terms(shard, param_vals) for shard in shards)
 
-    :param scipy.sparse.csr_matrix lesson_participation_in_concepts:
-        A binary matrix of dimensions [number of unique lessons] X [number of unique concepts],
-        where an entry indicates lesson-concept association. Concept associations for a given
-        lesson sum to one, i.e., each row sums to one.
+    def _shard_terms(self, shard, param_vals):
+        """
+        Evaluate the negative log-likelihood of the interactions in a shard,
+        and add its gradient into the shard's gradient buffer
 
-    :param scipy.sparse.csr_matrix concept_participation_in_assessments:
-        The transpose of assessment_participation_in_concepts
+        :param _InteractionShard shard: A shard of interactions
+        :param np.ndarray param_vals: Flattened parameter vector
+        :rtype: float
+        :return: The negative log-likelihood of the interactions in the shard
+        """
 
-    :param scipy.sparse.csr_matrix concept_participation_in_lessons:
-        The transpose of lesson_participation_in_lessons
+        if shard.phase_times is not None:
+            start_time = time.time()
+            gather_time = shard.phase_times['gather']
+            scatter_time = shard.phase_times['scatter']
 
-    :param (np.array,np.array) prereq_edge_concept_idxes:
-        (Indices of prereq concepts, Indices of postreq concepts)
+        gradient = shard.gradient
 
-    :param (scipy.sparse.csr_matrix,scipy.sparse.csr_matrix) concept_participation_in_prereq_edges:
-        The first binary matrix has dimensions [number of unique concepts] X
-        [number of prereq edges], where a non-zero entry indicates that the concept is the prereq
-        in the edge.
+        student_embeddings = self._unpack(param_vals, models.STUDENT_EMBEDDINGS)
+        student_grad = self._unpack(gradient, models.STUDENT_EMBEDDINGS)
 
-        The second binary matrix has the same dimensions,
-        where a non-zero entry indicates that the concept is the postreq in the edge.
+        cost = 0.
+        if shard.num_assessment_ixns > 0:
+            if self.using_bias:
+                student_biases = self._unpack(param_vals, models.STUDENT_BIASES)
+                assessment_biases = self._unpack(param_vals, models.ASSESSMENT_BIASES)
+            else:
+                student_biases = assessment_biases = None
+            cost += self._assessment_ixn_terms(
+                shard,
+                student_embeddings,
+                self._unpack(param_vals, models.ASSESSMENT_EMBEDDINGS),
+                student_biases,
+                assessment_biases,
+                student_grad,
+                self._unpack(gradient, models.ASSESSMENT_EMBEDDINGS),
+                self._unpack(gradient, models.STUDENT_BIASES),
+                self._unpack(gradient, models.ASSESSMENT_BIASES))
+
+        # likelihood of lesson interactions (or the temporal process on student embeddings)
+        if shard.num_lesson_ixns > 0:
+            if self.using_lessons:
+                lesson_embeddings = self._unpack(param_vals, models.LESSON_EMBEDDINGS)
+                lesson_grad = self._unpack(gradient, models.LESSON_EMBEDDINGS)
+            else:
+                lesson_embeddings = lesson_grad = None
+            if self.using_prereqs:
+                prereq_embeddings = self._unpack(param_vals, models.PREREQ_EMBEDDINGS)
+                prereq_grad = self._unpack(gradient, models.PREREQ_EMBEDDINGS)
+            else:
+                prereq_embeddings = prereq_grad = None
+            cost += self._lesson_ixn_terms(
+                shard, student_embeddings, lesson_embeddings, prereq_embeddings,
+                student_grad, lesson_grad, prereq_grad)
 
-    :param int last_student_embedding_idx:
-        Index of the last student embedding parameter in the flattened gradient
+        if shard.phase_times is not None:
+            # everything but gathers and scatters is elementwise arithmetic
+            shard.phase_times['elementwise'] += time.time() - start_time - (
+                shard.phase_times['gather'] - gather_time) - (
+                shard.phase_times['scatter'] - scatter_time)
 
-    :param int last_assessment_embedding_idx:
-        Index of the last assessment embedding parameter in the flattened gradient
+        return cost
 
-    :param int last_lesson_embedding_idx:
-        Index of the last lesson embedding parameter in the flattened gradient
+    def _gather(self, shard, x, idxes, out):
+        """
+        Gather rows of x into out, i.e., out = x[idxes]
 
-    :param int last_prereq_embedding_idx:
-        Index of the last prereq embedding parameter in the flattened gradient
+        :param _InteractionShard shard: The shard that the rows are gathered for
+        """
 
-    :param int last_student_bias_idx:
-        Index of the last student bias parameter in the flattened gradient
+        if shard.phase_times is None:
+            np.take(x, idxes, axis=0, out=out)
+            return
+        start_time = time.time()
+        np.take(x, idxes, axis=0, out=out)
+        shard.phase_times['gather'] += time.time() - start_time
 
-    :param int last_assessment_bias_idx:
-        Index of the last assessment bias parameter in the flattened gradient
+    def _scatter(self, shard, participation_matrix, vals, out):
+        """
+        Add per-interaction values into rows of out with the scatter backend
+        (see :py:func:`grad._scatter_add` and :py:func:`grad._bincount_scatter_add`)
 
-    :param int num_timesteps:
-        Maximum number of timesteps in a student history, i.e.,
-        the output of InteractionHistory.duration()
+        :param _InteractionShard shard: The shard that the values belong to
+        """
 
-    :param bool using_bias:
-        Including bias terms in the assessment result likelihood
+        if isinstance(participation_matrix, _RowWindow):
+            out = out[participation_matrix.rows]
+            participation_matrix = participation_matrix.participation
 
-    :param bool using_graph_prior:
-        Including the graph regularization term
+        if shard.phase_times is None:
+            self._scatter_add(participation_matrix, vals, out)
+            return
+        start_time = time.time()
+        self._scatter_add(participation_matrix, vals, out)
+        shard.phase_times['scatter'] += time.time() - start_time
 
-    :param bool using_l1_regularizer:
-        True => use L1 regularization on lesson and assessment embeddings
-        False => use L2 regularization on lesson and assessment embeddings
+    def _reduce_shard_gradients(self, params):
+        """
+        Sum a range of the shards' gradients into the gradient buffer
 
-    :rtype: function
-    :return:
-        A function that computes gradients and evaluates the cost function
-        at supplied parameter values. See the docstring below for my_grads
-        for further details.
-    """
+        :param slice params: Range of the flattened parameter vector
+        """
 
-    # pull regularization constants for different parameters out of tuple
-    (
-        student_regularization_constant,
-        assessment_regularization_constant,
-        lesson_regularization_constant,
-        prereq_regularization_constant,
-        concept_regularization_constant) = regularization_constant
+        out = self._gradient[params]
+        np.copyto(out, self._shard_groups[0][0].gradient[params])
+        for shards in self._shard_groups[1:]:
+            out += shards[0].gradient[params]
 
-    def my_grads(param_vals):
+    def grads(self, params):
         """
-        Compute the gradient of the cost function with respect to model parameters
+        Evaluate the cost function and its gradient, with parameters stored in a dictionary
 
-        :param dict[str,np.ndarray] param_vals:
+        :param dict[str,np.ndarray] params:
             A dictionary mapping a parameter's name to its current value
 
-        :rtype: (dict[str,np.ndarray],float)
+        :rtype: (dict[str,np.ndarray], float)
         :return:
             A dictionary mapping a parameter's name to the gradient
             of the cost function with respect to that parameter
-            (evaluated at the supplied parameter values),
-            and the value of the cost function
+            (evaluated at the supplied parameter values), and the value of the cost function
             (evaluated at the supplied parameter values)
         """
 
-        # pull parameters from param_vals into separate variables
-        student_embeddings = param_vals[models.STUDENT_EMBEDDINGS]
-        assessment_embeddings = param_vals[models.ASSESSMENT_EMBEDDINGS]
-        lesson_embeddings = param_vals[models.LESSON_EMBEDDINGS]
-        if using_graph_prior:
-            concept_embeddings = param_vals[models.CONCEPT_EMBEDDINGS]
+        param_vals = np.concatenate([params[k].ravel() for k in self.param_shapes])
+        cost, gradient = self(param_vals)
+        gradient = {k: self._unpack(gradient, k).copy() for k in self.param_shapes}
+        return gradient, cost
 
-        # split assessment interactions into students, assessments, outcomes
-        (
-            student_idxes_for_assessment_ixns,
-            assessment_idxes_for_assessment_ixns,
-            outcomes_for_assessment_ixns) = assessment_interactions
+    def _module_regularization_terms(
+        self, embeddings, grad, work, regularization_constant, using_l1):
+        """
+        Add the gradient of the norm regularization term for embeddings to grad
 
-        # split lesson interactions into students, lessons
-        student_idxes_for_lesson_ixns, lesson_idxes_for_lesson_ixns, _ = lesson_interactions
+        :param np.ndarray work: Scratch buffer with the same shape as embeddings
+        :rtype: float
+        :return: The value of the regularization term
+        """
 
-        # get biases for assessment interactions
-        if using_bias:
-            student_biases = param_vals[models.STUDENT_BIASES][\
-                    student_idxes_for_assessment_ixns // num_timesteps][:, None]
-            assessment_biases = param_vals[models.ASSESSMENT_BIASES][\
-                    assessment_idxes_for_assessment_ixns][:, None]
+        if using_l1:
+            np.sign(embeddings, out=work)
+            work *= regularization_constant
+            grad += work
+            return regularization_constant * np.absolute(embeddings).sum()
         else:
-            student_biases = assessment_biases = 0
-
-        # shape outcomes as a column vector
-        outcomes = outcomes_for_assessment_ixns[:, None]
-
-        # get the assessment embedding for each assessment interaction
-        assessment_embeddings_for_assessment_ixns = \
-                assessment_embeddings[assessment_idxes_for_assessment_ixns, :]
-
-        # compute the L2 norm of the assessment embedding for each assessment interaction
-        assessment_embedding_norms_for_assessment_ixns = np.linalg.norm(
-            assessment_embeddings_for_assessment_ixns, axis=1)[:, None]
+            np.multiply(embeddings, 2 * regularization_constant, out=work)
+            grad += work
+            return regularization_constant * np.einsum('ij, ij', embeddings, embeddings)
+
+    def _assessment_ixn_terms(
+        self,
+        shard,
+        student_embeddings,
+        assessment_embeddings,
+        student_biases,
+        assessment_biases,
+        student_grad,
+        assessment_grad,
+        student_bias_grad,
+        assessment_bias_grad):
+        """
+        Add the gradient of the negative log-likelihood of the assessment interactions in a shard
+        to the gradients w.r.t. student embeddings, assessment embeddings and bias terms
 
-        # get the student embedding for each assessment interaction
-        student_embeddings_for_assessment_ixns = \
-                student_embeddings[student_idxes_for_assessment_ixns, :]
+        :rtype: float
+        :return: The negative log-likelihood of assessment interactions
+        """
 
-        # compute the dot product of the student embedding
-        # and assessment embedding for each interaction
-        student_dot_assessment = np.einsum(
-            'ij, ij->i',
+        outcomes = shard.outcomes
+        assessment_embeddings_for_assessment_ixns = shard.assessment_embeddings_for_assessment_ixns
+        student_embeddings_for_assessment_ixns = shard.student_embeddings_for_assessment_ixns
+        norms = shard.assessment_embedding_norms
+        student_dot_assessment = shard.student_dot_assessment
+        logits = shard.assessment_ixn_logits
+        mult_diff = shard.mult_diff
+        mult_diff_over_norms = shard.mult_diff_over_norms
+        work = shard.assessment_ixn_work
+
+        # get the assessment and student embeddings for each assessment interaction
+        self._gather(
+            shard, assessment_embeddings, shard.assessment_idxes_for_assessment_ixns,
+            assessment_embeddings_for_assessment_ixns)
+        self._gather(
+            shard, student_embeddings, shard.student_idxes_for_assessment_ixns,
+            student_embeddings_for_assessment_ixns)
+
+        # compute the L2 norm of the assessment embedding, and the dot product
+        # of the student embedding and assessment embedding, for each interaction
+        np.sqrt(_rowwise_dot(
+            assessment_embeddings_for_assessment_ixns,
+            assessment_embeddings_for_assessment_ixns,
+            norms), out=norms)
+        _rowwise_dot(
             student_embeddings_for_assessment_ixns,
-            assessment_embeddings_for_assessment_ixns)[:, None]
-
-        # compute intermediate quantities for the gradient that get reused
-        exp_diff = np.exp(outcomes * (
-            assessment_embedding_norms_for_assessment_ixns - student_dot_assessment / \
-                    assessment_embedding_norms_for_assessment_ixns - student_biases - \
-                    assessment_biases))
-        one_plus_exp_diff = 1 + exp_diff
-        mult_diff = outcomes * exp_diff / one_plus_exp_diff
-
-        # get lesson embeddings for lesson interactions
-        lesson_embeddings_for_lesson_ixns = lesson_embeddings[lesson_idxes_for_lesson_ixns, :]
-
-        # get embeddings of student states resulting from lesson interactions
-        curr_student_embeddings_for_lesson_ixns = \
-                student_embeddings[student_idxes_for_lesson_ixns, :]
-
-        # get embeddings of student states prior to lesson interactions
-        prev_student_embeddings_for_lesson_ixns = \
-                student_embeddings[student_idxes_for_lesson_ixns - 1, :]
-
-        # compute intermediate quantities for the gradient that get reused
-        diffs = curr_student_embeddings_for_lesson_ixns - prev_student_embeddings_for_lesson_ixns \
-                - lesson_embeddings_for_lesson_ixns + forgetting_penalty_terms
-        diffs_over_var = diffs / learning_update_variance
-
-        if using_graph_prior:
-            # get distance from an assessment embedding to its prior embedding,
-            # i.e., the weighted average of the embeddings of the assessment's
-            # governing concepts
-            assessment_diffs_from_concept_centers = assessment_embeddings - \
-                    assessment_participation_in_concepts.dot(concept_embeddings)
-
-            # get distance from a lesson embedding to its prior embedding,
-            # i.e., the weighted average of the embeddings of the lesson's
-            # governing concepts
-            lesson_diffs_from_concept_centers = lesson_embeddings - \
-                    lesson_participation_in_concepts.dot(concept_embeddings)
-
-            # grab the concept dependency graph
-            prereq_concept_idxes, postreq_concept_idxes = prereq_edge_concept_idxes
-            concept_participation_in_prereqs, concept_participation_in_postreqs = \
-                    concept_participation_in_prereq_edges
-
-            # get prereq and postreq concept embeddings
-            prereq_concept_embeddings = concept_embeddings[prereq_concept_idxes, :]
-            postreq_concept_embeddings = concept_embeddings[postreq_concept_idxes, :]
-
-            # compute column vector of L2 norms for postreq concept embeddings
-            postreq_concept_norms = np.linalg.norm(postreq_concept_embeddings, axis=1)[:, None]
-
-            # compute the dot product of the prereq concept embedding
-            # and postreq concept embedding for each edge in the concept dependency graph
-            prereq_dot_postreq = np.einsum(
-                'ij, ij->i',
-                prereq_concept_embeddings,
-                postreq_concept_embeddings)[:, None]
-
-            # intermediate quantity, useful and reusable later
-            prereq_edge_diffs = prereq_dot_postreq / postreq_concept_norms - postreq_concept_norms
-
-        # compute the gradient w.r.t. student embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        # and the gradient of the regularization terms
-        stud_grad_from_asmt_ixns = -student_participation_in_assessment_ixns.dot(
-            mult_diff / assessment_embedding_norms_for_assessment_ixns * \
-                    assessment_embeddings_for_assessment_ixns)
-        stud_grad_from_lesson_ixns = curr_student_participation_in_lesson_ixns.dot(diffs_over_var)
-        stud_grad_from_norm_regularization = 2 * student_regularization_constant * \
-                student_embeddings
-        gradient_wrt_student_embedding = stud_grad_from_asmt_ixns + stud_grad_from_lesson_ixns + \
-                stud_grad_from_norm_regularization
-
-        # compute the gradient w.r.t. assessment embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        # and the gradient of the regularization terms
-        asmt_grad_from_asmt_ixns = -assessment_participation_in_assessment_ixns.dot(
-                mult_diff / assessment_embedding_norms_for_assessment_ixns * (
-                    student_embeddings_for_assessment_ixns - \
-                            assessment_embeddings_for_assessment_ixns - student_dot_assessment / \
-                            np.einsum(
-                                'ij, ij->ij',
-                                assessment_embedding_norms_for_assessment_ixns,
-                                assessment_embedding_norms_for_assessment_ixns) * \
-                                        assessment_embeddings_for_assessment_ixns))
-        if using_l1_regularizer:
-            asmt_grad_from_norm_regularization = assessment_regularization_constant * np.sign(
-                    assessment_embeddings)
-        else:
-            asmt_grad_from_norm_regularization = 2 * assessment_regularization_constant * \
-                    assessment_embeddings
-        if using_graph_prior:
-            asmt_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                    assessment_diffs_from_concept_centers
-        else:
-            asmt_grad_from_graph_regularization = 0
-        gradient_wrt_assessment_embedding = asmt_grad_from_asmt_ixns + \
-                asmt_grad_from_norm_regularization + asmt_grad_from_graph_regularization
-
-        # compute the gradient w.r.t. lesson embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment and lesson interactions
-        # and the gradient of the regularization terms
-        lesson_grad_from_lesson_ixns = -lesson_participation_in_lesson_ixns.dot(diffs_over_var)
-        if using_l1_regularizer:
-            lesson_grad_from_norm_regularization = lesson_regularization_constant * np.sign(
-                    lesson_embeddings)
-        else:
-            lesson_grad_from_norm_regularization = 2 * lesson_regularization_constant * \
-                    lesson_embeddings
-        if using_graph_prior:
-            lesson_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                    lesson_diffs_from_concept_centers
-        else:
-            lesson_grad_from_graph_regularization = 0
-        gradient_wrt_lesson_embedding = lesson_grad_from_lesson_ixns + \
-                lesson_grad_from_norm_regularization + lesson_grad_from_graph_regularization
-
-        # compute the gradient w.r.t. student biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient_wrt_student_biases = \
-                -student_bias_participation_in_assessment_ixns.dot(mult_diff)[:,0]
-
-        # compute the gradient w.r.t. assessment biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient_wrt_assessment_biases = \
-                -assessment_participation_in_assessment_ixns.dot(mult_diff)[:,0]
-
-        if using_graph_prior:
-            # compute the gradient w.r.t. concept embeddings,
-            # which is the sum of gradient of the log-likelihood of assessment
-            # and lesson interactions and the gradient of the regularization terms
-            concept_grad_from_assessments = -concept_participation_in_assessments.dot(
-                2 * assessment_diffs_from_concept_centers)
-
-            concept_grad_from_lessons = concept_participation_in_lessons.dot(
-                2 * lesson_diffs_from_concept_centers)
-
-            concept_grad_from_prereqs = concept_participation_in_prereqs.dot(
-                postreq_concept_embeddings / postreq_concept_norms)
-
-            concept_grad_from_postreqs = concept_participation_in_postreqs.dot(
-                (prereq_concept_embeddings - 2 * postreq_concept_embeddings) / \
-                        postreq_concept_norms - 2 * prereq_dot_postreq * \
-                        postreq_concept_embeddings / postreq_concept_norms**3)
-
-            gradient_wrt_concept_embedding = graph_regularization_constant * (
-                concept_grad_from_assessments + concept_grad_from_lessons + \
-                        concept_grad_from_prereqs + concept_grad_from_postreqs)
-        else:
-            gradient_wrt_concept_embedding = None
-
-        gradient = {
-            models.STUDENT_EMBEDDINGS : gradient_wrt_student_embedding,
-            models.ASSESSMENT_EMBEDDINGS : gradient_wrt_assessment_embedding,
-            models.LESSON_EMBEDDINGS : gradient_wrt_lesson_embedding,
-            models.STUDENT_BIASES : gradient_wrt_student_biases,
-            models.ASSESSMENT_BIASES : gradient_wrt_assessment_biases,
-            models.CONCEPT_EMBEDDINGS : gradient_wrt_concept_embedding
-            }
-
-        cost_from_assessment_ixns = np.einsum('ij->', np.log(one_plus_exp_diff))
-        cost_from_lesson_ixns = np.einsum('ij, ij', diffs, diffs) / (2 * learning_update_variance)
-
-        cost_from_student_regularization = student_regularization_constant * np.einsum(
-            'ij, ij', student_embeddings, student_embeddings)
-        if using_l1_regularizer:
-            cost_from_assessment_regularization = assessment_regularization_constant * np.absolute(
-                    assessment_embeddings).sum()
-            cost_from_lesson_regularization = lesson_regularization_constant * np.absolute(
-                    lesson_embeddings).sum()
-        else:
-            cost_from_assessment_regularization = assessment_regularization_constant * np.einsum(
-                'ij, ij', assessment_embeddings, assessment_embeddings)
-            cost_from_lesson_regularization = lesson_regularization_constant * np.einsum(
-                'ij, ij', lesson_embeddings, lesson_embeddings)
-
-        if using_graph_prior:
-            cost_from_concept_regularization = concept_regularization_constant * np.einsum(
-                'ij, ij', concept_embeddings, concept_embeddings)
-            cost_from_graph_regularization = graph_regularization_constant * ((
-                assessment_diffs_from_concept_centers**2).sum() + (
-                lesson_diffs_from_concept_centers**2).sum() + prereq_edge_diffs.sum())
-        else:
-            cost_from_concept_regularization = cost_from_graph_regularization = 0
-
-        cost_from_ixns = cost_from_assessment_ixns + cost_from_lesson_ixns
-        cost_from_regularization = cost_from_student_regularization + \
-                cost_from_assessment_regularization + cost_from_lesson_regularization + \
-                cost_from_concept_regularization + cost_from_graph_regularization
-        cost = cost_from_ixns + cost_from_regularization
-
-        return gradient, cost
-
-    return my_grads
-
-def with_scipy_without_lessons(
-    param_vals,
-    param_shapes,
-    assessment_interactions,
-    lesson_interactions,
-    learning_update_variance,
-    forgetting_penalty_terms,
-    regularization_constant,
-    graph_regularization_constant,
-    student_participation_in_assessment_ixns,
-    student_bias_participation_in_assessment_ixns,
-    assessment_participation_in_assessment_ixns,
-    curr_student_participation_in_lesson_ixns,
-    prev_student_participation_in_lesson_ixns,
-    lesson_participation_in_lesson_ixns,
-    assessment_participation_in_concepts,
-    lesson_participation_in_concepts,
-    concept_participation_in_assessments,
-    concept_participation_in_lessons,
-    prereq_edge_concept_idxes,
-    concept_participation_in_prereq_edges,
-    last_student_embedding_idx,
-    last_assessment_embedding_idx,
-    last_lesson_embedding_idx,
-    last_prereq_embedding_idx,
-    last_student_bias_idx,
-    last_assessment_bias_idx,
-    num_timesteps,
-    using_bias,
-    using_graph_prior,
-    using_l1_regularizer,
-    gradient):
-    """
-    Compute the gradient of the cost function with respect to model parameters
-
-    :param np.array param_vals:
-        Flattened, concatenated parameter values
-
-    :param dict[str,tuple] param_shapes:
-        A dictionary mapping a parameter's name to the shape of its np.ndarray
-
-    :param (np.array,np.array,np.array) assessment_interactions:
-        For each assessment interaction, (student_idx, assessment_idx, outcome),
-        where outcome is -1 or 1
-
-    :param (np.array,np.array,np.array) lesson_interactions:
-        For each lesson interaction, (student_idx, lesson_idx, time_since_previous_interaction)
-
-    :param np.array|float learning_update_variance:
-        Variance of the Gaussian learning update. If float, then the variance
-        is constant across all interactions. If np.array, then the variance is
-        different for each lesson interaction.
-
-    :param np.array|float forgetting_penalty_terms:
-        Penalty term for the forgetting effect in the Gaussian learning update.
-        If float, then the penalty term is constant across all interactions. If
-        np.array, then the penalty is different for each lesson interaction.
-
-    :param (float,float,float,float,float) regularization_constant:
-        Coefficients of the regularization terms for (students, assessments,
-        lessons, prereqs, concepts)
-
-    :param float graph_regularization_constant:
-        Coefficient of the graph regularization term
-
-    :param scipy.sparse.csr_matrix student_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of assessment interactions] where a non-zero entry indicates that the student at a
-        specific timestep participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix student_bias_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students] X
-        [number of assessment interactions] where a non-zero entry indicates that the student
-        participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix assessment_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique assessments] X
-        [number of assessment interactions] where a non-zero entry indicates that the assessment
-        participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix curr_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the post-update student state for the lesson interaction
-
-    :param scipy.sparse.csr_matrix prev_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the pre-update student state for the lesson interaction
-
-    :param scipy.sparse.csr_matrix lesson_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique lessons] X [number of lesson interactions]
-        where a non-zero entry indicates that the lesson participated in the lesson interaction
-
-    :param scipy.sparse.csr_matrix assessment_participation_in_concepts:
-        A binary matrix of dimensions [number of unique assessments] X [number of unique concepts],
-        where an entry indicates assessment-concept association. Concept associations for a given
-        assessment sum to one, i.e., each row sums to one.
-
-    :param scipy.sparse.csr_matrix lesson_participation_in_concepts:
-        A binary matrix of dimensions [number of unique lessons] X [number of unique concepts],
-        where an entry indicates lesson-concept association. Concept associations for a given
-        lesson sum to one, i.e., each row sums to one.
-
-    :param scipy.sparse.csr_matrix concept_participation_in_assessments:
-        The transpose of assessment_participation_in_concepts
-
-    :param scipy.sparse.csr_matrix concept_participation_in_lessons:
-        The transpose of lesson_participation_in_lessons
-
-    :param (np.array,np.array) prereq_edge_concept_idxes:
-        (Indices of prereq concepts, Indices of postreq concepts)
-
-    :param (scipy.sparse.csr_matrix,scipy.sparse.csr_matrix) concept_participation_in_prereq_edges:
-        The first binary matrix has dimensions [number of unique concepts] X
-        [number of prereq edges], where a non-zero entry indicates that the concept is the prereq
-        in the edge.
-
-        The second binary matrix has the same dimensions,
-        where a non-zero entry indicates that the concept is the postreq in the edge.
-
-    :param int last_student_embedding_idx:
-        Index of the last student embedding parameter in the flattened gradient
-
-    :param int last_assessment_embedding_idx:
-        Index of the last assessment embedding parameter in the flattened gradient
-
-    :param int last_lesson_embedding_idx:
-        Index of the last lesson embedding parameter in the flattened gradient
-
-    :param int last_prereq_embedding_idx:
-        Index of the last prereq embedding parameter in the flattened gradient
-
-    :param int last_student_bias_idx:
-        Index of the last student bias parameter in the flattened gradient
-
-    :param int last_assessment_bias_idx:
-        Index of the last assessment bias parameter in the flattened gradient
-
-    :param int num_timesteps:
-        Maximum number of timesteps in a student history, i.e.,
-        the output of InteractionHistory.duration()
-
-    :param bool using_bias:
-        Including bias terms in the assessment result likelihood
-
-    :param bool using_graph_prior:
-        Including the graph regularization term
-
-    :param bool using_l1_regularizer:
-        True => use L1 regularization on lesson and assessment embeddings
-        False => use L1 regularization on lesson and assessment embeddings
-
-    :param np.array gradient:
-        Placeholder for the flattened gradient
-
-    :rtype: (float,np.array)
-    :return:
-        The value of the cost function
-        (evaluated at the supplied parameter values),
-        and the flattened gradient of the cost function
-        (evaluated at the supplied parameter values)
-    """
-
-    # pull regularization constants for different parameters out of tuple
-    (
-        student_regularization_constant,
-        assessment_regularization_constant,
-        lesson_regularization_constant,
-        prereq_regularization_constant,
-        concept_regularization_constant) = regularization_constant
-    
-    # reshape flattened student embeddings into tensor
-    student_embeddings = np.reshape(
-        param_vals[:last_student_embedding_idx],
-        param_shapes[models.STUDENT_EMBEDDINGS])
-
-    # reshape flattened assessment embeddings into matrix
-    assessment_embeddings = np.reshape(
-        param_vals[last_student_embedding_idx:last_assessment_embedding_idx],
-        param_shapes[models.ASSESSMENT_EMBEDDINGS])
-
-    if using_graph_prior:
-        # reshape flattened concept embeddings into matrix
-        concept_embeddings = np.reshape(
-            param_vals[last_assessment_bias_idx:],
-            param_shapes[models.CONCEPT_EMBEDDINGS])
-
-    # split assessment interactions into students, assessments, outcomes
-    (
-        student_idxes_for_assessment_ixns,
-        assessment_idxes_for_assessment_ixns,
-        outcomes_for_assessment_ixns) = assessment_interactions
-
-    # use dummy lesson interactions to get students in temporal process
-    student_idxes_for_temporal_process, _, _ = lesson_interactions
-
-    if not using_bias:
-        # zero out bias terms, so that they definitely have no effect
-        # on the gradient or cost here. this should be done in addition to
-        # imposing (0, 0) bounds in the call to scipy.optimize.minimize in est.
-        param_vals[last_assessment_embedding_idx:last_assessment_bias_idx] = 0
-
-    # get biases for assessment interactions
-    student_biases = np.reshape(
-        param_vals[last_assessment_embedding_idx:last_student_bias_idx],
-        param_shapes[models.STUDENT_BIASES])[(
-        student_idxes_for_assessment_ixns // num_timesteps)][:, None]
-    assessment_biases = np.reshape(
-        param_vals[last_student_bias_idx:last_assessment_bias_idx],
-        param_shapes[models.ASSESSMENT_BIASES])[(
-        assessment_idxes_for_assessment_ixns)][:, None]
-
-    # shape outcomes as a column vector
-    outcomes = outcomes_for_assessment_ixns[:, None]
-
-    # get the assessment embedding for each assessment interaction
-    assessment_embeddings_for_assessment_ixns = assessment_embeddings[\
-            assessment_idxes_for_assessment_ixns, :]
-
-    # compute the L2 norm of the assessment embedding for each assessment interaction
-    assessment_embedding_norms_for_assessment_ixns = np.linalg.norm(
-        assessment_embeddings_for_assessment_ixns, axis=1)[:, None]
-
-    # get the student embedding for each assessment interaction
-    student_embeddings_for_assessment_ixns = (
-        student_embeddings[student_idxes_for_assessment_ixns, :])
-
-    # compute the dot product of the student embedding
-    # and assessment embedding for each interaction
-    student_dot_assessment = np.einsum(
-        'ij, ij->i',
-        student_embeddings_for_assessment_ixns,
-        assessment_embeddings_for_assessment_ixns)[:, None]
-
-    # compute intermediate quantities for the gradient that get reused
-    exp_diff = np.exp(outcomes * (
-        assessment_embedding_norms_for_assessment_ixns - student_dot_assessment / \
-                assessment_embedding_norms_for_assessment_ixns - student_biases - \
-                assessment_biases))
-    one_plus_exp_diff = 1 + exp_diff
-    mult_diff = outcomes * exp_diff / one_plus_exp_diff
-
-    using_temporal_process = len(student_idxes_for_temporal_process) > 0
-    if using_temporal_process:
-        # get embeddings of student states resulting from lesson interactions
-        curr_student_embeddings_for_lesson_ixns = \
-                student_embeddings[student_idxes_for_temporal_process, :]
-
-        # get embeddings of student states prior to lesson interactions
-        prev_student_embeddings_for_lesson_ixns = \
-                student_embeddings[student_idxes_for_temporal_process - 1, :]
-
-        # compute intermediate quantities for the gradient that get reused
-        diffs = curr_student_embeddings_for_lesson_ixns - prev_student_embeddings_for_lesson_ixns \
-                + forgetting_penalty_terms
-        diffs_over_var = diffs / learning_update_variance
-    else:
-        diffs = diffs_over_var = 0
-
-    if using_graph_prior:
-        # get distance from an assessment embedding to its prior embedding,
-        # i.e., the weighted average of the embeddings of the assessment's
-        # governing concepts
-        assessment_diffs_from_concept_centers = assessment_embeddings - \
-                assessment_participation_in_concepts.dot(concept_embeddings)
-
-        # grab the concept dependency graph
-        prereq_concept_idxes, postreq_concept_idxes = prereq_edge_concept_idxes
-        (
-            concept_participation_in_prereqs,
-            concept_participation_in_postreqs) = concept_participation_in_prereq_edges
-
-        # get prereq and postreq concept embeddings
-        prereq_concept_embeddings = concept_embeddings[prereq_concept_idxes, :]
-        postreq_concept_embeddings = concept_embeddings[postreq_concept_idxes, :]
-
-        postreq_concept_norms = np.linalg.norm(postreq_concept_embeddings, axis=1)[:, None]
-        prereq_dot_postreq = np.einsum(
-            'ij, ij->i',
-            prereq_concept_embeddings,
-            postreq_concept_embeddings)[:, None]
-
-        # intermediate quantity, useful later
-        prereq_edge_diffs = prereq_dot_postreq / postreq_concept_norms - postreq_concept_norms
-
-    # compute the gradient w.r.t. student embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment interactions
-    # and the gradient of the regularization terms
-    stud_grad_from_asmt_ixns = -student_participation_in_assessment_ixns.dot(
-        mult_diff / assessment_embedding_norms_for_assessment_ixns * \
-                assessment_embeddings_for_assessment_ixns)
-    if using_temporal_process:
-        stud_grad_from_temporal_process = curr_student_participation_in_lesson_ixns.dot(
-                diffs_over_var)
-    else:
-        stud_grad_from_temporal_process = 0
-    stud_grad_from_norm_regularization = 2 * student_regularization_constant * student_embeddings
-    gradient[:last_student_embedding_idx] = (
-        stud_grad_from_asmt_ixns + stud_grad_from_temporal_process + \
-                stud_grad_from_norm_regularization).ravel()
-
-    # compute the gradient w.r.t. assessment embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment interactions
-    # and the gradient of the regularization terms
-    asmt_grad_from_asmt_ixns = -assessment_participation_in_assessment_ixns.dot(
-            mult_diff / assessment_embedding_norms_for_assessment_ixns * (
-                    student_embeddings_for_assessment_ixns - \
-                            assessment_embeddings_for_assessment_ixns - student_dot_assessment / \
-                            np.einsum(
-                                'ij, ij->ij',
-                                assessment_embedding_norms_for_assessment_ixns,
-                                assessment_embedding_norms_for_assessment_ixns) * \
-                                        assessment_embeddings_for_assessment_ixns))
-    if using_graph_prior:
-        asmt_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                assessment_diffs_from_concept_centers
-    else:
-        asmt_grad_from_graph_regularization = 0
-    if using_l1_regularizer:
-        asmt_grad_from_norm_regularization = assessment_regularization_constant * np.sign(
-                assessment_embeddings)
-    else:
-        asmt_grad_from_norm_regularization = 2 * assessment_regularization_constant * \
-                assessment_embeddings
-    gradient[last_student_embedding_idx:last_assessment_embedding_idx] = (
-        asmt_grad_from_asmt_ixns + asmt_grad_from_graph_regularization + \
-                asmt_grad_from_norm_regularization).ravel()
-
-    if using_bias:
-        # compute the gradient w.r.t. student biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient[last_assessment_embedding_idx:last_student_bias_idx] = \
-                -student_bias_participation_in_assessment_ixns.dot(mult_diff).ravel()
-
-        # compute the gradient w.r.t. assessment biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient[last_student_bias_idx:last_assessment_bias_idx] = \
-                -assessment_participation_in_assessment_ixns.dot(mult_diff).ravel()
-
-    if using_graph_prior:
-        # compute the gradient w.r.t. concept embeddings,
-        # which is the sum of gradient of the log-likelihood
-        # of assessment and lesson interactions and the gradient
-        # of the regularization terms
-        concept_grad_from_assessments = -concept_participation_in_assessments.dot(
-            2 * assessment_diffs_from_concept_centers)
-
-        concept_grad_from_prereqs = concept_participation_in_prereqs.dot(
-            postreq_concept_embeddings / postreq_concept_norms)
-
-        concept_grad_from_postreqs = concept_participation_in_postreqs.dot(
-            (prereq_concept_embeddings - 2 * postreq_concept_embeddings) / postreq_concept_norms -\
-                    2 * prereq_dot_postreq * postreq_concept_embeddings / postreq_concept_norms**3)
-
-        concept_grad_from_norm_regularization = 2 * concept_regularization_constant * \
-                concept_embeddings
-        gradient[last_assessment_bias_idx:] = (graph_regularization_constant * (
-            concept_grad_from_assessments + concept_grad_from_prereqs + \
-                    concept_grad_from_postreqs) + concept_grad_from_norm_regularization).ravel()
-
-    cost_from_assessment_ixns = np.einsum('ij->', np.log(one_plus_exp_diff))
-    if using_temporal_process:
-        cost_from_temporal_process = np.einsum(
-                'ij, ij', diffs, diffs) / (2 * learning_update_variance)
-    else:
-        cost_from_temporal_process = 0
-    cost_from_student_regularization = student_regularization_constant * np.einsum(
-            'ij, ij', student_embeddings, student_embeddings)
-    if using_l1_regularizer:
-        cost_from_assessment_regularization = assessment_regularization_constant * np.absolute(
-                assessment_embeddings).sum()
-    else:
-        cost_from_assessment_regularization = assessment_regularization_constant * np.einsum(
-                'ij, ij', assessment_embeddings, assessment_embeddings)
-    if using_graph_prior:
-        cost_from_concept_regularization = concept_regularization_constant * np.einsum(
-                'ij, ij', concept_embeddings, concept_embeddings)
-        cost_from_graph_regularization = graph_regularization_constant * ((
-            assessment_diffs_from_concept_centers**2).sum() + prereq_edge_diffs.sum())
-    else:
-        cost_from_concept_regularization = 0
-        cost_from_graph_regularization = 0
-    cost_from_norm_regularization = cost_from_student_regularization + \
-            cost_from_assessment_regularization + cost_from_concept_regularization
-
-    cost_from_regularization = cost_from_norm_regularization + cost_from_graph_regularization
-    cost = cost_from_assessment_ixns + cost_from_temporal_process + cost_from_regularization
-
-    return cost, gradient
-
-def with_scipy_with_prereqs(
-    param_vals,
-    param_shapes,
-    assessment_interactions,
-    lesson_interactions,
-    learning_update_variance,
-    forgetting_penalty_terms,
-    regularization_constant,
-    graph_regularization_constant,
-    student_participation_in_assessment_ixns,
-    student_bias_participation_in_assessment_ixns,
-    assessment_participation_in_assessment_ixns,
-    curr_student_participation_in_lesson_ixns,
-    prev_student_participation_in_lesson_ixns,
-    lesson_participation_in_lesson_ixns,
-    assessment_participation_in_concepts,
-    lesson_participation_in_concepts,
-    concept_participation_in_assessments,
-    concept_participation_in_lessons,
-    prereq_edge_concept_idxes,
-    concept_participation_in_prereq_edges,
-    last_student_embedding_idx,
-    last_assessment_embedding_idx,
-    last_lesson_embedding_idx,
-    last_prereq_embedding_idx,
-    last_student_bias_idx,
-    last_assessment_bias_idx,
-    num_timesteps,
-    using_bias,
-    using_graph_prior,
-    using_l1_regularizer,
-    gradient):
-    """
-    Compute the gradient of the cost function with respect to model parameters
-
-    :param np.array param_vals:
-        Flattened, concatenated parameter values
-
-    :param dict[str,tuple] param_shapes:
-        A dictionary mapping a parameter's name to the shape of its np.ndarray
-
-    :param (np.array,np.array,np.array) assessment_interactions:
-        For each assessment interaction, (student_idx, assessment_idx, outcome),
-        where outcome is -1 or 1
-
-    :param (np.array,np.array,np.array) lesson_interactions:
-        For each lesson interaction, (student_idx, lesson_idx, time_since_previous_interaction)
-
-    :param np.array|float learning_update_variance:
-        Variance of the Gaussian learning update. If float, then the variance
-        is constant across all interactions. If np.array, then the variance is
-        different for each lesson interaction.
-
-    :param np.array|float forgetting_penalty_terms:
-        Penalty term for the forgetting effect in the Gaussian learning update.
-        If float, then the penalty term is constant across all interactions. If
-        np.array, then the penalty is different for each lesson interaction.
-
-    :param (float,float,float,float,float) regularization_constant:
-        Coefficients of the regularization terms for (students, assessments,
-        lessons, prereqs, concepts)
-
-    :param float graph_regularization_constant:
-        Coefficient of the graph regularization term
-
-    :param scipy.sparse.csr_matrix student_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of assessment interactions] where a non-zero entry indicates that the student at a
-        specific timestep participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix student_bias_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students] X
-        [number of assessment interactions] where a non-zero entry indicates that the student
-        participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix assessment_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique assessments] X
-        [number of assessment interactions] where a non-zero entry indicates that the assessment
-        participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix curr_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the post-update student state for the lesson interaction
-
-    :param scipy.sparse.csr_matrix prev_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the pre-update student state for the lesson interaction
-
-    :param scipy.sparse.csr_matrix lesson_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique lessons] X [number of lesson interactions]
-        where a non-zero entry indicates that the lesson participated in the lesson interaction
-
-    :param scipy.sparse.csr_matrix assessment_participation_in_concepts:
-        A binary matrix of dimensions [number of unique assessments] X [number of unique concepts],
-        where an entry indicates assessment-concept association. Concept associations for a given
-        assessment sum to one, i.e., each row sums to one.
-
-    :param scipy.sparse.csr_matrix lesson_participation_in_concepts:
-        A binary matrix of dimensions [number of unique lessons] X [number of unique concepts],
-        where an entry indicates lesson-concept association. Concept associations for a given
-        lesson sum to one, i.e., each row sums to one.
-
-    :param scipy.sparse.csr_matrix concept_participation_in_assessments:
-        The transpose of assessment_participation_in_concepts
-
-    :param scipy.sparse.csr_matrix concept_participation_in_lessons:
-        The transpose of lesson_participation_in_lessons
-
-    :param (np.array,np.array) prereq_edge_concept_idxes:
-        (Indices of prereq concepts, Indices of postreq concepts)
-
-    :param (scipy.sparse.csr_matrix,scipy.sparse.csr_matrix) concept_participation_in_prereq_edges:
-        The first binary matrix has dimensions [number of unique concepts] X
-        [number of prereq edges], where a non-zero entry indicates that the concept is the prereq
-        in the edge.
-
-        The second binary matrix has the same dimensions,
-        where a non-zero entry indicates that the concept is the postreq in the edge.
-
-    :param int last_student_embedding_idx:
-        Index of the last student embedding parameter in the flattened gradient
-
-    :param int last_assessment_embedding_idx:
-        Index of the last assessment embedding parameter in the flattened gradient
-
-    :param int last_lesson_embedding_idx:
-        Index of the last lesson embedding parameter in the flattened gradient
-
-    :param int last_prereq_embedding_idx:
-        Index of the last prereq embedding parameter in the flattened gradient
-
-    :param int last_student_bias_idx:
-        Index of the last student bias parameter in the flattened gradient
-
-    :param int last_assessment_bias_idx:
-        Index of the last assessment bias parameter in the flattened gradient
-
-    :param int num_timesteps:
-        Maximum number of timesteps in a student history, i.e.,
-        the output of InteractionHistory.duration()
+            assessment_embeddings_for_assessment_ixns,
+            student_dot_assessment)
+
+        # logits[i] = outcome * (||a|| - s.a / ||a|| - student bias - assessment bias)
+        np.divide(student_dot_assessment, norms, out=logits)
+        np.subtract(norms, logits, out=logits)
+        if self.using_bias:
+            logits -= student_biases[shard.student_bias_idxes_for_assessment_ixns]
+            logits -= assessment_biases[shard.assessment_idxes_for_assessment_ixns]
+        logits *= outcomes
+
+        # negative log-likelihood = log(1 + exp(logits)),
+        # and its derivative w.r.t. the logits is sigmoid(logits)
+        cost = np.logaddexp(0, logits, out=shard.assessment_ixn_costs).sum()
+        np.negative(logits, out=mult_diff)
+        np.exp(mult_diff, out=mult_diff)
+        mult_diff += 1
+        np.divide(outcomes, mult_diff, out=mult_diff)
+        np.divide(mult_diff, norms, out=mult_diff_over_norms)
+
+        # gradient w.r.t. student embeddings
+        np.multiply(
+            assessment_embeddings_for_assessment_ixns, mult_diff_over_norms[:, None], out=work)
+        np.negative(work, out=work)
+        self._scatter(
+            shard, shard.student_participation_in_assessment_ixns, work, student_grad)
+
+        # gradient w.r.t. assessment embeddings
+        # -mult_diff / ||a|| * (s - a - (s.a / ||a||^2) * a)
+        np.divide(student_dot_assessment, norms, out=student_dot_assessment)
+        np.divide(student_dot_assessment, norms, out=student_dot_assessment)
+        student_dot_assessment += 1
+        np.multiply(
+            assessment_embeddings_for_assessment_ixns, student_dot_assessment[:, None], out=work)
+        np.subtract(work, student_embeddings_for_assessment_ixns, out=work)
+        work *= mult_diff_over_norms[:, None]
+        self._scatter(
+            shard, shard.assessment_participation_in_assessment_ixns, work, assessment_grad)
+
+        # gradient w.r.t. bias terms
+        if self.using_bias:
+            np.negative(mult_diff, out=mult_diff)
+            self._scatter(
+                shard, shard.student_bias_participation_in_assessment_ixns, mult_diff,
+                student_bias_grad)
+            self._scatter(
+                shard, shard.assessment_participation_in_assessment_ixns, mult_diff,
+                assessment_bias_grad)
+
+        return cost
+
+    def _lesson_ixn_terms(
+        self,
+        shard,
+        student_embeddings,
+        lesson_embeddings,
+        prereq_embeddings,
+        student_grad,
+        lesson_grad,
+        prereq_grad):
+        """
+        Add the gradient of the negative log-likelihood of the Gaussian learning updates in a shard
+        to the gradients w.r.t. student, lesson and prereq embeddings
 
-    :param bool using_bias:
-        Including bias terms in the assessment result likelihood
+        Without lessons, the updates have zero mean,
+        i.e., student embeddings follow a Gaussian random walk
 
-    :param bool using_graph_prior:
-        Including the graph regularization term
+        :rtype: float
+        :return: The negative log-likelihood of lesson interactions
+        """
 
-    :param bool using_l1_regularizer:
-        True => use L1 regularization on lesson and assessment embeddings
-        False => use L2 regularization on lesson and assessment embeddings
+        curr_student_embeddings = shard.curr_student_embeddings_for_lesson_ixns
+        prev_student_embeddings = shard.prev_student_embeddings_for_lesson_ixns
+        diffs = shard.diffs
+        diffs_over_var = shard.diffs_over_var
+        work = shard.lesson_ixn_work
+
+        # get embeddings of student states before and after lesson interactions
+        self._gather(
+            shard, student_embeddings, shard.student_idxes_for_lesson_ixns,
+            curr_student_embeddings)
+        self._gather(
+            shard, student_embeddings, shard.prev_student_idxes_for_lesson_ixns,
+            prev_student_embeddings)
+
+        # diffs = curr - prev - (gated) lesson embedding + forgetting penalty
+        np.subtract(curr_student_embeddings, prev_student_embeddings, out=diffs)
+        if self.using_lessons:
+            lesson_embeddings_for_lesson_ixns = shard.lesson_embeddings_for_lesson_ixns
+            self._gather(
+                shard, lesson_embeddings, shard.lesson_idxes_for_lesson_ixns,
+                lesson_embeddings_for_lesson_ixns)
+
+        if self.using_prereqs:
+            prereq_embeddings_for_lesson_ixns = shard.prereq_embeddings_for_lesson_ixns
+            prereq_norms = shard.prereq_embedding_norms
+            prev_student_dot_prereq = shard.prev_student_dot_prereq
+            update_exp_diff = shard.update_exp_diff
+            gates = shard.update_gates
+            update_mult_diff = shard.update_mult_diff
+
+            self._gather(
+                shard, prereq_embeddings, shard.lesson_idxes_for_lesson_ixns,
+                prereq_embeddings_for_lesson_ixns)
+            np.sqrt(_rowwise_dot(
+                prereq_embeddings_for_lesson_ixns,
+                prereq_embeddings_for_lesson_ixns,
+                prereq_norms), out=prereq_norms)
+            _rowwise_dot(
+                prev_student_embeddings, prereq_embeddings_for_lesson_ixns,
+                prev_student_dot_prereq)
+
+            # gates = 1 / (1 + exp(||p|| - prev.p / ||p||))
+            np.divide(prev_student_dot_prereq, prereq_norms, out=update_exp_diff)
+            np.subtract(prereq_norms, update_exp_diff, out=update_exp_diff)
+            np.exp(update_exp_diff, out=update_exp_diff)
+            np.add(update_exp_diff, 1, out=gates)
+            np.reciprocal(gates, out=gates)
+
+            np.multiply(lesson_embeddings_for_lesson_ixns, gates[:, None], out=work)
+            diffs -= work
+        elif self.using_lessons:
+            diffs -= lesson_embeddings_for_lesson_ixns
+
+        diffs += shard.forgetting_penalty_terms
+        np.divide(diffs, shard.learning_update_variance, out=diffs_over_var)
+
+        np.multiply(diffs, diffs_over_var, out=work)
+        cost = work.sum() / 2
+
+        # gradient w.r.t. student embeddings
+        # (without prereqs, curr_student_participation_in_lesson_ixns is the difference
+        # of the participation matrices for post-update and pre-update student states)
+        self._scatter(
+            shard, shard.curr_student_participation_in_lesson_ixns, diffs_over_var, student_grad)
+
+        if self.using_prereqs:
+            # update_mult_diff = (diffs_over_var . l) * exp_diff * gates^2 / ||p||
+            _rowwise_dot(diffs_over_var, lesson_embeddings_for_lesson_ixns, update_mult_diff)
+            update_mult_diff *= update_exp_diff
+            update_mult_diff *= gates
+            update_mult_diff *= gates
+            update_mult_diff /= prereq_norms
+
+            # -(update_mult_diff * p + diffs_over_var)
+            np.multiply(prereq_embeddings_for_lesson_ixns, update_mult_diff[:, None], out=work)
+            work += diffs_over_var
+            np.negative(work, out=work)
+            self._scatter(
+                shard, shard.prev_student_participation_in_lesson_ixns, work, student_grad)
+
+            # gradient w.r.t. prereq embeddings
+            # update_mult_diff * ((prev.p / ||p||^2 + 1) * p - prev)
+            np.divide(prev_student_dot_prereq, prereq_norms, out=prev_student_dot_prereq)
+            np.divide(prev_student_dot_prereq, prereq_norms, out=prev_student_dot_prereq)
+            prev_student_dot_prereq += 1
+            np.multiply(
+                prereq_embeddings_for_lesson_ixns, prev_student_dot_prereq[:, None], out=work)
+            work -= prev_student_embeddings
+            work *= update_mult_diff[:, None]
+            self._scatter(shard, shard.lesson_participation_in_lesson_ixns, work, prereq_grad)
+
+        # gradient w.r.t. lesson embeddings
+        if self.using_lessons:
+            if self.using_prereqs:
+                np.multiply(diffs_over_var, gates[:, None], out=work)
+            else:
+                work[:] = diffs_over_var
+            np.negative(work, out=work)
+            self._scatter(shard, shard.lesson_participation_in_lesson_ixns, work, lesson_grad)
+
+        return cost
+
+    def _graph_terms(
+        self,
+        concept_embeddings,
+        assessment_embeddings,
+        lesson_embeddings,
+        concept_grad,
+        assessment_grad,
+        lesson_grad):
+        """
+        Add the gradient of the graph prior to the gradients w.r.t. concept, assessment
+        and lesson embeddings
 
-    :param np.array gradient:
-        Placeholder for the flattened gradient
+        :rtype: float
+        :return: The value of the graph regularization terms
+        """
 
-    :rtype: (float,np.array)
-    :return:
-        The value of the cost function
-        (evaluated at the supplied parameter values),
-        and the flattened gradient of the cost function
-        (evaluated at the supplied parameter values)
-    """
+        graph_regularization_constant = self.graph_regularization_constant
 
-    # pull regularization constants for different parameters out of tuple
-    (
-        student_regularization_constant,
-        assessment_regularization_constant,
-        lesson_regularization_constant,
-        prereq_regularization_constant,
-        concept_regularization_constant) = regularization_constant
-    
-    # reshape flattened student embeddings into tensor
-    student_embeddings = np.reshape(
-        param_vals[:last_student_embedding_idx],
-        param_shapes[models.STUDENT_EMBEDDINGS])
-
-    # reshape flattened assessment embeddings into matrix
-    assessment_embeddings = np.reshape(
-        param_vals[last_student_embedding_idx:last_assessment_embedding_idx],
-        param_shapes[models.ASSESSMENT_EMBEDDINGS])
-
-    # reshape flattened lesson embeddings into matrix
-    lesson_embeddings = np.reshape(
-        param_vals[last_assessment_embedding_idx:last_lesson_embedding_idx],
-        param_shapes[models.LESSON_EMBEDDINGS])
-
-    # reshape flattened prereq embeddings into matrix
-    prereq_embeddings = np.reshape(
-        param_vals[last_lesson_embedding_idx:last_prereq_embedding_idx],
-        param_shapes[models.PREREQ_EMBEDDINGS])
-
-    if using_graph_prior:
-        # reshape flattened concept embeddings into matrix
-        concept_embeddings = np.reshape(
-            param_vals[last_assessment_bias_idx:],
-            param_shapes[models.CONCEPT_EMBEDDINGS])
-
-    # split assessment interactions into students, assessments, outcomes
-    (
-        student_idxes_for_assessment_ixns,
-        assessment_idxes_for_assessment_ixns,
-        outcomes_for_assessment_ixns) = assessment_interactions
-
-    # split lesson interactions into students, lessons
-    student_idxes_for_lesson_ixns, lesson_idxes_for_lesson_ixns, _ = lesson_interactions
-
-    if not using_bias:
-        # zero out bias terms, so that they definitely have no effect
-        # on the gradient or cost here. this should be done in addition to
-        # imposing (0, 0) bounds in the call to scipy.optimize.minimize in est.
-        param_vals[last_prereq_embedding_idx:last_assessment_bias_idx] = 0
-
-    # get biases for assessment interactions
-    student_biases = np.reshape(
-        param_vals[last_prereq_embedding_idx:last_student_bias_idx],
-        param_shapes[models.STUDENT_BIASES])[(
-        student_idxes_for_assessment_ixns // num_timesteps)][:, None]
-    assessment_biases = np.reshape(
-        param_vals[last_student_bias_idx:last_assessment_bias_idx],
-        param_shapes[models.ASSESSMENT_BIASES])[assessment_idxes_for_assessment_ixns][:, None]
-
-    # shape outcomes as a column vector
-    outcomes = outcomes_for_assessment_ixns[:, None]
-
-    # get the assessment embedding for each assessment interaction
-    assessment_embeddings_for_assessment_ixns = \
-            assessment_embeddings[assessment_idxes_for_assessment_ixns, :]
-
-    # compute the L2 norm of the assessment embedding for each assessment interaction
-    assessment_embedding_norms_for_assessment_ixns = np.linalg.norm(
-        assessment_embeddings_for_assessment_ixns, axis=1)[:, None]
-
-    # get the student embedding for each assessment interaction
-    student_embeddings_for_assessment_ixns = (
-        student_embeddings[student_idxes_for_assessment_ixns, :])
-
-    # compute the dot product of the student embedding
-    # and assessment embedding for each interaction
-    student_dot_assessment = np.einsum(
-        'ij, ij->i',
-        student_embeddings_for_assessment_ixns,
-        assessment_embeddings_for_assessment_ixns)[:, None]
-
-    # compute intermediate quantities for the gradient that get reused
-    exp_diff = np.exp(outcomes * (
-        assessment_embedding_norms_for_assessment_ixns - student_dot_assessment / \
-                assessment_embedding_norms_for_assessment_ixns - student_biases - \
-                assessment_biases))
-    one_plus_exp_diff = 1 + exp_diff
-    mult_diff = outcomes * exp_diff / one_plus_exp_diff
-
-    # get lesson embeddings for lesson interactions
-    lesson_embeddings_for_lesson_ixns = lesson_embeddings[lesson_idxes_for_lesson_ixns, :]
-
-    # get lesson prereq embeddings for lesson interactions
-    prereq_embeddings_for_lesson_ixns = prereq_embeddings[lesson_idxes_for_lesson_ixns, :]
-
-    # get embeddings of student states resulting from lesson interactions
-    curr_student_embeddings_for_lesson_ixns = student_embeddings[student_idxes_for_lesson_ixns, :]
-
-    # get embeddings of student states prior to lesson interactions
-    prev_student_embeddings_for_lesson_ixns = \
-            student_embeddings[student_idxes_for_lesson_ixns - 1, :]
-
-    # compute the L2 norm of the lesson embedding for each lesson interaction
-    prereq_embedding_norms_for_lesson_ixns = np.linalg.norm(
-        prereq_embeddings_for_lesson_ixns, axis=1)[:, None]
-
-    # compute the dot product of the student embedding prior
-    # to the lesson interaction and the lesson prereq embedding,
-    # for each interaction
-    prev_student_dot_prereq = np.einsum(
-        'ij, ij->i',
-        prev_student_embeddings_for_lesson_ixns,
-        prereq_embeddings_for_lesson_ixns)[:, None]
-
-    # compute intermediate quantities for the gradient that get reused
-    update_exp_diff = np.exp(
-        prereq_embedding_norms_for_lesson_ixns - prev_student_dot_prereq / \
-                prereq_embedding_norms_for_lesson_ixns)
-    update_one_plus_exp_diff = 1 + update_exp_diff
-    diffs = curr_student_embeddings_for_lesson_ixns - prev_student_embeddings_for_lesson_ixns - \
-            lesson_embeddings_for_lesson_ixns / update_one_plus_exp_diff + forgetting_penalty_terms
-    diffs_over_var = diffs / learning_update_variance
-    update_mult_diff = np.einsum(
-        'ij, ij->i',
-        diffs_over_var,
-        lesson_embeddings_for_lesson_ixns)[:, None] * update_exp_diff / (
-        np.einsum('ij, ij->ij',
-            update_one_plus_exp_diff,
-            update_one_plus_exp_diff) * prereq_embedding_norms_for_lesson_ixns)
-
-    if using_graph_prior:
-        # get distance from an assessment embedding to its prior embedding,
-        # i.e., the weighted average of the embeddings of the assessment's
-        # governing concepts
+        # get distance from a module embedding to its prior embedding,
+        # i.e., the weighted average of the embeddings of the module's governing concepts
         assessment_diffs_from_concept_centers = assessment_embeddings - \
-                assessment_participation_in_concepts.dot(concept_embeddings)
-
-        # get distance from a lesson embedding to its prior embedding,
-        # i.e., the weighted average of the embeddings of the lesson's
-        # governing concepts
-        lesson_diffs_from_concept_centers = lesson_embeddings - \
-                lesson_participation_in_concepts.dot(concept_embeddings)
-
-        # grab the concept dependency graph
-        prereq_concept_idxes, postreq_concept_idxes = prereq_edge_concept_idxes
-        concept_participation_in_prereqs, concept_participation_in_postreqs = \
-                concept_participation_in_prereq_edges
-
-        # get prereq and postreq concept embeddings
-        prereq_concept_embeddings = concept_embeddings[prereq_concept_idxes, :]
-        postreq_concept_embeddings = concept_embeddings[postreq_concept_idxes, :]
-
-        # compute column vector of L2 norms for postreq concept embeddings
-        postreq_concept_norms = np.linalg.norm(postreq_concept_embeddings, axis=1)[:, None]
-
-        # compute the dot product of the prereq concept embedding
-        # and postreq concept embedding for each edge in the concept dependency graph
-        prereq_dot_postreq = np.einsum(
-            'ij, ij->i',
-            prereq_concept_embeddings,
-            postreq_concept_embeddings)[:, None]
-
-        # intermediate quantity, useful and reusable later
-        prereq_edge_diffs = prereq_dot_postreq / postreq_concept_norms - postreq_concept_norms
-
-    # compute the gradient w.r.t. student embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment interactions
-    # and the gradient of the regularization terms
-    stud_grad_from_asmt_ixns = -student_participation_in_assessment_ixns.dot(
-        mult_diff / assessment_embedding_norms_for_assessment_ixns * \
-                assessment_embeddings_for_assessment_ixns)
-    stud_grad_from_lesson_ixns = curr_student_participation_in_lesson_ixns.dot(
-        diffs_over_var) - prev_student_participation_in_lesson_ixns.dot(
-        update_mult_diff * prereq_embeddings_for_lesson_ixns + diffs_over_var)
-    stud_grad_from_norm_regularization = 2 * student_regularization_constant * student_embeddings
-    gradient[:last_student_embedding_idx] = (
-        stud_grad_from_asmt_ixns + stud_grad_from_lesson_ixns + \
-                stud_grad_from_norm_regularization).ravel()
-
-    # compute the gradient w.r.t. assessment embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment interactions
-    # and the gradient of the regularization terms
-    asmt_grad_from_asmt_ixns = -assessment_participation_in_assessment_ixns.dot(
-            mult_diff / assessment_embedding_norms_for_assessment_ixns * (
-                student_embeddings_for_assessment_ixns - assessment_embeddings_for_assessment_ixns\
-                        - student_dot_assessment / np.einsum(
-                            'ij, ij->ij',
-                            assessment_embedding_norms_for_assessment_ixns,
-                            assessment_embedding_norms_for_assessment_ixns) * \
-                                    assessment_embeddings_for_assessment_ixns))
-    if using_graph_prior:
-        asmt_grad_from_graph_regularization = 2 * graph_regularization_constant * \
+                self.assessment_participation_in_concepts.dot(concept_embeddings)
+        assessment_grad += 2 * graph_regularization_constant * \
                 assessment_diffs_from_concept_centers
-    else:
-        asmt_grad_from_graph_regularization = 0
-    if using_l1_regularizer:
-        asmt_grad_from_norm_regularization = assessment_regularization_constant * np.sign(
-                assessment_embeddings)
-    else:
-        asmt_grad_from_norm_regularization = 2 * assessment_regularization_constant * \
-                assessment_embeddings
-    gradient[last_student_embedding_idx:last_assessment_embedding_idx] = (
-        asmt_grad_from_asmt_ixns + asmt_grad_from_graph_regularization + \
-                asmt_grad_from_norm_regularization).ravel()
-
-    # compute the gradient w.r.t. lesson embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment and lesson interactions
-    # and the gradient of the regularization terms
-    lesson_grad_from_lesson_ixns = -lesson_participation_in_lesson_ixns.dot(
-        diffs_over_var / update_one_plus_exp_diff)
-    if using_graph_prior:
-        lesson_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                lesson_diffs_from_concept_centers
-    else:
-        lesson_grad_from_graph_regularization = 0
-    if using_l1_regularizer:
-        lesson_grad_from_norm_regularization = lesson_regularization_constant * np.sign(
-                lesson_embeddings)
-    else:
-        lesson_grad_from_norm_regularization = 2 * lesson_regularization_constant * \
-                lesson_embeddings
-    gradient[last_assessment_embedding_idx:last_lesson_embedding_idx] = (
-        lesson_grad_from_lesson_ixns + lesson_grad_from_graph_regularization + \
-                lesson_grad_from_norm_regularization).ravel()
-
-    # compute the gradient w.r.t. prereq embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment and lesson interactions
-    # and the gradient of the regularization terms
-    prereq_grad_from_lesson_ixns = lesson_participation_in_lesson_ixns.dot(
-            update_mult_diff * (prev_student_dot_prereq / np.einsum(
-                'ij, ij->ij',
-                prereq_embedding_norms_for_lesson_ixns,
-                prereq_embedding_norms_for_lesson_ixns) * \
-                        prereq_embeddings_for_lesson_ixns - \
-                        prev_student_embeddings_for_lesson_ixns + \
-                        prereq_embeddings_for_lesson_ixns))
-    prereq_grad_from_norm_regularization = 2 * prereq_regularization_constant * prereq_embeddings
-    gradient[last_lesson_embedding_idx:last_prereq_embedding_idx] = (
-            prereq_grad_from_lesson_ixns + prereq_grad_from_norm_regularization).ravel()
-
-    if using_bias:
-        # compute the gradient w.r.t. student biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient[last_prereq_embedding_idx:last_student_bias_idx] = \
-                -student_bias_participation_in_assessment_ixns.dot(mult_diff).ravel()
-
-        # compute the gradient w.r.t. assessment biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient[last_student_bias_idx:last_assessment_bias_idx] = \
-                -assessment_participation_in_assessment_ixns.dot(mult_diff).ravel()
-
-    if using_graph_prior:
-        # compute the gradient w.r.t. concept embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment
-        # and lesson interactions and the gradient of the regularization terms
-        concept_grad_from_assessments = -concept_participation_in_assessments.dot(
-            2 * assessment_diffs_from_concept_centers)
-
-        concept_grad_from_lessons = concept_participation_in_lessons.dot(
-            2 * lesson_diffs_from_concept_centers)
-
-        concept_grad_from_prereqs = concept_participation_in_prereqs.dot(
-            postreq_concept_embeddings / postreq_concept_norms)
-
-        concept_grad_from_postreqs = concept_participation_in_postreqs.dot(
-            (prereq_concept_embeddings - 2 * postreq_concept_embeddings) / \
-                    postreq_concept_norms - 2 * prereq_dot_postreq * postreq_concept_embeddings / \
-                    postreq_concept_norms**3)
-
-        gradient[last_assessment_bias_idx:] = graph_regularization_constant * (
-            concept_grad_from_assessments + concept_grad_from_lessons + concept_grad_from_prereqs +
-            concept_grad_from_postreqs).ravel()
-
-    cost_from_assessment_ixns = np.einsum('ij->', np.log(one_plus_exp_diff))
-    cost_from_lesson_ixns = np.einsum('ij, ij', diffs, diffs) / (2 * learning_update_variance)
-    cost_from_student_regularization = student_regularization_constant * np.einsum(
-            'ij, ij', student_embeddings, student_embeddings)
-    if using_l1_regularizer:
-        cost_from_assessment_regularization = assessment_regularization_constant * np.absolute(
-                assessment_embeddings).sum()
-        cost_from_lesson_regularization = lesson_regularization_constant * np.absolute(
-                lesson_embeddings).sum()
-    else:
-        cost_from_assessment_regularization = assessment_regularization_constant * np.einsum(
-                'ij, ij', assessment_embeddings, assessment_embeddings)
-        cost_from_lesson_regularization = lesson_regularization_constant * np.einsum(
-                'ij, ij', lesson_embeddings, lesson_embeddings)
-    cost_from_prereq_regularization = prereq_regularization_constant * np.einsum(
-            'ij, ij', prereq_embeddings, prereq_embeddings)
-    if using_graph_prior:
-        cost_from_concept_regularization = concept_regularization_constant * np.einsum(
-                'ij, ij', concept_embeddings, concept_embeddings)
-        cost_from_graph_regularization = graph_regularization_constant * ((
-            assessment_diffs_from_concept_centers**2).sum() + (
-            lesson_diffs_from_concept_centers**2).sum() + prereq_edge_diffs.sum())
-    else:
-        cost_from_concept_regularization = 0
-        cost_from_graph_regularization = 0
-    cost_from_norm_regularization = cost_from_student_regularization + \
-            cost_from_assessment_regularization + cost_from_lesson_regularization + \
-            cost_from_prereq_regularization + cost_from_concept_regularization
-
-    cost_from_ixns = cost_from_assessment_ixns + cost_from_lesson_ixns
-    cost_from_regularization = cost_from_norm_regularization + cost_from_graph_regularization
-    cost = cost_from_ixns + cost_from_regularization
-
-    return cost, gradient
-
-def with_scipy_without_prereqs(
-    param_vals,
-    param_shapes,
-    assessment_interactions,
-    lesson_interactions,
-    learning_update_variance,
-    forgetting_penalty_terms,
-    regularization_constant,
-    graph_regularization_constant,
-    student_participation_in_assessment_ixns,
-    student_bias_participation_in_assessment_ixns,
-    assessment_participation_in_assessment_ixns,
-    curr_student_participation_in_lesson_ixns,
-    prev_student_participation_in_lesson_ixns,
-    lesson_participation_in_lesson_ixns,
-    assessment_participation_in_concepts,
-    lesson_participation_in_concepts,
-    concept_participation_in_assessments,
-    concept_participation_in_lessons,
-    prereq_edge_concept_idxes,
-    concept_participation_in_prereq_edges,
-    last_student_embedding_idx,
-    last_assessment_embedding_idx,
-    last_lesson_embedding_idx,
-    last_prereq_embedding_idx,
-    last_student_bias_idx,
-    last_assessment_bias_idx,
-    num_timesteps,
-    using_bias,
-    using_graph_prior,
-    using_l1_regularizer,
-    gradient):
-    """
-    Compute the gradient of the cost function with respect to model parameters
-
-    :param np.array param_vals:
-        Flattened, concatenated parameter values
-
-    :param dict[str,tuple] param_shapes:
-        A dictionary mapping a parameter's name to the shape of its np.ndarray
-
-    :param (np.array,np.array,np.array) assessment_interactions:
-        For each assessment interaction, (student_idx, assessment_idx, outcome),
-        where outcome is -1 or 1
-
-    :param (np.array,np.array,np.array) lesson_interactions:
-        For each lesson interaction, (student_idx, lesson_idx, time_since_previous_interaction)
-
-    :param np.array|float learning_update_variance:
-        Variance of the Gaussian learning update. If float, then the variance
-        is constant across all interactions. If np.array, then the variance is
-        different for each lesson interaction.
-
-    :param np.array|float forgetting_penalty_terms:
-        Penalty term for the forgetting effect in the Gaussian learning update.
-        If float, then the penalty term is constant across all interactions. If
-        np.array, then the penalty is different for each lesson interaction.
-
-    :param (float,float,float,float,float) regularization_constant:
-        Coefficients of the regularization terms for (students, assessments,
-        lessons, prereqs, concepts)
-
-    :param float graph_regularization_constant:
-        Coefficient of the graph regularization term
-
-    :param scipy.sparse.csr_matrix student_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of assessment interactions] where a non-zero entry indicates that the student at a
-        specific timestep participated in the assessment interaction
-
-    :param scipy.sparse.csr_matrix student_bias_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique students] X [number of assessment
-        interactions] where a non-zero entry indicates that the student participated in the
-        assessment interaction
-
-    :param scipy.sparse.csr_matrix assessment_participation_in_assessment_ixns:
-        A binary matrix of dimensions [number of unique assessments] X [number of assessment
-        interactions] where a non-zero entry indicates that the assessment participated in the
-        assessment interaction
-
-    :param scipy.sparse.csr_matrix curr_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the post-update student state for the lesson interaction
-
-    :param scipy.sparse.csr_matrix prev_student_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique students * number of timesteps] X
-        [number of lesson interactions] where a non-zero entry indicates that the student at a
-        specific timestep was the pre-update student state for the lesson interaction
-
-    :param scipy.sparse.csr_matrix lesson_participation_in_lesson_ixns:
-        A binary matrix of dimensions [number of unique lessons] X [number of lesson interactions]
-        where a non-zero entry indicates that the lesson participated in the lesson interaction
-
-    :param scipy.sparse.csr_matrix assessment_participation_in_concepts:
-        A binary matrix of dimensions [number of unique assessments] X [number of unique concepts],
-        where an entry indicates assessment-concept association. Concept associations for a given
-        assessment sum to one, i.e., each row sums to one.
+        concept_grad_from_modules = -2 * self.concept_participation_in_assessments.dot(
+            assessment_diffs_from_concept_centers)
+        cost_from_modules = (assessment_diffs_from_concept_centers**2).sum()
 
-    :param scipy.sparse.csr_matrix lesson_participation_in_concepts:
-        A binary matrix of dimensions [number of unique lessons] X [number of unique concepts],
-        where an entry indicates lesson-concept association. Concept associations for a given
-        lesson sum to one, i.e., each row sums to one.
-
-    :param scipy.sparse.csr_matrix concept_participation_in_assessments:
-        The transpose of assessment_participation_in_concepts
-
-    :param scipy.sparse.csr_matrix concept_participation_in_lessons:
-        The transpose of lesson_participation_in_lessons
-
-    :param (np.array,np.array) prereq_edge_concept_idxes:
-        (Indices of prereq concepts, Indices of postreq concepts)
-
-    :param (scipy.sparse.csr_matrix,scipy.sparse.csr_matrix) concept_participation_in_prereq_edges:
-        The first binary matrix has dimensions [number of unique concepts] X
-        [number of prereq edges], where a non-zero entry indicates that the concept is the prereq
-        in the edge.
-
-        The second binary matrix has the same dimensions,
-        where a non-zero entry indicates that the concept is the postreq in the edge.
-
-    :param int last_student_embedding_idx:
-        Index of the last student embedding parameter in the flattened gradient
-
-    :param int last_assessment_embedding_idx:
-        Index of the last assessment embedding parameter in the flattened gradient
-
-    :param int last_lesson_embedding_idx:
-        Index of the last lesson embedding parameter in the flattened gradient
-
-    :param int last_prereq_embedding_idx:
-        Index of the last prereq embedding parameter in the flattened gradient
-
-    :param int last_student_bias_idx:
-        Index of the last student bias parameter in the flattened gradient
-
-    :param int last_assessment_bias_idx:
-        Index of the last assessment bias parameter in the flattened gradient
-
-    :param int num_timesteps:
-        Maximum number of timesteps in a student history, i.e.,
-        the output of InteractionHistory.duration()
-
-    :param bool using_bias:
-        Including bias terms in the assessment result likelihood
-
-    :param bool using_graph_prior:
-        Including the graph regularization term
-
-    :param bool using_l1_regularizer:
-        True => use L1 regularization on lesson and assessment embeddings
-        False => use L2 regularization on lesson and assessment embeddings
-
-    :param np.array gradient:
-        Placeholder for the flattened gradient
-
-    :rtype: (float,np.array)
-    :return:
-        The value of the cost function
-        (evaluated at the supplied parameter values),
-        and the flattened gradient of the cost function
-        (evaluated at the supplied parameter values)
-    """
-
-    # pull regularization constants for different parameters out of tuple
-    (
-        student_regularization_constant,
-        assessment_regularization_constant,
-        lesson_regularization_constant,
-        prereq_regularization_constant,
-        concept_regularization_constant) = regularization_constant
-    
-    # reshape flattened student embeddings into tensor
-    student_embeddings = np.reshape(
-        param_vals[:last_student_embedding_idx],
-        param_shapes[models.STUDENT_EMBEDDINGS])
-
-    # reshape flattened assessment embeddings into matrix
-    assessment_embeddings = np.reshape(
-        param_vals[last_student_embedding_idx:last_assessment_embedding_idx],
-        param_shapes[models.ASSESSMENT_EMBEDDINGS])
-
-    # reshape flattened lesson embeddings into matrix
-    lesson_embeddings = np.reshape(
-        param_vals[last_assessment_embedding_idx:last_lesson_embedding_idx],
-        param_shapes[models.LESSON_EMBEDDINGS])
-
-    if using_graph_prior:
-        # reshape flattened concept embeddings into matrix
-        concept_embeddings = np.reshape(
-            param_vals[last_assessment_bias_idx:],
-            param_shapes[models.CONCEPT_EMBEDDINGS])
-
-    # split assessment interactions into students, assessments, outcomes
-    (
-        student_idxes_for_assessment_ixns,
-        assessment_idxes_for_assessment_ixns,
-        outcomes_for_assessment_ixns) = assessment_interactions
-
-    # split lesson interactions into students, lessons
-    student_idxes_for_lesson_ixns, lesson_idxes_for_lesson_ixns, _ = lesson_interactions
-
-    if not using_bias:
-        # zero out bias terms, so that they definitely have no effect
-        # on the gradient or cost here. this should be done in addition to
-        # imposing (0, 0) bounds in the call to scipy.optimize.minimize in est.
-        param_vals[last_lesson_embedding_idx:last_assessment_bias_idx] = 0
-
-    # get biases for assessment interactions
-    student_biases = np.reshape(
-        param_vals[last_lesson_embedding_idx:last_student_bias_idx],
-        param_shapes[models.STUDENT_BIASES])[(
-        student_idxes_for_assessment_ixns // num_timesteps)][:, None]
-    assessment_biases = np.reshape(
-        param_vals[last_student_bias_idx:last_assessment_bias_idx],
-        param_shapes[models.ASSESSMENT_BIASES])[(
-        assessment_idxes_for_assessment_ixns)][:, None]
-
-    # shape outcomes as a column vector
-    outcomes = outcomes_for_assessment_ixns[:, None]
-
-    # get the assessment embedding for each assessment interaction
-    assessment_embeddings_for_assessment_ixns = \
-            assessment_embeddings[assessment_idxes_for_assessment_ixns, :]
-
-    # compute the L2 norm of the assessment embedding for each assessment interaction
-    assessment_embedding_norms_for_assessment_ixns = np.linalg.norm(
-        assessment_embeddings_for_assessment_ixns, axis=1)[:, None]
-
-    # get the student embedding for each assessment interaction
-    student_embeddings_for_assessment_ixns = \
-            student_embeddings[student_idxes_for_assessment_ixns, :]
-
-    # compute the dot product of the student embedding
-    # and assessment embedding for each interaction
-    student_dot_assessment = np.einsum(
-        'ij, ij->i',
-        student_embeddings_for_assessment_ixns,
-        assessment_embeddings_for_assessment_ixns)[:, None]
-
-    # compute intermediate quantities for the gradient that get reused
-    exp_diff = np.exp(outcomes * (
-        assessment_embedding_norms_for_assessment_ixns - student_dot_assessment / \
-                assessment_embedding_norms_for_assessment_ixns - student_biases - \
-                assessment_biases))
-    one_plus_exp_diff = 1 + exp_diff
-    mult_diff = outcomes * exp_diff / one_plus_exp_diff
-
-    # get lesson embeddings for lesson interactions
-    lesson_embeddings_for_lesson_ixns = lesson_embeddings[lesson_idxes_for_lesson_ixns, :]
-
-    # get embeddings of student states resulting from lesson interactions
-    curr_student_embeddings_for_lesson_ixns = student_embeddings[student_idxes_for_lesson_ixns, :]
-
-    # get embeddings of student states prior to lesson interactions
-    prev_student_embeddings_for_lesson_ixns = \
-            student_embeddings[student_idxes_for_lesson_ixns - 1, :]
-
-    # compute intermediate quantities for the gradient that get reused
-    diffs = curr_student_embeddings_for_lesson_ixns - (
-        prev_student_embeddings_for_lesson_ixns) - (
-        lesson_embeddings_for_lesson_ixns) + forgetting_penalty_terms
-    diffs_over_var = diffs / learning_update_variance
-
-    if using_graph_prior:
-        # get distance from an assessment embedding to its prior embedding,
-        # i.e., the weighted average of the embeddings of the assessment's
-        # governing concepts
-        assessment_diffs_from_concept_centers = assessment_embeddings - \
-                assessment_participation_in_concepts.dot(concept_embeddings)
-
-        # get distance from a lesson embedding to its prior embedding,
-        # i.e., the weighted average of the embeddings of the lesson's
-        # governing concepts
-        lesson_diffs_from_concept_centers = (
-            lesson_embeddings) - lesson_participation_in_concepts.dot(
-            concept_embeddings)
-
-        # grab the concept dependency graph
-        prereq_concept_idxes, postreq_concept_idxes = prereq_edge_concept_idxes
-        concept_participation_in_prereqs, concept_participation_in_postreqs = \
-                concept_participation_in_prereq_edges
-
-        # get prereq and postreq concept embeddings
-        prereq_concept_embeddings = concept_embeddings[prereq_concept_idxes, :]
-        postreq_concept_embeddings = concept_embeddings[postreq_concept_idxes, :]
-
-        # compute column vector of L2 norms for postreq concept embeddings
+        if self.using_lessons:
+            lesson_diffs_from_concept_centers = lesson_embeddings - \
+                    self.lesson_participation_in_concepts.dot(concept_embeddings)
+            lesson_grad += 2 * graph_regularization_constant * \
+                    lesson_diffs_from_concept_centers
+            concept_grad_from_modules -= 2 * self.concept_participation_in_lessons.dot(
+                lesson_diffs_from_concept_centers)
+            cost_from_modules += (lesson_diffs_from_concept_centers**2).sum()
+
+        # get prereq and postreq concept embeddings for each edge
+        # in the concept dependency graph
+        prereq_concept_embeddings = concept_embeddings[self.prereq_concept_idxes, :]
+        postreq_concept_embeddings = concept_embeddings[self.postreq_concept_idxes, :]
         postreq_concept_norms = np.linalg.norm(postreq_concept_embeddings, axis=1)[:, None]
-
-        # compute the dot product of the prereq concept embedding
-        # and postreq concept embedding for each edge in the concept dependency graph
         prereq_dot_postreq = np.einsum(
             'ij, ij->i',
             prereq_concept_embeddings,
             postreq_concept_embeddings)[:, None]
-
-        # intermediate quantity, useful and reusable later
         prereq_edge_diffs = prereq_dot_postreq / postreq_concept_norms - postreq_concept_norms
 
-    # compute the gradient w.r.t. student embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment interactions
-    # and the gradient of the regularization terms
-    stud_grad_from_asmt_ixns = -student_participation_in_assessment_ixns.dot(
-        mult_diff / assessment_embedding_norms_for_assessment_ixns * \
-                assessment_embeddings_for_assessment_ixns)
-    stud_grad_from_lesson_ixns = curr_student_participation_in_lesson_ixns.dot(diffs_over_var)
-    stud_grad_from_norm_regularization = 2 * student_regularization_constant * student_embeddings
-    gradient[:last_student_embedding_idx] = (
-        stud_grad_from_asmt_ixns + stud_grad_from_lesson_ixns + \
-                stud_grad_from_norm_regularization).ravel()
-
-    # compute the gradient w.r.t. assessment embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment interactions
-    # and the gradient of the regularization terms
-    asmt_grad_from_asmt_ixns = -assessment_participation_in_assessment_ixns.dot(
-        mult_diff / assessment_embedding_norms_for_assessment_ixns * (
-            student_embeddings_for_assessment_ixns - assessment_embeddings_for_assessment_ixns - \
-                    student_dot_assessment / np.einsum(
-                        'ij, ij->ij',
-                        assessment_embedding_norms_for_assessment_ixns,
-                        assessment_embedding_norms_for_assessment_ixns) * \
-                                assessment_embeddings_for_assessment_ixns))
-    if using_graph_prior:
-        asmt_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                assessment_diffs_from_concept_centers
-    else:
-        asmt_grad_from_graph_regularization = 0
-    if using_l1_regularizer:
-        asmt_grad_from_norm_regularization = assessment_regularization_constant * np.sign(
-                assessment_embeddings)
-    else:
-        asmt_grad_from_norm_regularization = 2 * assessment_regularization_constant * \
-                assessment_embeddings
-    gradient[last_student_embedding_idx:last_assessment_embedding_idx] = (
-        asmt_grad_from_asmt_ixns + asmt_grad_from_graph_regularization + \
-                asmt_grad_from_norm_regularization).ravel()
-
-    # compute the gradient w.r.t. lesson embeddings,
-    # which is the sum of gradient of the log-likelihood of assessment and lesson interactions
-    # and the gradient of the regularization terms
-    lesson_grad_from_lesson_ixns = -lesson_participation_in_lesson_ixns.dot(diffs_over_var)
-    if using_graph_prior:
-        lesson_grad_from_graph_regularization = 2 * graph_regularization_constant * \
-                lesson_diffs_from_concept_centers
-    else:
-        lesson_grad_from_graph_regularization = 0
-    if using_l1_regularizer:
-        lesson_grad_from_norm_regularization = lesson_regularization_constant * np.sign(
-                lesson_embeddings)
-    else:
-        lesson_grad_from_norm_regularization = 2 * lesson_regularization_constant * \
-                lesson_embeddings
-    gradient[last_assessment_embedding_idx:last_lesson_embedding_idx] = (
-        lesson_grad_from_lesson_ixns + lesson_grad_from_graph_regularization + \
-                lesson_grad_from_norm_regularization).ravel()
-
-    if using_bias:
-        # compute the gradient w.r.t. student biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient[last_lesson_embedding_idx:last_student_bias_idx] = \
-                -student_bias_participation_in_assessment_ixns.dot(mult_diff).ravel()
-
-        # compute the gradient w.r.t. assessment biases,
-        # which is the sum of gradient of the log-likelihood of assessment interactions
-        gradient[last_student_bias_idx:last_assessment_bias_idx] = \
-                -assessment_participation_in_assessment_ixns.dot(mult_diff).ravel()
-
-    if using_graph_prior:
-        # compute the gradient w.r.t. concept embeddings,
-        # which is the sum of gradient of the log-likelihood of assessment
-        # and lesson interactions and the gradient of the regularization terms
-        concept_grad_from_assessments = -concept_participation_in_assessments.dot(
-            2 * assessment_diffs_from_concept_centers)
-
-        concept_grad_from_lessons = concept_participation_in_lessons.dot(
-            2 * lesson_diffs_from_concept_centers)
-
-        concept_grad_from_prereqs = concept_participation_in_prereqs.dot(
+        concept_grad_from_prereqs = self.concept_participation_in_prereqs.dot(
             postreq_concept_embeddings / postreq_concept_norms)
+        concept_grad_from_postreqs = self.concept_participation_in_postreqs.dot(
+            (prereq_concept_embeddings - postreq_concept_embeddings) / postreq_concept_norms - \
+                    prereq_dot_postreq * postreq_concept_embeddings / postreq_concept_norms**3)
 
-        concept_grad_from_postreqs = concept_participation_in_postreqs.dot(
-            (prereq_concept_embeddings - 2 * postreq_concept_embeddings) / postreq_concept_norms \
-                    - 2 * prereq_dot_postreq * postreq_concept_embeddings / \
-                    postreq_concept_norms**3)
-
-        concept_grad_from_norm_regularization = 2 * concept_regularization_constant * \
-                concept_embeddings
-        gradient[last_assessment_bias_idx:] = (graph_regularization_constant * (
-            concept_grad_from_assessments + concept_grad_from_lessons + \
-                    concept_grad_from_prereqs + concept_grad_from_postreqs) + \
-                    concept_grad_from_norm_regularization).ravel()
-
-    cost_from_assessment_ixns = np.einsum('ij->', np.log(one_plus_exp_diff))
-    cost_from_lesson_ixns = np.einsum('ij, ij', diffs, diffs) / (2 * learning_update_variance)
-    cost_from_student_regularization = student_regularization_constant * np.einsum(
-            'ij, ij', student_embeddings, student_embeddings)
-    if using_l1_regularizer:
-        cost_from_assessment_regularization = assessment_regularization_constant * np.absolute(
-                assessment_embeddings).sum()
-        cost_from_lesson_regularization = lesson_regularization_constant * np.absolute(
-                lesson_embeddings).sum()
-    else:
-        cost_from_assessment_regularization = assessment_regularization_constant * np.einsum(
-                'ij, ij', assessment_embeddings, assessment_embeddings)
-        cost_from_lesson_regularization = lesson_regularization_constant * np.einsum(
-                'ij, ij', lesson_embeddings, lesson_embeddings)
-    if using_graph_prior:
-        cost_from_concept_regularization = concept_regularization_constant * np.einsum(
-                'ij, ij', concept_embeddings, concept_embeddings)
-        cost_from_graph_regularization = graph_regularization_constant * ((
-            assessment_diffs_from_concept_centers**2).sum() + (
-            lesson_diffs_from_concept_centers**2).sum() + prereq_edge_diffs.sum())
-    else:
-        cost_from_concept_regularization = 0
-        cost_from_graph_regularization = 0
-    cost_from_norm_regularization = cost_from_student_regularization + \
-            cost_from_assessment_regularization + cost_from_lesson_regularization + \
-            cost_from_concept_regularization
-
-    cost_from_ixns = cost_from_assessment_ixns + cost_from_lesson_ixns
-    cost_from_regularization = cost_from_norm_regularization + cost_from_graph_regularization
-    cost = cost_from_ixns + cost_from_regularization
-
-    return cost, gradient
-
-def get_grad(
-    using_scipy=True,
-    using_lessons=True,
-    using_prereqs=True):
-    """
-    Select the appropriate gradient and cost function evaluator
-    for a model configuration
-
-    :param bool using_scipy: Using scipy.optimize.minize for optimization
-    :param bool using_lessons: Including lessons in the embedding model
-    :param bool using_prereqs: Including lesson prereqs in the embedding model
-    :rtype: function
-    :return: A function that takes current parameter values
-        as input, and outputs the gradient of the cost function
-        with respect to those parameters
-    """
+        concept_grad[:] = graph_regularization_constant * (
+            concept_grad_from_modules + concept_grad_from_prereqs + \
+                    concept_grad_from_postreqs) + 2 * self.concept_regularization_constant * \
+                    concept_embeddings
 
-    if using_scipy:
-        if using_lessons:
-            if using_prereqs:
-                return with_scipy_with_prereqs
-            else:
-                return with_scipy_without_prereqs
-        else:
-            return with_scipy_without_lessons
-    else:
-        if using_lessons:
-            if using_prereqs:
-                return without_scipy_with_prereqs
-            else:
-                return without_scipy_without_prereqs
-        else:
-            return without_scipy_without_lessons
+        cost_from_concept_regularization = self.concept_regularization_constant * np.einsum(
+            'ij, ij', concept_embeddings, concept_embeddings)
+        cost_from_graph_regularization = graph_regularization_constant * (
+            cost_from_modules + prereq_edge_diffs.sum())
 
+        return cost_from_concept_regularization + cost_from_graph_regularization
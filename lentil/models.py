@@ -7,13 +7,13 @@ Module for skill models
 
 
 from abc import abstractmethod
+import json
 import math
 import logging
 
 import numpy as np
+import pandas as pd
 from scipy import sparse
-from sklearn import cross_validation
-from sklearn.linear_model import LogisticRegression
 
 from . import datatools
 from . import forget
@@ -34,12 +34,272 @@ ASSESSMENT_BIASES = 'assessment_biases'
 # see docstring for EmbeddingModel.__init__ 
 ANTI_SINGULARITY_LOWER_BOUND = 0.001
 
+# version of the binary model format written by EmbeddingModel.save
+MODEL_FORMAT_VERSION = 1
+
 # names of parameters for MIRTModel
 STUDENT_FACTORS = 'student_factors'
 ASSESSMENT_FACTORS = 'assessment_factors'
 ASSESSMENT_OFFSETS = 'assessment_offsets'
 
 
+class StudentTrajectories(object):
+    """
+    Ragged storage for the student embeddings of an :py:class:`EmbeddingModel`
+
+    Student states are packed into a single matrix with shape (num_states, embedding_dimension),
+    and the states of the student at student_idx occupy rows offsets[student_idx] through
+    offsets[student_idx+1]-1 (one row per timestep, starting at timestep 0). Memory therefore
+    scales with the total length of student histories instead of
+    num_students * embedding_dimension * duration.
+
+    A student's state after their last interaction is pinned to the state at their last
+    interaction, so lookups for timesteps beyond the end of a trajectory are clamped.
+
+    Indexing with [student_idx(es), skill_idx(es), timestep(s)] mimics the dense
+    (num_students, embedding_dimension, duration) student tensor.
+    """
+
+    def __init__(self, offsets, embedding_dimension, states=None, duration=None):
+        """
+        Initialize trajectory store
+
+        :param np.ndarray offsets: An array of length num_students + 1 (see
+            :py:func:`datatools.InteractionHistory.trajectory_offsets`)
+
+        :param int embedding_dimension: The number of dimensions in the latent skill space
+        :param np.ndarray|None states: Packed student states with shape
+            (offsets[-1], embedding_dimension). None => initialize states to zero.
+
+        :param int|None duration: Number of timesteps exposed by dense-style indexing
+            None => use the length of the longest trajectory
+        """
+
+        self.offsets = np.asarray(offsets, dtype=int)
+        self.embedding_dimension = embedding_dimension
+
+        if states is None:
+            states = np.zeros((self.offsets[-1], embedding_dimension))
+        elif states.shape != (self.offsets[-1], embedding_dimension):
+            raise ValueError('Expected packed states with shape {} not {}'.format(
+                (self.offsets[-1], embedding_dimension), states.shape))
+        self.states = states
+
+        self.duration = duration if duration is not None else (
+            self.lengths().max() if self.num_students() > 0 else 0)
+
+    @classmethod
+    def from_dense(cls, student_embeddings):
+        """
+        Pack a dense student tensor
+
+        :param np.ndarray student_embeddings: A student tensor with shape
+            (num_students, embedding_dimension, duration)
+
+        :rtype: StudentTrajectories
+        :return: A trajectory store where every student has a full-length trajectory
+        """
+
+        num_students, embedding_dimension, duration = student_embeddings.shape
+        offsets = np.arange(0, (num_students + 1) * duration, duration)
+        states = np.reshape(
+            student_embeddings.swapaxes(1, 2), (num_students * duration, embedding_dimension))
+
+        return cls(offsets, embedding_dimension, states=states, duration=duration)
+
+    @property
+    def shape(self):
+        """
+        :rtype: (int,int,int)
+        :return: The shape of the equivalent dense student tensor
+        """
+        return (self.num_students(), self.embedding_dimension, self.duration)
+
+    def num_students(self):
+        """
+        :rtype: int
+        :return: Number of students
+        """
+        return len(self.offsets) - 1
+
+    def num_states(self):
+        """
+        :rtype: int
+        :return: Total number of stored student states
+        """
+        return self.offsets[-1]
+
+    def lengths(self):
+        """
+        :rtype: np.ndarray
+        :return: Number of stored states (i.e., timestep of last interaction + 1)
+            for each student
+        """
+        return np.diff(self.offsets)
+
+    def state_idxes(self, student_idxes, timesteps):
+        """
+        Get rows of the packed states for (student, timestep) pairs
+
+        :param np.ndarray|int student_idxes: Student indices
+        :param np.ndarray|int timesteps: Timesteps (broadcast against student_idxes)
+        :rtype: np.ndarray|int
+        :return: Row indices into self.states, clamped to the end of each trajectory
+        """
+
+        student_idxes = np.asarray(student_idxes)
+        timesteps = np.asarray(timesteps)
+        last_state_idxes = self.offsets[student_idxes + 1] - 1
+
+        return np.minimum(self.offsets[student_idxes] + timesteps, last_state_idxes)
+
+    def student_idxes_of_states(self):
+        """
+        :rtype: np.ndarray
+        :return: For each row of self.states, the index of the student it belongs to
+        """
+        return np.repeat(np.arange(self.num_students()), self.lengths())
+
+    def extend(self, student_idxes, timesteps):
+        """
+        Extend the trajectories of students up to new last timesteps
+
+        New states are initialized to the state at the end of the old trajectory,
+        consistent with lookups past the end of a trajectory being clamped
+
+        :param np.ndarray student_idxes: Indices of students
+        :param np.ndarray timesteps: The new timestep of the last state of each student
+            (trajectories are never shortened)
+        """
+
+        lengths = self.lengths()
+        new_lengths = lengths.copy()
+        new_lengths[student_idxes] = np.maximum(lengths[student_idxes], timesteps + 1)
+        if (new_lengths == lengths).all():
+            return
+
+        new_offsets = np.concatenate(([0], np.cumsum(new_lengths)))
+
+        self.states = self.repacked(new_offsets).states
+        self.offsets = new_offsets
+        self.duration = max(self.duration, new_lengths.max())
+
+    def repacked(self, offsets):
+        """
+        Copy the trajectories into a store with different trajectory lengths
+
+        Shortened trajectories keep their first states, and lengthened trajectories
+        are padded with the state at the end of the old trajectory
+
+        :param np.ndarray offsets: An array of length num_students + 1
+        :rtype: StudentTrajectories
+        :return: A trajectory store with the given offsets
+        """
+
+        offsets = np.asarray(offsets, dtype=int)
+        if len(offsets) != len(self.offsets):
+            raise ValueError('Expected offsets for {} students not {}'.format(
+                self.num_students(), len(offsets) - 1))
+
+        student_idxes_of_states = np.repeat(np.arange(self.num_students()), np.diff(offsets))
+        timesteps_of_states = np.arange(offsets[-1]) - offsets[student_idxes_of_states]
+
+        return StudentTrajectories(
+            offsets,
+            self.embedding_dimension,
+            states=self.states[self.state_idxes(student_idxes_of_states, timesteps_of_states)],
+            duration=self.duration)
+
+    def to_dense(self):
+        """
+        :rtype: np.ndarray
+        :return: A dense student tensor with shape (num_students, embedding_dimension, duration)
+        """
+        return self[:, :, :]
+
+    def __getitem__(self, key):
+        student_idxes, skill_idxes, timesteps = key
+
+        if isinstance(student_idxes, slice):
+            student_idxes = np.arange(self.num_students())[student_idxes]
+
+        if isinstance(timesteps, slice):
+            # keep the time axis last, like basic indexing on the dense tensor
+            timesteps = np.arange(self.duration)[timesteps]
+            state_idxes = self.state_idxes(np.asarray(student_idxes)[..., None], timesteps)
+            return np.swapaxes(self.states[state_idxes], -1, -2)[..., skill_idxes, :]
+
+        return self.states[self.state_idxes(student_idxes, timesteps)][..., skill_idxes]
+
+
+class InferenceCache(object):
+    """
+    Frozen inference representation of the module parameters of a trained
+    :py:class:`EmbeddingModel`
+
+    The assessment norms in the embedding distance (s dot a) / ||a|| - ||a|| are constant
+    after fitting, so each assessment is stored as a unit vector and a combined offset
+    (assessment bias - ||a||) in contiguous float32 arrays, and scoring an interaction
+    reduces to a dot product and two additions. Lesson prerequisites are stored
+    as unit vectors and norms.
+    """
+
+    # names of cached arrays
+    ARRAY_NAMES = [
+        'assessment_norms',
+        'assessment_unit_vectors',
+        'assessment_offsets',
+        'prereq_norms',
+        'prereq_unit_vectors']
+
+    def __init__(self, model, dtype=np.float32):
+        """
+        Initialize cache
+
+        :param EmbeddingModel model: A trained embedding model
+        :param type dtype: Data type of cached arrays
+        """
+
+        assessment_norms = np.linalg.norm(model.assessment_embeddings, axis=1)
+        self.assessment_norms = assessment_norms.astype(dtype)
+        self.assessment_unit_vectors = np.ascontiguousarray(
+            model.assessment_embeddings / assessment_norms[:, None], dtype=dtype)
+        if model.using_bias:
+            self.assessment_offsets = (model.assessment_biases - assessment_norms).astype(dtype)
+        else:
+            self.assessment_offsets = (-assessment_norms).astype(dtype)
+
+        if model.using_prereqs:
+            prereq_norms = np.linalg.norm(model.prereq_embeddings, axis=1)
+            self.prereq_norms = prereq_norms.astype(dtype)
+            self.prereq_unit_vectors = np.ascontiguousarray(
+                model.prereq_embeddings / prereq_norms[:, None], dtype=dtype)
+        else:
+            self.prereq_norms = self.prereq_unit_vectors = None
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Wrap precomputed arrays (e.g., memory-mapped from a model file) without copying them
+
+        :param dict[str,np.ndarray] arrays: A dictionary mapping names in
+            InferenceCache.ARRAY_NAMES to arrays (missing names => None)
+
+        :rtype: InferenceCache
+        :return: A cache backed by the arrays
+        """
+
+        cache = cls.__new__(cls)
+        for name in cls.ARRAY_NAMES:
+            setattr(cache, name, arrays.get(name))
+        return cache
+
+
+# parameters of EmbeddingModel that InferenceCache depends on
+_INFERENCE_CACHE_DEPENDENCIES = frozenset([
+    ASSESSMENT_EMBEDDINGS, ASSESSMENT_BIASES, PREREQ_EMBEDDINGS, 'using_bias', 'using_prereqs'])
+
+
 class SkillModel(object):
     """
     Superclass for skill models. A skill model is an object that
@@ -79,6 +339,26 @@ class SkillModel(object):
 
         return math.exp(self.assessment_outcome_log_likelihood(interaction, outcome=True))
 
+    @abstractmethod
+    def pass_likelihoods_from_idxes(
+        self,
+        student_idxes,
+        assessment_idxes,
+        timesteps=None):
+        """
+        Compute the likelihoods of passing a batch of assessment interactions,
+        given as integer index arrays
+
+        :param np.ndarray student_idxes: Indices of students
+        :param np.ndarray assessment_idxes: Indices of assessments
+        :param np.ndarray|None timesteps: Timesteps of interactions
+            (ignored by models without student dynamics)
+
+        :rtype: np.array
+        :return: Likelihoods of passing outcomes, given student and content parameters
+        """
+        pass
+
     def assessment_pass_likelihoods(
         self,
         interactions):
@@ -192,8 +472,9 @@ class EmbeddingModel(SkillModel):
         if self.using_graph_prior:
             self.concept_embeddings = None
 
-        # student tensor
+        # ragged student tensor
         # student_idx, skillidx, timestep -> skill level
+        # see StudentTrajectories
         self.student_embeddings = None
 
         # assessment matrix
@@ -223,8 +504,10 @@ class EmbeddingModel(SkillModel):
 
         if self.history is not None:
             num_students = self.history.num_students()
-            self.student_embeddings = np.zeros(
-                    (num_students, self.embedding_dimension, self.history.duration()))
+            self.student_embeddings = StudentTrajectories(
+                self.history.trajectory_offsets(),
+                self.embedding_dimension,
+                duration=self.history.duration())
 
             num_assessments = self.history.num_assessments()
             self.assessment_embeddings = np.zeros((num_assessments, self.embedding_dimension))
@@ -243,6 +526,167 @@ class EmbeddingModel(SkillModel):
                 num_concepts = len(self.graph.idx_of_concept_id)
                 self.concept_embeddings = np.zeros((num_concepts, self.embedding_dimension))
 
+    def __setattr__(self, name, value):
+        # reassigning module parameters (e.g., at the end of fitting) invalidates
+        # the frozen inference representation
+        if name in _INFERENCE_CACHE_DEPENDENCIES:
+            self.__dict__.pop('_inference_cache', None)
+        super(EmbeddingModel, self).__setattr__(name, value)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_inference_cache', None)
+        return state
+
+    def inference_cache(self):
+        """
+        Get the frozen inference representation of module parameters,
+        which is built on first use after parameters are assigned
+
+        Parameters that are modified in place need a call to
+        :py:func:`models.EmbeddingModel.invalidate_inference_cache`
+
+        :rtype: InferenceCache
+        :return: Precomputed norms, unit vectors and offsets of module embeddings
+        """
+
+        cache = self.__dict__.get('_inference_cache')
+        if cache is None:
+            cache = self._inference_cache = InferenceCache(self)
+        return cache
+
+    def invalidate_inference_cache(self):
+        """
+        Drop the frozen inference representation of module parameters
+        """
+
+        self.__dict__.pop('_inference_cache', None)
+
+    def save(self, path, dtype=None):
+        """
+        Write the model to a compact, versioned binary file
+
+        Only the parameters needed for inference are stored: module embeddings and biases,
+        packed student trajectories and biases, the id -> index maps of the interaction
+        history, hyperparameters, and the frozen inference representation of module
+        parameters (see :py:class:`InferenceCache`). The interaction history, concept graph,
+        and models of forgetting and learning update variance are not stored.
+
+        The file is an uncompressed .npz archive without pickled objects,
+        so :py:func:`models.EmbeddingModel.load` can memory-map it.
+
+        :param str path: Output path to model file
+        :param type|None dtype: Data type of stored parameters (e.g., np.float32)
+            None => keep the data types of the model's parameters
+        """
+
+        if self.history is None:
+            raise ValueError('Cannot save a model without an interaction history!')
+        if self.graph is not None or self.forgetting_model is not None or \
+                self.tv_luv_model is not None:
+            _logger.warning('Concept graph, forgetting model, and learning update variance model '
+                            'are only used for training, and will not be saved')
+
+        id_maps = self.history if isinstance(
+            self.history, datatools.IdMaps) else datatools.IdMaps.from_history(self.history)
+
+        hyperparameters = {
+            'embedding_dimension' : int(self.embedding_dimension),
+            'using_lessons' : bool(self.using_lessons),
+            'using_prereqs' : bool(self.using_prereqs),
+            'using_bias' : bool(self.using_bias),
+            'using_l1_regularizer' : bool(self.using_l1_regularizer),
+            'learning_update_variance_constant' : float(self.learning_update_variance_constant),
+            'forgetting_penalty_term_constant' : float(self.forgetting_penalty_term_constant),
+            'anti_singularity_lower_bound' : float(
+                self.anti_singularity_lower_bounds[ASSESSMENT_EMBEDDINGS])
+        }
+
+        cast = (lambda x: x) if dtype is None else (lambda x: np.asarray(x, dtype=dtype))
+
+        arrays = {
+            'format_version' : np.array(MODEL_FORMAT_VERSION),
+            'model_class' : np.array(type(self).__name__),
+            'hyperparameters' : np.array(json.dumps(hyperparameters, sort_keys=True)),
+            'student_ids' : id_maps._student_id_array,
+            'assessment_ids' : id_maps._assessment_id_array,
+            'lesson_ids' : id_maps._lesson_id_array,
+            'history_duration' : np.array(id_maps.duration()),
+            'trajectory_offsets' : self.student_embeddings.offsets,
+            'trajectory_duration' : np.array(self.student_embeddings.duration),
+            STUDENT_EMBEDDINGS : cast(self.student_embeddings.states),
+            STUDENT_BIASES : cast(self.student_biases),
+            ASSESSMENT_EMBEDDINGS : cast(self.assessment_embeddings),
+            ASSESSMENT_BIASES : cast(self.assessment_biases)
+        }
+        if self.using_lessons:
+            arrays[LESSON_EMBEDDINGS] = cast(self.lesson_embeddings)
+        if self.using_prereqs:
+            arrays[PREREQ_EMBEDDINGS] = cast(self.prereq_embeddings)
+
+        cache = self.inference_cache()
+        for name in InferenceCache.ARRAY_NAMES:
+            if getattr(cache, name) is not None:
+                arrays['inference_cache_' + name] = getattr(cache, name)
+
+        # np.savez appends .npz to paths without the extension, but not to file objects
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a model from a file written by :py:func:`models.EmbeddingModel.save`
+
+        With mmap=True, parameter arrays are read-only memory maps into the file, so
+        processes that load the same file share one copy in the page cache, and loading
+        does not read parameters until they are used. The model's history is a
+        :py:class:`datatools.IdMaps`, so the model can score interactions and recommend
+        modules, but cannot be refit or fold in new interactions.
+
+        :param str path: Path to model file
+        :param bool mmap: True => memory-map parameter arrays instead of reading them into memory
+        :rtype: EmbeddingModel
+        :return: A trained embedding model
+        """
+
+        arrays = datatools._load_npz(path, mmap_mode='r' if mmap else None)
+
+        format_version = int(arrays['format_version'])
+        if format_version > MODEL_FORMAT_VERSION:
+            raise ValueError('Unsupported model format version: {}'.format(format_version))
+        model_class = str(arrays['model_class'])
+        if model_class != cls.__name__:
+            raise ValueError('Expected a file containing {} not {}'.format(
+                cls.__name__, model_class))
+
+        model = cls(None, **json.loads(str(arrays['hyperparameters'])))
+        model.history = datatools.IdMaps(
+            arrays['student_ids'],
+            arrays['assessment_ids'],
+            arrays['lesson_ids'],
+            int(arrays['history_duration']))
+
+        model.student_embeddings = StudentTrajectories(
+            arrays['trajectory_offsets'],
+            model.embedding_dimension,
+            states=arrays[STUDENT_EMBEDDINGS],
+            duration=int(arrays['trajectory_duration']))
+        model.student_biases = arrays[STUDENT_BIASES]
+        model.assessment_embeddings = arrays[ASSESSMENT_EMBEDDINGS]
+        model.assessment_biases = arrays[ASSESSMENT_BIASES]
+        if model.using_lessons:
+            model.lesson_embeddings = arrays[LESSON_EMBEDDINGS]
+        if model.using_prereqs:
+            model.prereq_embeddings = arrays[PREREQ_EMBEDDINGS]
+
+        # assigned last, since assigning module parameters invalidates the cache
+        prefix = 'inference_cache_'
+        model._inference_cache = InferenceCache.from_arrays({
+            k[len(prefix):]: v for k, v in arrays.items() if k.startswith(prefix)})
+
+        return model
+
     def learning_update_variance(self, times_since_prev_ixn_for_lesson_ixns):
         """
         Compute variances of Gaussian learning updates
@@ -315,6 +759,26 @@ class EmbeddingModel(SkillModel):
 
         estimator.fit_model(self)
 
+    def fold_in(self, new_interactions, estimator=None):
+        """
+        Update the embeddings of existing students with new interactions,
+        without refitting the rest of the model
+
+        The new interactions are appended to the model's interaction history
+
+        :param pd.DataFrame new_interactions: Interactions between existing students
+            and existing modules, that occur at or after each student's last interaction
+        :param est.StudentFoldInEstimator|None estimator: A fold-in estimator
+            None => use the default settings of est.StudentFoldInEstimator
+        """
+
+        if estimator is None:
+            # est depends on this module
+            from . import est
+            estimator = est.StudentFoldInEstimator()
+
+        estimator.fold_in_model(self, new_interactions)
+
     def embedding_distance(
         self,
         student_embedding,
@@ -365,12 +829,18 @@ class EmbeddingModel(SkillModel):
         student_idx = self.history.idx_of_student_id(student_id)
         assessment_idx = self.history.idx_of_assessment_id(assessment_id)
 
-        return self.assessment_outcome_log_likelihood_helper(
-            self.student_embeddings[student_idx, :, timestep],
-            self.assessment_embeddings[assessment_idx, :],
-            self.student_biases[student_idx],
-            self.assessment_biases[assessment_idx],
-            outcome)
+        # the cache holds float32 arrays, so compute the logit in float64
+        cache = self.inference_cache()
+        delta = np.dot(
+            np.asarray(self.student_embeddings[student_idx, :, timestep], dtype=np.float64),
+            np.asarray(cache.assessment_unit_vectors[assessment_idx, :], dtype=np.float64)) + \
+                float(cache.assessment_offsets[assessment_idx]) + \
+                float(self.student_biases[student_idx])
+
+        try:
+            return -math.log(1 + math.exp(-outcome * delta))
+        except: # overflow or underflow
+            return np.nan
 
     def assessment_outcome_log_likelihood_helper(
         self,
@@ -405,22 +875,38 @@ class EmbeddingModel(SkillModel):
         :return: A list of pass likelihoods
         """
 
-        student_idxes = df['student_id'].apply(self.history.idx_of_student_id)
-        assessment_idxes = df['module_id'].apply(self.history.idx_of_assessment_id)
+        return self.pass_likelihoods_from_idxes(
+            self.history.idxes_of_student_ids(df['student_id']),
+            self.history.idxes_of_assessment_ids(df['module_id']),
+            np.asarray(df['timestep'].values, dtype=int))
+
+    def pass_likelihoods_from_idxes(self, student_idxes, assessment_idxes, timesteps):
+        """
+        Compute pass likelihoods of a batch of assessment interactions,
+        without looking up ids
+
+        :param np.ndarray student_idxes: Indices of students
+        :param np.ndarray assessment_idxes: Indices of assessments
+        :param np.ndarray timesteps: Timesteps of interactions
+        :rtype: np.array
+        :return: A list of pass likelihoods
+        """
 
-        student_embeddings_of_ixns = self.student_embeddings[student_idxes, :, df['timestep']]
-        assessment_embeddings_of_ixns = self.assessment_embeddings[assessment_idxes, :]
-        assessment_embedding_norms_of_ixns = np.linalg.norm(assessment_embeddings_of_ixns, axis=1)
+        cache = self.inference_cache()
+
+        # the cache holds float32 arrays, so the dot products are accumulated in float64
+        # and the logistic is evaluated in float64
+        student_embeddings_of_ixns = self.student_embeddings.states[
+            self.student_embeddings.state_idxes(student_idxes, timesteps)]
+        deltas = np.einsum(
+            'ij, ij->i',
+            student_embeddings_of_ixns,
+            cache.assessment_unit_vectors[assessment_idxes, :],
+            dtype=np.float64) + cache.assessment_offsets[assessment_idxes].astype(np.float64)
         if self.using_bias:
-            student_biases_of_ixns = self.student_biases[student_idxes]
-            assessment_biases_of_ixns = self.assessment_biases[assessment_idxes]
-        else:
-            student_biases_of_ixns = assessment_biases_of_ixns = 0
+            deltas += self.student_biases[student_idxes]
 
-        return 1 / (1 + np.exp(-(
-            np.einsum('ij, ij->i', student_embeddings_of_ixns, assessment_embeddings_of_ixns) / \
-                    assessment_embedding_norms_of_ixns - assessment_embedding_norms_of_ixns + \
-                    student_biases_of_ixns + assessment_biases_of_ixns)))
+        return 1 / (1 + np.exp(-deltas))
 
 
 class StudentBiasedCoinModel(SkillModel):
@@ -454,7 +940,8 @@ class StudentBiasedCoinModel(SkillModel):
         self.name_of_user_id = name_of_user_id
 
         # student_idx -> probability of the student passing any assessment
-        self.idx_of_user_id = {k: i for i, k in enumerate(self.history.data[self.name_of_user_id].unique())}
+        self._user_ids = pd.Index(self.history.data[self.name_of_user_id].unique())
+        self.idx_of_user_id = {k: i for i, k in enumerate(self._user_ids)}
         self._student_pass_likelihoods = np.zeros(len(self.idx_of_user_id))
 
     def fit(self):
@@ -510,7 +997,7 @@ class StudentBiasedCoinModel(SkillModel):
         except KeyError:
             raise ValueError('Interaction is missing fields!')
 
-        student_idx = self.idx_of_user_id[student_id]
+        student_idx = self.idx_of_user_id[user_id]
         pass_likelihood = self._student_pass_likelihoods[student_idx]
         outcome_likelihood = pass_likelihood if outcome else (1 - pass_likelihood)
 
@@ -525,8 +1012,21 @@ class StudentBiasedCoinModel(SkillModel):
         :return: A list of pass likelihoods
         """
 
-        return np.array([self._student_pass_likelihoods[user_idx] for user_idx in \
-                df[self.name_of_user_id].map(self.idx_of_user_id)])
+        return self.pass_likelihoods_from_idxes(
+            datatools._idxes_of_ids(self._user_ids, df[self.name_of_user_id]), None)
+
+    def pass_likelihoods_from_idxes(self, student_idxes, assessment_idxes, timesteps=None):
+        """
+        Compute pass likelihoods of a batch of assessment interactions
+
+        :param np.ndarray student_idxes: Indices of students (see self.idx_of_user_id)
+        :param np.ndarray|None assessment_idxes: Ignored
+        :param np.ndarray|None timesteps: Ignored
+        :rtype: np.array
+        :return: A list of pass likelihoods
+        """
+
+        return self._student_pass_likelihoods[student_idxes]
 
 class AssessmentBiasedCoinModel(SkillModel):
     """
@@ -627,8 +1127,21 @@ class AssessmentBiasedCoinModel(SkillModel):
         :return: A list of pass likelihoods
         """
 
-        return np.array([self._assessment_pass_likelihoods[assessment_idx] for assessment_idx in \
-                df['module_id'].apply(self.history.idx_of_assessment_id)])
+        return self.pass_likelihoods_from_idxes(
+            None, self.history.idxes_of_assessment_ids(df['module_id']))
+
+    def pass_likelihoods_from_idxes(self, student_idxes, assessment_idxes, timesteps=None):
+        """
+        Compute pass likelihoods of a batch of assessment interactions
+
+        :param np.ndarray|None student_idxes: Ignored
+        :param np.ndarray assessment_idxes: Indices of assessments
+        :param np.ndarray|None timesteps: Ignored
+        :rtype: np.array
+        :return: A list of pass likelihoods
+        """
+
+        return self._assessment_pass_likelihoods[assessment_idxes]
 
 class IRTModel(SkillModel):
     """
@@ -664,9 +1177,11 @@ class IRTModel(SkillModel):
         # with only lesson interactions. Note that we still want to estimate proficiencies for
         # these students, but they will get regularized to zero due to the absence
         # of any assessment interactions.
-        self.idx_of_student_id = {k: i for i, k in enumerate(history[self.name_of_user_id].unique())}
+        self._student_ids = pd.Index(history[self.name_of_user_id].unique())
+        self.idx_of_student_id = {k: i for i, k in enumerate(self._student_ids)}
         self.num_students = len(self.idx_of_student_id)
-        self.idx_of_assessment_id = {k: i for i, k in enumerate(history['module_id'].unique())}
+        self._assessment_ids = pd.Index(history['module_id'].unique())
+        self.idx_of_assessment_id = {k: i for i, k in enumerate(self._assessment_ids)}
         self.num_assessments = len(self.idx_of_assessment_id)
 
     @abstractmethod
@@ -681,10 +1196,30 @@ class IRTModel(SkillModel):
         """
         return
 
+    @abstractmethod
+    def logits_from_idxes(self, student_idxes, assessment_idxes):
+        """
+        Compute the linear predictors (before the intercept) of a batch of
+        assessment interactions directly from the coefficients of the logistic regression,
+        instead of constructing a feature matrix
+
+        :param np.ndarray student_idxes: Indices of students (see self.idx_of_student_id)
+        :param np.ndarray assessment_idxes: Indices of assessments
+            (see self.idx_of_assessment_id)
+
+        :rtype: np.ndarray
+        :return: Dot products of feature vectors with self.model.coef_
+        """
+        return
+
     def fit(self):
         """
         Estimate model parameters that fit the interaction history in self.history
         """
+        # sklearn is slow to import, and only needed by IRT models
+        from sklearn import cross_validation
+        from sklearn.linear_model import LogisticRegression
+
         X = self.feature_matrix_from_interactions(self.history)
         Y = np.array(self.history['outcome'].apply(lambda x: 1 if x else 0).values)
 
@@ -724,16 +1259,12 @@ class IRTModel(SkillModel):
         :return: Log-likelihood of outcome that occurred, under the model
         """
 
-        X = np.zeros(self.num_students+self.num_assessments)
-        X[self.idx_of_student_id[interaction[self.name_of_user_id]]] = \
-                X[self.idx_of_assessment_id[interaction['module_id']]] = 1
+        pass_likelihood = self.pass_likelihoods_from_idxes(
+            np.array([self.idx_of_student_id[interaction[self.name_of_user_id]]]),
+            np.array([self.idx_of_assessment_id[interaction['module_id']]]))[0]
 
-        log_proba = self.model.predict_log_proba(X)
-
-        idx_of_zero = 1 if self.model.classes_[1]==0 else 0
-
-        return log_proba[0, idx_of_zero ^ (1 if (
-            interaction['outcome'] if outcome is None else outcome) else 0)]
+        return math.log(pass_likelihood if (
+            interaction['outcome'] if outcome is None else outcome) else 1 - pass_likelihood)
 
     def assessment_pass_likelihoods(self, df):
         """
@@ -743,10 +1274,29 @@ class IRTModel(SkillModel):
         :rtype: list[float]
         :return: A list of pass likelihoods
         """
-        X = self.feature_matrix_from_interactions(df)
-        probas = self.model.predict_proba(X)
-        idx_of_one = 1 if self.model.classes_[1]==1 else 0
-        return probas[:, idx_of_one]
+        return self.pass_likelihoods_from_idxes(
+            datatools._idxes_of_ids(self._student_ids, df[self.name_of_user_id]),
+            datatools._idxes_of_ids(self._assessment_ids, df['module_id']))
+
+    def pass_likelihoods_from_idxes(self, student_idxes, assessment_idxes, timesteps=None):
+        """
+        Compute pass likelihoods of a batch of assessment interactions
+
+        Equivalent to self.model.predict_proba on the feature matrix of the interactions
+
+        :param np.ndarray student_idxes: Indices of students (see self.idx_of_student_id)
+        :param np.ndarray assessment_idxes: Indices of assessments
+            (see self.idx_of_assessment_id)
+        :param np.ndarray|None timesteps: Ignored
+        :rtype: np.array
+        :return: A list of pass likelihoods
+        """
+
+        logits = self.logits_from_idxes(student_idxes, assessment_idxes) + \
+                self.model.intercept_[0]
+        if self.model.classes_[1] != 1:
+            logits = -logits
+        return 1 / (1 + np.exp(-logits))
 
 class OneParameterLogisticModel(IRTModel):
     """
@@ -766,8 +1316,8 @@ class OneParameterLogisticModel(IRTModel):
         :return: A sparse array of dimensions [n_samples] X [n_features]
         """
 
-        student_idxes = np.array(df[self.name_of_user_id].map(self.idx_of_student_id).values)
-        assessment_idxes = np.array(df['module_id'].map(self.idx_of_assessment_id).values)
+        student_idxes = datatools._idxes_of_ids(self._student_ids, df[self.name_of_user_id])
+        assessment_idxes = datatools._idxes_of_ids(self._assessment_ids, df['module_id'])
 
         num_ixns = len(df)
         ixn_idxes = np.concatenate((list(range(num_ixns)), list(range(num_ixns))), axis=0)
@@ -778,6 +1328,16 @@ class OneParameterLogisticModel(IRTModel):
             (np.ones(2*num_ixns), (ixn_idxes, studa_idxes)),
             shape=(num_ixns, self.num_students + self.num_assessments)).tocsr()
 
+    def logits_from_idxes(self, student_idxes, assessment_idxes):
+        """
+        Proficiency of student + coefficient of assessment (i.e., negative difficulty)
+
+        See :py:func:`models.IRTModel.logits_from_idxes`
+        """
+
+        coef = self.model.coef_[0]
+        return coef[student_idxes] + coef[self.num_students + assessment_idxes]
+
 class TwoParameterLogisticModel(IRTModel):
     """
     Class for two-parameter logistic item response theory (1PL IRT)
@@ -796,8 +1356,8 @@ class TwoParameterLogisticModel(IRTModel):
         :return: A sparse array of dimensions [n_samples] X [n_features]
         """
 
-        student_idxes = np.array(df[self.name_of_user_id].map(self.idx_of_student_id).values)
-        assessment_idxes = np.array(df['module_id'].map(self.idx_of_assessment_id).values)
+        student_idxes = datatools._idxes_of_ids(self._student_ids, df[self.name_of_user_id])
+        assessment_idxes = datatools._idxes_of_ids(self._assessment_ids, df['module_id'])
 
         num_ixns = len(df)
         ixn_idxes = np.concatenate((list(range(num_ixns)), list(range(num_ixns))), axis=0)
@@ -809,6 +1369,17 @@ class TwoParameterLogisticModel(IRTModel):
             (np.ones(2*num_ixns), (ixn_idxes, studa_idxes)),
             shape=(num_ixns, (self.num_students + 1) * self.num_assessments)).tocsr()
 
+    def logits_from_idxes(self, student_idxes, assessment_idxes):
+        """
+        Coefficient of student-assessment pair + coefficient of assessment
+
+        See :py:func:`models.IRTModel.logits_from_idxes`
+        """
+
+        coef = self.model.coef_[0]
+        return coef[student_idxes * self.num_assessments + assessment_idxes] + coef[
+            self.num_students * self.num_assessments + assessment_idxes]
+
 
 class MIRTModel(object):
     """
@@ -858,10 +1429,22 @@ class MIRTModel(object):
         :return: A list of pass likelihoods
         """
 
-        student_idxes = np.array(df['student_id'].apply(self.history.idx_of_student_id).values)
-        assessment_idxes = np.array(df['module_id'].apply(
-            self.history.idx_of_assessment_id).values)
-        
+        return self.pass_likelihoods_from_idxes(
+            self.history.idxes_of_student_ids(df['student_id']),
+            self.history.idxes_of_assessment_ids(df['module_id']))
+
+    def pass_likelihoods_from_idxes(self, student_idxes, assessment_idxes, timesteps=None):
+        """
+        Compute pass likelihoods of a batch of assessment interactions,
+        without looking up ids
+
+        :param np.ndarray student_idxes: Indices of students
+        :param np.ndarray assessment_idxes: Indices of assessments
+        :param np.ndarray|None timesteps: Ignored (student factors are static)
+        :rtype: np.array
+        :return: A list of pass likelihoods
+        """
+
         student_factors_of_ixns = self.student_factors[student_idxes, :]
         assessment_factors_of_ixns = self.assessment_factors[assessment_idxes, :]
         assessment_offsets_of_ixns = self.assessment_offsets[assessment_idxes]
@@ -0,0 +1,371 @@
+"""
+Module for recommending lessons and assessments to students,
+using a trained embedding model
+"""
+
+import logging
+
+import numpy as np
+from scipy import spatial
+
+
+_logger = logging.getLogger(__name__)
+
+# upper bound on the number of (student, lesson, target assessment) entries
+# that get scored at once, which caps the size of temporaries in top_k_lessons
+MAX_BLOCK_ENTRIES = 2**22
+
+
+def _logistic(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def _logit(p):
+    with np.errstate(divide='ignore'):
+        return np.log(p) - np.log1p(-p)
+
+
+def _top_k(scores, k):
+    """
+    Get the k highest-scoring columns of each row, using a partial sort
+
+    :param np.ndarray scores: A matrix with shape (num_rows, num_columns)
+    :param int k: Number of columns to keep in each row
+    :rtype: (np.ndarray,np.ndarray)
+    :return: (Column indices, scores), both with shape (num_rows, k),
+        sorted in decreasing order of score
+    """
+
+    num_rows, num_columns = scores.shape
+    k = min(k, num_columns)
+    if k < num_columns:
+        idxes = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        idxes = np.tile(np.arange(num_columns), (num_rows, 1))
+    top_scores = scores[np.arange(num_rows)[:, None], idxes]
+    order = np.argsort(-top_scores, axis=1)
+    rows = np.arange(num_rows)[:, None]
+    return idxes[rows, order], top_scores[rows, order]
+
+
+class EmbeddingRecommender(object):
+    """
+    Answers batched recommendation queries for students in a trained
+    :py:class:`models.EmbeddingModel`, like "which K lessons maximize expected gain for
+    each of these students right now?" or "which assessments are in the 60-80%
+    pass-likelihood band for each of these students?"
+
+    Students are scored in blocks against all modules at once, using the frozen inference
+    representation of the model (see :py:class:`models.InferenceCache`).
+
+    Assessment scores are inner products of (student embedding, 1) with
+    (assessment unit vector, assessment offset), so pass-likelihood bands can optionally
+    be served from a k-d tree over assessments, after the usual reduction of
+    maximum inner product search to nearest neighbor search.
+    This pays off when there are many assessments and bands are narrow.
+    """
+
+    def __init__(self, model, block_size=1024, using_spatial_index=False):
+        """
+        Initialize recommender
+
+        :param models.EmbeddingModel model: A trained embedding model
+        :param int block_size: Number of students scored at once
+        :param bool using_spatial_index:
+            True => use a k-d tree over assessments to find assessments in a band
+            False => score every assessment
+        """
+
+        if block_size < 1:
+            raise ValueError('block_size must be positive not {}'.format(block_size))
+
+        self.model = model
+        self.block_size = block_size
+        self.using_spatial_index = using_spatial_index
+
+        self._assessment_tree = None
+        self._assessment_tree_cache = None
+
+    def _student_states(self, student_idxes, timesteps=None):
+        """
+        Get the embeddings and biases of students
+
+        :param np.ndarray student_idxes: Indices of students
+        :param np.ndarray|None timesteps: Timesteps of student states
+            None => the state of each student after their last interaction
+
+        :rtype: (np.ndarray,np.ndarray)
+        :return: (Student embeddings with shape (num_students, embedding_dimension),
+            student biases)
+        """
+
+        student_embeddings = self.model.student_embeddings
+        if timesteps is None:
+            timesteps = student_embeddings.lengths()[student_idxes] - 1
+        states = student_embeddings.states[
+            student_embeddings.state_idxes(student_idxes, timesteps)]
+
+        if self.model.using_bias:
+            biases = self.model.student_biases[student_idxes]
+        else:
+            biases = np.zeros(len(student_idxes))
+
+        return states, biases
+
+    def _blocks(self, num_students, block_size):
+        for start in range(0, num_students, block_size):
+            yield slice(start, min(start + block_size, num_students))
+
+    def assessment_pass_likelihoods(self, student_idxes, timesteps=None):
+        """
+        Compute the pass likelihoods of every assessment for a batch of students
+
+        :param np.ndarray student_idxes: Indices of students
+        :param np.ndarray|None timesteps: Timesteps of student states
+            None => the state of each student after their last interaction
+
+        :rtype: np.ndarray
+        :return: A matrix of pass likelihoods with shape (num_students, num_assessments)
+        """
+
+        student_idxes = np.asarray(student_idxes, dtype=int)
+        cache = self.model.inference_cache()
+
+        pass_likelihoods = np.zeros(
+            (len(student_idxes), len(cache.assessment_offsets)),
+            dtype=cache.assessment_unit_vectors.dtype)
+        for block in self._blocks(len(student_idxes), self.block_size):
+            states, biases = self._student_states(
+                student_idxes[block], timesteps[block] if timesteps is not None else None)
+            pass_likelihoods[block] = _logistic(
+                states.dot(cache.assessment_unit_vectors.T) + \
+                        cache.assessment_offsets + biases[:, None])
+
+        return pass_likelihoods
+
+    def _build_assessment_tree(self, cache):
+        """
+        Build a k-d tree over assessments, such that the nearest neighbors
+        of (s, 1, 0) are the assessments a with the largest s.u_a + offset_a
+
+        Each assessment is augmented to x_a = (u_a, offset_a, sqrt(M^2 - ||(u_a, offset_a)||^2)),
+        where M is the largest norm of any (u_a, offset_a), so for a query q = (s, 1, 0)
+        ||q - x_a||^2 = ||q||^2 + M^2 - 2 (s.u_a + offset_a)
+
+        :param models.InferenceCache cache: The frozen inference representation of the model
+        """
+
+        points = np.column_stack((
+            cache.assessment_unit_vectors, cache.assessment_offsets)).astype(float)
+        norms_squared = (points ** 2).sum(axis=1)
+        self._max_norm_squared = norms_squared.max()
+        self._assessment_tree = spatial.cKDTree(np.column_stack((
+            points, np.sqrt(np.maximum(0, self._max_norm_squared - norms_squared)))))
+        self._assessment_tree_cache = cache
+
+    def _candidates_in_band(self, states, lower_logits):
+        """
+        Find assessments whose logits are at least a lower bound, with a k-d tree
+
+        :param np.ndarray states: Student embeddings with shape (num_students, embedding_dimension)
+        :param np.ndarray lower_logits: Lower bound on s.u_a + offset_a for each student
+        :rtype: list[list[int]]
+        :return: Indices of candidate assessments for each student
+        """
+
+        cache = self.model.inference_cache()
+        if self._assessment_tree_cache is not cache:
+            # parameters were reassigned since the tree was built
+            self._build_assessment_tree(cache)
+
+        queries = np.column_stack((states, np.ones(len(states)), np.zeros(len(states))))
+        radii_squared = (queries ** 2).sum(axis=1) + self._max_norm_squared - 2 * lower_logits
+
+        # the tree is queried in float64, so pad radii to keep assessments on the boundary,
+        # which get filtered out later if they are outside the band
+        radii = np.sqrt(np.maximum(0, radii_squared)) * (1 + 1e-6) + 1e-6
+
+        return self._assessment_tree.query_ball_point(queries, radii)
+
+    def assessments_in_band(self, student_idxes, lower=0.6, upper=0.8, timesteps=None):
+        """
+        Find the assessments that each student passes with a likelihood in a band
+
+        :param np.ndarray student_idxes: Indices of students
+        :param float lower: Lower bound on pass likelihood
+        :param float upper: Upper bound on pass likelihood
+        :param np.ndarray|None timesteps: Timesteps of student states
+            None => the state of each student after their last interaction
+
+        :rtype: list[np.ndarray]
+        :return: Indices of assessments in the band for each student,
+            in decreasing order of pass likelihood
+        """
+
+        if not 0 <= lower < upper <= 1:
+            raise ValueError('Need 0 <= lower < upper <= 1 not lower={}, upper={}'.format(
+                lower, upper))
+
+        student_idxes = np.asarray(student_idxes, dtype=int)
+        cache = self.model.inference_cache()
+        lower_logit, upper_logit = _logit(lower), _logit(upper)
+
+        assessments = []
+        for block in self._blocks(len(student_idxes), self.block_size):
+            states, biases = self._student_states(
+                student_idxes[block], timesteps[block] if timesteps is not None else None)
+
+            if self.using_spatial_index and np.isfinite(lower_logit):
+                candidates = self._candidates_in_band(states, lower_logit - biases)
+                for state, bias, candidate_idxes in zip(states, biases, candidates):
+                    candidate_idxes = np.asarray(candidate_idxes, dtype=int)
+                    logits = cache.assessment_unit_vectors[candidate_idxes].dot(state) + \
+                            cache.assessment_offsets[candidate_idxes] + bias
+                    in_band = (logits >= lower_logit) & (logits <= upper_logit)
+                    assessments.append(
+                        candidate_idxes[in_band][np.argsort(-logits[in_band], kind='mergesort')])
+            else:
+                logits = states.dot(cache.assessment_unit_vectors.T) + \
+                        cache.assessment_offsets + biases[:, None]
+                in_band = (logits >= lower_logit) & (logits <= upper_logit)
+                for student_logits, student_in_band in zip(logits, in_band):
+                    assessment_idxes = np.flatnonzero(student_in_band)
+                    assessments.append(assessment_idxes[np.argsort(
+                        -student_logits[assessment_idxes], kind='mergesort')])
+
+        return assessments
+
+    def lesson_gains(
+        self,
+        student_idxes,
+        timesteps=None,
+        target_assessment_idxes=None,
+        linearized=False):
+        """
+        Compute the expected gain from each lesson for a batch of students
+
+        The gain of a lesson is the increase in pass likelihood, averaged over target
+        assessments, after the expected learning update from the lesson
+        (the lesson embedding, gated by the prerequisite weight if using_prereqs).
+        The forgetting penalty is the same for every lesson, so it is left out.
+
+        Exact gains cost O(num_lessons * num_targets) per student. Linearized gains use
+        a first-order expansion of pass likelihoods around the current student state,
+        gain(l) ~= gate(l) * (l . g), where g is the gradient of the average pass
+        likelihood of targets w.r.t. the student embedding, which costs
+        O((num_lessons + num_targets) * embedding_dimension) per student
+        and is accurate when learning updates are small.
+
+        :param np.ndarray student_idxes: Indices of students
+        :param np.ndarray|None timesteps: Timesteps of student states
+            None => the state of each student after their last interaction
+        :param np.ndarray|None target_assessment_idxes: Indices of target assessments
+            None => all assessments
+        :param bool linearized: True => use first-order approximations of gains
+
+        :rtype: np.ndarray
+        :return: A matrix of expected gains with shape (num_students, num_lessons)
+        """
+
+        return np.concatenate([block_gains for _, block_gains in self._lesson_gain_blocks(
+            student_idxes, timesteps, target_assessment_idxes, linearized)], axis=0)
+
+    def top_k_lessons(
+        self,
+        student_idxes,
+        k=5,
+        timesteps=None,
+        target_assessment_idxes=None,
+        linearized=False):
+        """
+        Find the lessons with the largest expected gain for each student
+
+        See :py:func:`recommend.EmbeddingRecommender.lesson_gains` for details
+
+        :param np.ndarray student_idxes: Indices of students
+        :param int k: Number of lessons to recommend to each student
+        :param np.ndarray|None timesteps: Timesteps of student states
+            None => the state of each student after their last interaction
+        :param np.ndarray|None target_assessment_idxes: Indices of target assessments
+            None => all assessments
+        :param bool linearized: True => use first-order approximations of gains
+
+        :rtype: (np.ndarray,np.ndarray)
+        :return: (Indices of lessons, expected gains), both with shape (num_students, k),
+            in decreasing order of expected gain
+        """
+
+        if k < 1:
+            raise ValueError('k must be positive not {}'.format(k))
+
+        lesson_idxes = []
+        gains = []
+        for _, block_gains in self._lesson_gain_blocks(
+                student_idxes, timesteps, target_assessment_idxes, linearized):
+            block_lesson_idxes, block_top_gains = _top_k(block_gains, k)
+            lesson_idxes.append(block_lesson_idxes)
+            gains.append(block_top_gains)
+
+        return np.concatenate(lesson_idxes, axis=0), np.concatenate(gains, axis=0)
+
+    def _lesson_gain_blocks(
+        self, student_idxes, timesteps, target_assessment_idxes, linearized=False):
+        """
+        Compute expected lesson gains for blocks of students
+
+        :rtype: generator[(slice,np.ndarray)]
+        :return: (Slice of students, matrix of expected gains for those students)
+        """
+
+        model = self.model
+        if not model.using_lessons:
+            raise ValueError('Cannot recommend lessons without lesson embeddings!')
+
+        student_idxes = np.asarray(student_idxes, dtype=int)
+        cache = model.inference_cache()
+
+        if target_assessment_idxes is None:
+            target_unit_vectors = cache.assessment_unit_vectors
+            target_offsets = cache.assessment_offsets
+        else:
+            target_unit_vectors = cache.assessment_unit_vectors[target_assessment_idxes]
+            target_offsets = cache.assessment_offsets[target_assessment_idxes]
+
+        lesson_embeddings = model.lesson_embeddings.astype(target_unit_vectors.dtype)
+        num_lessons = len(lesson_embeddings)
+        num_targets = len(target_offsets)
+
+        if linearized:
+            block_size = self.block_size
+        else:
+            # logits after an update are linear in the update, i.e.,
+            # next_state.u_a = state.u_a + gate_l * (l.u_a)
+            lesson_dot_targets = lesson_embeddings.dot(target_unit_vectors.T)
+            block_size = max(1, min(self.block_size, MAX_BLOCK_ENTRIES // max(
+                1, num_lessons * num_targets)))
+
+        if len(student_idxes) == 0:
+            yield slice(0, 0), np.zeros((0, num_lessons))
+
+        for block in self._blocks(len(student_idxes), block_size):
+            states, biases = self._student_states(
+                student_idxes[block], timesteps[block] if timesteps is not None else None)
+
+            logits_before = states.dot(target_unit_vectors.T) + target_offsets + biases[:, None]
+            if model.using_prereqs:
+                # gates = 1 / (1 + exp(||p|| - s.p / ||p||))
+                gates = _logistic(states.dot(cache.prereq_unit_vectors.T) - cache.prereq_norms)
+            else:
+                gates = np.ones((len(states), num_lessons))
+
+            if linearized:
+                pass_likelihoods_before = _logistic(logits_before)
+                # gradients of average pass likelihoods w.r.t. student embeddings
+                grads = (pass_likelihoods_before * (1 - pass_likelihoods_before)).dot(
+                    target_unit_vectors) / num_targets
+                yield block, gates * grads.dot(lesson_embeddings.T)
+            else:
+                logits_after = logits_before[:, None, :] + \
+                        gates[:, :, None] * lesson_dot_targets[None, :, :]
+                yield block, (_logistic(logits_after) - _logistic(
+                    logits_before)[:, None, :]).mean(axis=2)
@@ -0,0 +1,232 @@
+"""
+Module for per-iteration telemetry of parameter estimation, e.g., for charting training runs
+"""
+
+import json
+import logging
+import sys
+import time
+
+try:
+    import resource
+except ImportError: # e.g., on Windows
+    resource = None
+
+from . import grad
+
+
+_logger = logging.getLogger(__name__)
+
+
+def peak_memory_usage():
+    """
+    :rtype: int|None
+    :return: Peak resident set size of this process in bytes,
+        or None if it cannot be measured on this platform
+    """
+
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == 'darwin' else 1024 * max_rss
+
+
+class TrainingTelemetry(object):
+    """
+    Collects per-iteration statistics of a fit, and passes a record for each iteration
+    to a list of sinks
+
+    Cost functions report every evaluation to the telemetry object
+    (see the telemetry argument of :py:class:`grad.CostFunction`), and the telemetry object
+    is called after each iteration, with the same arguments as the callbacks of
+    :py:func:`est.gradient_descent` and :py:func:`est.minibatch_gradient_descent`.
+    :py:class:`est.EmbeddingMAPEstimator` takes care of both.
+
+    A record is a dictionary with keys
+
+        'optimizer' : name of the optimizer
+        'iter_idx' : number of completed iterations (or epochs)
+        'cost' : value of the cost function at the end of the iteration
+        'wall_time' : seconds since the start of the fit
+        'iter_time' : seconds spent in the iteration
+        'num_evaluations' : number of evaluations of the cost function in the iteration
+        'gradient_norms' : parameter name -> L2 norm of the gradient at the last evaluation
+            (for mini-batch optimizers, the gradient of the last batch)
+        'phase_times' : phase -> seconds spent in that phase of evaluations in the iteration
+            (see grad.PHASES; time spent on shards is summed across threads)
+        'peak_memory' : peak resident set size of the process in bytes
+
+    With every > 1, iter_time, num_evaluations and phase_times are averaged over
+    the iterations since the last record.
+    """
+
+    def __init__(self, sinks, every=1):
+        """
+        Initialize telemetry object
+
+        :param list[function] sinks: Functions that take a record as input,
+            e.g., :py:class:`telemetry.JSONLinesSink` or :py:class:`telemetry.LoggingSink`
+        :param int every: Number of iterations between records
+        """
+
+        if every < 1:
+            raise ValueError('every must be positive not {}'.format(every))
+
+        self.sinks = sinks
+        self.every = every
+        self.start()
+
+    def start(self, optimizer=None):
+        """
+        Reset timers and counters at the start of a fit
+
+        :param str|None optimizer: Name of the optimizer
+        """
+
+        self.optimizer = optimizer
+        self._start_time = self._iter_start_time = time.time()
+        self._reset_iteration()
+
+    def _reset_iteration(self):
+        self._num_evaluations = 0
+        self._gradient_norms = {}
+        self._phase_times = dict.fromkeys(grad.PHASES, 0.)
+
+    def record_evaluation(self, cost, gradient_norms, phase_times):
+        """
+        Accumulate the statistics of an evaluation of the cost function
+
+        :param float cost: Value of the cost function
+        :param dict[str,float] gradient_norms: Parameter name -> L2 norm of the gradient
+        :param dict[str,float] phase_times: Phase -> seconds spent in that phase
+        """
+
+        self.record_evaluations(1, phase_times, gradient_norms=gradient_norms)
+
+    def record_evaluations(self, num_evaluations, phase_times, gradient_norms=None):
+        """
+        Accumulate the statistics of evaluations of the cost function that were collected
+        elsewhere, e.g., by another telemetry object in a worker process
+        (see :py:func:`telemetry.TrainingTelemetry.take_evaluations`)
+
+        :param int num_evaluations: Number of evaluations
+        :param dict[str,float] phase_times: Phase -> seconds spent in that phase
+        :param dict[str,float]|None gradient_norms: Parameter name -> L2 norm of the gradient
+            at the last evaluation (None => keep the norms of an earlier evaluation)
+        """
+
+        self._num_evaluations += num_evaluations
+        if gradient_norms is not None:
+            self._gradient_norms = gradient_norms
+        for phase, phase_time in phase_times.items():
+            self._phase_times[phase] += phase_time
+
+    def take_evaluations(self):
+        """
+        Get the statistics of evaluations since the last record, and reset them
+
+        :rtype: (int, dict[str,float], dict[str,float])
+        :return: (number of evaluations, parameter name -> L2 norm of the gradient
+            at the last evaluation, phase -> seconds spent in that phase)
+        """
+
+        evaluations = (self._num_evaluations, self._gradient_norms, self._phase_times)
+        self._reset_iteration()
+        return evaluations
+
+    def __call__(self, iter_idx, params, costs, optimizer_state):
+        """
+        Pass a record of the iteration to the sinks every self.every iterations
+
+        :param int iter_idx: Number of completed iterations
+        :param dict[str,np.ndarray] params: Parameter values
+        :param list[float] costs: Cost history
+        :param dict[str,np.ndarray|dict[str,np.ndarray]] optimizer_state: Optimizer state
+        """
+
+        if iter_idx % self.every != 0:
+            return
+
+        end_time = time.time()
+        every = float(self.every)
+        record = {
+            'optimizer' : self.optimizer,
+            'iter_idx' : int(iter_idx),
+            'cost' : float(costs[-1]) if len(costs) > 0 else None,
+            'wall_time' : end_time - self._start_time,
+            'iter_time' : (end_time - self._iter_start_time) / every,
+            'num_evaluations' : self._num_evaluations / every,
+            'gradient_norms' : self._gradient_norms,
+            'phase_times' : {
+                phase : phase_time / every for phase, phase_time in self._phase_times.items()},
+            'peak_memory' : peak_memory_usage()
+        }
+        for sink in self.sinks:
+            sink(record)
+
+        self._iter_start_time = time.time()
+        self._reset_iteration()
+
+    def close(self):
+        """
+        Close sinks that hold resources (e.g., files)
+        """
+
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+
+class JSONLinesSink(object):
+    """
+    Writes each record to a file as a line of JSON
+    """
+
+    def __init__(self, path, append=False):
+        """
+        Initialize sink object
+
+        :param str path: Path to output file
+        :param bool append: True => append to an existing file (e.g., when resuming a fit),
+            False => overwrite it
+        """
+
+        self.path = path
+        self._file = open(path, 'a' if append else 'w')
+
+    def __call__(self, record):
+        self._file.write(json.dumps(record, sort_keys=True) + '\n')
+        # flush, so that a run can be charted while it is in progress
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class LoggingSink(object):
+    """
+    Logs a summary of each record
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        """
+        Initialize sink object
+
+        :param logging.Logger|None logger: Logger (None => the logger of this module)
+        :param int level: Logging level
+        """
+
+        self.logger = logger if logger is not None else _logger
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(
+            self.level,
+            'Iteration %d, cost=%s, %.3f seconds per iteration (%s), gradient norms: %s',
+            record['iter_idx'],
+            record['cost'],
+            record['iter_time'],
+            ', '.join('{}={:.3f}s'.format(k, record['phase_times'][k]) for k in grad.PHASES),
+            ', '.join('{}={:.3g}'.format(k, v) for k, v in sorted(
+                record['gradient_norms'].items())))
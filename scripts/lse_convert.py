@@ -0,0 +1,38 @@
+"""
+Command-line interface for converting interaction histories to the columnar .npz format
+"""
+
+import click
+import logging
+
+from lentil import datatools
+
+
+_logger = logging.getLogger(__name__)
+
+
+@click.command()
+# Path to interaction history CSV/pickle input file
+@click.argument('history_file', type=click.Path(exists=True))
+# Path to .npz file where the columnar history should be written
+@click.argument('npz_file', type=click.Path(exists=False))
+def cli(history_file, npz_file):
+    """
+    This script provides a command-line interface for converting an interaction history
+    into the columnar format written by :py:func:`datatools.InteractionHistory.to_npz`,
+    which lse_train and lse_eval load memory-mapped.
+
+    :param str history_file: Input path to CSV/pickle file containing interaction history
+    :param str npz_file: Output path to .npz file
+    """
+
+    click.echo('Loading interaction history from %s...' % (
+        click.format_filename(history_file)))
+
+    history = datatools.load_interaction_history(history_file)
+    history.to_npz(npz_file)
+
+    click.echo('Columnar interaction history written to %s' % click.format_filename(npz_file))
+
+if __name__ == '__main__':
+    cli()
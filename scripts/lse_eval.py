@@ -10,22 +10,21 @@ import click
 import logging
 import math
 import pickle
-import os
 
-import pandas as pd
 import numpy as np
 
 from lentil import datatools
 from lentil import models
 from lentil import est
 from lentil import evaluate
+from lentil import telemetry
 
 
 _logger = logging.getLogger(__name__)
 
 
 @click.command()
-# path to interaction history CSV/pickle input file
+# path to interaction history CSV/npz/pickle input file
 @click.argument('history_file', type=click.Path(exists=True))
 # path to pickled results file
 @click.argument('results_file', type=click.Path(exists=False))
@@ -49,7 +48,7 @@ _logger = logging.getLogger(__name__)
     help='Constant variance for Gaussian lesson updates')
 @click.option(
     '--opt-algo',
-    type=click.Choice(['l-bfgs-b', 'batch-gd', 'adagrad']),
+    type=click.Choice(['l-bfgs-b', 'batch-gd', 'adagrad', 'minibatch-sgd', 'minibatch-adam']),
     default='l-bfgs-b',
     help='Iterative optimization algorithm used for parameter estimation')
 @click.option(
@@ -61,12 +60,32 @@ _logger = logging.getLogger(__name__)
 @click.option('--learning-rate', default=5e-3, help='Fixed learning rate')
 @click.option('--adagrad-eta', default=1e-3, help='Adagrad learning rate')
 @click.option('--adagrad-eps', default=0.1, help='Adagrad epsilon')
+@click.option(
+    '--batch-size', default=256,
+    help='Number of students in each mini-batch for mini-batch optimization')
+@click.option(
+    '--lr-schedule',
+    type=click.Choice(['constant', 'inverse', 'exponential']),
+    default='constant',
+    help='Learning rate schedule across epochs for mini-batch optimization')
+@click.option(
+    '--max-epochs', default=100,
+    help='Maximum number of passes over the students for mini-batch optimization')
+@click.option(
+    '--cache-dir', type=click.Path(), default=None,
+    help='Directory for caching preprocessed interactions across runs on the same data')
 @click.option('--num-folds', default=10, help='Number of folds in k-fold cross-validation')
 @click.option(
     '--truncation-style',
     type=click.Choice(['random', 'last']),
     default='last',
     help='Truncate student history at random, or just before last assessment interactions')
+@click.option(
+    '--n-jobs', default=1,
+    help='Number of worker processes that run cross-validation folds in parallel')
+@click.option(
+    '--warm-start', is_flag=True,
+    help='Warm-start each fold from a model fit to the truncated histories of non-test students')
 def cli(
     history_file,
     results_file,
@@ -83,7 +102,13 @@ def cli(
     ftol,
     learning_rate,
     adagrad_eta,
-    adagrad_eps):
+    adagrad_eps,
+    batch_size,
+    lr_schedule,
+    max_epochs,
+    cache_dir,
+    n_jobs,
+    warm_start):
     """
     This script provides a command-line interface for model evaluation.
     It reads an interaction history from file, computes the cross-validated AUC of
@@ -91,9 +116,10 @@ def cli(
 
     The pickled results will be an object of type :py:class:`evaluate.CVResults`
 
-    :param str history_file: Input path to CSV/pickle file containing interaction history
+    :param str history_file: Input path to CSV/npz/pickle file containing interaction history
     :param str results_file: Output path for pickled results of cross-validation
-    :param bool verbose: True => logger level set to logging.INFO
+    :param bool verbose: True => logger level set to logging.INFO,
+        and per-iteration training statistics are logged
     :param int num_folds: Number of folds in k-fold cross-validation
     :param str truncation_style: Hold-out scheme for student histories
     :param bool using_lessons: Including lessons in embedding
@@ -107,28 +133,20 @@ def cli(
     :param float learning_rate: Fixed learning rate for gradient descent
     :param float adagrad_eta: Base learning rate parameter for Adagrad
     :param float adagrad_eps: Epsilon parameter for Adagrad
+    :param int batch_size: Number of students in each mini-batch
+    :param str lr_schedule: Learning rate schedule for mini-batch optimization
+    :param int max_epochs: Maximum number of epochs of mini-batch optimization
+    :param str|None cache_dir: Directory for cached split histories and participation matrices
+    :param int n_jobs: Number of worker processes for cross-validation folds
+    :param bool warm_start: Warm-start folds from a fit to non-test students
     """
 
-    if verbose and opt_algo == 'l-bfgs-b':
-        raise ValueError('Verbose mode is not currently supported for L-BFGS-B.\
-                Try turning off verbose mode, or change your choice of optimization algorithm.')
-
     if verbose:
         _logger.setLevel(logging.DEBUG)
 
     click.echo('Loading interaction history from %s...' % click.format_filename(history_file))
 
-    _, history_file_ext = os.path.splitext(history_file)
-    if history_file_ext == '.csv':
-        data = pd.DataFrame.from_csv(history_file)
-        history = datatools.InteractionHistory(pd.read_csv(history_file))
-    elif history_file_ext == '.pkl':
-        with open(history_file, 'rb') as f:
-            history = pickle.load(f)
-    else:
-        raise ValueError('Unrecognized file extension for history_file.\
-                Please supply a .csv with an interaction history, or a .pkl file containing\
-                a datatools.InteractionHistory object.')
+    history = datatools.load_interaction_history(history_file)
 
     embedding_kwargs = {
         'embedding_dimension' : embedding_dimension,
@@ -149,26 +167,43 @@ def cli(
         'num_checkpoints' : 100
     }
 
+    minibatch_kwargs = {
+        'using_adam' : opt_algo == 'minibatch-adam',
+        'batch_size' : batch_size,
+        'rate' : learning_rate,
+        'lr_schedule' : lr_schedule,
+        'ftol' : ftol,
+        'max_epochs' : max_epochs,
+        'debug_mode_on' : verbose
+    }
+
     estimator = est.EmbeddingMAPEstimator(
         regularization_constant=regularization_constant,
         using_scipy=(opt_algo == 'l-bfgs-b'),
         gradient_descent_kwargs=gradient_descent_kwargs,
+        using_minibatches=opt_algo.startswith('minibatch'),
+        minibatch_kwargs=minibatch_kwargs,
         verify_gradient=False,
         debug_mode_on=verbose,
-        ftol=ftol)
+        ftol=ftol,
+        cache=est.PreprocessingCache(cache_dir=cache_dir) if cache_dir is not None else None,
+        telemetry=telemetry.TrainingTelemetry(
+            [telemetry.LoggingSink(_logger)]) if verbose else None)
 
     def build_embedding(
         embedding_kwargs,
         estimator,
         history,
         filtered_history,
-        split_history=None):
+        split_history=None,
+        initial_param_vals=None):
 
         model = models.EmbeddingModel(history, **embedding_kwargs)
 
         estimator.filtered_history = filtered_history
         if split_history is not None:
             estimator.split_history = split_history
+        estimator.initial_param_vals = initial_param_vals if initial_param_vals is not None else {}
 
         model.fit(estimator)
 
@@ -191,7 +226,9 @@ def cli(
         model_builders,
         history,
         num_folds=num_folds,
-        random_truncations=(truncation_style == 'random'))
+        random_truncations=(truncation_style == 'random'),
+        n_jobs=n_jobs,
+        warm_start=warm_start)
 
     train_auc_mean = results.training_auc_mean('model')
     val_auc_mean = results.validation_auc_mean('model')
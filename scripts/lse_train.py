@@ -7,23 +7,24 @@ Command-line interface for model training
 import click
 import logging
 import pickle
-import os
 
-import pandas as pd
+import numpy as np
 
 from lentil import models
 from lentil import datatools
 from lentil import est
 from lentil import evaluate
+from lentil import grad
+from lentil import telemetry
 
 
 _logger = logging.getLogger(__name__)
 
 
 @click.command()
-# Path to interaction history CSV/pickle input file
+# Path to interaction history CSV/npz/pickle input file
 @click.argument('history_file', type=click.Path(exists=True))
-# Path to pickle file where trained model should be dumped
+# Path to model file where trained model should be written
 @click.argument('model_file', type=click.Path(exists=False))
 @click.option(
     '--verbose', is_flag=True,
@@ -48,7 +49,9 @@ _logger = logging.getLogger(__name__)
     help='Constant variance for Gaussian lesson updates')
 @click.option(
     '--opt-algo',
-    type=click.Choice(['l-bfgs-b', 'batch-gd', 'adagrad']),
+    type=click.Choice([
+        'l-bfgs-b', 'batch-gd', 'adagrad', 'minibatch-sgd', 'minibatch-adam',
+        'block-coordinate']),
     default='l-bfgs-b',
     help='Iterative optimization algorithm used for parameter estimation')
 @click.option(
@@ -60,6 +63,68 @@ _logger = logging.getLogger(__name__)
 @click.option('--learning-rate', default=5e-3, help='Fixed learning rate')
 @click.option('--adagrad-eta', default=1e-3, help='Adagrad learning rate')
 @click.option('--adagrad-eps', default=0.1, help='Adagrad epsilon')
+@click.option(
+    '--batch-size', default=256,
+    help='Number of students in each mini-batch for mini-batch optimization '
+         '(or in each block for block-coordinate optimization)')
+@click.option(
+    '--lr-schedule',
+    type=click.Choice(['constant', 'inverse', 'exponential']),
+    default='constant',
+    help='Learning rate schedule across epochs for mini-batch optimization')
+@click.option(
+    '--max-epochs', default=100,
+    help='Maximum number of passes over the students for mini-batch '
+         'and block-coordinate optimization')
+@click.option(
+    '--cache-dir', type=click.Path(), default=None,
+    help='Directory for caching preprocessed interactions across runs on the same data')
+@click.option(
+    '--threads', default=1,
+    help='Number of threads used to evaluate the gradient on shards of interactions '
+         '(and to solve blocks of students for block-coordinate optimization)')
+@click.option(
+    '--worker-type',
+    type=click.Choice(est.WORKER_TYPES),
+    default='thread',
+    help='Solve blocks of students on threads or in worker processes '
+         'for block-coordinate optimization')
+@click.option(
+    '--dtype',
+    type=click.Choice(['float64', 'float32']),
+    default='float64',
+    help='Floating-point type of parameters and intermediate quantities during training')
+@click.option(
+    '--scatter-backend',
+    type=click.Choice(grad.SCATTER_BACKENDS),
+    default='csr',
+    help='Sparse participation matrix products (csr) or np.bincount on interaction indices '
+         '(bincount) for summing per-interaction gradients')
+@click.option(
+    '--chunk-size', type=int, default=None,
+    help='Maximum number of interactions of each type that a thread evaluates at once, '
+         'to bound the memory used by intermediate quantities of the gradient')
+@click.option(
+    '--model-format',
+    type=click.Choice(['pickle', 'binary']),
+    default='pickle',
+    help='Pickle the model (readable with pickle.load), or write a compact binary model file '
+         'that can be memory-mapped with models.EmbeddingModel.load')
+@click.option(
+    '--float32-params', is_flag=True,
+    help='Store parameters as float32 in the binary model file')
+@click.option(
+    '--checkpoint-file', type=click.Path(), default=None,
+    help='File where the state of the fit is periodically written')
+@click.option(
+    '--checkpoint-every', default=10,
+    help='Number of iterations (or epochs) between checkpoints')
+@click.option(
+    '--resume', is_flag=True,
+    help='Continue from the latest checkpoint instead of random initialization')
+@click.option(
+    '--telemetry-file', type=click.Path(), default=None,
+    help='JSON-lines file where per-iteration training statistics are written')
 def cli(
     history_file,
     model_file,
@@ -75,15 +140,32 @@ def cli(
     ftol,
     learning_rate,
     adagrad_eta,
-    adagrad_eps):
+    adagrad_eps,
+    batch_size,
+    lr_schedule,
+    max_epochs,
+    cache_dir,
+    threads,
+    worker_type,
+    dtype,
+    scatter_backend,
+    chunk_size,
+    model_format,
+    float32_params,
+    checkpoint_file,
+    checkpoint_every,
+    resume,
+    telemetry_file):
     """
     This script provides a command-line interface for model training.
     It reads an interaction history from file, trains an embedding model,
     and writes the model to file.
 
-    :param str history_file: Input path to CSV/pickle file containing interaction history
-    :param str model_file: Output path to pickle file containing trained model
-    :param bool verbose: True => logger level set to logging.INFO
+    :param str history_file: Input path to CSV/npz/pickle file containing interaction history
+    :param str model_file: Output path to file containing trained model
+        (a pickle, or see :py:func:`models.EmbeddingModel.load` for binary model files)
+    :param bool verbose: True => logger level set to logging.INFO,
+        and per-iteration training statistics are logged
     :param bool compute_training_auc: True => compute training AUC of model
     :param bool using_lessons: Including lessons in embedding
     :param bool using_prereqs: Including lesson prereqs in embedding
@@ -96,29 +178,48 @@ def cli(
     :param float learning_rate: Fixed learning rate for gradient descent
     :param float adagrad_eta: Base learning rate parameter for Adagrad
     :param float adagrad_eps: Epsilon parameter for Adagrad
+    :param int batch_size: Number of students in each mini-batch
+    :param str lr_schedule: Learning rate schedule for mini-batch optimization
+    :param int max_epochs: Maximum number of epochs of mini-batch optimization
+    :param str|None cache_dir: Directory for cached split histories and participation matrices
+    :param int threads: Number of threads used to evaluate the gradient
+    :param str worker_type: Whether blocks of students are solved on threads or in processes
+        for block-coordinate optimization (one of est.WORKER_TYPES)
+    :param str dtype: Floating-point type used during training ('float64' or 'float32')
+    :param str scatter_backend: How per-interaction gradients are summed
+        (one of grad.SCATTER_BACKENDS)
+    :param int|None chunk_size: Maximum number of interactions of each type that a thread
+        evaluates at once (None => all interactions at once)
+    :param str model_format: 'pickle' => pickled model (including its interaction history),
+        'binary' => compact memory-mappable model file
+    :param bool float32_params: True => store parameters as float32 in binary model files
+    :param str|None checkpoint_file: Path to checkpoint file (None => no checkpoints)
+    :param int checkpoint_every: Number of iterations (or epochs) between checkpoints
+    :param bool resume: True => continue from the latest checkpoint in checkpoint_file
+    :param str|None telemetry_file: Path to JSON-lines file of per-iteration training
+        statistics (None => statistics are not written)
     """
 
-    if verbose and opt_algo == 'l-bfgs-b':
-        raise ValueError('Verbose mode is not currently supported for L-BFGS-B.\
-                Try turning off verbose mode, or change your choice of optimization algorithm.')
+    if float32_params and model_format != 'binary':
+        raise ValueError('--float32-params requires --model-format binary')
+    if resume and checkpoint_file is None:
+        raise ValueError('--resume requires --checkpoint-file')
+    if opt_algo == 'block-coordinate' and checkpoint_file is not None:
+        raise ValueError('Block-coordinate optimization does not support checkpoints')
 
+    telemetry_sinks = []
     if verbose:
         _logger.setLevel(logging.DEBUG)
+        telemetry_sinks.append(telemetry.LoggingSink(_logger))
+    if telemetry_file is not None:
+        telemetry_sinks.append(telemetry.JSONLinesSink(telemetry_file, append=resume))
+    training_telemetry = telemetry.TrainingTelemetry(
+        telemetry_sinks) if telemetry_sinks else None
 
     click.echo('Loading interaction history from %s...' % (
         click.format_filename(history_file)))
 
-    _, history_file_ext = os.path.splitext(history_file)
-    if history_file_ext == '.csv':
-        data = pd.DataFrame.from_csv(history_file)
-        history = datatools.InteractionHistory(pd.read_csv(history_file))
-    elif history_file_ext == '.pkl':
-        with open(history_file, 'rb') as f:
-            history = pickle.load(f)
-    else:
-        raise ValueError('Unrecognized file extension for history_file.\
-                Please supply a .csv with an interaction history, or a .pkl file containing\
-                a datatools.InteractionHistory object.')
+    history = datatools.load_interaction_history(history_file)
 
     click.echo('Computing MAP estimates of model parameters...')
 
@@ -140,18 +241,61 @@ def cli(
         'num_checkpoints' : 100
     }
 
-    estimator = est.EmbeddingMAPEstimator(
-        regularization_constant=regularization_constant,
-        using_scipy=(opt_algo == 'l-bfgs-b'),
-        gradient_descent_kwargs=gradient_descent_kwargs,
-        verify_gradient=False,
-        debug_mode_on=verbose,
-        ftol=ftol)
+    minibatch_kwargs = {
+        'using_adam' : opt_algo == 'minibatch-adam',
+        'batch_size' : batch_size,
+        'rate' : learning_rate,
+        'lr_schedule' : lr_schedule,
+        'ftol' : ftol,
+        'max_epochs' : max_epochs,
+        'debug_mode_on' : verbose
+    }
 
-    model.fit(estimator)
+    if opt_algo == 'block-coordinate':
+        estimator = est.BlockCoordinateEstimator(
+            regularization_constant=regularization_constant,
+            num_sweeps=max_epochs,
+            ftol=ftol,
+            block_size=batch_size,
+            num_workers=threads,
+            worker_type=worker_type,
+            cache=est.PreprocessingCache(cache_dir=cache_dir) if cache_dir is not None else None,
+            debug_mode_on=verbose,
+            dtype=np.dtype(dtype),
+            telemetry=training_telemetry,
+            scatter_backend=scatter_backend,
+            chunk_size=chunk_size)
+    else:
+        estimator = est.EmbeddingMAPEstimator(
+            regularization_constant=regularization_constant,
+            using_scipy=(opt_algo == 'l-bfgs-b'),
+            gradient_descent_kwargs=gradient_descent_kwargs,
+            using_minibatches=opt_algo.startswith('minibatch'),
+            minibatch_kwargs=minibatch_kwargs,
+            verify_gradient=False,
+            debug_mode_on=verbose,
+            ftol=ftol,
+            cache=est.PreprocessingCache(cache_dir=cache_dir) if cache_dir is not None else None,
+            num_threads=threads,
+            dtype=np.dtype(dtype),
+            checkpointer=est.FitCheckpointer(
+                checkpoint_file, every=checkpoint_every) if checkpoint_file is not None else None,
+            resuming=resume,
+            telemetry=training_telemetry,
+            scatter_backend=scatter_backend,
+            chunk_size=chunk_size)
 
-    with open(model_file, 'wb') as f:
-        pickle.dump(model, f, pickle.HIGHEST_PROTOCOL)
+    try:
+        model.fit(estimator)
+    finally:
+        if training_telemetry is not None:
+            training_telemetry.close()
+
+    if model_format == 'binary':
+        model.save(model_file, dtype=np.float32 if float32_params else None)
+    else:
+        with open(model_file, 'wb') as f:
+            pickle.dump(model, f, pickle.HIGHEST_PROTOCOL)
 
     click.echo('Trained model written to %s' % click.format_filename(model_file))
 
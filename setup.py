@@ -32,5 +32,6 @@ setup(
         [console_scripts]
         lse_train=scripts.lse_train:cli
         lse_eval=scripts.lse_eval:cli
+        lse_convert=scripts.lse_convert:cli
     '''
 )
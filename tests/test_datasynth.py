@@ -0,0 +1,104 @@
+"""
+Module for unit tests that check the vectorized synthetic history generator
+"""
+
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from lentil import datasynth
+from lentil import datatools
+from lentil import models
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.DEBUG)
+
+
+class TestDatasynth(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.model = models.EmbeddingModel(None, embedding_dimension=3)
+        self.model.assessment_embeddings = 0.1 + rng.random_sample((20, 3))
+        self.model.lesson_embeddings = 0.1 * rng.random_sample((10, 3))
+        self.model.prereq_embeddings = 0.1 + rng.random_sample((10, 3))
+        self.model.assessment_biases = rng.normal(size=20)
+
+    def test_sample_synthetic_history(self):
+        """
+        Every student should complete the same sequence of assessments and lessons,
+        with timesteps that only advance on lessons, and outcomes should follow
+        the assessment biases
+        """
+
+        num_students, num_timesteps, k = 25, 4, 3
+        history = datasynth.sample_synthetic_history(
+            self.model, num_students, num_timesteps, num_assessment_ixns_per_timestep=k,
+            chunk_size=10, random_state=np.random.RandomState(1))
+
+        df = history.data
+        self.assertEqual(history.num_students(), num_students)
+        self.assertEqual(len(df), num_students * (num_timesteps * (k + 1) - 1))
+        for _, student_df in df.groupby('student_id'):
+            is_lesson_ixn = (student_df['module_type'] == \
+                    datatools.LessonInteraction.MODULETYPE).values
+            self.assertEqual(is_lesson_ixn.sum(), num_timesteps - 1)
+            np.testing.assert_array_equal(
+                student_df['timestep'].values, 1 + np.cumsum(is_lesson_ixn))
+            self.assertTrue(student_df['outcome'][is_lesson_ixn].isnull().all())
+
+        history.squash_timesteps()
+        self.assertEqual(history.duration(), num_timesteps + 1)
+        history.split_interactions_by_type()
+
+        # the same seed should give the same history
+        other_history = datasynth.sample_synthetic_history(
+            self.model, num_students, num_timesteps, num_assessment_ixns_per_timestep=k,
+            chunk_size=10, random_state=np.random.RandomState(1))
+        self.assertTrue(df['module_id'].equals(other_history.data['module_id']))
+        self.assertTrue(df['outcome'].equals(other_history.data['outcome']))
+
+        for assessment_bias, expected_outcome in [(50, True), (-50, False)]:
+            self.model.assessment_biases[:] = assessment_bias
+            history = datasynth.sample_synthetic_history(
+                self.model, num_students, num_timesteps, random_state=np.random.RandomState(1))
+            outcomes = history.data['outcome'][history.data['module_type'] == \
+                    datatools.AssessmentInteraction.MODULETYPE]
+            self.assertTrue((outcomes == expected_outcome).all())
+
+        with self.assertRaises(ValueError):
+            datasynth.sample_synthetic_history(self.model, 0, num_timesteps)
+
+    def test_write_history_chunks(self):
+        """
+        Chunk files should load as interaction histories that together
+        make up the history sampled in memory
+        """
+
+        output_dir = tempfile.mkdtemp()
+        try:
+            paths = datasynth.write_history_chunks(
+                self.model, os.path.join(output_dir, 'history'), 25, 4, chunk_size=10,
+                random_state=np.random.RandomState(1))
+            self.assertEqual(len(paths), 3)
+
+            history = datasynth.sample_synthetic_history(
+                self.model, 25, 4, chunk_size=10, random_state=np.random.RandomState(1))
+            chunk_histories = [datatools.load_interaction_history(path) for path in paths]
+            self.assertEqual([h.num_students() for h in chunk_histories], [10, 10, 5])
+            for column in ['student_id', 'module_id', 'outcome', 'timestep']:
+                self.assertEqual(
+                    [x for h in chunk_histories for x in h.data[column]],
+                    list(history.data[column]))
+        finally:
+            shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,357 @@
+"""
+Module for unit tests that check vectorized interaction history transformations
+against straightforward reference implementations
+"""
+
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import numpy as np
+
+from lentil import datatools
+from lentil import toy
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.DEBUG)
+
+
+def reference_squash_timesteps(history):
+    """
+    Row-by-row implementation of InteractionHistory.squash_timesteps
+    """
+
+    df = history.data.groupby('student_id')
+    for student_id in history.iter_students():
+        timestep = 1
+        for idx, interaction in df.get_group(student_id).iterrows():
+            if interaction['module_type'] == datatools.LessonInteraction.MODULETYPE:
+                timestep += 1
+            history.data.loc[idx, 'timestep'] = timestep
+
+
+def reference_reindex_timesteps(data):
+    """
+    Row-by-row implementation of InteractionHistory.reindex_timesteps
+    """
+
+    new_timesteps_for_student = {student_id: {k: (i+1) for i, k in enumerate(
+        sorted(group['timestep'].unique()))} for student_id, group in data.groupby(
+            'student_id')}
+    data['timestep'] = data.apply(
+            lambda ixn: new_timesteps_for_student[ixn['student_id']][ixn['timestep']],
+            axis=1)
+
+
+def reference_split_interactions_by_type(
+    history, filtered_history=None, insert_dummy_lesson_ixns=False):
+    """
+    Row-by-row implementation of InteractionHistory.split_interactions_by_type,
+    which looks up ids one interaction at a time and builds dummy lesson interactions
+    in a Python loop over students
+    """
+
+    df = filtered_history if filtered_history is not None else history.data
+    trajectory_offsets = history.trajectory_offsets(filtered_history)
+
+    def df_to_state_idxes(dataframe):
+        output = np.array(dataframe['student_id'].apply(history.idx_of_student_id), dtype=int)
+        return trajectory_offsets[output] + dataframe['timestep'].values
+
+    assessment_df = df[df['module_type']==datatools.AssessmentInteraction.MODULETYPE]
+    assessment_interactions = (
+        np.array(df_to_state_idxes(assessment_df), dtype=int),
+        np.array(assessment_df['module_id'].apply(history.idx_of_assessment_id), dtype=int),
+        np.array(assessment_df['outcome'] * 2 - 1, dtype=int))
+
+    lesson_df = df[df['module_type']==datatools.LessonInteraction.MODULETYPE]
+    if len(lesson_df) == 0 and insert_dummy_lesson_ixns:
+        lesson_idxes_of_lesson_ixns = None
+        student_idxes_of_lesson_ixns = []
+        times_since_prev_ixn_of_lesson_ixns = []
+        for student_id, group in df.groupby('student_id'):
+            T = group['timestep'].max()
+            student_idxes_of_lesson_ixns.extend(
+                trajectory_offsets[history.idx_of_student_id(student_id)] + np.arange(2, T+1))
+            grouped = group.groupby('timestep')
+            for timestep in range(2, T+1):
+                times_since_prev_ixn_of_lesson_ixns.append(grouped.get_group(
+                    timestep)['time_since_previous_interaction'].iloc[0])
+        student_idxes_of_lesson_ixns = np.array(student_idxes_of_lesson_ixns, dtype=int)
+        times_since_prev_ixn_of_lesson_ixns = np.array(times_since_prev_ixn_of_lesson_ixns)
+    else:
+        student_idxes_of_lesson_ixns = df_to_state_idxes(lesson_df)
+        lesson_idxes_of_lesson_ixns = np.array(lesson_df['module_id'].apply(
+            history.idx_of_lesson_id), dtype=int)
+        times_since_prev_ixn_of_lesson_ixns = np.array(
+            lesson_df['time_since_previous_interaction'])
+
+    lesson_interactions = (student_idxes_of_lesson_ixns,
+            lesson_idxes_of_lesson_ixns,
+            times_since_prev_ixn_of_lesson_ixns)
+
+    timestep_of_last_interaction = df.groupby('student_id')['timestep'].max().to_dict()
+
+    return datatools.SplitHistory(
+            assessment_interactions,
+            lesson_interactions,
+            timestep_of_last_interaction,
+            trajectory_offsets)
+
+
+def assert_split_histories_equal(split_history, expected_split_history):
+    """
+    Interactions are unordered, so compare them sorted by student state
+    (the reference dummy lesson interactions come out grouped by sorted student id)
+    """
+
+    for ixns, expected_ixns in [
+        (split_history.assessment_interactions, expected_split_history.assessment_interactions),
+        (split_history.lesson_interactions, expected_split_history.lesson_interactions)]:
+        order = np.argsort(ixns[0], kind='mergesort')
+        expected_order = np.argsort(expected_ixns[0], kind='mergesort')
+        for x, expected_x in zip(ixns, expected_ixns):
+            if x is None or expected_x is None:
+                assert x is None and expected_x is None
+            else:
+                np.testing.assert_array_equal(x[order], expected_x[expected_order])
+    np.testing.assert_array_equal(
+        split_history.trajectory_offsets, expected_split_history.trajectory_offsets)
+    assert split_history.timestep_of_last_interaction == \
+            expected_split_history.timestep_of_last_interaction
+
+
+def sample_history_data(num_students=20, num_ixns=500):
+    """
+    Sample interactions with interleaved students, lessons and assessments,
+    and sparse, unsorted timesteps
+    """
+
+    module_types = np.where(
+        np.random.random(num_ixns) < 0.3,
+        datatools.LessonInteraction.MODULETYPE,
+        datatools.AssessmentInteraction.MODULETYPE)
+    return pd.DataFrame({
+        'student_id': ['S%d' % i for i in np.random.randint(num_students, size=num_ixns)],
+        'module_id': ['M%d' % i for i in np.random.randint(10, size=num_ixns)],
+        'module_type': module_types,
+        'outcome': np.where(
+            module_types == datatools.AssessmentInteraction.MODULETYPE,
+            np.random.random(num_ixns) < 0.5, None),
+        'timestep': np.random.randint(100, size=num_ixns) * 3 + 1})
+
+
+class TestDatatools(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1997)
+
+    def tearDown(self):
+        pass
+
+    def test_squash_timesteps(self):
+        """
+        Vectorized timestep squashing should match the row-by-row implementation
+        """
+
+        data = sample_history_data()
+        history = datatools.InteractionHistory(data.copy(deep=True))
+        expected_history = datatools.InteractionHistory(data.copy(deep=True))
+
+        history.squash_timesteps()
+        reference_squash_timesteps(expected_history)
+
+        np.testing.assert_array_equal(
+            history.data['timestep'].values, expected_history.data['timestep'].values)
+        self.assertEqual(history.duration(), expected_history.data['timestep'].max() + 1)
+
+    def test_reindex_timesteps(self):
+        """
+        Vectorized timestep reindexing should match the row-by-row implementation
+        """
+
+        data = sample_history_data()
+        history = datatools.InteractionHistory(data.copy(deep=True), reindex_timesteps=True)
+
+        expected_data = data.copy(deep=True)
+        expected_data.index = list(range(len(expected_data)))
+        reference_reindex_timesteps(expected_data)
+
+        np.testing.assert_array_equal(
+            history.data['timestep'].values, expected_data['timestep'].values)
+        self.assertTrue(np.issubdtype(history.data['timestep'].dtype, np.integer))
+
+    def test_split_interactions_by_type(self):
+        """
+        Vectorized splitting of interactions should match the row-by-row implementation,
+        for the whole history and for a filtered history
+        """
+
+        history = datatools.InteractionHistory(
+            sample_history_data(), reindex_timesteps=True, size_of_test_set=0.25)
+        filtered_history = history.data[history.data['student_id'].isin(
+            history.id_of_nontest_student_idx.values())]
+
+        for df in [None, filtered_history]:
+            assert_split_histories_equal(
+                history.split_interactions_by_type(filtered_history=df),
+                reference_split_interactions_by_type(history, filtered_history=df))
+
+    def test_split_interactions_with_dummy_lessons(self):
+        """
+        Dummy lesson interactions, which put student embeddings in a temporal process when
+        there are no lessons, should match the row-by-row implementation, for the whole history
+        and for a filtered history
+        """
+
+        data = sample_history_data()
+        data = data[data['module_type'] == datatools.AssessmentInteraction.MODULETYPE].copy()
+        data['time_since_previous_interaction'] = np.random.exponential(size=len(data))
+        history = datatools.InteractionHistory(
+            data, reindex_timesteps=True, size_of_test_set=0.25)
+
+        # drop the test students, and the later timesteps of the others
+        filtered_history = history.data[history.data['student_id'].isin(
+            history.id_of_nontest_student_idx.values()) & (history.data['timestep'] <= 10)]
+
+        for df in [None, filtered_history]:
+            split_history = history.split_interactions_by_type(
+                filtered_history=df, insert_dummy_lesson_ixns=True)
+            self.assertIsNone(split_history.lesson_interactions[1])
+            self.assertTrue(len(split_history.lesson_interactions[0]) > 0)
+            assert_split_histories_equal(split_history, reference_split_interactions_by_type(
+                history, filtered_history=df, insert_dummy_lesson_ixns=True))
+
+    def test_npz_round_trip(self):
+        """
+        A history loaded (memory-mapped) from the columnar format should have the same
+        interactions and id -> index maps as the history that was written
+        """
+
+        history = toy.get_lesson_prereqs_history()
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'history.npz')
+            history.to_npz(path)
+            loaded_history = datatools.InteractionHistory.from_npz(path)
+
+            self.assertIsInstance(loaded_history.data['timestep'].values, np.memmap)
+            self.assertEqual(loaded_history._student_idx, history._student_idx)
+            self.assertEqual(loaded_history._assessment_idx, history._assessment_idx)
+            self.assertEqual(loaded_history._lesson_idx, history._lesson_idx)
+            self.assertEqual(loaded_history.duration(), history.duration())
+
+            for column in ['student_id', 'module_id', 'module_type', 'timestep']:
+                self.assertEqual(
+                    list(loaded_history.data[column]), list(history.data[column]))
+            for column in ['student_id', 'module_id', 'module_type']:
+                self.assertEqual(loaded_history.data[column].dtype.name, 'category')
+
+            # missing outcomes (of lesson interactions) load as nulls
+            is_missing_outcome = history.data['outcome'].isnull()
+            np.testing.assert_array_equal(
+                loaded_history.data['outcome'].isnull(), is_missing_outcome)
+            self.assertEqual(
+                list(loaded_history.data['outcome'][~is_missing_outcome]),
+                list(history.data['outcome'][~is_missing_outcome]))
+            self.assertEqual(loaded_history.fingerprint(), history.fingerprint())
+
+            split_history = history.split_interactions_by_type()
+            loaded_split_history = loaded_history.split_interactions_by_type()
+            for x, y in zip(
+                split_history.assessment_interactions,
+                loaded_split_history.assessment_interactions):
+                np.testing.assert_array_equal(x, y)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_npz_large_offsets(self):
+        """
+        Arrays stored more than 64 KiB into the file should be memory-mapped
+        at the right offsets
+        """
+
+        history = datatools.InteractionHistory(sample_history_data(num_ixns=20000))
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'history.npz')
+            history.to_npz(path)
+            loaded_history = datatools.InteractionHistory.from_npz(path)
+
+            for column in ['student_id', 'module_id', 'timestep']:
+                np.testing.assert_array_equal(
+                    loaded_history.data[column].values, history.data[column].values)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_npz_non_string_ids(self):
+        """
+        Numeric ids should round-trip through the columnar format,
+        and mixed ids should be rejected instead of being cast to strings
+        """
+
+        data = sample_history_data()
+        data['student_id'] = data['student_id'].map(
+            {k: i for i, k in enumerate(data['student_id'].unique())})
+        history = datatools.InteractionHistory(data)
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'history.npz')
+            history.to_npz(path)
+            loaded_history = datatools.InteractionHistory.from_npz(path)
+            self.assertEqual(loaded_history._student_idx, history._student_idx)
+            self.assertEqual(
+                list(loaded_history.data['student_id']), list(history.data['student_id']))
+
+            data['student_id'] = data['student_id'].astype(object)
+            data.loc[0, 'student_id'] = 'a'
+            with self.assertRaises(ValueError):
+                datatools.InteractionHistory(data).to_npz(path)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_interactions_of_students(self):
+        """
+        Interactions looked up with the row index of each student should match
+        the interactions of those students in the history, including appended interactions
+        """
+
+        data = sample_history_data()
+        history = datatools.InteractionHistory(data.iloc[:400].copy(deep=True))
+        student_idxes = np.array([history.idx_of_student_id(k) for k in ['S3', 'S0', 'S7']])
+
+        def check_interactions_of_students(expected_data):
+            ixns, num_ixns = history.interactions_of_students(student_idxes)
+            expected_ixns = [expected_data[expected_data['student_id'] == history.id_of_student_idx(
+                student_idx)] for student_idx in student_idxes]
+            self.assertEqual(list(num_ixns), [len(x) for x in expected_ixns])
+            for column in ['student_id', 'module_id', 'timestep']:
+                self.assertEqual(
+                    list(ixns[column]), list(pd.concat(expected_ixns)[column]))
+
+        check_interactions_of_students(data.iloc[:400])
+
+        # appended interactions are buffered, and kept in the row index
+        appended_data = data.iloc[400:]
+        appended_data = appended_data[appended_data['student_id'].isin(history.data['student_id'])]
+        history.append(appended_data.iloc[:50])
+        history.append(appended_data.iloc[50:])
+        self.assertEqual(len(history._appended_data), 2)
+        check_interactions_of_students(pd.concat([data.iloc[:400], appended_data]))
+
+        # accessing the dataframe concatenates the appended interactions
+        self.assertEqual(len(history.data), 400 + len(appended_data))
+        self.assertEqual(len(history._appended_data), 0)
+        check_interactions_of_students(pd.concat([data.iloc[:400], appended_data]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,16 +4,29 @@ Module for unit tests that check if parameter estimation converges for toy examp
 @author Siddharth Reddy <sgr45@cornell.edu>
 """
 
+from collections import OrderedDict
 import copy
 import unittest
 import logging
+import os
+import shutil
+import sys
+import tempfile
 
 import pandas as pd
 import numpy as np
 
+from lentil import datatools
 from lentil import models
 from lentil import est
+from lentil import grad
 from lentil import toy
+from lentil import cgraph
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'benchmarks'))
+import bench_common
+import bench_grad
 
 
 logging.basicConfig()
@@ -21,6 +34,31 @@ _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.INFO)
 
 
+# (using_lessons, using_prereqs) of the embedding models that tests fit
+LESSONS_AND_PREREQS = [(False, False), (True, False), (True, True)]
+
+
+def fit_embedding_model(
+    history, estimator, using_lessons=True, using_prereqs=True, seed=1997):
+    """
+    Fit a two-dimensional embedding model with bias terms to an interaction history
+
+    :param int|None seed: Random seed for the initialization of parameters
+        (None => use the current random state)
+    """
+
+    if seed is not None:
+        np.random.seed(seed)
+    model = models.EmbeddingModel(
+        history,
+        2,
+        using_prereqs=using_prereqs,
+        using_lessons=using_lessons,
+        using_bias=True)
+    model.fit(estimator)
+    return model
+
+
 class TestEstimators(unittest.TestCase):
 
     def setUp(self):
@@ -267,6 +305,490 @@ class TestEstimators(unittest.TestCase):
 
             self.assertTrue(estimator.fd_err < eps)
 
+    def test_graph_prior(self):
+        """
+        Check the analytic gradient of the cost function with the graph prior on module
+        embeddings, for models with and without lessons and prereqs
+        """
+
+        history = toy.get_lesson_prereqs_history()
+
+        module_ids = list(history.iter_assessments()) + list(history.iter_lessons())
+        graph = cgraph.ConceptGraph(
+            {module_id: {'C%d' % (i % 3)} for i, module_id in enumerate(module_ids)},
+            {'C1': {'C0'}, 'C2': {'C0', 'C1'}})
+
+        estimator = est.EmbeddingMAPEstimator(
+            regularization_constant=1e-3,
+            using_scipy=True,
+            verify_gradient=True,
+            max_iter=1)
+
+        eps = 1e-6
+
+        for using_lessons, using_prereqs in LESSONS_AND_PREREQS:
+            model = models.EmbeddingModel(
+                history,
+                2,
+                using_lessons=using_lessons,
+                using_prereqs=using_prereqs,
+                using_graph_prior=True,
+                graph=graph)
+
+            model.fit(estimator)
+
+            self.assertTrue(estimator.fd_err < eps)
+
+    def test_preprocessing_cache(self):
+        """
+        Fits that share a preprocessing cache (in memory or on disk) should
+        recover the same parameters as fits that preprocess from scratch
+        """
+
+        history = toy.get_lesson_prereqs_history()
+
+        def fit(cache):
+            return fit_embedding_model(
+                history, est.EmbeddingMAPEstimator(using_scipy=True, cache=cache))
+
+        expected_model = fit(None)
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = est.PreprocessingCache(cache_dir=cache_dir)
+            models_with_cache = [fit(cache), fit(cache)]
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+            # a fresh cache should load the split history and matrices from disk
+            models_with_cache.append(fit(est.PreprocessingCache(cache_dir=cache_dir)))
+        finally:
+            shutil.rmtree(cache_dir)
+
+        for model in models_with_cache:
+            np.testing.assert_allclose(
+                model.student_embeddings.states, expected_model.student_embeddings.states)
+            np.testing.assert_allclose(
+                model.lesson_embeddings, expected_model.lesson_embeddings)
+
+    def test_legacy_gradient(self):
+        """
+        The fused cost function should give the same cost and gradient as the
+        per-configuration gradient functions it replaced (see benchmarks/legacy_grad.py)
+        """
+
+        history = bench_common.make_history(10, 20, num_assessments=10, num_lessons=5)
+        for using_lessons, using_prereqs, using_bias, using_graph_prior, using_l1_regularizer \
+                in bench_grad.CONFIGS:
+            legacy_cost_function, cost_function, param_vals = bench_grad.make_cost_functions(
+                history, 2, using_lessons, using_prereqs,
+                using_bias=using_bias, using_graph_prior=using_graph_prior,
+                using_l1_regularizer=using_l1_regularizer)
+            bench_grad.check_cost_functions(
+                legacy_cost_function, cost_function, param_vals, using_graph_prior)
+
+    def test_sharded_gradient(self):
+        """
+        Evaluating the gradient on shards of interactions in a thread pool should
+        give the same gradient, and the same parameter estimates, as a single thread
+        """
+
+        history = toy.get_lesson_prereqs_history()
+
+        def fit(num_threads, using_lessons, using_prereqs):
+            estimator = est.EmbeddingMAPEstimator(
+                using_scipy=True, verify_gradient=True, num_threads=num_threads)
+            model = fit_embedding_model(history, estimator, using_lessons, using_prereqs)
+            self.assertTrue(estimator.fd_err < 1e-6)
+            return model
+
+        for using_lessons, using_prereqs in LESSONS_AND_PREREQS:
+            expected_model = fit(1, using_lessons, using_prereqs)
+            model = fit(3, using_lessons, using_prereqs)
+            np.testing.assert_allclose(
+                model.student_embeddings.states, expected_model.student_embeddings.states,
+                rtol=1e-6, atol=1e-8)
+            np.testing.assert_allclose(
+                model.assessment_embeddings, expected_model.assessment_embeddings,
+                rtol=1e-6, atol=1e-8)
+
+    def test_scatter_backend(self):
+        """
+        Summing per-interaction gradients with np.bincount should give the same
+        parameter estimates as sparse participation matrix products, with and without
+        shards of interactions and mini-batches
+        """
+
+        history = toy.get_lesson_prereqs_history()
+
+        def fit(scatter_backend, using_lessons, using_prereqs, **kwargs):
+            return fit_embedding_model(
+                history,
+                est.EmbeddingMAPEstimator(scatter_backend=scatter_backend, **kwargs),
+                using_lessons,
+                using_prereqs)
+
+        estimator_kwargs = [
+            {'using_scipy' : True, 'verify_gradient' : True},
+            {'using_scipy' : True, 'num_threads' : 3},
+            {'using_minibatches' : True, 'minibatch_kwargs' : {
+                'batch_size' : 2, 'max_epochs' : 3}}]
+        for using_lessons, using_prereqs in LESSONS_AND_PREREQS:
+            for kwargs in estimator_kwargs:
+                expected_model = fit('csr', using_lessons, using_prereqs, **kwargs)
+                model = fit('bincount', using_lessons, using_prereqs, **kwargs)
+                np.testing.assert_allclose(
+                    model.student_embeddings.states, expected_model.student_embeddings.states,
+                    rtol=1e-6, atol=1e-8)
+                np.testing.assert_allclose(
+                    model.assessment_embeddings, expected_model.assessment_embeddings,
+                    rtol=1e-6, atol=1e-8)
+
+        with self.assertRaises(ValueError):
+            est.EmbeddingMAPEstimator(scatter_backend='coo')
+
+    def test_chunked_gradient(self):
+        """
+        Evaluating the cost function on chunks of interactions should give the same
+        cost and gradient as evaluating all interactions at once, for every
+        scatter backend and number of threads
+        """
+
+        history = toy.get_lesson_prereqs_history()
+        split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+        student_embeddings = models.StudentTrajectories(split_history.trajectory_offsets, 2)
+        num_assessments = history.num_assessments()
+        num_lessons = history.num_lessons()
+
+        for using_lessons, using_prereqs in LESSONS_AND_PREREQS:
+            param_shapes = OrderedDict([
+                (models.STUDENT_EMBEDDINGS, student_embeddings.states.shape),
+                (models.ASSESSMENT_EMBEDDINGS, (num_assessments, 2))])
+            if using_lessons:
+                param_shapes[models.LESSON_EMBEDDINGS] = (num_lessons, 2)
+            if using_prereqs:
+                param_shapes[models.PREREQ_EMBEDDINGS] = (num_lessons, 2)
+            param_shapes[models.STUDENT_BIASES] = (history.num_students(), )
+            param_shapes[models.ASSESSMENT_BIASES] = (num_assessments, )
+            np.random.seed(1997)
+            param_vals = np.concatenate([
+                np.random.random(v).ravel() + 0.1 for v in param_shapes.values()])
+
+            def cost_function(**kwargs):
+                participation_matrices = est.compute_participation_matrices(
+                    split_history, num_assessments, num_lessons if using_lessons else 0,
+                    using_lessons=using_lessons, using_prereqs=using_prereqs)
+                return grad.CostFunction(
+                    param_shapes,
+                    split_history.assessment_interactions,
+                    split_history.lesson_interactions,
+                    participation_matrices,
+                    student_embeddings.student_idxes_of_states(),
+                    regularization_constant=[1e-2] * 5,
+                    using_lessons=using_lessons,
+                    using_prereqs=using_prereqs,
+                    **kwargs)
+
+            expected_cost, expected_gradient = cost_function()(param_vals)
+            expected_gradient = expected_gradient.copy()
+            for scatter_backend in grad.SCATTER_BACKENDS:
+                for num_threads in [1, 2]:
+                    for chunk_size in [1, 3, 1000]:
+                        f = cost_function(
+                            scatter_backend=scatter_backend, num_threads=num_threads,
+                            chunk_size=chunk_size)
+                        for _ in range(2):
+                            cost, gradient = f(param_vals)
+                        f.close()
+                        self.assertAlmostEqual(cost, expected_cost)
+                        np.testing.assert_allclose(gradient, expected_gradient, atol=1e-12)
+
+        with self.assertRaises(ValueError):
+            est.EmbeddingMAPEstimator(chunk_size=0)
+
+    def test_minibatch_cost_function(self):
+        """
+        The costs and gradients of mini-batches that partition the students
+        should sum to the full cost function and its gradient
+        """
+
+        history = toy.get_lesson_prereqs_history()
+        split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+        student_embeddings = models.StudentTrajectories(split_history.trajectory_offsets, 2)
+        num_assessments = history.num_assessments()
+        num_lessons = history.num_lessons()
+
+        param_shapes = OrderedDict([
+            (models.STUDENT_EMBEDDINGS, student_embeddings.states.shape),
+            (models.ASSESSMENT_EMBEDDINGS, (num_assessments, 2)),
+            (models.LESSON_EMBEDDINGS, (num_lessons, 2)),
+            (models.PREREQ_EMBEDDINGS, (num_lessons, 2)),
+            (models.STUDENT_BIASES, (history.num_students(), )),
+            (models.ASSESSMENT_BIASES, (num_assessments, ))])
+        np.random.seed(1997)
+        params = OrderedDict((k, np.random.random(v) + 0.1) for k, v in param_shapes.items())
+
+        cost_function = grad.CostFunction(
+            param_shapes,
+            split_history.assessment_interactions,
+            split_history.lesson_interactions,
+            est.compute_participation_matrices(split_history, num_assessments, num_lessons),
+            student_embeddings.student_idxes_of_states(),
+            regularization_constant=[1e-2] * 5)
+        expected_gradients, expected_cost = cost_function.grads(params)
+
+        for num_threads in [1, 2]:
+            batch_grads = est.StudentMinibatchCostFunction(
+                split_history,
+                param_shapes,
+                num_assessments,
+                num_lessons,
+                regularization_constant=[1e-2] * 5,
+                num_threads=num_threads)
+            gradients = {k: np.zeros(v) for k, v in param_shapes.items()}
+            cost = 0
+            for student_idxes in np.array_split(
+                    np.random.permutation(batch_grads.num_students), 3):
+                g, c, rows = batch_grads(params, student_idxes)
+                cost += c
+                for k in gradients:
+                    gradients[k][rows[k]] += g[k]
+
+            self.assertAlmostEqual(cost, expected_cost)
+            for k in gradients:
+                np.testing.assert_allclose(gradients[k], expected_gradients[k], atol=1e-12)
+
+    def test_block_coordinate(self):
+        """
+        Solving blocks of students in a thread pool or in worker processes should give
+        the same estimates as solving them in a single thread, and the cost should decrease
+        after every sweep
+        """
+
+        history = toy.get_lesson_prereqs_history()
+
+        def cost(model):
+            split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+            params = OrderedDict([
+                (models.STUDENT_EMBEDDINGS, model.student_embeddings.states),
+                (models.ASSESSMENT_EMBEDDINGS, model.assessment_embeddings),
+                (models.LESSON_EMBEDDINGS, model.lesson_embeddings),
+                (models.PREREQ_EMBEDDINGS, model.prereq_embeddings),
+                (models.STUDENT_BIASES, model.student_biases),
+                (models.ASSESSMENT_BIASES, model.assessment_biases)])
+            cost_function = grad.CostFunction(
+                OrderedDict((k, v.shape) for k, v in params.items()),
+                split_history.assessment_interactions,
+                split_history.lesson_interactions,
+                est.compute_participation_matrices(
+                    split_history, history.num_assessments(), history.num_lessons()),
+                model.student_embeddings.student_idxes_of_states(),
+                learning_update_variance=model.learning_update_variance_constant,
+                regularization_constant=[1e-6] * 5)
+            return cost_function.grads(params)[1]
+
+        expected_model = fit_embedding_model(history, est.BlockCoordinateEstimator(
+            num_sweeps=1, block_size=3, num_workers=1))
+        model = fit_embedding_model(history, est.BlockCoordinateEstimator(
+            num_sweeps=1, block_size=3, num_workers=2))
+        np.testing.assert_allclose(
+            model.student_embeddings.states, expected_model.student_embeddings.states,
+            rtol=1e-6, atol=1e-8)
+        np.testing.assert_allclose(
+            model.assessment_embeddings, expected_model.assessment_embeddings,
+            rtol=1e-6, atol=1e-8)
+
+        model = fit_embedding_model(history, est.BlockCoordinateEstimator(
+            num_sweeps=1, block_size=3, num_workers=2, worker_type='process'))
+        np.testing.assert_allclose(
+            model.student_embeddings.states, expected_model.student_embeddings.states,
+            rtol=1e-6, atol=1e-8)
+        np.testing.assert_allclose(
+            model.prereq_embeddings, expected_model.prereq_embeddings, rtol=1e-6, atol=1e-8)
+
+        costs = []
+        model = fit_embedding_model(history, est.BlockCoordinateEstimator(
+            num_sweeps=20, ftol=1e-6, block_size=3, num_workers=2,
+            callback=lambda iter_idx, params, c, state: costs.append(c[-1])))
+        self.assertGreater(len(costs), 1)
+        self.assertTrue(all(x >= y - 1e-6 for x, y in zip(costs[:-1], costs[1:])))
+        self.assertAlmostEqual(cost(model) / costs[-1], 1)
+        self.assertLess(costs[-1], 0.9 * costs[0])
+
+        # float32 fits keep parameters in float32
+        for worker_type in est.WORKER_TYPES:
+            model = fit_embedding_model(history, est.BlockCoordinateEstimator(
+                num_sweeps=2, block_size=3, num_workers=2, worker_type=worker_type,
+                dtype=np.float32))
+            for v in [model.student_embeddings.states, model.assessment_embeddings,
+                      model.lesson_embeddings, model.prereq_embeddings,
+                      model.student_biases, model.assessment_biases]:
+                self.assertEqual(v.dtype, np.float32)
+
+        with self.assertRaises(ValueError):
+            est.BlockCoordinateEstimator(block_size=0)
+        with self.assertRaises(ValueError):
+            est.BlockCoordinateEstimator(worker_type='fiber')
+
+    def test_float32(self):
+        """
+        A float32 cost function should agree with float64 up to single precision,
+        and float32 fits should keep parameters in float32
+        """
+
+        history = toy.get_lesson_prereqs_history()
+        split_history = history.split_interactions_by_type(insert_dummy_lesson_ixns=True)
+        student_embeddings = models.StudentTrajectories(split_history.trajectory_offsets, 2)
+        num_assessments = history.num_assessments()
+        num_lessons = history.num_lessons()
+
+        param_shapes = OrderedDict([
+            (models.STUDENT_EMBEDDINGS, student_embeddings.states.shape),
+            (models.ASSESSMENT_EMBEDDINGS, (num_assessments, 2)),
+            (models.LESSON_EMBEDDINGS, (num_lessons, 2)),
+            (models.PREREQ_EMBEDDINGS, (num_lessons, 2)),
+            (models.STUDENT_BIASES, (history.num_students(), )),
+            (models.ASSESSMENT_BIASES, (num_assessments, ))])
+        param_vals = np.random.random(sum(int(np.prod(v)) for v in param_shapes.values())) + 0.1
+
+        costs, gradients = {}, {}
+        for dtype in [np.float64, np.float32]:
+            cost_function = grad.CostFunction(
+                param_shapes,
+                split_history.assessment_interactions,
+                split_history.lesson_interactions,
+                est.compute_participation_matrices(
+                    split_history, num_assessments, num_lessons, dtype=np.float64),
+                student_embeddings.student_idxes_of_states(),
+                dtype=dtype)
+            cost, gradient = cost_function(param_vals)
+            self.assertEqual(gradient.dtype, dtype)
+            costs[dtype] = cost
+            gradients[dtype] = cost_function.float64(param_vals)[1]
+            self.assertEqual(gradients[dtype].dtype, np.float64)
+
+        self.assertAlmostEqual(costs[np.float32], costs[np.float64], places=3)
+        np.testing.assert_allclose(
+            gradients[np.float32], gradients[np.float64], rtol=1e-4, atol=1e-5)
+
+        for using_scipy in [True, False]:
+            model = fit_embedding_model(
+                history, est.EmbeddingMAPEstimator(using_scipy=using_scipy, dtype=np.float32),
+                seed=None)
+            self.assertEqual(model.student_embeddings.states.dtype, np.float32)
+            self.assertEqual(model.assessment_embeddings.dtype, np.float32)
+            self.assertEqual(model.prereq_embeddings.dtype, np.float32)
+
+        with self.assertRaises(ValueError):
+            est.EmbeddingMAPEstimator(dtype=np.int64)
+
+    def test_checkpoint_and_resume(self):
+        """
+        An Adagrad fit that is interrupted and resumed from its latest checkpoint
+        should end where an uninterrupted fit does
+        """
+
+        history = toy.get_lesson_prereqs_history()
+        checkpoint_dir = tempfile.mkdtemp()
+        checkpoint_file = os.path.join(checkpoint_dir, 'fit.ckpt')
+
+        # the random state is set before each fit, to check that resuming ignores it
+        def fit(max_iter, checkpointer=None, resuming=False):
+            return fit_embedding_model(
+                history,
+                est.EmbeddingMAPEstimator(
+                    gradient_descent_kwargs={
+                        'using_adagrad' : True, 'max_iter' : max_iter, 'ftol' : 1e-12},
+                    using_scipy=False, checkpointer=checkpointer, resuming=resuming),
+                seed=None)
+
+        try:
+            np.random.seed(1)
+            uninterrupted_model = fit(20)
+
+            np.random.seed(1)
+            fit(10, checkpointer=est.FitCheckpointer(checkpoint_file, every=5))
+            checkpoint = est.FitCheckpointer(checkpoint_file).load()
+            self.assertEqual(checkpoint['iter_idx'], 10)
+            self.assertEqual(len(checkpoint['costs']), 10)
+            self.assertIn('hg', checkpoint['optimizer_state'])
+
+            # the random initialization is ignored when resuming
+            np.random.seed(2)
+            resumed_model = fit(
+                20, checkpointer=est.FitCheckpointer(checkpoint_file, every=5), resuming=True)
+            np.testing.assert_allclose(
+                resumed_model.student_embeddings.states,
+                uninterrupted_model.student_embeddings.states)
+            np.testing.assert_allclose(
+                resumed_model.assessment_embeddings, uninterrupted_model.assessment_embeddings)
+
+            # a checkpoint of a different fit should not be resumed
+            with self.assertRaises(ValueError):
+                models.EmbeddingModel(history, 3).fit(est.EmbeddingMAPEstimator(
+                    using_scipy=False, resuming=True,
+                    checkpointer=est.FitCheckpointer(checkpoint_file)))
+        finally:
+            shutil.rmtree(checkpoint_dir)
+
+    def test_fold_in(self):
+        """
+        Folding in new interactions of a student should only update the suffix of that
+        student's trajectory, and make the new interactions more likely
+        """
+
+        data = toy.get_lesson_prereqs_history().data
+        new_interactions = data.loc[[12, 16]] # McLovin's lesson, and assessment at timestep 2
+        history = datatools.InteractionHistory(data.drop([12, 16]))
+
+        model = fit_embedding_model(history, est.EmbeddingMAPEstimator())
+
+        student_idx = history.idx_of_student_id('McLovin')
+        new_assessment_interactions = new_interactions[
+            new_interactions['module_type'] == datatools.AssessmentInteraction.MODULETYPE]
+        pass_likelihood = model.assessment_pass_likelihoods(new_assessment_interactions)[0]
+        states = model.student_embeddings.to_dense()
+        assessment_embeddings = model.assessment_embeddings.copy()
+        lesson_embeddings = model.lesson_embeddings.copy()
+
+        # a fold-in that fails leaves the model as it was
+        bad_interactions = new_interactions.copy()
+        bad_interactions['outcome'] = None
+        with self.assertRaises(TypeError):
+            model.fold_in(bad_interactions)
+        self.assertEqual(len(history.data), len(data) - 2)
+        np.testing.assert_array_equal(model.student_embeddings.to_dense(), states)
+
+        model.fold_in(new_interactions)
+
+        self.assertEqual(len(history.data), len(data))
+        self.assertEqual(model.student_embeddings.lengths()[student_idx], 3)
+        np.testing.assert_array_equal(model.assessment_embeddings, assessment_embeddings)
+        np.testing.assert_array_equal(model.lesson_embeddings, lesson_embeddings)
+
+        new_states = model.student_embeddings.to_dense()
+        other_student_idxes = np.arange(history.num_students()) != student_idx
+        np.testing.assert_array_equal(
+            new_states[other_student_idxes], states[other_student_idxes])
+        np.testing.assert_array_equal(
+            new_states[student_idx, :, :2], states[student_idx, :, :2])
+
+        self.assertTrue(model.assessment_pass_likelihoods(
+            new_assessment_interactions)[0] > pass_likelihood)
+
+        with self.assertRaises(ValueError):
+            model.fold_in(data.loc[[0]]) # occurs before McLovin's last interaction
+
+        later_interactions = new_interactions.copy()
+        later_interactions['timestep'] += 1
+        new_module_interactions = later_interactions.copy()
+        new_module_interactions['module_id'] = 'Latin'
+        with self.assertRaises(ValueError) as context:
+            model.fold_in(new_module_interactions)
+        self.assertIn('new modules', str(context.exception))
+        # a missing column is not reported as an unrecognized id
+        with self.assertRaises(KeyError):
+            model.fold_in(later_interactions.drop('module_type', axis=1))
+
     # TODO: add unit tests for tv_luv_model, forgetting_model, using_graph_prior=True,
     # and using_lessons=False for temporal process on student
     
@@ -0,0 +1,230 @@
+"""
+Module for unit tests that check cross-validation of skill models
+"""
+
+import unittest
+import logging
+import random
+
+import pandas as pd
+import numpy as np
+
+from lentil import datatools
+from lentil import est
+from lentil import evaluate
+from lentil import models
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.DEBUG)
+
+
+def build_student_biased_coin_model(history, filtered_history, split_history=None):
+    """
+    Deterministic model builder, so results can be compared across runs
+    """
+
+    model = models.StudentBiasedCoinModel(history, filtered_history)
+    model.fit()
+    return model
+
+
+def build_assessment_biased_coin_model(history, filtered_history, split_history=None):
+    """
+    Deterministic model builder, so results can be compared across runs
+    """
+
+    model = models.AssessmentBiasedCoinModel(history, filtered_history)
+    model.fit()
+    return model
+
+
+def build_embedding_model(history, filtered_history, split_history=None):
+    """
+    Model builder whose parameters are randomly initialized with np.random
+    """
+
+    model = models.EmbeddingModel(
+        history, embedding_dimension=2, using_lessons=False, using_prereqs=False)
+    model.fit(est.EmbeddingMAPEstimator(
+        filtered_history=filtered_history, split_history=split_history))
+    return model
+
+
+class TestCrossValidation(unittest.TestCase):
+
+    def setUp(self):
+        # InteractionHistory samples the test set with the random module
+        random.seed(0)
+        rng = np.random.RandomState(0)
+        num_students = 20
+        num_assessments = 4
+        num_timesteps = 6
+        ixns = []
+        for student_idx in range(num_students):
+            skill = rng.normal()
+            for timestep in range(1, num_timesteps+1):
+                for assessment_idx in rng.choice(num_assessments, size=2, replace=False):
+                    ixns.append({
+                        'student_id' : 's%d' % student_idx,
+                        'module_id' : 'A%d' % assessment_idx,
+                        'module_type' : datatools.AssessmentInteraction.MODULETYPE,
+                        'outcome' : rng.random_sample() < 1 / (1 + np.exp(
+                            assessment_idx - 1.5 - skill)),
+                        'timestep' : timestep
+                        })
+        self.history = datatools.InteractionHistory(
+            pd.DataFrame(ixns), size_of_test_set=0.2)
+
+        self.model_builders = {
+            'student' : build_student_biased_coin_model,
+            'assessment' : build_assessment_biased_coin_model
+            }
+
+    def test_parallel_folds(self):
+        """
+        Check that running folds in worker processes gives the same results
+        as running them sequentially
+        """
+
+        model_builders = dict(self.model_builders, embedding=build_embedding_model)
+        results = []
+        for n_jobs in [1, 2]:
+            np.random.seed(0)
+            results.append(evaluate.cross_validated_auc(
+                model_builders,
+                self.history,
+                num_folds=4,
+                random_truncations=False,
+                size_of_test_set=0.2,
+                n_jobs=n_jobs))
+
+        sequential_results, parallel_results = results
+        for k in model_builders:
+            np.testing.assert_allclose(
+                sequential_results.validation_aucs(k), parallel_results.validation_aucs(k))
+            np.testing.assert_allclose(
+                sequential_results.training_aucs(k), parallel_results.training_aucs(k))
+            self.assertAlmostEqual(
+                sequential_results.test_auc(k), parallel_results.test_auc(k))
+
+        for (seq_idxes, seq_y_true, seq_probas_pred), (par_idxes, par_y_true, par_probas_pred) \
+                in zip(sequential_results.val_ixn_data, parallel_results.val_ixn_data):
+            self.assertEqual(seq_idxes, par_idxes)
+            np.testing.assert_array_equal(seq_y_true, par_y_true)
+            for k in model_builders:
+                np.testing.assert_allclose(seq_probas_pred[k], par_probas_pred[k])
+
+        with self.assertRaises(ValueError):
+            evaluate.cross_validated_auc(self.model_builders, self.history, n_jobs=0)
+
+    def test_parallel_folds_with_extra_columns(self):
+        """
+        Check that folds of histories with columns that workers do not get
+        fall back to running sequentially
+        """
+
+        self.history.data['user_id'] = self.history.data['student_id']
+
+        def build_user_biased_coin_model(history, filtered_history, split_history=None):
+            model = models.StudentBiasedCoinModel(
+                history, filtered_history, name_of_user_id='user_id')
+            model.fit()
+            return model
+
+        model_builders = {'user' : build_user_biased_coin_model}
+        results = []
+        for n_jobs in [1, 2]:
+            np.random.seed(0)
+            results.append(evaluate.cross_validated_auc(
+                model_builders, self.history, num_folds=4, n_jobs=n_jobs))
+
+        sequential_results, parallel_results = results
+        np.testing.assert_allclose(
+            sequential_results.validation_aucs('user'), parallel_results.validation_aucs('user'))
+
+        with self.assertRaises(ValueError):
+            evaluate._run_folds_in_pool(model_builders, self.history, [], [], False, 2)
+
+    def test_warm_start(self):
+        """
+        Check that warm-started folds re-randomize left-out students,
+        and still produce sensible AUCs
+        """
+
+        embedding_builds = []
+        filtered_histories = []
+
+        def build_embedding(history, filtered_history, split_history=None,
+                            initial_param_vals=None):
+            embedding_builds.append(initial_param_vals)
+            filtered_histories.append(filtered_history)
+            model = models.EmbeddingModel(history, embedding_dimension=2, using_lessons=False,
+                                          using_prereqs=False)
+            estimator = est.EmbeddingMAPEstimator(
+                filtered_history=filtered_history,
+                split_history=split_history,
+                initial_param_vals=initial_param_vals if initial_param_vals is not None else {})
+            model.fit(estimator)
+            return model
+
+        model_builders = dict(self.model_builders, embedding=build_embedding)
+        results = evaluate.cross_validated_auc(
+            model_builders,
+            self.history,
+            num_folds=4,
+            size_of_test_set=0.2,
+            warm_start=True)
+
+        # full fit, 4 folds, and the test run
+        self.assertEqual(len(embedding_builds), 6)
+        self.assertIsNone(embedding_builds[0])
+        for initial_param_vals in embedding_builds[1:]:
+            self.assertIsInstance(
+                initial_param_vals[models.STUDENT_EMBEDDINGS], models.StudentTrajectories)
+        self.assertEqual(len(results.validation_aucs('embedding')), 4)
+        self.assertEqual(len(results.validation_aucs('student')), 4)
+
+        # the full fit never sees the validation interactions of folds
+        for val_idxes, _, _ in results.val_ixn_data:
+            self.assertFalse(set(val_idxes) & set(filtered_histories[0].index))
+
+        full_model = models.EmbeddingModel(
+            self.history, embedding_dimension=2, using_lessons=False, using_prereqs=False)
+        full_model.fit(est.EmbeddingMAPEstimator())
+        left_out_student_ids = {'s0', 's1'}
+        initial_param_vals = evaluate._warm_start_param_vals(full_model, left_out_student_ids)
+        student_embeddings = initial_param_vals[models.STUDENT_EMBEDDINGS]
+        for student_id in self.history.iter_students():
+            student_idx = self.history.idx_of_student_id(student_id)
+            states = student_embeddings[student_idx, :, :]
+            full_states = full_model.student_embeddings[student_idx, :, :]
+            bias = initial_param_vals[models.STUDENT_BIASES][student_idx]
+            full_bias = full_model.student_biases[student_idx]
+            if student_id in left_out_student_ids:
+                self.assertFalse((states == full_states).any())
+                self.assertNotEqual(bias, full_bias)
+            else:
+                self.assertTrue((states == full_states).all())
+                self.assertEqual(bias, full_bias)
+
+        # warm-start models are sent to workers without their interactions
+        stripped_model = evaluate._without_interactions(full_model)
+        self.assertIsInstance(stripped_model.history, datatools.IdMaps)
+        self.assertIs(full_model.history, self.history)
+        np.random.seed(0)
+        initial_param_vals = evaluate._warm_start_param_vals(full_model, left_out_student_ids)
+        np.random.seed(0)
+        stripped_param_vals = evaluate._warm_start_param_vals(
+            stripped_model, left_out_student_ids)
+        np.testing.assert_array_equal(
+            stripped_param_vals[models.STUDENT_EMBEDDINGS].states,
+            initial_param_vals[models.STUDENT_EMBEDDINGS].states)
+        np.testing.assert_array_equal(
+            stripped_param_vals[models.STUDENT_BIASES],
+            initial_param_vals[models.STUDENT_BIASES])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,10 @@ Module for unit tests that check if estimated embeddings for toy examples satisf
 
 import unittest
 import logging
+import os
+import pickle
+import shutil
+import tempfile
 
 import pandas as pd
 import numpy as np
@@ -320,6 +324,190 @@ class TestModels(unittest.TestCase):
             self.assertTrue(prereq_sat(mclovin[0]) > prereq_sat(seth[0]))
             self.assertTrue(prereq_sat(mclovin[0]) > prereq_sat(evan[0]))
 
+    def test_student_trajectories(self):
+        """
+        Ragged student trajectories should behave like the dense student tensor,
+        where student states after the last interaction are pinned to the last state
+        """
+
+        history = toy.get_independent_lessons_history()
+
+        embedding_dimension = 2
+
+        model = models.EmbeddingModel(
+            history,
+            embedding_dimension,
+            using_prereqs=False,
+            using_lessons=True,
+            using_bias=False,
+            learning_update_variance_constant=0.5)
+
+        estimator = est.EmbeddingMAPEstimator(
+            regularization_constant=1e-6,
+            using_scipy=True,
+            verify_gradient=False,
+            debug_mode_on=False)
+
+        model.fit(estimator)
+
+        trajectories = model.student_embeddings
+        last_timesteps = history.data.groupby('student_id')['timestep'].max()
+        self.assertTrue(trajectories.num_states() == (last_timesteps + 1).sum())
+        self.assertTrue(trajectories.num_states() < history.num_students() * history.duration())
+
+        dense = trajectories.to_dense()
+        self.assertTrue(dense.shape == (
+            history.num_students(), embedding_dimension, history.duration()))
+
+        for student_id, last_timestep in last_timesteps.items():
+            student_idx = history.idx_of_student_id(student_id)
+            self.assertTrue((dense[student_idx, :, last_timestep:] == dense[
+                student_idx, :, last_timestep][:, None]).all())
+            self.assertTrue((trajectories[student_idx, :, :] == dense[student_idx, :, :]).all())
+            self.assertTrue((trajectories[student_idx, 0, 1] == dense[student_idx, 0, 1]).all())
+
+        repacked = models.StudentTrajectories.from_dense(dense)
+        self.assertTrue((repacked.to_dense() == dense).all())
+
+        # repacking to full-length trajectories pads with the last state
+        repacked = trajectories.repacked(repacked.offsets)
+        self.assertTrue((repacked.to_dense() == dense).all())
+        self.assertTrue((repacked.repacked(trajectories.offsets).states == \
+                trajectories.states).all())
+
+    def test_baseline_pass_likelihoods(self):
+        """
+        Vectorized scoring of baseline models should match
+        scoring interactions one at a time
+        """
+
+        history = toy.get_independent_lessons_history()
+        df = history.data
+        assessment_ixns = df[df['module_type'] == 'assessment']
+
+        baseline_models = [
+            models.StudentBiasedCoinModel(history, df),
+            models.AssessmentBiasedCoinModel(history, df),
+            models.OneParameterLogisticModel(df),
+            models.TwoParameterLogisticModel(df)]
+
+        for model in baseline_models:
+            model.fit()
+            pass_likelihoods = model.assessment_pass_likelihoods(assessment_ixns)
+            expected_pass_likelihoods = np.array([model.assessment_pass_likelihood(
+                ixn) for _, ixn in assessment_ixns.iterrows()])
+            np.testing.assert_allclose(pass_likelihoods, expected_pass_likelihoods)
+
+            if isinstance(model, models.IRTModel):
+                # check against the logistic regression itself
+                probas = model.model.predict_proba(
+                    model.feature_matrix_from_interactions(assessment_ixns))
+                np.testing.assert_allclose(
+                    pass_likelihoods, probas[:, list(model.model.classes_).index(1)])
+
+    def test_pass_likelihoods_from_idxes(self):
+        """
+        Scoring from index arrays should match the DataFrame path
+        and scoring interactions one at a time
+        """
+
+        history = toy.get_independent_lessons_history()
+        df = history.data
+        assessment_ixns = df[df['module_type'] == 'assessment']
+
+        model = models.EmbeddingModel(history, 2, using_prereqs=False, using_lessons=True)
+        model.fit(est.EmbeddingMAPEstimator())
+
+        pass_likelihoods = model.pass_likelihoods_from_idxes(
+            history.idxes_of_student_ids(assessment_ixns['student_id']),
+            history.idxes_of_assessment_ids(assessment_ixns['module_id']),
+            assessment_ixns['timestep'].values)
+        np.testing.assert_allclose(
+            pass_likelihoods, model.assessment_pass_likelihoods(assessment_ixns))
+        np.testing.assert_allclose(pass_likelihoods, [model.assessment_pass_likelihood(
+            ixn) for _, ixn in assessment_ixns.iterrows()])
+
+        # scores are computed in float64 from the float32 cache, so they stay close
+        # to the embedding distance evaluated on the float64 parameters
+        def pass_likelihood_from_params(ixn):
+            student_idx = history.idx_of_student_id(ixn['student_id'])
+            assessment_idx = history.idx_of_assessment_id(ixn['module_id'])
+            delta = model.embedding_distance(
+                model.student_embeddings[student_idx, :, ixn['timestep']],
+                model.assessment_embeddings[assessment_idx]) + \
+                        model.student_biases[student_idx] + model.assessment_biases[assessment_idx]
+            return 1 / (1 + np.exp(-delta))
+
+        self.assertEqual(pass_likelihoods.dtype, np.float64)
+        np.testing.assert_allclose(pass_likelihoods, [pass_likelihood_from_params(
+            ixn) for _, ixn in assessment_ixns.iterrows()], rtol=1e-6)
+
+        with self.assertRaises(KeyError):
+            model.assessment_pass_likelihoods(pd.DataFrame({
+                'student_id' : ['nobody'], 'module_id' : ['A'], 'timestep' : [1]}))
+
+        # reassigning parameters invalidates the frozen inference representation
+        cache = model.inference_cache()
+        self.assertTrue(model.inference_cache() is cache)
+        self.assertEqual(cache.assessment_unit_vectors.dtype, np.float32)
+        self.assertTrue('_inference_cache' not in pickle.loads(pickle.dumps(model)).__dict__)
+        model.assessment_biases = model.assessment_biases + 1
+        self.assertTrue(model.inference_cache() is not cache)
+        self.assertTrue((model.assessment_pass_likelihoods(assessment_ixns) >= \
+                pass_likelihoods).all())
+
+    def test_save_and_load(self):
+        """
+        A model loaded from the binary format should score interactions like the original
+        """
+
+        history = toy.get_lesson_prereqs_history()
+        df = history.data
+        assessment_ixns = df[df['module_type'] == 'assessment']
+
+        model = models.EmbeddingModel(history, 2, using_prereqs=True, using_lessons=True)
+        model.fit(est.EmbeddingMAPEstimator())
+        pass_likelihoods = model.assessment_pass_likelihoods(assessment_ixns)
+
+        model_dir = tempfile.mkdtemp()
+        try:
+            model_file = os.path.join(model_dir, 'model')
+            model.save(model_file)
+            loaded_model = models.EmbeddingModel.load(model_file)
+            self.assertIsInstance(loaded_model.assessment_embeddings, np.memmap)
+            self.assertIsInstance(
+                loaded_model.inference_cache().assessment_unit_vectors, np.memmap)
+            self.assertEqual(loaded_model.history.num_students(), history.num_students())
+            self.assertTrue(loaded_model.using_prereqs)
+            np.testing.assert_array_equal(
+                loaded_model.student_embeddings.states, model.student_embeddings.states)
+            np.testing.assert_allclose(
+                loaded_model.assessment_pass_likelihoods(assessment_ixns), pass_likelihoods)
+            for _, ixn in assessment_ixns.iterrows():
+                self.assertAlmostEqual(
+                    loaded_model.assessment_pass_likelihood(ixn),
+                    model.assessment_pass_likelihood(ixn))
+
+            # a loaded model has no interaction history to fold new interactions into
+            with self.assertRaises(ValueError):
+                loaded_model.fold_in(assessment_ixns)
+
+            # saving a loaded model with float32 parameters
+            float32_model_file = os.path.join(model_dir, 'model32')
+            loaded_model.save(float32_model_file, dtype=np.float32)
+            float32_model = models.EmbeddingModel.load(float32_model_file, mmap=False)
+            self.assertEqual(float32_model.assessment_embeddings.dtype, np.float32)
+            self.assertLess(os.path.getsize(float32_model_file), os.path.getsize(model_file))
+            np.testing.assert_allclose(
+                float32_model.assessment_pass_likelihoods(assessment_ixns), pass_likelihoods,
+                rtol=1e-5, atol=1e-6)
+
+            history.to_npz(os.path.join(model_dir, 'history.npz'))
+            with self.assertRaises(KeyError):
+                models.EmbeddingModel.load(os.path.join(model_dir, 'history.npz'))
+        finally:
+            shutil.rmtree(model_dir)
+
     # TODO: add unit tests for tv_luv_model, forgetting_model, and using_graph_prior=True
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+"""
+Module for unit tests that check batched recommendations
+against scoring students and modules one at a time
+"""
+
+import unittest
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from lentil import datatools
+from lentil import models
+from lentil import recommend
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.DEBUG)
+
+
+class TestRecommend(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        ixns = []
+        for student_idx in range(8):
+            for timestep in range(1, 6):
+                for assessment_idx in rng.choice(6, size=2, replace=False):
+                    ixns.append({
+                        'student_id' : 's%d' % student_idx,
+                        'module_id' : 'A%d' % assessment_idx,
+                        'module_type' : datatools.AssessmentInteraction.MODULETYPE,
+                        'outcome' : rng.random_sample() < 0.2 * timestep,
+                        'timestep' : timestep
+                        })
+                if timestep < 5:
+                    ixns.append({
+                        'student_id' : 's%d' % student_idx,
+                        'module_id' : 'L%d' % rng.randint(5),
+                        'module_type' : datatools.LessonInteraction.MODULETYPE,
+                        'outcome' : None,
+                        'timestep' : timestep + 1
+                        })
+        self.history = datatools.InteractionHistory(pd.DataFrame(ixns))
+        self.model = models.EmbeddingModel(
+            self.history, 3, using_lessons=True, using_prereqs=True, using_bias=True)
+
+        # parameters are sampled instead of estimated, so pass likelihoods
+        # are spread out instead of saturated
+        self.model.student_embeddings.states = rng.random_sample(
+            self.model.student_embeddings.states.shape)
+        self.model.assessment_embeddings = 0.1 + rng.random_sample(
+            self.model.assessment_embeddings.shape)
+        self.model.lesson_embeddings = 0.5 * rng.random_sample(
+            self.model.lesson_embeddings.shape)
+        self.model.prereq_embeddings = 0.1 + rng.random_sample(
+            self.model.prereq_embeddings.shape)
+        self.model.student_biases = rng.normal(size=self.model.student_biases.shape)
+        self.model.assessment_biases = rng.normal(size=self.model.assessment_biases.shape)
+
+        self.student_idxes = np.arange(self.history.num_students())
+        self.latest_states = [self.model.student_embeddings[
+            student_idx, :, self.model.student_embeddings.lengths()[student_idx] - 1] \
+                    for student_idx in self.student_idxes]
+
+    def reference_pass_likelihood(self, student_idx, state, assessment_idx):
+        return 1 / (1 + math.exp(-(self.model.embedding_distance(
+            state, self.model.assessment_embeddings[assessment_idx]) + \
+                    self.model.student_biases[student_idx] + \
+                    self.model.assessment_biases[assessment_idx])))
+
+    def test_lesson_gains(self):
+        """
+        Expected lesson gains and top-k lessons should match a straightforward loop
+        """
+
+        recommender = recommend.EmbeddingRecommender(self.model, block_size=2)
+        gains = recommender.lesson_gains(self.student_idxes)
+
+        num_assessments = self.history.num_assessments()
+        for student_idx, state in zip(self.student_idxes, self.latest_states):
+            for lesson_idx in range(self.history.num_lessons()):
+                next_state = state + self.model.prereq_weight(
+                    state, self.model.prereq_embeddings[lesson_idx]) * \
+                            self.model.lesson_embeddings[lesson_idx]
+                expected_gain = np.mean([self.reference_pass_likelihood(
+                    student_idx, next_state, assessment_idx) - self.reference_pass_likelihood(
+                        student_idx, state, assessment_idx) \
+                                for assessment_idx in range(num_assessments)])
+                self.assertAlmostEqual(gains[student_idx, lesson_idx], expected_gain, places=5)
+
+        # lesson embeddings are small, so first-order approximations are close
+        linearized_gains = recommender.lesson_gains(self.student_idxes, linearized=True)
+        np.testing.assert_allclose(linearized_gains, gains, rtol=0.1, atol=1e-3)
+
+        lesson_idxes, top_gains = recommender.top_k_lessons(self.student_idxes, k=2)
+        self.assertEqual(lesson_idxes.shape, (len(self.student_idxes), 2))
+        for student_idx in self.student_idxes:
+            np.testing.assert_allclose(
+                top_gains[student_idx], np.sort(gains[student_idx])[::-1][:2])
+            np.testing.assert_allclose(
+                gains[student_idx, lesson_idxes[student_idx]], top_gains[student_idx])
+
+    def test_assessments_in_band(self):
+        """
+        Assessments in a pass-likelihood band should match a straightforward loop,
+        with or without the spatial index
+        """
+
+        for lower, upper in [(0.6, 0.8), (0.2, 0.9), (0., 0.5), (0.5, 1.)]:
+            expected_assessments = []
+            for student_idx, state in zip(self.student_idxes, self.latest_states):
+                pass_likelihoods = np.array([self.reference_pass_likelihood(
+                    student_idx, state, assessment_idx) \
+                            for assessment_idx in range(self.history.num_assessments())])
+                in_band = np.flatnonzero(
+                    (pass_likelihoods >= lower) & (pass_likelihoods <= upper))
+                expected_assessments.append(
+                    set(in_band[np.argsort(-pass_likelihoods[in_band])]))
+
+            for using_spatial_index in [False, True]:
+                recommender = recommend.EmbeddingRecommender(
+                    self.model, block_size=3, using_spatial_index=using_spatial_index)
+                assessments = recommender.assessments_in_band(
+                    self.student_idxes, lower=lower, upper=upper)
+                self.assertEqual([set(x) for x in assessments], expected_assessments)
+
+                pass_likelihoods = recommender.assessment_pass_likelihoods(self.student_idxes)
+                for student_idx, assessment_idxes in zip(self.student_idxes, assessments):
+                    self.assertTrue((np.diff(
+                        pass_likelihoods[student_idx, assessment_idxes]) <= 0).all())
+
+        with self.assertRaises(ValueError):
+            recommend.EmbeddingRecommender(self.model).assessments_in_band(
+                self.student_idxes, lower=0.8, upper=0.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
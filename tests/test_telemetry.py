@@ -0,0 +1,125 @@
+"""
+Module for unit tests that check per-iteration training telemetry
+"""
+
+import unittest
+import logging
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from lentil import est
+from lentil import grad
+from lentil import models
+from lentil import telemetry
+from lentil import toy
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.DEBUG)
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1997)
+        self.telemetry_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.telemetry_dir)
+
+    def test_json_lines_sink(self):
+        """
+        Every optimizer should write one record per iteration, with the cost history
+        of the fit, gradient norms for every parameter and timings for every phase
+        """
+
+        history = toy.get_lesson_prereqs_history()
+        telemetry_file = os.path.join(self.telemetry_dir, 'fit.jsonl')
+
+        estimator_kwargs = [
+            {'using_scipy' : True},
+            {'using_scipy' : False, 'gradient_descent_kwargs' : {'max_iter' : 5}},
+            {'using_minibatches' : True, 'minibatch_kwargs' : {
+                'batch_size' : 2, 'max_epochs' : 3}}]
+        for kwargs in estimator_kwargs:
+            training_telemetry = telemetry.TrainingTelemetry(
+                [telemetry.JSONLinesSink(telemetry_file), telemetry.LoggingSink(_logger)])
+            checkpointer = est.FitCheckpointer(
+                os.path.join(self.telemetry_dir, 'fit.ckpt'), every=1)
+            model = models.EmbeddingModel(history, 2, using_prereqs=True, using_lessons=True)
+            model.fit(est.EmbeddingMAPEstimator(
+                telemetry=training_telemetry, checkpointer=checkpointer, **kwargs))
+            training_telemetry.close()
+
+            with open(telemetry_file) as f:
+                records = [json.loads(line) for line in f]
+
+            costs = checkpointer.load()['costs']
+            self.assertEqual(len(records), len(costs))
+            self.assertEqual([r['iter_idx'] for r in records], list(range(1, len(costs) + 1)))
+            np.testing.assert_allclose([r['cost'] for r in records], costs)
+
+            for record in records:
+                self.assertGreaterEqual(record['num_evaluations'], 1)
+                self.assertTrue(set(record['gradient_norms']).issuperset([
+                    models.STUDENT_EMBEDDINGS, models.ASSESSMENT_EMBEDDINGS,
+                    models.LESSON_EMBEDDINGS, models.PREREQ_EMBEDDINGS]))
+                self.assertEqual(set(record['phase_times']), set(grad.PHASES))
+                self.assertTrue(all(t >= 0 for t in record['phase_times'].values()))
+                self.assertGreater(record['peak_memory'], 0)
+
+    def test_every(self):
+        """
+        Records made every few iterations should average the statistics of the iterations
+        since the last record
+        """
+
+        records = []
+        training_telemetry = telemetry.TrainingTelemetry([records.append], every=2)
+        for iter_idx in range(1, 5):
+            training_telemetry.record_evaluations(3, {'gather' : 1.})
+            training_telemetry(iter_idx, None, [iter_idx], {})
+
+        self.assertEqual([r['iter_idx'] for r in records], [2, 4])
+        for record in records:
+            self.assertEqual(record['num_evaluations'], 3)
+            self.assertEqual(record['phase_times']['gather'], 1.)
+            self.assertEqual(record['phase_times']['scatter'], 0.)
+
+    def test_block_coordinate(self):
+        """
+        Block-coordinate fits should write one record per sweep, with statistics
+        of the evaluations of the cost functions of blocks, whether blocks are solved
+        on threads or in worker processes
+        """
+
+        history = toy.get_lesson_prereqs_history()
+
+        for worker_type in est.WORKER_TYPES:
+            records = []
+            costs = []
+            model = models.EmbeddingModel(history, 2, using_prereqs=True, using_lessons=True)
+            model.fit(est.BlockCoordinateEstimator(
+                num_sweeps=3, ftol=1e-12, block_size=3, num_workers=2,
+                worker_type=worker_type,
+                telemetry=telemetry.TrainingTelemetry([records.append]),
+                callback=lambda iter_idx, params, c, state: costs.append(c[-1])))
+
+            self.assertEqual([r['iter_idx'] for r in records], [1, 2, 3])
+            np.testing.assert_allclose([r['cost'] for r in records], costs)
+            for record in records:
+                self.assertGreater(record['num_evaluations'], 1)
+                self.assertEqual(set(record['gradient_norms']), {
+                    models.STUDENT_EMBEDDINGS, models.ASSESSMENT_EMBEDDINGS,
+                    models.LESSON_EMBEDDINGS, models.PREREQ_EMBEDDINGS,
+                    models.STUDENT_BIASES, models.ASSESSMENT_BIASES})
+                self.assertGreater(record['phase_times']['gather'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()